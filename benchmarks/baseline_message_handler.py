@@ -0,0 +1,375 @@
+# benchmarks/baseline_message_handler.py
+"""
+Vendored copy of BinanceWSMessageHandler at the baseline commit (abfb5e2), the "before"
+reference of bench_message_handler. Only the class is kept (not STREAM_DESCRIPTION), and
+`update_market_data` is the baseline one, writing into this module's own `market_data`
+so the benchmark does not touch the stores of the current package. Do not modernize.
+"""
+import json
+import time
+from typing import Any
+
+
+market_data = {}
+
+def update_market_data(
+    exchange: str,
+    symbol: str,
+    market_type: str,
+    event_type: str,
+    data: Any,      
+):
+    """
+    Update the market data with the given data.
+    
+    Args:
+        exchange (str): The exchange of the data.
+        symbol (str): The symbol of the data.
+        market_type (str): The market type of the data.
+        event_type (str): The event type of the data.
+        data (Any): The data to be updated.
+    """
+    global market_data
+    try:
+        market_data[exchange][symbol][market_type][event_type] = data
+    except KeyError:
+        if exchange not in market_data:
+            market_data[exchange] = {}
+        if symbol not in market_data[exchange]:
+            market_data[exchange][symbol] = {}
+        if market_type not in market_data[exchange][symbol]:
+            market_data[exchange][symbol][market_type] = {}
+        if event_type not in market_data[exchange][symbol][market_type]:
+            market_data[exchange][symbol][market_type][event_type] = {}
+        market_data[exchange][symbol][market_type][event_type] = data
+
+
+class BinanceWSMessageHandler:
+    """
+    A class that handles messages from the Binance websocket streams.
+    """
+    def __init__(self,
+                 callback=None):
+        self.handler_tree = None
+        self.callback = callback
+
+        self._initialize_handler_tree()
+    
+
+    def _initialize_handler_tree(self):
+        self.handler_tree = {
+            "spot": {
+                "e": {
+                    # Market Streams
+                    "aggTrade": self._agg_trade_handler,
+                    "trade": self._trade_handler,
+                    "kline": self._kline_handler,
+                    "24hrMiniTicker": self._miniticker_handler,
+                    "24hrTicker": self._ticker_handler,
+                    "1hTicker": self._window_ticker_handler,
+                    "4hTicker": self._window_ticker_handler,
+                    "1dTicker": self._window_ticker_handler,
+
+                    # User Data Streams
+                    "outboundAccountInfo": self._outbound_account_info_handler,
+                    "balanceUpdate": self._balance_update_handler,
+                    "executionReport": self._execution_report_handler, # https://binance-docs.github.io/apidocs/spot/en/#public-api-definitions
+                    "depthUpdate": self._depth_handler,
+                    "bookTicker": self._spot_book_ticker_handler,
+                },
+            },
+            "um": {
+                "e": {
+                    # Market Streams
+                    "aggTrade": self._agg_trade_handler,
+                    "markPriceUpdate": self._mark_price_update_handler,
+                    "kline": self._kline_handler,
+                    "continuous_kline": self._continuous_kline_handler,
+                    "24hrMiniTicker": self._miniticker_handler,
+                    "24hrTicker": self._ticker_handler,
+                    "bookTicker": self._um_book_ticker_handler,
+                    "forceOrder": self._force_order_handler,
+                    "depthUpdate": self._um_depth_handler,
+                    "compositeIndex": self._composite_index_handler,
+                    "contractInfo": self._contract_info_handler,
+                    "assetIndexUpdate": self._asset_index_handler,
+
+                    # User Data Streams
+                    "MARGIN_CALL": self._um_margin_call_handler,
+                    "ACCOUNT_UPDATE": self._um_account_update_handler,
+                    "ORDER_TRADE_UPDATE": self._um_order_trade_update_handler,
+                    "ACCOUNT_CONFIG_UPDATE": self._um_account_config_update_handler,
+                    "STRATEGY_UPDATE": self._um_strategy_update_handler,
+                    "GRID_UPDATE": self._um_grid_update_handler,
+                    "CONDITIONAL_ORDER_TRIGGER_REJECT": self._um_conditional_order_trigger_reject_handler,
+                },
+            },
+        }
+
+
+    um_ACCOUNT_UPDATE_HANDLER_TREE = {}
+    um_ORDER_TRADE_UPDATE_HANDLER_TREE = {}
+    um_STRATEGY_UPDATE_HANDLER_TREE = {}
+
+    EXECUTION_REPORT_HANDLER_TREE = {
+        # See more here: https://binance-docs.github.io/apidocs/spot/en/#public-api-definitions
+        
+    }
+
+    """Spot Websocket Handlers"""
+
+    def _agg_trade_handler(self, message, market: str, **kwargs):
+        """
+        Aggregate trade streams push trade information that is aggregated for a single taker order.
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#aggregate-trade-streams
+        """
+        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
+        # price = message["p"]
+        # quantity = message["q"]
+        # trade_time = message["T"]
+        update_market_data(
+            exchange="binance",
+            symbol=symbol,
+            market_type=market,
+            event_type="aggTrade",
+            data=message,
+        )
+
+    def _trade_handler(self, message, **kwargs):
+        """
+        Trade streams push raw trade information; each trade has a unique buyer and seller.
+        """
+        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
+        update_market_data("binance", symbol, "spot", "trade", message)
+    
+    def _kline_handler(self, message, market: str, **kwargs):
+        """
+        Kline/candlestick Stream push updates to the current klines/candlestick every second.
+        
+        """
+        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
+        interval = message["k"]["i"] # Interval (e.g. "1m")
+        update_market_data("binance", symbol, market, f"kline__{interval}", message)
+    
+    def _ticker_handler(self, message, market: str, **kwargs):
+        """
+        24hr rolling window ticker statistics for a single symbol pushed every second.
+        These are NOT the statistics of the UTC day, but a 24hr rolling window for the previous 24hrs.
+        
+        """
+        symbol = message["s"]
+        update_market_data("binance", symbol, market, "ticker", message)
+
+    def _window_ticker_handler(self, message, **kwargs):
+        raise NotImplementedError
+
+    def _miniticker_handler(self, message, market: str, **kwargs):
+        """
+        24hr rolling window mini-ticker statistics. These are NOT the statistics of the UTC day.
+        but a 24hr rolling window for the previous 24hrs.
+        """
+        symbol = message["s"]
+        update_market_data("binance", symbol, market, "miniTicker", message)
+
+    def _spot_book_ticker_handler(self, message, **kwargs):
+        """
+        Pushes any update to the best bid or ask's price or quantity in real-time for a specified symbol.
+        Payload:
+        {
+            "u":400900217,     // order book updateId
+            "s":"BNBUSDT",     // symbol
+            "b":"25.35190000", // best bid price
+            "B":"31.21000000", // best bid qty
+            "a":"25.36520000", // best ask price
+            "A":"40.66000000"  // best ask qty
+        }
+        """
+        symbol = message["s"]
+        update_market_data("binance", symbol, "spot", "bookTicker", message)
+
+    def _depth_handler(self, message, market: str, **kwargs):
+        update_market_data("binance", message["s"], market, "depth", message)
+
+    def _outbound_account_info_handler(self, message):
+        raise NotImplementedError
+
+    def _balance_update_handler(self, message):
+        raise NotImplementedError
+
+    def _execution_report_handler(self, message):
+        """
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#public-api-definitions
+        """
+        raise NotImplementedError
+
+
+    """UM Futures Websocket Handlers"""
+
+    
+    def _mark_price_update_handler(self, message, **kwargs):
+        """
+        Mark price and funding rate for a single symbol pushed every 3 or 1 seconds.
+        """
+        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
+        mark_price = message["p"] # Mark price
+        funding_rate = message["r"] # Funding rate
+        next_funding_time = message["T"] # Next funding time
+        update_market_data("binance", symbol, "um", "markPriceUpdate", message)
+        update_market_data("binance", symbol, "um", "markPrice", mark_price)
+        update_market_data("binance", symbol, "um", "fundingRate", funding_rate)
+        update_market_data("binance", symbol, "um", "nextFundingTime", next_funding_time)
+
+    def _continuous_kline_handler(self, message):
+        raise NotImplementedError
+    
+    def _force_order_handler(self, message):
+        raise NotImplementedError
+
+    def _asset_index_handler(self, message):
+        raise NotImplementedError
+
+    def _composite_index_handler(self, message):
+        raise NotImplementedError 
+
+    def _asset_index_handler(self, message):
+        raise NotImplementedError
+
+    def _contract_info_handler(self, message):
+        raise NotImplementedError
+
+    def _um_depth_handler(self, message):
+        raise NotImplementedError
+
+
+    def _um_book_ticker_handler(self, message, **kwargs):
+        """
+        Pushes any update to the best bid or ask's price or quantity in real-time for a specified symbol.
+        Payload:
+        {
+            "e": "bookTicker",  // Event type
+            "u": 400900217,     // order book updateId
+            "E": 1568014460893, // Event time
+            "T": 1568014460891, // transaction time
+            "s": "BNBUSDT",     // symbol
+            "b": "25.35190000", // best bid price
+            "B": "31.21000000", // best bid qty
+            "a": "25.36520000", // best ask price
+            "A": "40.66000000"  // best ask qty
+        }
+
+        e.g.: Binance__um__BNBUSDT__book_ticker
+        """
+        symbol = message["s"]
+        update_market_data("binance", symbol, "um", "bookTicker", message)
+
+    def _um_margin_call_handler(self, message):
+        raise NotImplementedError
+
+    def _um_account_update_handler(self, message):
+        raise NotImplementedError
+
+    def _um_order_trade_update_handler(self, message):
+        raise NotImplementedError
+
+    def _um_account_config_update_handler(self, message):
+        raise NotImplementedError
+
+    def _um_strategy_update_handler(self, message):
+        raise NotImplementedError
+
+    def _um_grid_update_handler(self, message):
+        raise NotImplementedError
+
+    def _um_conditional_order_trigger_reject_handler(self, message, **kwargs):
+        raise NotImplementedError
+
+    def _unknown_event_type_handler(self, message, market: str, stream_name: str, **kwargs):
+        
+        raise Exception(f"Unknown event type: {message}\n \
+                          Market: {market}\n \
+                          Stream name: {stream_name}\n \
+                          Additional kwargs: {kwargs}")
+
+    def _handle_single_data_point(self, data_point: dict, market: str, stream_name: str):
+        """
+        Handle a single data point.
+        """
+        event_type = data_point.get("e")
+
+        if event_type:
+            handler = self.handler_tree[market]["e"].get(event_type)
+            if handler:
+                handler(data_point, market=market)
+            else:
+                self._unknown_event_type_handler(data_point, market, stream_name,
+                                            user_message="Can't find handler for event type")
+        else:
+            if "depth" in stream_name:
+                event_type = "depthUpdate"
+            elif "bookTicker" in stream_name:
+                event_type = "bookTicker"
+            else:
+                self._unknown_event_type_handler(data_point, market, stream_name)
+            
+            handler = self.handler_tree[market]["e"].get(event_type)
+
+            if handler:
+                handler(data_point, market=market)
+            else:
+                self._unknown_event_type_handler(data_point, market, stream_name, 
+                                            user_message="Can't find handler for event type")
+
+
+    def _handle_multiple_data_points(self, data_points: list, market: str, stream_name: str):
+        """
+        Handle multiple data points.
+        """
+        for data_point in data_points:
+            self._handle_single_data_point(data_point, market, stream_name)
+
+
+    def _handle_error(self, error):
+        """
+        Handle an error.
+        """
+        error_code = error.get("code")
+        error_message = error.get("msg")
+
+        
+        print(f"Error code {error_code}: {error_message}, {error}")
+        time.sleep(1)
+        #raise Exception(f"Error code {error_code}: {error_message}, {error}")
+
+
+    def _handle_full_message(self, message, market: str):
+        message = json.loads(message)
+        if "data" in message and "stream" in message:
+            data = message["data"]
+            stream_name = message["stream"]
+
+            if isinstance(data, list):
+                # Multiple data points
+                self._handle_multiple_data_points(data, market, stream_name)
+            else:
+                # Single data point
+                self._handle_single_data_point(data, market, stream_name)
+        
+        else:
+            # Error
+            self._handle_error(message)
+        
+        if self.callback: 
+            self.callback(message)
+
+
+    def get_on_um_message_handler(self) -> callable:
+        def on_um_message(_, message):
+            self._handle_full_message(message, "um")
+        return on_um_message
+
+    
+    def get_spot_message_handler(self) -> callable:
+        def on_spot_message(_, message):
+            self._handle_full_message(message, "spot")
+        return on_spot_message
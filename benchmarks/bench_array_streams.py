@@ -0,0 +1,120 @@
+# benchmarks/bench_array_streams.py
+"""
+Micro-benchmark of the array streams (!markPrice@arr, !ticker@arr, !miniTicker@arr).
+
+Compares, per frame, handling the payloads one by one (typed event + `market_data`
+entries per symbol, the handler before batch handling) with the batch handlers
+(one call per frame, columnar store update, one notification; the per-symbol
+mark price entries of `market_data` are still written).
+Frames are decoded beforehand, the decode cost (the same for both) is reported separately.
+With --subscribe, a coalescing queue is subscribed to every um update (like main.py),
+so the cost of the change notifications is included.
+
+Usage:
+    python -m benchmarks.bench_array_streams [--symbols N] [--frames N] [--repeat N] [--subscribe]
+"""
+import argparse
+import json
+import random
+import time
+
+from crypto_bot import market_data_subscriptions
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+
+
+class PerPayloadMessageHandler(BinanceWSMessageHandler):
+    """
+    Array frames handled payload by payload, kept here as the "before" reference.
+    """
+    def _handle_multiple_data_points(self, data_points: list, market: str, stream_name: str):
+        handler = self._get_stream_handler(market, stream_name)
+        if handler is None:
+            for data_point in data_points:
+                self._handle_event(data_point, market, stream_name)
+        else:
+            for data_point in data_points:
+                handler(data_point, market=market)
+
+
+def synthetic_frames(n_symbols: int = 500, n_frames: int = 50, seed: int = 0) -> dict:
+    """
+    Returns:
+        dict: stream name -> [(market, raw frame as bytes), ...]
+    """
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}USDT" for i in range(n_symbols)]
+    event_time = 1568014460893
+    frames = {"!markPrice@arr": [], "!ticker@arr": [], "!miniTicker@arr": []}
+    for i in range(n_frames):
+        event_time += 1000
+        prices = [rng.uniform(1, 1000) for _ in symbols]
+        frames["!markPrice@arr"].append(("um", [{
+            "e": "markPriceUpdate", "E": event_time, "s": s,
+            "p": f"{p:.8f}", "i": f"{p:.8f}", "P": f"{p:.8f}",
+            "r": "0.00010000", "T": event_time + 3600000,
+        } for s, p in zip(symbols, prices)]))
+        frames["!ticker@arr"].append(("um", [{
+            "e": "24hrTicker", "E": event_time, "s": s,
+            "p": "0.0015", "P": "250.00", "w": f"{p:.8f}", "c": f"{p:.8f}", "Q": "10",
+            "o": f"{p:.8f}", "h": f"{p * 1.01:.8f}", "l": f"{p * 0.99:.8f}",
+            "v": "10000", "q": "18", "O": event_time - 86400000, "C": event_time,
+            "F": 0, "L": 18150, "n": 18151,
+        } for s, p in zip(symbols, prices)]))
+        frames["!miniTicker@arr"].append(("um", [{
+            "e": "24hrMiniTicker", "E": event_time, "s": s,
+            "c": f"{p:.8f}", "o": f"{p:.8f}", "h": f"{p * 1.01:.8f}", "l": f"{p * 0.99:.8f}",
+            "v": "10000", "q": "18",
+        } for s, p in zip(symbols, prices)]))
+    return {
+        stream_name: [(market, json.dumps({"stream": stream_name, "data": data}).encode()) for market, data in stream_frames]
+        for stream_name, stream_frames in frames.items()
+    }
+
+
+def run(handler: BinanceWSMessageHandler, stream_name: str, decoded: list, repeat: int) -> float:
+    """
+    Returns:
+        float: µs per frame
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for market, message in decoded:
+            handler._handle_multiple_data_points(message["data"], market, stream_name)
+    return (time.perf_counter() - start) / (len(decoded) * repeat) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--subscribe", action="store_true", help="Subscribe a queue to every um update")
+    args = parser.parse_args()
+
+    if args.subscribe:
+        queue = market_data_subscriptions.subscribe_queue(exchange="binance", market_type="um")
+
+    before = PerPayloadMessageHandler()
+    after = BinanceWSMessageHandler()
+
+    print(f"{args.symbols} symbols, {args.frames} frames x {args.repeat}, json decoder: {after.json_decoder_backend}")
+    for stream_name, frames in synthetic_frames(args.symbols, args.frames).items():
+        start = time.perf_counter()
+        decoded = [(market, after._decode(frame)) for market, frame in frames]
+        decode_us = (time.perf_counter() - start) / len(frames) * 1e6
+
+        # Warm up (symbol rows, dispatch tables)
+        run(before, stream_name, decoded, 1)
+        run(after, stream_name, decoded, 1)
+
+        before_us = run(before, stream_name, decoded, args.repeat)
+        after_us = run(after, stream_name, decoded, args.repeat)
+        print(f"{stream_name:<18} decode {decode_us:9.1f} µs | per payload {before_us:9.1f} µs | "
+              f"batch {after_us:9.1f} µs | {before_us / after_us:6.1f}x")
+
+    if args.subscribe:
+        market_data_subscriptions.unsubscribe(queue.subscription)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/bench_message_handler.py
+"""
+Micro-benchmark of BinanceWSMessageHandler._handle_full_message.
+
+Reports messages/sec of the baseline handler (vendored in baseline_message_handler: stdlib json,
+per-message event type / stream name scanning, nested market_data dict) and of the current
+handler on the same frames.
+
+Usage:
+    python -m benchmarks.bench_message_handler [--frames FILE] [--repeat N]
+
+FILE is a TickRecorder recording (directory or segment file), or holds one
+recorded frame per line, prefixed by its market and a tab:
+    um\\t{"stream":"!bookTicker","data":{...}}
+Without --frames, synthetic !bookTicker / !markPrice@arr / <symbol>@bookTicker frames are used.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+from benchmarks.baseline_message_handler import BinanceWSMessageHandler as BaselineMessageHandler
+from crypto_bot.binance.recorder import SEGMENT_SUFFIX
+from crypto_bot.binance.replay import recording_frames
+
+
+def synthetic_frames(n_symbols: int = 300, n_frames: int = 20000, seed: int = 0) -> list:
+    """
+    Build a frame mix close to the `!bookTicker` + `!markPrice@arr` firehose,
+    plus spot `<symbol>@bookTicker` frames (no "e" field).
+
+    Returns:
+        list: [(market, raw frame as bytes), ...]
+    """
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}USDT" for i in range(n_symbols)]
+    frames = []
+    event_time = 1568014460893
+    for i in range(n_frames):
+        event_time += rng.randint(0, 3)
+        symbol = rng.choice(symbols)
+        price = rng.uniform(1, 1000)
+        if i % 1000 == 999:
+            frames.append(("um", {
+                "stream": "!markPrice@arr",
+                "data": [{
+                    "e": "markPriceUpdate", "E": event_time, "s": s,
+                    "p": f"{price:.8f}", "i": f"{price:.8f}", "P": f"{price:.8f}",
+                    "r": "0.00010000", "T": event_time + 3600000,
+                } for s in symbols],
+            }))
+        elif i % 4 == 0:
+            frames.append(("spot", {
+                "stream": f"{symbol.lower()}@bookTicker",
+                "data": {
+                    "u": i, "s": symbol,
+                    "b": f"{price:.8f}", "B": "31.21000000",
+                    "a": f"{price * 1.0001:.8f}", "A": "40.66000000",
+                },
+            }))
+        else:
+            frames.append(("um", {
+                "stream": "!bookTicker",
+                "data": {
+                    "e": "bookTicker", "u": i, "E": event_time, "T": event_time - 2, "s": symbol,
+                    "b": f"{price:.8f}", "B": "31.21000000",
+                    "a": f"{price * 1.0001:.8f}", "A": "40.66000000",
+                },
+            }))
+    return [(market, json.dumps(frame).encode()) for market, frame in frames]
+
+
+def load_frames(path: str) -> list:
+    if os.path.isdir(path) or path.endswith(SEGMENT_SUFFIX):
+        return [(market, bytes(frame)) for _, market, frame in recording_frames(path)]
+
+    frames = []
+    with open(path, "rb") as f:
+        for line in f:
+            market, frame = line.rstrip(b"\n").split(b"\t", 1)
+            frames.append((market.decode(), frame))
+    return frames
+
+
+def run(handler: BinanceWSMessageHandler, frames: list, repeat: int) -> float:
+    """
+    Returns:
+        float: messages/sec (one message = one websocket frame)
+    """
+    on_message = {
+        "spot": handler.get_spot_message_handler(),
+        "um": handler.get_on_um_message_handler(),
+    }
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for market, frame in frames:
+            on_message[market](None, frame)
+    elapsed = time.perf_counter() - start
+    return len(frames) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", help="Recorded frames file (market<TAB>frame per line)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames()
+
+    before = BaselineMessageHandler()
+    after = BinanceWSMessageHandler()
+
+    # Warm up (symbol rows, dispatch table)
+    run(before, frames, 1)
+    run(after, frames, 1)
+
+    before_rate = run(before, frames, args.repeat)
+    after_rate = run(after, frames, args.repeat)
+
+    print(f"frames: {len(frames)} x {args.repeat}")
+    print(f"before (baseline handler)             : {before_rate:12,.0f} msg/s")
+    print(f"after  ({after.json_decoder_backend}, stream dispatch table): {after_rate:12,.0f} msg/s")
+    print(f"speedup: {after_rate / before_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
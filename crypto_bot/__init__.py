@@ -2,6 +2,9 @@
 
 from typing import Any
 
+from .market_store import BookTickerStore, MarkPriceStore, TickerStore, MiniTickerStore
+from .market_events import MarketDataSubscriptions
+
 
 market_data = {}
 """
@@ -11,7 +14,10 @@ Global data dictionary that stores the data from the exchanges.
 exchange: binance, etc.
 symbol: BTCUSDT, ETHUSDT, etc.
 market_type: spot, um
-event_type: bookTicker, aggTrade, markPrice, kline__1m, etc.
+event_type: aggTrade, markPrice, kline__1m, etc.
+(bookTicker messages are kept in the columnar `book_tickers` stores instead.)
+
+Binance events are stored as typed events with parsed numerics (see binance/events.py).
 
 
 The data is stored in the following format:
@@ -32,20 +38,31 @@ Example:
     "binance": {
         "BTCUSDT": {
             "um": {
-                "bookTicker": {
-                    "u": 123456789,
-                    "s": "BTCUSDT",
-                    "b": "123.45",
-                    "B": "123.45",
-                    "a": "123.45",
-                    "A": "123.45"
-                }
+                "markPriceUpdate": MarkPriceUpdate(...),  # typed event, see binance/events.py
+                "markPrice": 123.45,
+                "fundingRate": 0.0001,
             }
         }
     },
 }
 """
 
+market_data_subscriptions = MarketDataSubscriptions()
+"""
+Subscriptions to the updates of `market_data` and `book_tickers`.
+
+Example:
+    queue = market_data_subscriptions.subscribe_queue(symbol="BTCUSDT", market_type="um")
+    (exchange, symbol, market_type, event_type), data = queue.get()
+
+For bookTicker updates, data is the `BookTickerStore` the symbol was updated in.
+Array streams (!markPrice@arr, !ticker@arr, !miniTicker@arr) are applied to the columnar stores
+in one batch per frame, without per-symbol notifications: a single
+"markPriceBatch" / "tickerBatch" / "miniTickerBatch" update is published per frame, with symbol None
+and the updated store as data. The per-symbol mark price entries of `market_data` are still written
+(see `update_market_data_batch`).
+"""
+
 def update_market_data(
     exchange: str,
     symbol: str,
@@ -77,4 +94,205 @@ def update_market_data(
             market_data[exchange][symbol][market_type][event_type] = {}
         market_data[exchange][symbol][market_type][event_type] = data
 
+    market_data_subscriptions.publish(exchange, symbol, market_type, event_type, data)
+
+
+def update_market_data_batch(
+    exchange: str,
+    market_type: str,
+    symbols: list,
+    columns: dict,
+):
+    """
+    Update several event types of many symbols at once (e.g. an array stream frame),
+    without per-symbol notifications: the caller publishes a single batch update.
 
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+        symbols (list): The symbols of the data.
+        columns (dict): Event type -> values, aligned with `symbols`.
+    """
+    exchange_data = market_data.setdefault(exchange, {})
+    targets = []
+    for symbol in symbols:
+        try:
+            targets.append(exchange_data[symbol][market_type])
+        except KeyError:
+            targets.append(exchange_data.setdefault(symbol, {}).setdefault(market_type, {}))
+    for event_type, values in columns.items():
+        for symbol_data, value in zip(targets, values):
+            symbol_data[event_type] = value
+
+
+
+
+symbol_tables = {}
+"""
+Symbol tables (binance/symbol_info.py `SymbolTable`) whose IDs are the rows of the stores,
+per exchange and market type, see `use_symbol_table`.
+"""
+
+def use_symbol_table(exchange: str, market_type: str, symbol_table) -> None:
+    """
+    Make the symbol IDs of a `SymbolTable` the rows of every store of the exchange and market type
+    (book tickers, mark prices, tickers), so a symbol has the same row in all of them.
+    Must be called before the stores are created.
+
+    Raises:
+        ValueError: If a store of the exchange and market type already exists.
+    """
+    for stores in (book_tickers, mark_prices):
+        if market_type in stores.get(exchange, {}):
+            raise ValueError(f"The {exchange} {market_type} stores already exist")
+    if tickers.get(exchange, {}).get(market_type):
+        raise ValueError(f"The {exchange} {market_type} stores already exist")
+    symbol_tables.setdefault(exchange, {})[market_type] = symbol_table
+
+
+def _symbol_table(exchange: str, market_type: str):
+    return symbol_tables.get(exchange, {}).get(market_type)
+
+
+book_tickers = {}
+"""
+Global top-of-book stores, one columnar `BookTickerStore` per exchange and market type.
+
+The data is stored in the following format:
+{
+    exchange: {
+        market_type: BookTickerStore
+    }
+}
+
+Example:
+    book_tickers["binance"]["um"].get("BTCUSDT")["bid"]
+"""
+
+def get_book_ticker_store(exchange: str, market_type: str) -> BookTickerStore:
+    """
+    Get the top-of-book store of the given exchange and market type,
+    creating it on first use.
+
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+    """
+    global book_tickers
+    try:
+        return book_tickers[exchange][market_type]
+    except KeyError:
+        store = book_tickers.setdefault(exchange, {}).setdefault(
+            market_type, BookTickerStore(symbol_table=_symbol_table(exchange, market_type)))
+        return store
+
+
+def update_book_ticker(
+    exchange: str,
+    market_type: str,
+    message: dict,
+) -> int:
+    """
+    Update the top-of-book store with a raw bookTicker message.
+
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+        message (dict): The bookTicker payload.
+    Returns:
+        int: The row of the symbol in the store.
+    """
+    store = get_book_ticker_store(exchange, market_type)
+    row = store.update_from_message(message)
+    market_data_subscriptions.publish(exchange, message["s"], market_type, "bookTicker", store)
+    return row
+
+
+
+mark_prices = {}
+"""
+Global mark price / funding stores, one columnar `MarkPriceStore` per exchange and market type.
+(the per-symbol values are also kept in `market_data`, see above)
+
+Example:
+    mark_prices["binance"]["um"].get("BTCUSDT")["fundingRate"]
+"""
+
+def get_mark_price_store(exchange: str, market_type: str) -> MarkPriceStore:
+    """
+    Get the mark price store of the given exchange and market type,
+    creating it on first use.
+
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+    """
+    global mark_prices
+    try:
+        return mark_prices[exchange][market_type]
+    except KeyError:
+        store = mark_prices.setdefault(exchange, {}).setdefault(
+            market_type, MarkPriceStore(symbol_table=_symbol_table(exchange, market_type)))
+        return store
+
+
+def update_mark_price(
+    exchange: str,
+    market_type: str,
+    event,
+) -> int:
+    """
+    Update the mark price store with a typed mark price event.
+    Nothing is published here, see "markPriceBatch" in `market_data_subscriptions`.
+
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+        event: The `MarkPriceUpdate` event.
+    Returns:
+        int: The row of the symbol in the store.
+    """
+    return get_mark_price_store(exchange, market_type).update_from_event(event)
+
+
+
+TICKER_STORE_CLASSES = {
+    "ticker": TickerStore,
+    "miniTicker": MiniTickerStore,
+}
+
+tickers = {}
+"""
+Global 24hr ticker stores, one columnar store per exchange, market type and event type
+("ticker": `TickerStore`, "miniTicker": `MiniTickerStore`).
+
+The data is stored in the following format:
+{
+    exchange: {
+        market_type: {
+            event_type: TickerStore
+        }
+    }
+}
+
+Example:
+    tickers["binance"]["um"]["miniTicker"].get("BTCUSDT")["close"]
+"""
+
+def get_ticker_store(exchange: str, market_type: str, event_type: str = "ticker"):
+    """
+    Get the ticker store of the given exchange, market type and event type,
+    creating it on first use.
+
+    Args:
+        exchange (str): The exchange of the data.
+        market_type (str): The market type of the data.
+        event_type (str): "ticker" or "miniTicker".
+    """
+    global tickers
+    try:
+        return tickers[exchange][market_type][event_type]
+    except KeyError:
+        stores = tickers.setdefault(exchange, {}).setdefault(market_type, {})
+        return stores.setdefault(
+            event_type, TICKER_STORE_CLASSES[event_type](symbol_table=_symbol_table(exchange, market_type)))
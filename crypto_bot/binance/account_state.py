@@ -0,0 +1,436 @@
+# crypto_bot/binance/account_state.py
+"""
+In-memory account state (balances, um positions, open orders), kept up to date by the
+user data stream events and corrected by periodic REST reconciliation.
+
+    account = message_handler.account
+    account.get_balance("spot", "USDT").free
+    account.get_position("BTCUSDT").amount
+    account.get_open_orders("um", "BTCUSDT")
+
+User data streams expire when their listenKey is not renewed: `ListenKeyKeepalive`
+renews them, and replaces keys that expired anyway.
+"""
+import threading
+import time
+
+from binance.error import ClientError
+
+from crypto_bot import market_data_subscriptions
+from .order_gateway import OrderTable
+
+
+class Balance:
+    __slots__ = ("asset", "free", "locked", "wallet_balance", "cross_wallet_balance", "update_time")
+
+    def __init__(self, asset: str):
+        self.asset = asset
+        self.free = 0.0
+        """um: the wallet balance"""
+        self.locked = 0.0
+        self.wallet_balance = 0.0
+        """um only"""
+        self.cross_wallet_balance = 0.0
+        """um only"""
+        self.update_time = 0
+
+    @property
+    def total(self) -> float:
+        return self.free + self.locked
+
+    def __repr__(self):
+        return f"Balance({self.asset} free={self.free} locked={self.locked} wallet={self.wallet_balance})"
+
+
+class Position:
+    __slots__ = ("symbol", "position_side", "amount", "entry_price", "break_even_price", "unrealized_pnl",
+                 "accumulated_realized", "margin_type", "isolated_wallet", "update_time")
+
+    def __init__(self, symbol: str, position_side: str = "BOTH"):
+        self.symbol = symbol
+        self.position_side = position_side
+        self.amount = 0.0
+        self.entry_price = 0.0
+        self.break_even_price = 0.0
+        self.unrealized_pnl = 0.0
+        self.accumulated_realized = 0.0
+        self.margin_type = None
+        self.isolated_wallet = 0.0
+        self.update_time = 0
+
+    def __repr__(self):
+        return (f"Position({self.symbol} {self.position_side} amount={self.amount} "
+                f"entry={self.entry_price} upnl={self.unrealized_pnl})")
+
+
+class AccountState:
+    """
+    Balances per market and asset, um positions per symbol and position side,
+    and the open orders of an `OrderTable`: every lookup is a dict access.
+    """
+    def __init__(self, orders: OrderTable = None, on_update: callable = None):
+        """
+        Args:
+            orders (OrderTable): Table of the orders (shared with the `OrderGateway`).
+            on_update (callable): Called with (market, Balance | Position) after every change.
+        """
+        self.orders = orders if orders is not None else OrderTable()
+        self.on_update = on_update
+        self.balances = {"spot": {}, "um": {}}
+        """market -> asset -> Balance"""
+        self.positions = {}
+        """symbol -> position side -> Position (um)"""
+        self.leverage = {}
+        """symbol -> leverage (um)"""
+        self.multi_assets_mode = None
+        """um Multi-Assets mode, once an ACCOUNT_CONFIG_UPDATE reported it."""
+        self.margin_call = None
+        """Last MARGIN_CALL event (um)."""
+        self.last_event_time = {"spot": 0, "um": 0}
+
+        self.reconcile_count = 0
+        self.reconcile_corrections = 0
+        """Differences between the state built from the events and the REST snapshots."""
+        self._lock = threading.Lock()
+        self._reconcile_thread = None
+        self._reconcile_stop = threading.Event()
+
+    """Lookups"""
+
+    def get_balance(self, market: str, asset: str) -> Balance:
+        return self.balances[market].get(asset)
+
+    def get_position(self, symbol: str, position_side: str = "BOTH") -> Position:
+        sides = self.positions.get(symbol)
+        return sides.get(position_side) if sides else None
+
+    def get_open_orders(self, market: str, symbol: str) -> list:
+        return self.orders.open_orders(market, symbol)
+
+    """Updates"""
+
+    def _balance(self, market: str, asset: str) -> Balance:
+        balance = self.balances[market].get(asset)
+        if balance is None:
+            balance = self.balances[market][asset] = Balance(asset)
+        return balance
+
+    def _position(self, symbol: str, position_side: str) -> Position:
+        sides = self.positions.get(symbol)
+        if sides is None:
+            sides = self.positions[symbol] = {}
+        position = sides.get(position_side)
+        if position is None:
+            position = sides[position_side] = Position(symbol, position_side)
+        return position
+
+    def _updated(self, market: str, item) -> None:
+        if self.on_update:
+            self.on_update(market, item)
+
+    def on_outbound_account_position(self, message: dict) -> None:
+        """
+        Spot outboundAccountPosition event: absolute balances of the assets that changed.
+
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#payload-account-update
+        """
+        update_time = message.get("u") or message["E"]
+        with self._lock:
+            self.last_event_time["spot"] = message["E"]
+            for asset_balance in message["B"]:
+                balance = self._balance("spot", asset_balance["a"])
+                if update_time < balance.update_time:
+                    continue
+                balance.free = float(asset_balance["f"])
+                balance.locked = float(asset_balance["l"])
+                balance.update_time = update_time
+                self._updated("spot", balance)
+
+    def on_balance_update(self, message: dict) -> None:
+        """
+        Spot balanceUpdate event: deposit, withdrawal or transfer delta.
+
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#payload-balance-update
+        """
+        with self._lock:
+            self.last_event_time["spot"] = message["E"]
+            balance = self._balance("spot", message["a"])
+            # An outboundAccountPosition event newer than the delta already includes it
+            if message["E"] <= balance.update_time:
+                return
+            balance.free += float(message["d"])
+            balance.update_time = message["E"]
+            self._updated("spot", balance)
+
+    def on_account_update(self, message: dict) -> None:
+        """
+        UM futures ACCOUNT_UPDATE event: absolute balances and positions that changed.
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-balance-and-position-update
+        """
+        update_time = message.get("T") or message["E"]
+        account = message["a"]
+        with self._lock:
+            self.last_event_time["um"] = message["E"]
+            for asset_balance in account.get("B", ()):
+                balance = self._balance("um", asset_balance["a"])
+                if update_time < balance.update_time:
+                    continue
+                balance.wallet_balance = float(asset_balance["wb"])
+                balance.cross_wallet_balance = float(asset_balance["cw"])
+                balance.free = balance.wallet_balance
+                balance.update_time = update_time
+                self._updated("um", balance)
+
+            for position_update in account.get("P", ()):
+                position = self._position(position_update["s"], position_update.get("ps", "BOTH"))
+                if update_time < position.update_time:
+                    continue
+                position.amount = float(position_update["pa"])
+                position.entry_price = float(position_update["ep"])
+                position.break_even_price = float(position_update.get("bep", 0.0))
+                position.accumulated_realized = float(position_update.get("cr", 0.0))
+                position.unrealized_pnl = float(position_update["up"])
+                position.margin_type = position_update.get("mt")
+                position.isolated_wallet = float(position_update.get("iw", 0.0))
+                position.update_time = update_time
+                self._updated("um", position)
+
+    def on_account_config_update(self, message: dict) -> None:
+        """
+        UM futures ACCOUNT_CONFIG_UPDATE event: leverage of a symbol ("ac")
+        or Multi-Assets mode ("ai") changed.
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-account-configuration-update-previous-leverage-update
+        """
+        with self._lock:
+            self.last_event_time["um"] = message["E"]
+            leverage = message.get("ac")
+            if leverage is not None:
+                self.leverage[leverage["s"]] = int(leverage["l"])
+            multi_assets = message.get("ai")
+            if multi_assets is not None:
+                self.multi_assets_mode = bool(multi_assets["j"])
+
+    def on_margin_call(self, message: dict) -> None:
+        """
+        UM futures MARGIN_CALL event: positions close to liquidation. Their margin type,
+        isolated wallet and unrealized PnL are updated, the amounts are left to ACCOUNT_UPDATE.
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-margin-call
+        """
+        with self._lock:
+            self.last_event_time["um"] = message["E"]
+            self.margin_call = message
+            for position_update in message.get("p", ()):
+                position = self._position(position_update["s"], position_update.get("ps", "BOTH"))
+                position.margin_type = position_update.get("mt", position.margin_type)
+                position.isolated_wallet = float(position_update.get("iw", position.isolated_wallet))
+                position.unrealized_pnl = float(position_update.get("up", position.unrealized_pnl))
+                self._updated("um", position)
+        symbols = ", ".join(position_update["s"] for position_update in message.get("p", ()))
+        print(f"Margin call (cross wallet balance {message.get('cw')}): {symbols}")
+
+    """REST reconciliation"""
+
+    def reconcile(self, market: str, client) -> int:
+        """
+        Correct the state with REST snapshots of the balances, positions and open orders.
+        Items updated by an event since the snapshot was requested are left as they are.
+
+        Args:
+            client: The market's (scheduled) connector client, with credentials.
+        Returns:
+            int: Number of corrections.
+        """
+        snapshot_time = int(time.time() * 1000)
+        corrections = 0
+
+        if market == "spot":
+            account = client.account()
+            open_orders = client.get_open_orders()
+            update_time = account.get("updateTime") or snapshot_time
+            with self._lock:
+                for asset_balance in account["balances"]:
+                    balance = self._balance("spot", asset_balance["asset"])
+                    if balance.update_time > update_time:
+                        continue
+                    free, locked = float(asset_balance["free"]), float(asset_balance["locked"])
+                    if (free, locked) != (balance.free, balance.locked):
+                        corrections += 1
+                        balance.free, balance.locked = free, locked
+                        self._updated("spot", balance)
+                    balance.update_time = update_time
+        else:
+            balances = client.balance()
+            positions = client.get_position_risk()
+            open_orders = client.get_orders()
+            with self._lock:
+                for asset_balance in balances:
+                    balance = self._balance("um", asset_balance["asset"])
+                    update_time = asset_balance.get("updateTime") or snapshot_time
+                    if balance.update_time > update_time:
+                        continue
+                    wallet_balance = float(asset_balance["balance"])
+                    if wallet_balance != balance.wallet_balance:
+                        corrections += 1
+                        balance.wallet_balance = balance.free = wallet_balance
+                        balance.cross_wallet_balance = float(asset_balance.get("crossWalletBalance", wallet_balance))
+                        self._updated("um", balance)
+                    balance.update_time = update_time
+
+                for rest_position in positions:
+                    position = self._position(rest_position["symbol"], rest_position.get("positionSide", "BOTH"))
+                    update_time = rest_position.get("updateTime") or snapshot_time
+                    if position.update_time > update_time:
+                        continue
+                    amount = float(rest_position["positionAmt"])
+                    if amount != position.amount:
+                        corrections += 1
+                    position.amount = amount
+                    position.entry_price = float(rest_position["entryPrice"])
+                    position.break_even_price = float(rest_position.get("breakEvenPrice", 0.0))
+                    position.unrealized_pnl = float(rest_position.get("unRealizedProfit", 0.0))
+                    position.isolated_wallet = float(rest_position.get("isolatedWallet", 0.0))
+                    position.margin_type = rest_position.get("marginType", position.margin_type)
+                    if "leverage" in rest_position:
+                        self.leverage[position.symbol] = int(rest_position["leverage"])
+                    position.update_time = update_time
+                    self._updated("um", position)
+
+        corrections += self.orders.reconcile(market, open_orders, snapshot_time)
+        self.reconcile_count += 1
+        self.reconcile_corrections += corrections
+        return corrections
+
+    def start_reconciliation(self, clients: dict, interval: float = 300.0) -> None:
+        """
+        Reconcile every market at once, then every `interval` seconds on a background thread.
+
+        Args:
+            clients (dict): market -> connector client, e.g. {"spot": spot_client, "um": um_client}
+        """
+        def reconcile_all():
+            for market, client in clients.items():
+                try:
+                    self.reconcile(market, client)
+                except Exception as e:
+                    print(f"Account reconciliation of {market} failed: {e!r}")
+
+        def run():
+            reconcile_all()
+            while not self._reconcile_stop.wait(interval):
+                reconcile_all()
+
+        self._reconcile_stop.clear()
+        self._reconcile_thread = threading.Thread(target=run, name="account-reconciliation", daemon=True)
+        self._reconcile_thread.start()
+
+    def stop_reconciliation(self) -> None:
+        self._reconcile_stop.set()
+        if self._reconcile_thread is not None:
+            self._reconcile_thread.join()
+            self._reconcile_thread = None
+
+
+class ListenKeyKeepalive:
+    """
+    Renews the listenKeys of the user data streams (they expire 60 minutes after the
+    last renewal), and creates a new key when one expired anyway (renewal rejected,
+    or listenKeyExpired event).
+    """
+    def __init__(self,
+                 clients: dict,
+                 listen_keys: dict,
+                 on_new_listen_key: callable = None,
+                 interval: float = 30 * 60.0,
+                 retry_interval: float = 30.0):
+        """
+        Args:
+            clients (dict): market -> connector client, with credentials.
+            listen_keys (dict): market -> current listenKey.
+            on_new_listen_key (callable): Called with (market, new listenKey, previous listenKey)
+                when a key is replaced: the user data stream must be subscribed again.
+            interval (float): Seconds between renewals.
+            retry_interval (float): Seconds before retrying a failed renewal.
+        """
+        self.clients = clients
+        self.listen_keys = dict(listen_keys)
+        self.on_new_listen_key = on_new_listen_key
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.renewals = 0
+        self.replacements = 0
+
+        self._expired = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._subscription = None
+
+    def _on_listen_key_expired(self, exchange, symbol, market_type, event_type, data) -> None:
+        if market_type in self.clients:
+            self._expired.add(market_type)
+            self._wake.set()
+
+    def _replace(self, market: str) -> None:
+        previous = self.listen_keys.get(market)
+        self.listen_keys[market] = self.clients[market].new_listen_key()["listenKey"]
+        self.replacements += 1
+        if self.on_new_listen_key:
+            self.on_new_listen_key(market, self.listen_keys[market], previous)
+
+    def renew(self) -> bool:
+        """
+        Renew every key (replace the expired ones).
+
+        Returns:
+            bool: False if a renewal failed for another reason than an expired key.
+        """
+        succeeded = True
+        for market, client in self.clients.items():
+            try:
+                if market in self._expired:
+                    self._expired.discard(market)
+                    self._replace(market)
+                    continue
+                client.renew_listen_key(self.listen_keys[market])
+                self.renewals += 1
+            except ClientError as e:
+                # -1125: This listenKey does not exist.
+                try:
+                    self._replace(market)
+                except Exception as replace_error:
+                    print(f"Could not replace the {market} listenKey: {replace_error!r} (renewal: {e!r})")
+                    succeeded = False
+            except Exception as e:
+                print(f"Could not renew the {market} listenKey: {e!r}")
+                succeeded = False
+        return succeeded
+
+    def start(self) -> None:
+        def run():
+            wait = self.interval
+            while True:
+                self._wake.wait(wait)
+                if self._stop.is_set():
+                    return
+                self._wake.clear()
+                wait = self.interval if self.renew() else self.retry_interval
+
+        self._subscription = market_data_subscriptions.subscribe(
+            self._on_listen_key_expired, exchange="binance", event_type="listenKeyExpired",
+        )
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="listen-key-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._subscription is not None:
+            market_data_subscriptions.unsubscribe(self._subscription)
+            self._subscription = None
@@ -0,0 +1,209 @@
+# crypto_bot/binance/async_websocket_client.py
+"""
+asyncio websocket client for the Binance market / user data streams.
+
+Alternative to the thread-based `SpotWebsocketStreamClient` / `UMFuturesWebsocketClient`
+of the connectors: every connection is a task of a single event loop, and frames are passed
+to `on_message` on that loop, without any thread hop.
+
+Requires the `websockets` package.
+"""
+import asyncio
+import json
+import random
+
+
+SPOT_STREAM_URL = "wss://stream.binance.com:9443"
+UM_STREAM_URL = "wss://fstream.binance.com"
+
+
+def _connect(uri: str, **kwargs):
+    try:
+        from websockets.asyncio.client import connect
+    except ImportError:
+        # websockets < 13
+        from websockets import connect
+    return connect(uri, **kwargs)
+
+
+class AsyncBinanceWebsocketClient:
+    """
+    A combined (or raw) stream connection with live subscribe / unsubscribe and automatic reconnect.
+
+    `on_message` is called like the connectors' callbacks: on_message(client, message).
+
+    Ping / pong:
+        Binance pings every few minutes and closes connections that do not answer;
+        pongs are sent automatically by `websockets`. The client also pings the server
+        every `ping_interval` seconds, so that dead connections are detected.
+
+    Reconnect:
+        When the connection drops, it is reopened after an exponential, jittered backoff
+        and every subscribed stream is subscribed again. `close` interrupts the backoff.
+    """
+    def __init__(self,
+                 stream_url: str,
+                 on_message: callable,
+                 is_combined: bool = True,
+                 ping_interval: float = 20.0,
+                 ping_timeout: float = 20.0,
+                 reconnect: bool = True,
+                 min_reconnect_delay: float = 0.5,
+                 max_reconnect_delay: float = 30.0,
+                 connect_timeout: float = 10.0,
+                 on_connect: callable = None):
+        """
+        Args:
+            stream_url (str): e.g. SPOT_STREAM_URL, UM_STREAM_URL
+            on_message (callable): Called with (client, raw frame) for every frame.
+            is_combined (bool): Use the combined stream endpoint (/stream) instead of the raw one (/ws).
+            connect_timeout (float): Timeout (s) of the opening handshake of each connection attempt,
+                and default timeout of `connect`.
+            on_connect (callable): Called with the client every time a connection is (re)opened.
+        """
+        self.stream_url = stream_url
+        self.uri = f"{stream_url}/stream" if is_combined else f"{stream_url}/ws"
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.reconnect = reconnect
+        self.min_reconnect_delay = min_reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connect_timeout = connect_timeout
+
+        self.streams = []
+        """Subscribed streams, subscribed again on reconnect."""
+        self.reconnect_count = 0
+
+        self._websocket = None
+        self._connected = asyncio.Event()
+        self._run_task = None
+        self._closing = False
+        self._closed = asyncio.Event()
+        """Set by `close`, ends the reconnect backoff sleep."""
+        self._next_id = 1
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected.is_set()
+
+    async def connect(self, timeout: float = None) -> None:
+        """
+        Start the connection task and wait until the connection is open.
+
+        Args:
+            timeout (float): Defaults to `connect_timeout`.
+        Raises:
+            TimeoutError: The connection was not open in time (the connection task is stopped).
+        """
+        if self._run_task is None:
+            self._closing = False
+            self._closed.clear()
+            self._run_task = asyncio.get_running_loop().create_task(self.run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout or self.connect_timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"Could not connect to {self.uri} within {timeout or self.connect_timeout}s")
+
+    async def run(self) -> None:
+        """
+        Connect, receive frames and reconnect until `close` is called.
+        """
+        delay = self.min_reconnect_delay
+        while not self._closing:
+            try:
+                async with _connect(self.uri,
+                                    ping_interval=self.ping_interval,
+                                    ping_timeout=self.ping_timeout,
+                                    open_timeout=self.connect_timeout,
+                                    max_size=None) as websocket:
+                    self._websocket = websocket
+                    delay = self.min_reconnect_delay
+                    if self.streams:
+                        await self._send("SUBSCRIBE", self.streams)
+                    self._connected.set()
+                    if self.on_connect:
+                        self.on_connect(self)
+
+                    on_message = self.on_message
+                    async for frame in websocket:
+                        on_message(self, frame)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._closing:
+                    print(f"Websocket {self.uri} disconnected: {e!r}")
+            finally:
+                self._websocket = None
+                self._connected.clear()
+
+            if self._closing or not self.reconnect:
+                break
+            self.reconnect_count += 1
+            try:
+                await asyncio.wait_for(self._closed.wait(), delay * random.uniform(0.5, 1.5))
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _send(self, method: str, params: list = None) -> int:
+        request_id = self._next_id
+        self._next_id += 1
+        request = {"method": method, "id": request_id}
+        if params is not None:
+            request["params"] = params
+        await self._websocket.send(json.dumps(request))
+        return request_id
+
+    async def subscribe(self, stream: list) -> None:
+        """
+        Subscribe to streams. Sent right away if connected, otherwise on the next connect.
+        """
+        if isinstance(stream, str):
+            stream = [stream]
+        new_streams = [s for s in stream if s not in self.streams]
+        if not new_streams:
+            return
+        self.streams.extend(new_streams)
+        if self._websocket is not None:
+            await self._send("SUBSCRIBE", new_streams)
+
+    async def unsubscribe(self, stream: list) -> None:
+        if isinstance(stream, str):
+            stream = [stream]
+        removed = [s for s in stream if s in self.streams]
+        if not removed:
+            return
+        self.streams = [s for s in self.streams if s not in removed]
+        if self._websocket is not None:
+            await self._send("UNSUBSCRIBE", removed)
+
+    async def list_subscribe(self) -> None:
+        """The response is passed to `on_message` like any other frame."""
+        await self._send("LIST_SUBSCRIPTIONS")
+
+    async def user_data(self, listen_key: str) -> None:
+        await self.subscribe([listen_key])
+
+    async def close(self) -> None:
+        """
+        Close the connection and stop reconnecting. Does not wait for a pending reconnect
+        delay or opening handshake: they are cancelled.
+        """
+        self._closing = True
+        self._closed.set()
+        if self._websocket is not None:
+            await self._websocket.close()
+        elif self._run_task is not None:
+            self._run_task.cancel()
+        if self._run_task is not None:
+            try:
+                await self._run_task
+            except asyncio.CancelledError:
+                pass
+            self._run_task = None
+
+    stop = close
@@ -1,75 +1,222 @@
-import os
+import asyncio
 import logging
-from binance.lib.utils import config_logging
-from binance.spot import Spot
-from binance.um_futures import UMFutures
-from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
-from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient
+import threading
+from typing import TYPE_CHECKING
 
+from .config import BinanceConfig
 from .message_handler import BinanceWSMessageHandler
+from .stream_manager import StreamManager, SPOT_MAX_STREAMS_PER_CONNECTION, UM_MAX_STREAMS_PER_CONNECTION
+from .rest_scheduler import RestScheduler, ScheduledRestClient
+from .account_state import ListenKeyKeepalive
+from .connection_supervisor import ConnectionSupervisor, GapDetector, Backfiller
+from .symbol_info import SymbolRegistry
+from crypto_bot import use_symbol_table
+from crypto_bot.utils.log import configure_logging
 from crypto_bot.utils.util import get_yes_or_no_input
 
-from dotenv import load_dotenv
+if TYPE_CHECKING:
+	from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
+	from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient
 
-load_dotenv()
+# The connectors (and requests) are imported when the clients are created, not with this module.
 
-config_logging(logging, logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 class BinanceClient:
 	"""
 	Object that handles the authentication and streaming of data from Binance.
 	Supports both spot and futures data.
+
+	Transports:
+		"thread": The connectors' websocket clients, one thread per connection.
+		"asyncio": `AsyncBinanceWebsocketClient`s on a single event loop. Frames are handled
+			on the loop, without thread hops. If no loop is given, one is run on a background thread.
 	"""
 	def __init__(
 		self,
 		api_key=None,
 		secret_key=None,
 		message_handler: BinanceWSMessageHandler = None,
+		transport: str = "thread",
+		loop: asyncio.AbstractEventLoop = None,
+		spot_stream_url: str = None,
+		um_stream_url: str = None,
+		spot_stream_manager_options: dict = None,
+		um_stream_manager_options: dict = None,
+		rest_scheduler_options: dict = None,
+		supervisor_options: dict = None,
+		symbol_registry: SymbolRegistry = None,
+		defer_listen_keys: bool = False,
+		config: BinanceConfig = None,
 	):
+		"""
+		Args:
+			transport (str): "thread" or "asyncio".
+			loop (asyncio.AbstractEventLoop): Event loop of the "asyncio" transport.
+			spot_stream_url (str): Websocket base url of the spot streams (e.g. a local stand-in server).
+			um_stream_url (str): Websocket base url of the um futures streams.
+			spot_stream_manager_options (dict): Extra arguments of the spot `StreamManager`
+				(e.g. {"min_connections": 4, "symbol_weights": {"btcusdt": 10.0}}).
+			um_stream_manager_options (dict): Extra arguments of the um `StreamManager`.
+			rest_scheduler_options (dict): Extra arguments of the `RestScheduler` (e.g. {"pool_maxsize": 64}).
+			supervisor_options (dict): Extra arguments of the `ConnectionSupervisor` (e.g. {"stale_after": 60}).
+			symbol_registry (SymbolRegistry): Spot and um symbol tables (loaded here if they are not,
+				from the disk cache when warm) whose IDs become the rows of the binance stores,
+				refreshed in the background with this client's REST clients.
+			defer_listen_keys (bool): Do not create the listenKeys here (two REST calls, also used to
+				check the credentials), but in `start_user_data_streams`. Credentials are then only
+				checked by the first signed request.
+			config (BinanceConfig): Credentials and startup options, replacing api_key, secret_key
+				and defer_listen_keys. Missing credentials are read from the environment (and .env).
+				With `headless`, nothing prompts and the REST clients are created and authenticated
+				on a background thread while the websockets connect (see `wait_authenticated`).
+				The root logger is only configured if `log_level` is set.
+		"""
+		if transport not in ("thread", "asyncio"):
+			raise ValueError(f"Unknown transport: {transport}. Use 'thread' or 'asyncio'.")
+
+		if config is None:
+			config = BinanceConfig(api_key=api_key, secret_key=secret_key, defer_listen_keys=defer_listen_keys)
+		self.config = config
+		if config.log_level is not None:
+			configure_logging(config.log_level)
 		
 		self.message_handler = message_handler
+		self.transport = transport
+		self.loop = loop
+		self._loop_thread: threading.Thread = None
+		self.spot_stream_url = spot_stream_url
+		self.um_stream_url = um_stream_url
+		self.spot_stream_manager_options = spot_stream_manager_options or {}
+		self.um_stream_manager_options = um_stream_manager_options or {}
 
-		self.um_client: UMFutures = None
-		self.spot_client: Spot = None
+		self.rest: RestScheduler = None
+		"""Weight budget, priorities and connection pool shared by the REST clients."""
+		self.spot_client: ScheduledRestClient = None
+		self.um_client: ScheduledRestClient = None
 
 		self.spot_listen_key = None
 		self.um_listen_key = None
+		self.listen_key_keepalive: ListenKeyKeepalive = None
+		self._user_data_markets = set()
+		"""Markets whose user data stream is subscribed on the first connection."""
 
-		self._auth_and_get_listen_key(api_key, secret_key)
+		self.supervisor = ConnectionSupervisor(**(supervisor_options or {}))
+		"""Replaces stale connections (started by `start_stream`)."""
+		self.backfiller: Backfiller = None
+		"""Fetches the aggTrades missed during disconnections."""
+		self.gap_detector: GapDetector = None
 
-		self.spot_ws_stream_client: SpotWebsocketStreamClient = None
-		self.um_ws_client: UMFuturesWebsocketClient = None
+		self.spot_stream_manager: StreamManager = None
+		self.um_stream_manager: StreamManager = None
 
-		self._initialize_websockets()
+		self._rest_ready = threading.Event()
+		self._authenticated = threading.Event()
+		self.auth_error: Exception = None
+		"""Error of the background authentication of a headless client."""
+		if config.headless:
+			# REST setup (connector imports) and authentication overlap the websocket connects
+			threading.Thread(
+				target=self._initialize_rest_and_authenticate,
+				args=(rest_scheduler_options,),
+				name="binance-auth",
+				daemon=True,
+			).start()
+			self._initialize_websockets()
+			self._rest_ready.wait()
+			if self.rest is None:
+				raise RuntimeError(f"Failed to create the REST clients: {self.auth_error!r}")
+		else:
+			self._initialize_rest_and_authenticate(rest_scheduler_options)
+			self._initialize_websockets()
 
-	def _auth_and_get_listen_key(self, api_key, secret_key) -> None:
+		self.symbol_registry = symbol_registry
+		if symbol_registry is not None:
+			self._initialize_symbol_registry()
+
+		self._initialize_order_books()
+		self._initialize_gap_detection()
+
+	@property
+	def spot_ws_stream_client(self) -> "SpotWebsocketStreamClient":
+		"""First spot connection, carrying the user data stream (None after `stop_stream`)."""
+		connections = self.spot_stream_manager.connections
+		return connections[0].client if connections else None
+
+	@property
+	def um_ws_client(self) -> "UMFuturesWebsocketClient":
+		"""First um connection, carrying the user data stream (None after `stop_stream`)."""
+		connections = self.um_stream_manager.connections
+		return connections[0].client if connections else None
+
+	def _initialize_rest_and_authenticate(self, rest_scheduler_options: dict = None) -> None:
+		try:
+			self._initialize_rest(rest_scheduler_options)
+		except Exception as e:
+			self.auth_error = e
+			self._authenticated.set()
+			raise
+		finally:
+			self._rest_ready.set()
+		try:
+			self._auth_and_get_listen_key()
+		except Exception as e:
+			self.auth_error = e
+			logger.warning("Authentication failed, continuing without authentication: %r", e)
+		finally:
+			self._authenticated.set()
+
+	def _initialize_rest(self, rest_scheduler_options: dict = None) -> None:
+		from binance.spot import Spot
+		from binance.um_futures import UMFutures
+
+		self.rest = RestScheduler(**(rest_scheduler_options or {}))
+		self.spot_client = self.rest.wrap("spot", Spot())
+		self.um_client = self.rest.wrap("um", UMFutures())
+
+	def wait_authenticated(self, timeout: float = None) -> bool:
 		"""
-		Authenticate the user by either using the api key and secret key passed in
-		or by using the api key and secret key stored in the environment variables.
+		Wait for the authentication (only runs in the background for headless clients).
+
+		Returns:
+			bool: False on timeout.
 		"""
-		if api_key is None or secret_key is None:
-			api_key = os.environ.get("BINANCE_API_KEY")
-			secret_key = os.environ.get("BINANCE_SECRET_KEY")
+		return self._authenticated.wait(timeout)
 
-		if api_key is None or secret_key is None:
+	def _auth_and_get_listen_key(self) -> None:
+		"""
+		Authenticate the user with the credentials of the config, or else of the environment
+		variables (and .env). Headless clients never prompt: they continue without authentication.
+		"""
+		config = self.config
+		config.resolve_credentials()
+		api_key, secret_key = config.api_key, config.secret_key
+
+		if not config.has_credentials:
+			if config.headless:
+				logger.warning("No api key or secret key found, continuing without authentication.")
+				return
 			if get_yes_or_no_input("No api key or secret key found.\n" + \
 						  			"Continue without authentication?\n" + \
 									"Creating order and streaming user data will not be available.\n" + \
 						  			"(y/n): "):
-				self.spot_client = Spot()
-				self.um_client = UMFutures()
 				return
 			else:
 				self._auth_by_input()
 				return
 		
+		elif config.defer_listen_keys:
+			self.spot_client.set_credentials(api_key, secret_key)
+			self.um_client.set_credentials(api_key, secret_key)
+			return
+
 		elif not self._api_key_is_valid(api_key, secret_key):
+			if config.headless:
+				logger.warning("Invalid api key or secret key, continuing without authentication.")
+				return
 			self._auth_by_input()
 			return 
 		
-		self.spot_client = Spot(api_key, secret_key)
-		self.um_client = UMFutures(api_key, secret_key)
-		self._update_listen_keys()
 		print("\n\nAuthentication successful.\n\n")
 
 	def _auth_by_input(self):
@@ -80,54 +227,229 @@ class BinanceClient:
 			api_key = input("Enter api key: ").strip()
 			secret_key = input("Enter secret key: ").strip()
 			
-			if not self._api_key_is_valid(api_key, secret_key): 	
-				if get_yes_or_no_input("Invalid api key or secret key.\n" + \
-										"Try again?\n" + \
-										"(y/n): "):
-					continue
-				else:
-					print("\n\nContinuing without authentication.\n\n")
-					self.spot_client = Spot()
-					self.um_client = UMFutures()
-					return
+			if self._api_key_is_valid(api_key, secret_key):
+				print("\n\nAuthentication successful.\n\n")
+				return
+			if not get_yes_or_no_input("Invalid api key or secret key.\n" + \
+									"Try again?\n" + \
+									"(y/n): "):
+				print("\n\nContinuing without authentication.\n\n")
+				return
 			
 	def _api_key_is_valid(self, api_key, secret_key) -> bool:
-		self.spot_client = Spot(api_key, secret_key)
-		self.um_client = UMFutures(api_key, secret_key)
+		"""
+		Try the credentials on the existing clients (their sessions and connections are kept).
+		The clients are left unauthenticated if the credentials are rejected.
+		"""
+		self.spot_client.set_credentials(api_key, secret_key)
+		self.um_client.set_credentials(api_key, secret_key)
 		try:
 			self._update_listen_keys()
 			return True
 		except Exception as e:
-			print("Error: ", e)
+			logger.warning("Credentials rejected: %r", e)
+			self.spot_client.set_credentials()
+			self.um_client.set_credentials()
 			return False
 	
 	def _update_listen_keys(self) -> None:
 		self.spot_listen_key = self.spot_client.new_listen_key()["listenKey"]
 		self.um_listen_key = self.um_client.new_listen_key()["listenKey"]
 			
+	def _initialize_symbol_registry(self) -> None:
+		"""
+		Load the symbol tables (once the cache is warm, without REST calls), share their IDs
+		with the stores and keep them fresh in the background.
+		"""
+		registry = self.symbol_registry
+		registry.rest_clients.setdefault("spot", self.spot_client)
+		registry.rest_clients.setdefault("um", self.um_client)
+		missing = tuple(market for market in ("spot", "um") if market not in registry.tables)
+		if missing:
+			registry.load(missing)
+		for market in ("spot", "um"):
+			use_symbol_table("binance", market, registry.tables[market])
+		registry.start_refresh()
+
+	def _initialize_order_books(self) -> None:
+		"""
+		Local order books are (re)built from the REST depth snapshots of these clients.
+		"""
+		self.message_handler.order_books.set_snapshot_fetcher("spot", self.spot_client.depth)
+		self.message_handler.order_books.set_snapshot_fetcher("um", self.um_client.depth)
+
+	def _initialize_gap_detection(self) -> None:
+		"""
+		Sequence checks of the aggTrade streams and order books, missed aggTrades are backfilled.
+		"""
+		self.backfiller = Backfiller({"spot": self.spot_client, "um": self.um_client})
+		if self.message_handler.gap_detector is None:
+			self.message_handler.gap_detector = GapDetector()
+		self.gap_detector = self.message_handler.gap_detector
+		if self.gap_detector.on_gap is None:
+			self.gap_detector.on_gap = self.backfiller.on_gap
+		if self.message_handler.order_books.on_gap is None:
+			self.message_handler.order_books.on_gap = self.gap_detector.on_book_gap
+
 	def _initialize_websockets(self) -> None:
-		self.spot_ws_stream_client = SpotWebsocketStreamClient(
-			on_message=self.message_handler.get_spot_message_handler(),
-			is_combined=True,
+		"""
+		Create the spot and um stream managers. Each opens its first connection right away,
+		used for the user data streams; more are opened as subscriptions grow.
+		"""
+		if self.transport == "asyncio" and self.loop is None:
+			self.loop = asyncio.new_event_loop()
+			self._loop_thread = threading.Thread(
+				target=self.loop.run_forever,
+				name="binance-asyncio",
+				daemon=True,
+			)
+			self._loop_thread.start()
+
+		self.spot_stream_manager = StreamManager(
+			connection_factory=lambda: self._new_ws_client("spot"),
+			max_streams_per_connection=SPOT_MAX_STREAMS_PER_CONNECTION,
+			run=self._run,
+			on_subscribe=lambda streams: self.message_handler.register_streams("spot", streams),
+			on_reconnect=lambda connection, previous_client: self._on_reconnect("spot", connection),
+			**self.spot_stream_manager_options,
+		)
+		self.um_stream_manager = StreamManager(
+			connection_factory=lambda: self._new_ws_client("um"),
+			max_streams_per_connection=UM_MAX_STREAMS_PER_CONNECTION,
+			run=self._run,
+			on_subscribe=lambda streams: self.message_handler.register_streams("um", streams),
+			on_reconnect=lambda connection, previous_client: self._on_reconnect("um", connection),
+			**self.um_stream_manager_options,
 		)
-		self.um_ws_client = UMFuturesWebsocketClient(
-			on_message=self.message_handler.get_on_um_message_handler(),
+		self.supervisor.add_stream_manager("spot", self.spot_stream_manager)
+		self.supervisor.add_stream_manager("um", self.um_stream_manager)
+
+	def _new_ws_client(self, market: str):
+		"""
+		Open a new websocket connection of the market, with the configured transport.
+		Its frames are tracked by the supervisor.
+		"""
+		if market == "spot":
+			on_message = self.message_handler.get_spot_message_handler()
+			stream_url = self.spot_stream_url
+		else:
+			on_message = self.message_handler.get_on_um_message_handler()
+			stream_url = self.um_stream_url
+		on_message = self.supervisor.instrument(market, on_message)
+
+		if self.transport == "asyncio":
+			from .async_websocket_client import AsyncBinanceWebsocketClient, SPOT_STREAM_URL, UM_STREAM_URL
+			client = AsyncBinanceWebsocketClient(
+				stream_url=stream_url or (SPOT_STREAM_URL if market == "spot" else UM_STREAM_URL),
+				on_message=on_message,
+				is_combined=True,
+			)
+			self.supervisor.attach(client, on_message)
+			self._run(client.connect())
+			return client
+
+		if market == "spot":
+			from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient as websocket_client_class
+		else:
+			from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient as websocket_client_class
+		client = websocket_client_class(
+			on_message=on_message,
+			on_ping=on_message.on_keepalive,
+			on_pong=on_message.on_keepalive,
 			is_combined=True,
+			**({"stream_url": stream_url} if stream_url else {}),
 		)
+		self.supervisor.attach(client, on_message)
+		return client
+
+	def _on_reconnect(self, market: str, connection) -> None:
+		"""
+		A connection was replaced by the supervisor. The first one also carries the user data
+		stream: subscribe it again, and reconcile the account for the events missed meanwhile.
+		"""
+		stream_manager = self.spot_stream_manager if market == "spot" else self.um_stream_manager
+		if market not in self._user_data_markets or connection is not stream_manager.connections[0]:
+			return
+		self._subscribe_user_data(market, self.spot_listen_key if market == "spot" else self.um_listen_key)
+		client = self.spot_client if market == "spot" else self.um_client
+		threading.Thread(
+			target=self.message_handler.account.reconcile,
+			args=(market, client),
+			name=f"{market}-account-reconcile",
+			daemon=True,
+		).start()
+
+	def _run(self, result):
+		"""
+		Schedule the coroutines of the "asyncio" transport on its event loop.
+		Results of the thread-based clients are returned as is.
+
+		Returns:
+			asyncio.Task if called from the loop, concurrent.futures.Future otherwise.
+		"""
+		if not asyncio.iscoroutine(result):
+			return result
+		try:
+			running_loop = asyncio.get_running_loop()
+		except RuntimeError:
+			running_loop = None
+		if running_loop is self.loop:
+			return self.loop.create_task(result)
+		return asyncio.run_coroutine_threadsafe(result, self.loop)
 
-	def start_user_data_streams(self) -> None:
-		self.spot_ws_stream_client.user_data(
-			listen_key=self.spot_listen_key,
-			id=1,
+	def start_user_data_streams(self, reconcile_interval: float = 300.0) -> None:
+		"""
+		Subscribe to the user data streams, keep their listenKeys alive, and reconcile
+		the account state (`message_handler.account`) with REST snapshots every `reconcile_interval` seconds.
+		"""
+		self.wait_authenticated()
+		if self.spot_listen_key is None or self.um_listen_key is None:
+			self._update_listen_keys()
+		self._subscribe_user_data("spot", self.spot_listen_key)
+		self._subscribe_user_data("um", self.um_listen_key)
+		self._user_data_markets = {"spot", "um"}
+
+		clients = {"spot": self.spot_client, "um": self.um_client}
+		self.listen_key_keepalive = ListenKeyKeepalive(
+			clients=clients,
+			listen_keys={"spot": self.spot_listen_key, "um": self.um_listen_key},
+			on_new_listen_key=self._on_new_listen_key,
 		)
-		self.um_ws_client.user_data(
-			listen_key=self.um_listen_key,
-			id=2,
+		self.listen_key_keepalive.start()
+		self.message_handler.account.start_reconciliation(clients, interval=reconcile_interval)
+
+	def _subscribe_user_data(self, market: str, listen_key: str, previous_listen_key: str = None) -> None:
+		client = self.spot_ws_stream_client if market == "spot" else self.um_ws_client
+		if self.transport == "asyncio":
+			if previous_listen_key:
+				self._run(client.unsubscribe(previous_listen_key))
+			self._run(client.user_data(listen_key=listen_key))
+			return
+
+		if previous_listen_key:
+			client.unsubscribe(stream=previous_listen_key)
+		client.user_data(
+			listen_key=listen_key,
+			id=1 if market == "spot" else 2,
 		)
 
+	def _on_new_listen_key(self, market: str, listen_key: str, previous_listen_key: str) -> None:
+		"""The listenKey expired and was replaced: subscribe to the new user data stream."""
+		if market == "spot":
+			self.spot_listen_key = listen_key
+		else:
+			self.um_listen_key = listen_key
+		self._subscribe_user_data(market, listen_key, previous_listen_key)
+
 	def close_user_data_streams(self) -> None:
-		self.spot_ws_stream_client.stop()
-		self.um_ws_client.stop()
+		if self.listen_key_keepalive is not None:
+			self.listen_key_keepalive.stop()
+			self.listen_key_keepalive = None
+		self.message_handler.account.stop_reconciliation()
+		self._user_data_markets = set()
+		for client in (self.spot_ws_stream_client, self.um_ws_client):
+			if client is not None:
+				self._run(client.stop())
 	
 	def stream_pairs(self, 
 					 pairs: list,
@@ -140,7 +462,9 @@ class BinanceClient:
 			pairs (list): The pairs to stream.
 			types (list): The types of data to stream. (e.g. ["aggTrade", "kline_1m"])
 				Can be found here: https://binance-docs.github.io/apidocs/voptions/en/#live-subscribing-unsubscribing-to-streams
-			
+
+		The streams are spread over as many connections as the per connection
+		stream limit requires (see `StreamManager`).
 		"""
 		if types == []:
 			types = ["aggTrade"]
@@ -158,17 +482,33 @@ class BinanceClient:
 	def start_stream(self,
 			   spot_streams: list = None,
 			   um_streams: list = None) -> None:	
-		
+		"""
+		Subscribe to streams (also after `stop_stream`), supervised by `self.supervisor`.
+		"""
 		if spot_streams:
-			self.spot_ws_stream_client.subscribe(
-				stream=spot_streams,
-			)
+			self.spot_stream_manager.subscribe(spot_streams)
 		if um_streams:
-			self.um_ws_client.subscribe(
-				stream=um_streams,
-			)
+			self.um_stream_manager.subscribe(um_streams)
+		self.supervisor.start()
+		self.backfiller.start()
+		if self.symbol_registry is not None:
+			self.symbol_registry.start_refresh()
+
+	def unsubscribe_stream(self,
+			   spot_streams: list = None,
+			   um_streams: list = None) -> None:
+		"""Unsubscribe from streams without closing the connections."""
+		if spot_streams:
+			self.spot_stream_manager.unsubscribe(spot_streams)
+		if um_streams:
+			self.um_stream_manager.unsubscribe(um_streams)
 
 	def stop_stream(self) -> None:
-		"""Stop both the spot and futures streams."""
-		self.spot_ws_stream_client.stop()
-		self.um_ws_client.stop()
+		"""Stop both the spot and futures streams (the user data streams too)."""
+		self.supervisor.stop()
+		self.backfiller.stop()
+		self._user_data_markets = set()
+		self.spot_stream_manager.stop()
+		self.um_stream_manager.stop()
+		if self.symbol_registry is not None:
+			self.symbol_registry.stop_refresh()
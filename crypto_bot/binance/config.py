@@ -0,0 +1,77 @@
+# crypto_bot/binance/config.py
+"""
+Configuration of `BinanceClient`: credentials and startup behaviour.
+
+    config = BinanceConfig.from_env(headless=True)      # BINANCE_API_KEY / BINANCE_SECRET_KEY (and .env)
+    client = BinanceClient(config=config, message_handler=handler)
+
+Headless clients never prompt: missing or rejected credentials leave the client
+unauthenticated (with a warning logged by crypto_bot.binance.binance_client), and the REST
+setup and authentication run on a background thread while the websockets connect.
+
+Logging is left to the application unless `log_level` is set: the client then calls
+`configure_logging`, which routes the *root* logger through a queue (a process-wide change).
+"""
+import os
+from dataclasses import dataclass
+
+
+API_KEY_VARIABLE = "BINANCE_API_KEY"
+SECRET_KEY_VARIABLE = "BINANCE_SECRET_KEY"
+HEADLESS_VARIABLE = "BINANCE_HEADLESS"
+
+
+@dataclass
+class BinanceConfig:
+    api_key: str = None
+    secret_key: str = None
+    headless: bool = False
+    """Never prompt (no `input()`), authenticate in the background."""
+    defer_listen_keys: bool = False
+    """Create the listenKeys (two REST calls) in `start_user_data_streams` instead of at startup."""
+    log_level: int = None
+    """
+    Install the queue logging handler on the root logger at this level (see utils/log.py
+    `configure_logging`), a process-wide side effect. None (default): leave logging alone.
+    """
+
+    @classmethod
+    def from_env(cls, dotenv: bool = True, **kwargs) -> "BinanceConfig":
+        """
+        Credentials (and BINANCE_HEADLESS=1) from the environment, after loading .env if `dotenv`.
+        Keyword arguments override them.
+        """
+        if dotenv:
+            load_dotenv()
+        values = {
+            "api_key": os.environ.get(API_KEY_VARIABLE),
+            "secret_key": os.environ.get(SECRET_KEY_VARIABLE),
+            "headless": os.environ.get(HEADLESS_VARIABLE, "").lower() in ("1", "true", "yes"),
+        }
+        values.update(kwargs)
+        return cls(**values)
+
+    def resolve_credentials(self, dotenv: bool = True) -> None:
+        """Fill the missing credentials from the environment (and .env)."""
+        if self.api_key is not None and self.secret_key is not None:
+            return
+        if dotenv:
+            load_dotenv()
+        self.api_key = self.api_key or os.environ.get(API_KEY_VARIABLE)
+        self.secret_key = self.secret_key or os.environ.get(SECRET_KEY_VARIABLE)
+
+    @property
+    def has_credentials(self) -> bool:
+        return bool(self.api_key and self.secret_key)
+
+    def __repr__(self) -> str:
+        # Keep the secrets out of logs
+        return (f"BinanceConfig(api_key={'***' if self.api_key else None}, "
+                f"secret_key={'***' if self.secret_key else None}, headless={self.headless}, "
+                f"defer_listen_keys={self.defer_listen_keys}, log_level={self.log_level})")
+
+
+def load_dotenv() -> None:
+    """Load .env into the environment (python-dotenv is imported on first use)."""
+    from dotenv import load_dotenv as _load_dotenv
+    _load_dotenv()
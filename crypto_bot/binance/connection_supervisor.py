@@ -0,0 +1,332 @@
+# crypto_bot/binance/connection_supervisor.py
+"""
+Keeps the websocket connections of the `StreamManager`s alive and the data complete.
+
+    ConnectionSupervisor    Replaces connections that are dead (no frame and no keepalive), after a
+                            jittered exponential backoff, with the exact same stream set.
+    GapDetector             Detects missed aggTrades (aggregate trade ID "a" not contiguous) and
+                            order book gaps (reported by the `OrderBookManager`).
+    Backfiller              Fetches missed aggTrades over REST on its own thread, published as
+                            ("binance", symbol, market, "aggTradeBackfill", [AggTrade, ...]).
+
+Order books are backfilled by their REST snapshot resync (see `LocalOrderBook`).
+
+Nothing here runs on the websocket threads except a timestamp per frame / ping / pong and a dict
+lookup per aggTrade: keepalive pings and reconnects run on the supervisor thread, backfills on the
+backfill thread.
+"""
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from crypto_bot import market_data_subscriptions
+from .events import AggTrade
+
+
+AGG_TRADES_LIMIT = 1000
+"""Maximum aggTrades per REST request (spot and um)."""
+
+
+class ConnectionHealth:
+    """
+    Frame counter, last frame and keepalive times of a websocket connection, updated by its
+    on_message and on_ping / on_pong callbacks.
+    """
+    __slots__ = ("market", "frames", "last_frame", "last_keepalive", "last_ping", "failures", "reconnect_at")
+
+    def __init__(self, market: str, failures: int = 0):
+        self.market = market
+        self.frames = 0
+        self.last_frame = time.monotonic()
+        """Time of the last frame (or of the connection), time.monotonic()."""
+        self.last_keepalive = self.last_frame
+        """Time of the last ping or pong received (or of the connection), time.monotonic()."""
+        self.last_ping = None
+        """Time of the last ping sent by the supervisor."""
+        self.failures = failures
+        """Consecutive reconnects that did not receive any frame."""
+        self.reconnect_at = None
+
+
+class GapDetector:
+    """
+    Sequence checks of the aggTrade streams, called from the message handler
+    (`BinanceWSMessageHandler(gap_detector=...)`), and sink of the order book gaps.
+    """
+    def __init__(self, on_gap: callable = None, max_recorded_gaps: int = 1000):
+        """
+        Args:
+            on_gap (callable): Called with every gap dict (see `gaps`), on the websocket thread.
+                Must not block (e.g. `Backfiller.on_gap` only queues a request).
+        """
+        self.on_gap = on_gap
+        self.last_agg_trade_ids = {}
+        """(market, symbol) -> last aggregate trade ID"""
+        self.gaps = deque(maxlen=max_recorded_gaps)
+        """Recent gaps: {"time", "market", "symbol", "type", ...}"""
+        self.gap_count = 0
+
+    def on_agg_trade(self, market: str, agg_trade: AggTrade) -> None:
+        key = (market, agg_trade.symbol)
+        last = self.last_agg_trade_ids.get(key)
+        agg_trade_id = agg_trade.agg_trade_id
+        if last is not None and agg_trade_id <= last:
+            # Duplicate / replayed trade
+            return
+        self.last_agg_trade_ids[key] = agg_trade_id
+        if last is not None and agg_trade_id != last + 1:
+            self._report({
+                "market": market,
+                "symbol": agg_trade.symbol,
+                "type": "aggTrade",
+                "from_id": last + 1,
+                "to_id": agg_trade_id - 1,
+                "first_trade_id": agg_trade.first_trade_id,
+                "trade_time": agg_trade.trade_time,
+            })
+
+    def on_book_gap(self, market: str, symbol: str, last_update_id: int, event) -> None:
+        """Order book sequence gap, the book is rebuilt from a new REST snapshot."""
+        self._report({
+            "market": market,
+            "symbol": symbol,
+            "type": "depth",
+            "last_update_id": last_update_id,
+            "first_update_id": event.first_update_id,
+        })
+
+    def _report(self, gap: dict) -> None:
+        gap["time"] = time.time()
+        self.gaps.append(gap)
+        self.gap_count += 1
+        if self.on_gap is not None:
+            self.on_gap(gap)
+
+
+class Backfiller:
+    """
+    Fetches the aggTrades of the gaps reported by a `GapDetector` over REST, on a worker thread.
+    """
+    def __init__(self, rest_clients: dict, max_trades_per_gap: int = 10000):
+        """
+        Args:
+            rest_clients (dict): market -> REST client with agg_trades(symbol=..., fromId=..., limit=...).
+            max_trades_per_gap (int): Larger gaps are only backfilled up to this many trades.
+        """
+        self.rest_clients = rest_clients
+        self.max_trades_per_gap = max_trades_per_gap
+        self.backfilled = 0
+        """Number of aggTrades fetched."""
+        self.failures = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def on_gap(self, gap: dict) -> None:
+        if gap["type"] == "aggTrade" and gap["market"] in self.rest_clients:
+            self._queue.put(gap)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="aggtrade-backfill", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            gap = self._queue.get()
+            if gap is None:
+                return
+            try:
+                self.backfill(gap["market"], gap["symbol"], gap["from_id"], gap["to_id"])
+            except Exception as e:
+                self.failures += 1
+                print(f"Failed to backfill {gap['market']} {gap['symbol']} aggTrades "
+                      f"{gap['from_id']}-{gap['to_id']}: {e}")
+
+    def backfill(self, market: str, symbol: str, from_id: int, to_id: int) -> list:
+        """
+        Fetch the aggTrades from_id..to_id (inclusive) and publish them.
+
+        Returns:
+            list: The `AggTrade`s, in order.
+        """
+        client = self.rest_clients[market]
+        to_id = min(to_id, from_id + self.max_trades_per_gap - 1)
+        trades = []
+        next_id = from_id
+        while next_id <= to_id:
+            page = client.agg_trades(symbol=symbol, fromId=next_id, limit=min(AGG_TRADES_LIMIT, to_id - next_id + 1))
+            if not page:
+                break
+            for trade in page:
+                if trade["a"] > to_id:
+                    break
+                trades.append(AggTrade.from_message({**trade, "e": "aggTrade", "E": trade["T"], "s": symbol}))
+            next_id = page[-1]["a"] + 1
+
+        self.backfilled += len(trades)
+        if trades:
+            market_data_subscriptions.publish("binance", symbol, market, "aggTradeBackfill", trades)
+        return trades
+
+
+class ConnectionSupervisor:
+    """
+    Watches the connections of stream managers and replaces the dead ones:
+    a connection with streams that received neither a frame nor a keepalive for `stale_after` seconds
+    is reconnected (`StreamManager.reconnect`) after a jittered exponential backoff.
+
+    Quiet streams (illiquid symbols, user data) are not stale as long as the transport is alive:
+        thread clients      pinged by the supervisor after `ping_after` seconds without frames,
+                            their pongs (and the server's pings) count as liveness
+                            (pass `on_message.on_keepalive` as their on_ping / on_pong).
+        asyncio clients     alive while connected, their own keepalive (`ping_interval` /
+                            `ping_timeout`) closes dead connections.
+
+        supervisor = ConnectionSupervisor()
+        on_message = supervisor.instrument("um", on_message)    # before creating the client
+        supervisor.attach(client, on_message)                   # once it is created
+        supervisor.add_stream_manager("um", stream_manager)
+        supervisor.start()
+    """
+    def __init__(self,
+                 stale_after: float = 30.0,
+                 check_interval: float = 1.0,
+                 min_reconnect_delay: float = 0.5,
+                 max_reconnect_delay: float = 60.0,
+                 ping_after: float = 10.0):
+        """
+        Args:
+            stale_after (float): Seconds without frames nor keepalive after which a connection is
+                considered dead. Has to be longer than `ping_after` plus the round trip of a ping.
+            check_interval (float): Seconds between two checks of the connections.
+            min_reconnect_delay (float): Backoff of the first reconnect; doubled for every
+                consecutive reconnect that did not receive any frame, up to max_reconnect_delay.
+                Delays are jittered by +/-50%.
+            ping_after (float): Seconds without frames nor keepalive after which a thread client
+                is pinged (again every `ping_after` seconds).
+        """
+        self.stale_after = stale_after
+        self.ping_after = ping_after
+        self.check_interval = check_interval
+        self.min_reconnect_delay = min_reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.stream_managers = {}
+        """market -> StreamManager"""
+        self.reconnect_count = 0
+        self._health = {}
+        """id(client) -> ConnectionHealth"""
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def instrument(self, market: str, on_message: callable) -> callable:
+        """
+        Wrap the on_message callback of a new connection to track its frames.
+        The wrapper's `health` attribute is the connection's `ConnectionHealth`, its `on_keepalive`
+        attribute is the on_ping / on_pong callback of the client.
+        """
+        health = ConnectionHealth(market)
+        monotonic = time.monotonic
+
+        def on_health_message(client, message):
+            health.last_frame = monotonic()
+            health.frames += 1
+            on_message(client, message)
+
+        def on_keepalive(*args):
+            health.last_keepalive = monotonic()
+
+        on_health_message.health = health
+        on_health_message.on_keepalive = on_keepalive
+        return on_health_message
+
+    def attach(self, client, on_message: callable) -> None:
+        """Associate a client with the health of its instrumented on_message."""
+        self._health[id(client)] = on_message.health
+
+    def add_stream_manager(self, market: str, stream_manager) -> None:
+        self.stream_managers[market] = stream_manager
+
+    def health(self, client) -> ConnectionHealth:
+        return self._health.get(id(client))
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="connection-supervisor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Connection supervisor error: {e!r}")
+
+    def reconnect_delay(self, failures: int) -> float:
+        delay = min(self.min_reconnect_delay * 2 ** failures, self.max_reconnect_delay)
+        return delay * random.uniform(0.5, 1.5)
+
+    def check(self) -> None:
+        """Ping the quiet connections, reconnect the stale ones past their backoff."""
+        now = time.monotonic()
+        for market, stream_manager in list(self.stream_managers.items()):
+            for connection in list(stream_manager.connections):
+                client = connection.client
+                health = self._health.get(id(client))
+                if health is None or not connection.streams:
+                    continue
+                quiet = now - max(health.last_frame, health.last_keepalive)
+                if quiet < self.stale_after or getattr(client, "is_connected", False):
+                    health.reconnect_at = None
+                    if quiet >= self.ping_after:
+                        self._ping(client, health, now)
+                    continue
+                if health.reconnect_at is None:
+                    health.reconnect_at = now + self.reconnect_delay(health.failures)
+                    print(f"{market} connection {connection.index}: no frame nor keepalive for "
+                          f"{quiet:.1f}s, reconnecting")
+                if now >= health.reconnect_at:
+                    self._reconnect(market, stream_manager, connection, health)
+
+    def _ping(self, client, health: ConnectionHealth, now: float) -> None:
+        """Ping a quiet thread client, its pong is its keepalive."""
+        ping = getattr(client, "ping", None)
+        if ping is None or (health.last_ping is not None and now - health.last_ping < self.ping_after):
+            return
+        health.last_ping = now
+        try:
+            ping()
+        except Exception as e:
+            print(f"Failed to ping {health.market} connection: {e!r}")
+
+    def _reconnect(self, market: str, stream_manager, connection, health: ConnectionHealth) -> None:
+        old_client = connection.client
+        try:
+            stream_manager.reconnect(connection)
+        except Exception as e:
+            health.failures += 1
+            health.reconnect_at = time.monotonic() + self.reconnect_delay(health.failures)
+            print(f"Failed to reconnect {market} connection {connection.index}: {e!r}")
+            return
+        # The new connection inherits the failure count of the one it replaces
+        # (failures is only read and written on the supervisor thread).
+        new_health = self._health.get(id(connection.client))
+        if new_health is not None:
+            new_health.failures = 0 if health.frames else health.failures + 1
+        self._health.pop(id(old_client), None)
+        self.reconnect_count += 1
@@ -0,0 +1,206 @@
+# crypto_bot/binance/events.py
+"""
+Typed Binance websocket events.
+
+One `__slots__` dataclass is generated per event type documented in
+`message_handler.STREAM_DESCRIPTION`. Numeric fields are parsed once, when the event is
+decoded, so callers never have to convert the string numerics of the raw payloads.
+
+    event = decode_event({"e": "aggTrade", "E": 123456789, "s": "BNBBTC", "p": "0.001", ...})
+    event.price  # 0.001
+"""
+from dataclasses import make_dataclass
+
+
+def _levels(levels: list) -> list:
+    """[["0.0024", "10"], ...] -> [(0.0024, 10.0), ...]"""
+    return [(float(price), float(quantity)) for price, quantity in levels]
+
+
+EVENT_FIELDS = {
+    # Event type ("e") -> (class name, fields)
+    # field: (attribute, payload key or path of keys, converter, default if the key is optional)
+    "aggTrade": ("AggTrade", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("agg_trade_id", "a", int, None),
+        ("price", "p", float, None),
+        ("quantity", "q", float, None),
+        ("first_trade_id", "f", int, None),
+        ("last_trade_id", "l", int, None),
+        ("trade_time", "T", int, None),
+        ("is_buyer_maker", "m", bool, None),
+    )),
+    "trade": ("Trade", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("trade_id", "t", int, None),
+        ("price", "p", float, None),
+        ("quantity", "q", float, None),
+        ("trade_time", "T", int, None),
+        ("is_buyer_maker", "m", bool, None),
+    )),
+    "kline": ("Kline", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("start_time", ("k", "t"), int, None),
+        ("close_time", ("k", "T"), int, None),
+        ("interval", ("k", "i"), str, None),
+        ("first_trade_id", ("k", "f"), int, None),
+        ("last_trade_id", ("k", "L"), int, None),
+        ("open", ("k", "o"), float, None),
+        ("close", ("k", "c"), float, None),
+        ("high", ("k", "h"), float, None),
+        ("low", ("k", "l"), float, None),
+        ("volume", ("k", "v"), float, None),
+        ("trade_count", ("k", "n"), int, None),
+        ("is_closed", ("k", "x"), bool, None),
+        ("quote_volume", ("k", "q"), float, None),
+        ("taker_buy_volume", ("k", "V"), float, None),
+        ("taker_buy_quote_volume", ("k", "Q"), float, None),
+    )),
+    "24hrTicker": ("Ticker", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("price_change", "p", float, None),
+        ("price_change_percent", "P", float, None),
+        ("weighted_average_price", "w", float, None),
+        ("last_price", "c", float, None),
+        ("last_quantity", "Q", float, None),
+        ("open", "o", float, None),
+        ("high", "h", float, None),
+        ("low", "l", float, None),
+        ("volume", "v", float, None),
+        ("quote_volume", "q", float, None),
+        ("open_time", "O", int, None),
+        ("close_time", "C", int, None),
+        ("first_trade_id", "F", int, None),
+        ("last_trade_id", "L", int, None),
+        ("trade_count", "n", int, None),
+        # Spot only
+        ("bid", "b", float, float("nan")),
+        ("bid_quantity", "B", float, float("nan")),
+        ("ask", "a", float, float("nan")),
+        ("ask_quantity", "A", float, float("nan")),
+    )),
+    "24hrMiniTicker": ("MiniTicker", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("close", "c", float, None),
+        ("open", "o", float, None),
+        ("high", "h", float, None),
+        ("low", "l", float, None),
+        ("volume", "v", float, None),
+        ("quote_volume", "q", float, None),
+    )),
+    "markPriceUpdate": ("MarkPriceUpdate", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("mark_price", "p", float, None),
+        ("index_price", "i", float, None),
+        ("estimated_settle_price", "P", float, None),
+        ("funding_rate", "r", float, None),
+        ("next_funding_time", "T", int, None),
+    )),
+    "bookTicker": ("BookTicker", (
+        ("update_id", "u", int, None),
+        ("symbol", "s", str, None),
+        ("bid", "b", float, None),
+        ("bid_quantity", "B", float, None),
+        ("ask", "a", float, None),
+        ("ask_quantity", "A", float, None),
+        # UM only
+        ("event_time", "E", int, 0),
+        ("transaction_time", "T", int, 0),
+    )),
+    "depthUpdate": ("DepthUpdate", (
+        ("event_time", "E", int, None),
+        ("symbol", "s", str, None),
+        ("first_update_id", "U", int, None),
+        ("final_update_id", "u", int, None),
+        ("bids", "b", _levels, None),
+        ("asks", "a", _levels, None),
+        # UM only
+        ("transaction_time", "T", int, 0),
+        ("previous_final_update_id", "pu", int, -1),
+    )),
+    "forceOrder": ("ForceOrder", (
+        ("event_time", "E", int, None),
+        ("symbol", ("o", "s"), str, None),
+        ("side", ("o", "S"), str, None),
+        ("order_type", ("o", "o"), str, None),
+        ("time_in_force", ("o", "f"), str, None),
+        ("quantity", ("o", "q"), float, None),
+        ("price", ("o", "p"), float, None),
+        ("average_price", ("o", "ap"), float, None),
+        ("status", ("o", "X"), str, None),
+        ("last_filled_quantity", ("o", "l"), float, None),
+        ("filled_accumulated_quantity", ("o", "z"), float, None),
+        ("trade_time", ("o", "T"), int, None),
+    )),
+}
+
+
+def _make_event_class(class_name: str, event_type: str, fields: tuple) -> type:
+    """
+    Generate the `__slots__` dataclass of an event type and its `from_message` decoder.
+
+    The decoder is compiled from source, so decoding an event is a single constructor call
+    with one dict lookup + conversion per field, without any per-field loop.
+    """
+    cls = make_dataclass(
+        class_name,
+        [(attribute, converter if converter is not _levels else list) for attribute, _, converter, _ in fields],
+        slots=True,
+    )
+    cls.__doc__ = f'Typed "{event_type}" event. See STREAM_DESCRIPTION in message_handler.py.'
+    cls.event_type = event_type
+
+    namespace = {"cls": cls}
+    arguments = []
+    for n, (attribute, key, converter, default) in enumerate(fields):
+        namespace[f"convert_{n}"] = converter
+        path = (key,) if isinstance(key, str) else key
+        container = "message" + "".join(f"[{k!r}]" for k in path[:-1])
+        if default is None:
+            value = f"{container}[{path[-1]!r}]"
+            arguments.append(f"convert_{n}({value})")
+        else:
+            namespace[f"default_{n}"] = default
+            value = f"{container}.get({path[-1]!r})"
+            arguments.append(f"(default_{n} if {value} is None else convert_{n}({value}))")
+
+    source = "def from_message(message):\n    return cls(\n        " + ",\n        ".join(arguments) + ",\n    )\n"
+    exec(source, namespace)
+    cls.from_message = staticmethod(namespace["from_message"])
+    return cls
+
+
+EVENT_CLASSES = {
+    event_type: _make_event_class(class_name, event_type, fields)
+    for event_type, (class_name, fields) in EVENT_FIELDS.items()
+}
+"""Event type ("e") -> event class."""
+
+AggTrade = EVENT_CLASSES["aggTrade"]
+Trade = EVENT_CLASSES["trade"]
+Kline = EVENT_CLASSES["kline"]
+Ticker = EVENT_CLASSES["24hrTicker"]
+MiniTicker = EVENT_CLASSES["24hrMiniTicker"]
+MarkPriceUpdate = EVENT_CLASSES["markPriceUpdate"]
+BookTicker = EVENT_CLASSES["bookTicker"]
+DepthUpdate = EVENT_CLASSES["depthUpdate"]
+ForceOrder = EVENT_CLASSES["forceOrder"]
+
+
+def decode_event(message: dict, event_type: str = None):
+    """
+    Decode a raw payload into its typed event.
+
+    Args:
+        message (dict): The payload ("data" of a combined stream message).
+        event_type (str): The event type, for payloads without an "e" field (e.g. spot bookTicker).
+    Raises:
+        KeyError: If the event type has no typed event.
+    """
+    return EVENT_CLASSES[event_type or message["e"]].from_message(message)
@@ -0,0 +1,266 @@
+# crypto_bot/binance/kline_aggregator.py
+"""
+Builds OHLCV bars of any set of intervals from the aggTrade streams, in process.
+
+One aggTrade subscription per symbol gives every interval at once, instead of one
+kline subscription per symbol and interval, and the closed bars are kept in fixed-size
+ring buffers:
+
+    aggregator = KlineAggregator(intervals=["1s", "1m", "5m", "1h"])
+    message_handler = BinanceWSMessageHandler(kline_aggregator=aggregator)
+    ...
+    bars = aggregator.last_bars("um", "BTCUSDT", "1m", 20)   # dict of NumPy arrays
+    bars["close"]
+
+Closed exchange klines ("x": true) received on kline streams replace the aggregated
+bar of the same open time, so the bars converge to the exchange's.
+"""
+import numpy as np
+
+from .events import AggTrade, Kline
+
+
+INTERVAL_MS = {
+    "1s": 1_000,
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+}
+
+BAR_FLOAT_COLUMNS = ("open", "high", "low", "close", "volume", "quote_volume", "taker_buy_volume")
+BAR_INT_COLUMNS = ("open_time", "trade_count")
+
+
+class BarRing:
+    """
+    Fixed-size ring buffer of closed bars, one NumPy array per column.
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        """Index of the next write."""
+        self.columns = {name: np.zeros(capacity, dtype=np.float64) for name in BAR_FLOAT_COLUMNS}
+        self.columns.update({name: np.zeros(capacity, dtype=np.int64) for name in BAR_INT_COLUMNS})
+        self._open_time = self.columns["open_time"]
+
+    def append(self, open_time, open, high, low, close, volume, quote_volume, taker_buy_volume, trade_count) -> None:
+        i = self.head
+        columns = self.columns
+        columns["open_time"][i] = open_time
+        columns["open"][i] = open
+        columns["high"][i] = high
+        columns["low"][i] = low
+        columns["close"][i] = close
+        columns["volume"][i] = volume
+        columns["quote_volume"][i] = quote_volume
+        columns["taker_buy_volume"][i] = taker_buy_volume
+        columns["trade_count"][i] = trade_count
+        self.head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def find(self, open_time: int, interval_ms: int) -> int:
+        """
+        Position of the bar with the given open time (bars are contiguous), or None.
+        """
+        if not self.size:
+            return None
+        newest = (self.head - 1) % self.capacity
+        offset = (int(self._open_time[newest]) - open_time) // interval_ms
+        if offset < 0 or offset >= self.size:
+            return None
+        position = (newest - offset) % self.capacity
+        return position if self._open_time[position] == open_time else None
+
+    def last(self, k: int = None) -> dict:
+        """
+        The last k closed bars (all of them if k is None), oldest first.
+
+        Returns:
+            dict: column -> NumPy array
+        """
+        k = self.size if k is None else min(k, self.size)
+        positions = (np.arange(self.head - k, self.head)) % self.capacity
+        return {name: column[positions] for name, column in self.columns.items()}
+
+
+class BarSeries:
+    """
+    The bar in progress and the closed bars of one market / symbol / interval.
+    """
+    __slots__ = ("interval", "interval_ms", "bars", "open_time", "open", "high", "low", "close",
+                 "volume", "quote_volume", "taker_buy_volume", "trade_count", "late_trades")
+
+    def __init__(self, interval: str, capacity: int):
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.bars = BarRing(capacity)
+        self.open_time = None
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = self.quote_volume = self.taker_buy_volume = 0.0
+        self.trade_count = 0
+        self.late_trades = 0
+
+    def _close_bar(self) -> None:
+        self.bars.append(self.open_time, self.open, self.high, self.low, self.close,
+                         self.volume, self.quote_volume, self.taker_buy_volume, self.trade_count)
+
+    def _open_bar(self, open_time: int, price: float) -> None:
+        self.open_time = open_time
+        self.open = self.high = self.low = self.close = price
+        self.volume = self.quote_volume = self.taker_buy_volume = 0.0
+        self.trade_count = 0
+
+    def add_trade(self, trade_time: int, price: float, quantity: float, is_buyer_maker: bool, trade_count: int) -> int:
+        """
+        Returns:
+            int: Number of bars closed by this trade.
+        """
+        interval_ms = self.interval_ms
+        open_time = trade_time - trade_time % interval_ms
+        closed = 0
+
+        if self.open_time is None:
+            self._open_bar(open_time, price)
+        elif open_time > self.open_time:
+            self._close_bar()
+            closed = 1
+            # Intervals without trades are flat bars at the last close, as exchange klines are
+            missing = min((open_time - self.open_time) // interval_ms - 1, self.bars.capacity)
+            close = self.close
+            for n in range(missing, 0, -1):
+                self.bars.append(open_time - n * interval_ms, close, close, close, close, 0.0, 0.0, 0.0, 0)
+            closed += missing
+            self._open_bar(open_time, price)
+        elif open_time < self.open_time:
+            self.late_trades += 1
+            return 0
+
+        if self.trade_count == 0:
+            # First trade of the bar: replaces the seed of a bar opened by `reconcile`
+            self.open = self.high = self.low = price
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += quantity
+        self.quote_volume += price * quantity
+        if not is_buyer_maker:
+            self.taker_buy_volume += quantity
+        self.trade_count += trade_count
+        return closed
+
+    def reconcile(self, kline: Kline) -> bool:
+        """
+        Replace the aggregated bar of the closed exchange kline's open time by the kline.
+
+        Returns:
+            bool: False if the bar is not in the ring anymore (or not yet opened).
+        """
+        values = (kline.start_time, kline.open, kline.high, kline.low, kline.close, kline.volume,
+                  kline.quote_volume, kline.taker_buy_volume, kline.trade_count)
+
+        if self.open_time is not None and kline.start_time == self.open_time:
+            # The exchange closed the bar before any trade of the next interval. The next bar
+            # is seeded flat at the close, with trade_count 0 so that its first trade sets O/H/L/C
+            self.bars.append(*values)
+            self.open_time = kline.start_time + self.interval_ms
+            self.open = self.high = self.low = self.close = kline.close
+            self.volume = self.quote_volume = self.taker_buy_volume = 0.0
+            self.trade_count = 0
+            return True
+
+        position = self.bars.find(kline.start_time, self.interval_ms)
+        if position is None:
+            return False
+        columns = self.bars.columns
+        for name, value in zip(("open_time",) + BAR_FLOAT_COLUMNS + ("trade_count",), values):
+            columns[name][position] = value
+        return True
+
+    def current(self) -> dict:
+        """The bar in progress, or None before the first trade."""
+        if self.open_time is None:
+            return None
+        return {
+            "open_time": self.open_time, "open": self.open, "high": self.high, "low": self.low,
+            "close": self.close, "volume": self.volume, "quote_volume": self.quote_volume,
+            "taker_buy_volume": self.taker_buy_volume, "trade_count": self.trade_count,
+        }
+
+
+class KlineAggregator:
+    """
+    Bars of several intervals for every symbol of the aggTrade streams, per market.
+    """
+    def __init__(self,
+                 intervals: list = ("1s", "1m", "5m", "15m", "1h", "4h", "1d"),
+                 capacity: int = 1000,
+                 on_bar_close: callable = None):
+        """
+        Args:
+            intervals (list): Bar intervals, keys of INTERVAL_MS.
+            capacity (int): Closed bars kept per market / symbol / interval.
+            on_bar_close (callable): Called with (market, symbol, BarSeries) when bars of a series close.
+        """
+        for interval in intervals:
+            if interval not in INTERVAL_MS:
+                raise ValueError(f"Unsupported interval: {interval}. Available: {list(INTERVAL_MS)}")
+        self.intervals = tuple(intervals)
+        self.capacity = capacity
+        self.on_bar_close = on_bar_close
+        self.series = {"spot": {}, "um": {}}
+        """market -> symbol -> interval -> BarSeries"""
+
+    def _symbol_series(self, market: str, symbol: str) -> dict:
+        symbol_series = self.series[market].get(symbol)
+        if symbol_series is None:
+            symbol_series = self.series[market][symbol] = {
+                interval: BarSeries(interval, self.capacity) for interval in self.intervals
+            }
+        return symbol_series
+
+    def on_agg_trade(self, market: str, agg_trade: AggTrade) -> None:
+        symbol_series = self._symbol_series(market, agg_trade.symbol)
+        trade_count = agg_trade.last_trade_id - agg_trade.first_trade_id + 1
+        for series in symbol_series.values():
+            closed = series.add_trade(agg_trade.trade_time, agg_trade.price, agg_trade.quantity,
+                                      agg_trade.is_buyer_maker, trade_count)
+            if closed and self.on_bar_close:
+                self.on_bar_close(market, agg_trade.symbol, series)
+
+    def on_kline(self, market: str, kline: Kline) -> bool:
+        """
+        Reconcile with a closed exchange kline. Open klines and other intervals are ignored.
+
+        Returns:
+            bool: True if a bar was replaced.
+        """
+        if not kline.is_closed or kline.interval not in self.intervals:
+            return False
+        return self._symbol_series(market, kline.symbol)[kline.interval].reconcile(kline)
+
+    def get_series(self, market: str, symbol: str, interval: str) -> BarSeries:
+        symbol_series = self.series[market].get(symbol)
+        return symbol_series[interval] if symbol_series else None
+
+    def last_bars(self, market: str, symbol: str, interval: str, k: int = None) -> dict:
+        """
+        The last k closed bars, oldest first.
+
+        Returns:
+            dict: column -> NumPy array, or None if the symbol has no trades yet.
+        """
+        series = self.get_series(market, symbol, interval)
+        return series.bars.last(k) if series else None
@@ -0,0 +1,265 @@
+# crypto_bot/binance/kline_downloader.py
+"""
+Historical klines of arbitrary date ranges, downloaded concurrently and cached on disk.
+
+    downloader = KlineDownloader(fetchers={"spot": Spot().klines, "um": UMFutures().klines})
+    klines = downloader.download("um", "TRBUSDT", "1h", datetime(2023, 1, 1), datetime(2023, 12, 31))
+    klines["close"]     # NumPy float64 array
+    klines_to_dataframe(klines)
+
+Ranges are split into UTC days. Complete days are cached as one file per
+market / symbol / interval / day (Parquet when pyarrow is installed, .npz otherwise),
+so a range is only ever downloaded once. Consecutive missing days are downloaded
+together, so coarse intervals need one request for many days.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .kline_aggregator import INTERVAL_MS
+from .rest_scheduler import REQUEST_WEIGHT_PER_MINUTE, klines_request_weight
+
+
+DAY_MS = 86_400_000
+
+KLINE_COLUMNS = (
+    # (column, dtype) in the order of the REST response rows
+    ("open_time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("close_time", np.int64),
+    ("quote_volume", np.float64),
+    ("trade_count", np.int64),
+    ("taker_buy_volume", np.float64),
+    ("taker_buy_quote_volume", np.float64),
+)
+
+MAX_KLINES_PER_REQUEST = {"spot": 1000, "um": 1500}
+
+
+def to_milliseconds(time_value) -> int:
+    """datetime (naive datetimes are UTC) or ms since the epoch -> ms since the epoch."""
+    if isinstance(time_value, datetime):
+        if time_value.tzinfo is None:
+            time_value = time_value.replace(tzinfo=timezone.utc)
+        return int(time_value.timestamp() * 1000)
+    return int(time_value)
+
+
+def decode_klines(rows: list) -> dict:
+    """
+    REST kline rows (lists of numbers and numeric strings) -> typed columns.
+
+    Returns:
+        dict: column -> NumPy array
+    """
+    if not rows:
+        return empty_klines()
+    table = np.array([row[:len(KLINE_COLUMNS)] for row in rows], dtype=object)
+    return {column: table[:, i].astype(dtype) for i, (column, dtype) in enumerate(KLINE_COLUMNS)}
+
+
+def empty_klines() -> dict:
+    return {column: np.empty(0, dtype=dtype) for column, dtype in KLINE_COLUMNS}
+
+
+def concatenate_klines(parts: list) -> dict:
+    """Concatenate kline columns, sorted by open time, without duplicates."""
+    parts = [part for part in parts if len(part["open_time"])]
+    if not parts:
+        return empty_klines()
+    klines = {column: np.concatenate([part[column] for part in parts]) for column, _ in KLINE_COLUMNS}
+    _, index = np.unique(klines["open_time"], return_index=True)
+    return {column: values[index] for column, values in klines.items()}
+
+
+def klines_to_dataframe(klines: dict):
+    """Kline columns -> pandas DataFrame indexed by open time."""
+    import pandas as pd
+    df = pd.DataFrame(klines)
+    df.index = pd.to_datetime(df["open_time"], unit="ms")
+    return df
+
+
+class WeightBudget:
+    """
+    Sliding one-minute request weight budget, shared by the download threads.
+    """
+    def __init__(self, weight_per_minute: int):
+        self.weight_per_minute = weight_per_minute
+        self._spent = deque()
+        """(time, weight) of the requests of the last minute"""
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: int) -> None:
+        """Wait until the weight fits in the budget of the last minute, then spend it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._spent and now - self._spent[0][0] >= 60.0:
+                    self._total -= self._spent.popleft()[1]
+                if self._total + weight <= self.weight_per_minute:
+                    self._spent.append((now, weight))
+                    self._total += weight
+                    return
+                wait = 60.0 - (now - self._spent[0][0])
+            time.sleep(wait)
+
+
+class KlineCache:
+    """
+    One file per market / symbol / interval / UTC day:
+        <directory>/<market>/<symbol>/<interval>/<YYYY-MM-DD>.parquet (or .npz)
+    """
+    def __init__(self, directory: str, file_format: str = None):
+        """
+        Args:
+            file_format (str): "parquet" or "npz". Defaults to parquet if pyarrow is installed.
+        """
+        if file_format is None:
+            try:
+                import pyarrow  # noqa: F401
+                file_format = "parquet"
+            except ImportError:
+                file_format = "npz"
+        self.directory = directory
+        self.file_format = file_format
+
+    def path(self, market: str, symbol: str, interval: str, day_start: int) -> str:
+        day = datetime.fromtimestamp(day_start / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+        return os.path.join(self.directory, market, symbol, interval, f"{day}.{self.file_format}")
+
+    def load(self, market: str, symbol: str, interval: str, day_start: int) -> dict:
+        """Returns: the cached columns of the day, or None."""
+        path = self.path(market, symbol, interval, day_start)
+        if not os.path.exists(path):
+            return None
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+            table = pq.read_table(path)
+            return {column: table.column(column).to_numpy() for column, _ in KLINE_COLUMNS}
+        with np.load(path) as data:
+            return {column: data[column] for column, _ in KLINE_COLUMNS}
+
+    def save(self, market: str, symbol: str, interval: str, day_start: int, klines: dict) -> None:
+        path = self.path(market, symbol, interval, day_start)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        if self.file_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table(klines), temporary_path)
+        else:
+            with open(temporary_path, "wb") as f:
+                np.savez(f, **klines)
+        os.replace(temporary_path, path)
+
+
+class KlineDownloader:
+    """
+    Downloads klines page by page over a thread pool, within the request weight budget
+    of each market, and caches complete days.
+    """
+    def __init__(self,
+                 fetchers: dict,
+                 cache_directory: str = "data/klines",
+                 max_workers: int = 8,
+                 weight_budget_ratio: float = 0.5,
+                 file_format: str = None):
+        """
+        Args:
+            fetchers (dict): market -> callable(symbol, interval, startTime=, endTime=, limit=)
+                returning kline rows, e.g. {"spot": Spot().klines, "um": UMFutures().klines}
+            cache_directory (str): Root directory of the cache. None disables the cache.
+            max_workers (int): Concurrent requests.
+            weight_budget_ratio (float): Share of the request weight limits the downloads may use.
+            file_format (str): Cache file format, see `KlineCache`.
+        """
+        self.fetchers = fetchers
+        self.cache = KlineCache(cache_directory, file_format) if cache_directory else None
+        self.max_workers = max_workers
+        self.budgets = {
+            market: WeightBudget(int(limit * weight_budget_ratio))
+            for market, limit in REQUEST_WEIGHT_PER_MINUTE.items()
+        }
+        self.requests_sent = 0
+
+    def _fetch_page(self, market: str, symbol: str, interval: str, start: int, end: int) -> dict:
+        limit = min((end - start) // INTERVAL_MS[interval] + 1, MAX_KLINES_PER_REQUEST[market])
+        self.budgets[market].acquire(klines_request_weight(market, limit))
+        rows = self.fetchers[market](symbol, interval, startTime=start, endTime=end, limit=limit)
+        self.requests_sent += 1
+        return decode_klines(rows)
+
+    def _pages(self, market: str, interval: str, start: int, end: int) -> list:
+        """[(start, end), ...] of the requests covering [start, end]."""
+        page_ms = MAX_KLINES_PER_REQUEST[market] * INTERVAL_MS[interval]
+        return [(page_start, min(page_start + page_ms - 1, end)) for page_start in range(start, end + 1, page_ms)]
+
+    def download(self, market: str, symbol: str, interval: str, start, end=None) -> dict:
+        """
+        Klines opened in [start, end].
+
+        Args:
+            market (str): "spot" or "um"
+            symbol (str): e.g. "BTCUSDT"
+            interval (str): Up to "1d", see INTERVAL_MS.
+            start (datetime | int): Start time (datetime, naive = UTC, or ms since the epoch).
+            end (datetime | int): End time, defaults to now.
+        Returns:
+            dict: column -> NumPy array, see KLINE_COLUMNS.
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval: {interval}. Available: {list(INTERVAL_MS)}")
+        start = to_milliseconds(start)
+        now = int(time.time() * 1000)
+        end = now if end is None else min(to_milliseconds(end), now)
+
+        days = range(start - start % DAY_MS, end + 1, DAY_MS)
+        parts = {}
+        missing = []
+        for day_start in days:
+            cached = self.cache.load(market, symbol, interval, day_start) if self.cache else None
+            if cached is not None:
+                parts[day_start] = cached
+            else:
+                missing.append(day_start)
+
+        if missing:
+            # [start, end] of the runs of consecutive missing days, requested page by page
+            runs = []
+            for day_start in missing:
+                if runs and runs[-1][1] + 1 == day_start:
+                    runs[-1][1] = day_start + DAY_MS - 1
+                else:
+                    runs.append([day_start, day_start + DAY_MS - 1])
+            requests = [
+                page
+                for run_start, run_end in runs
+                for page in self._pages(market, interval, run_start, min(run_end, now))
+            ]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                downloaded = concatenate_klines(list(executor.map(
+                    lambda page: self._fetch_page(market, symbol, interval, *page),
+                    requests,
+                )))
+
+            bounds = np.searchsorted(downloaded["open_time"], [(day_start, day_start + DAY_MS) for day_start in missing])
+            for day_start, (first, last) in zip(missing, bounds):
+                klines = {column: values[first:last] for column, values in downloaded.items()}
+                parts[day_start] = klines
+                if self.cache and day_start + DAY_MS <= now:
+                    self.cache.save(market, symbol, interval, day_start, klines)
+
+        klines = concatenate_klines([parts[day_start] for day_start in days])
+        in_range = (klines["open_time"] >= start) & (klines["open_time"] <= end)
+        return {column: values[in_range] for column, values in klines.items()}
@@ -0,0 +1,330 @@
+# crypto_bot/binance/latency_monitor.py
+"""
+Latency instrumentation of the websocket message handler.
+
+Per market / stream / event type, the handler records (see `BinanceWSMessageHandler(latency_monitor=...)`):
+
+    exchange_to_receive     receive time - event time ("E") of the payload
+    receive_to_decode       JSON decoding of the frame (the `TickRecorder` write before it is not included)
+    decode_to_store         dispatch, handlers, store updates and synchronous subscribers
+
+plus frame / payload counters. Consumer queues (`CoalescingQueue(track_latency=True)`)
+can be registered for their depth and publish -> get latency.
+
+    monitor = LatencyMonitor()
+    handler = BinanceWSMessageHandler(latency_monitor=monitor)
+    monitor.register_queue("display", display_queue)
+    monitor.start_http_server(9464)     # Prometheus text format on /metrics
+    monitor.summary()                   # pull API
+
+exchange_to_receive includes the clock offset between the exchange and this host,
+negative values (clock behind the exchange) are counted as 0.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crypto_bot.utils.histogram import LatencyHistogram
+from .message_handler import get_stream_type
+
+
+STAGES = ("exchange_to_receive", "receive_to_decode", "decode_to_store")
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+METRIC_PREFIX = "crypto_bot"
+FLUSH_SIZE = 1024
+"""Samples buffered per stage before they are recorded into the histograms at once."""
+
+
+class StreamStats:
+    """
+    Counters and per-stage latency histograms (ns) of a market / stream / event type.
+
+    Samples are appended to plain lists on the websocket thread and recorded into the
+    histograms in bulk (`flush`), which keeps the per-frame cost to a few list appends.
+    `flush` runs on both the websocket thread and the pull side: the sample lists and the
+    histograms are only touched under `lock`.
+    """
+    __slots__ = ("market", "stream", "event_type", "messages", "payloads", "histograms", "samples", "lock")
+
+    def __init__(self, market: str, stream: str, event_type: str):
+        self.market = market
+        self.stream = stream
+        self.event_type = event_type
+        self.messages = 0
+        self.payloads = 0
+        self.histograms = tuple(LatencyHistogram() for _ in STAGES)
+        self.samples = tuple([] for _ in STAGES)
+        self.lock = threading.Lock()
+
+    def flush(self) -> None:
+        with self.lock:
+            samples = self.samples
+            self.samples = tuple([] for _ in STAGES)
+            for histogram, values in zip(self.histograms, samples):
+                histogram.record_many(values)
+
+    @property
+    def labels(self) -> dict:
+        return {"market": self.market, "stream": self.stream, "event_type": self.event_type}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.messages = 0
+            self.payloads = 0
+            self.samples = tuple([] for _ in STAGES)
+            for histogram in self.histograms:
+                histogram.reset()
+
+
+class LatencyMonitor:
+    """
+    Collects the latencies reported by the message handler, exposed through `summary` /
+    `queue_summary` and in the Prometheus text format (`prometheus_text`, `start_http_server`).
+    """
+    def __init__(self, sample_every: int = 1):
+        """
+        Args:
+            sample_every (int): Record the latencies of one frame out of `sample_every`
+                (counters are always updated).
+        """
+        self.sample_every = sample_every
+        self.streams = {}
+        """(market, stream label, event type) -> StreamStats"""
+        self.queues = {}
+        """name -> consumer queue"""
+        self._stats = {}
+        """(market, stream name, "e") -> StreamStats, several keys may share the same StreamStats."""
+        self._lock = threading.Lock()
+        self._http_server = None
+        self.started = time.time()
+
+    def _add_stats(self, key: tuple) -> StreamStats:
+        market, stream_name, event_type = key
+        stream_type = get_stream_type(stream_name)
+        # Listen keys are credentials, user data streams are all reported as "userData"
+        stream = stream_name if stream_type is not None else "userData"
+        event_type = event_type or stream_type or "unknown"
+        with self._lock:
+            label_key = (market, stream, event_type)
+            stats = self.streams.get(label_key)
+            if stats is None:
+                stats = StreamStats(market, stream, event_type)
+                self.streams = {**self.streams, label_key: stats}
+            self._stats[key] = stats
+        return stats
+
+    def observe(self,
+                market: str,
+                stream_name: str,
+                data,
+                receive_ns: int,
+                decode_start_ns: int,
+                decoded_ns: int,
+                stored_ns: int) -> None:
+        """
+        Record a handled frame. Called by the message handler, times are `time.time_ns()`.
+
+        Args:
+            data: The payload, or the list of payloads of an array stream frame.
+            receive_ns (int): Receive time of the frame.
+            decode_start_ns (int): Start of the JSON decoding (after the frame was recorded).
+        """
+        if data.__class__ is list:
+            payloads = len(data)
+            payload = data[0] if payloads else {}
+        else:
+            payloads = 1
+            payload = data
+        key = (market, stream_name, payload.get("e"))
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._add_stats(key)
+        stats.messages += 1
+        stats.payloads += payloads
+        if self.sample_every > 1 and stats.messages % self.sample_every:
+            return
+
+        event_time = payload.get("E")
+        with stats.lock:
+            exchange_to_receive, receive_to_decode, decode_to_store = stats.samples
+            if event_time:
+                exchange_to_receive.append(receive_ns - event_time * 1_000_000)
+            receive_to_decode.append(decoded_ns - decode_start_ns)
+            decode_to_store.append(stored_ns - decoded_ns)
+            full = len(decode_to_store) >= FLUSH_SIZE
+        if full:
+            stats.flush()
+
+    def register_queue(self, name: str, queue) -> None:
+        """
+        Report the depth of a consumer queue (anything with `__len__`, e.g. the buffers of
+        crypto_bot.pipeline with their `dropped` counter), and its publish -> get latency
+        if it has a `latency` histogram (`CoalescingQueue(track_latency=True)`).
+        """
+        with self._lock:
+            self.queues = {**self.queues, name: queue}
+
+    def unregister_queue(self, name: str) -> None:
+        with self._lock:
+            queues = dict(self.queues)
+            queues.pop(name, None)
+            self.queues = queues
+
+    def reset(self) -> None:
+        for stats in self.streams.values():
+            stats.reset()
+        self.started = time.time()
+
+    def flush(self) -> None:
+        """Record the buffered samples (done by every pull)."""
+        for stats in self.streams.values():
+            stats.flush()
+
+    """Pull API"""
+
+    def summary(self, percentiles: tuple = DEFAULT_PERCENTILES) -> dict:
+        """
+        Returns:
+            dict: (market, stream, event type) -> {
+                "messages", "payloads", "rate" (frames/s since start or reset),
+                stage: {"count", "min", "mean", "max", "p50", ...} in ns,
+            }
+        """
+        self.flush()
+        elapsed = max(time.time() - self.started, 1e-9)
+        summary = {}
+        for key, stats in self.streams.items():
+            with stats.lock:
+                summary[key] = {
+                    "messages": stats.messages,
+                    "payloads": stats.payloads,
+                    "rate": stats.messages / elapsed,
+                    **{stage: histogram.summary(percentiles) for stage, histogram in zip(STAGES, stats.histograms)},
+                }
+        return summary
+
+    def queue_summary(self, percentiles: tuple = DEFAULT_PERCENTILES) -> dict:
+        """
+        Returns:
+            dict: queue name -> {"depth", "coalesced", "dropped", "latency": {...} in ns (if tracked)}
+        """
+        summary = {}
+        for name, queue in self.queues.items():
+            summary[name] = {
+                "depth": len(queue),
+                "coalesced": getattr(queue, "coalesced", 0) or getattr(queue, "conflated", 0),
+                "dropped": getattr(queue, "dropped", 0),
+            }
+            latency = getattr(queue, "latency", None)
+            if latency is not None:
+                summary[name]["latency"] = latency.summary(percentiles)
+        return summary
+
+    """Prometheus"""
+
+    def prometheus_text(self, percentiles: tuple = DEFAULT_PERCENTILES) -> str:
+        """
+        All the metrics in the Prometheus text exposition format (latencies in seconds).
+        """
+        self.flush()
+        lines = []
+        streams = list(self.streams.values())
+
+        for name, help_text, attribute in (
+                ("ws_messages_total", "Websocket frames handled.", "messages"),
+                ("ws_payloads_total", "Websocket payloads handled (array frames have several).", "payloads")):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for stats in streams:
+                lines.append(f"{METRIC_PREFIX}_{name}{_labels(stats.labels)} {getattr(stats, attribute)}")
+
+        name = f"{METRIC_PREFIX}_ws_latency_seconds"
+        lines.append(f"# HELP {name} Latency of the websocket frames per stage.")
+        lines.append(f"# TYPE {name} summary")
+        for stats in streams:
+            with stats.lock:
+                for stage, histogram in zip(STAGES, stats.histograms):
+                    _summary_lines(lines, name, {**stats.labels, "stage": stage}, histogram, percentiles)
+
+        queues = self.queues
+        if queues:
+            name = f"{METRIC_PREFIX}_queue_depth"
+            lines.append(f"# HELP {name} Updates waiting in the consumer queue.")
+            lines.append(f"# TYPE {name} gauge")
+            for queue_name, queue in queues.items():
+                lines.append(f"{name}{_labels({'queue': queue_name})} {len(queue)}")
+
+            name = f"{METRIC_PREFIX}_queue_coalesced_total"
+            lines.append(f"# HELP {name} Updates overwritten before being consumed.")
+            lines.append(f"# TYPE {name} counter")
+            for queue_name, queue in queues.items():
+                coalesced = getattr(queue, "coalesced", 0) or getattr(queue, "conflated", 0)
+                lines.append(f"{name}{_labels({'queue': queue_name})} {coalesced}")
+
+            name = f"{METRIC_PREFIX}_queue_dropped_total"
+            lines.append(f"# HELP {name} Updates dropped because the consumer queue was full.")
+            lines.append(f"# TYPE {name} counter")
+            for queue_name, queue in queues.items():
+                lines.append(f"{name}{_labels({'queue': queue_name})} {getattr(queue, 'dropped', 0)}")
+
+            name = f"{METRIC_PREFIX}_queue_latency_seconds"
+            lines.append(f"# HELP {name} Time from the first pending update to its consumption.")
+            lines.append(f"# TYPE {name} summary")
+            for queue_name, queue in queues.items():
+                latency = getattr(queue, "latency", None)
+                if latency is not None:
+                    _summary_lines(lines, name, {"queue": queue_name}, latency, percentiles)
+
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port: int = 9464, host: str = "127.0.0.1") -> int:
+        """
+        Serve `prometheus_text` on http://host:port/metrics from a daemon thread.
+
+        Returns:
+            int: The port (useful with port 0).
+        """
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                payload = monitor.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._http_server.serve_forever, name="latency-metrics", daemon=True).start()
+        return self._http_server.server_address[1]
+
+    def stop_http_server(self) -> None:
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+
+def _labels(labels: dict) -> str:
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _summary_lines(lines: list, name: str, labels: dict, histogram: LatencyHistogram, percentiles: tuple) -> None:
+    """Append the quantiles, _sum and _count of a histogram in ns, as a summary in seconds."""
+    if histogram.count:
+        for percentile in percentiles:
+            value = histogram.percentile(percentile) / 1e9
+            lines.append(f"{name}{_labels({**labels, 'quantile': f'{percentile / 100:g}'})} {value:.9f}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.total / 1e9:.9f}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
@@ -0,0 +1,124 @@
+# crypto_bot/binance/local_kline_server.py
+"""
+Local stand-in for the Binance klines endpoints, to run the `KlineDownloader` offline.
+
+    server = LocalKlineServer()
+    server.start()
+    downloader = KlineDownloader(fetchers={
+        "spot": Spot(base_url=server.url).klines,
+        "um": UMFutures(base_url=server.url).klines,
+    })
+
+Klines are generated from their open time, so every page of a range is reproducible
+(see `kline_row`). Paging follows the exchange: rows opened in [startTime, endTime],
+at most `limit` of them (capped per market), none opened in the future.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from .kline_aggregator import INTERVAL_MS
+from .kline_downloader import MAX_KLINES_PER_REQUEST
+from .rest_scheduler import klines_request_weight
+
+
+KLINES_PATHS = {"/api/v3/klines": "spot", "/fapi/v1/klines": "um"}
+
+
+def kline_row(symbol: str, interval: str, open_time: int) -> list:
+    """
+    The generated kline of a symbol / interval / open time, as a REST response row.
+    """
+    interval_ms = INTERVAL_MS[interval]
+    step = open_time // interval_ms
+    base = 100.0 + sum(map(ord, symbol)) % 100 + step % 50
+    open, close = base, base + (step % 7 - 3) * 0.1
+    high, low = max(open, close) + 0.5, min(open, close) - 0.5
+    volume = float(1 + step % 13)
+    return [
+        open_time, f"{open:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}", f"{volume:.8f}",
+        open_time + interval_ms - 1, f"{volume * close:.8f}", 10 + step % 5,
+        f"{volume / 2:.8f}", f"{volume / 2 * close:.8f}", "0",
+    ]
+
+
+class LocalKlineServer:
+    """
+    Implements GET /api/v3/klines (spot) and /fapi/v1/klines (um).
+    """
+    def __init__(self, host: str = "127.0.0.1", listing_time: int = 0, now: callable = None):
+        """
+        Args:
+            listing_time (int): No klines open before this time (ms), like a newly listed symbol.
+            now (callable): Current time (ms), defaults to the wall clock.
+        """
+        self.host = host
+        self.listing_time = listing_time
+        self.now = now or (lambda: int(time.time() * 1000))
+        self.requests = []
+        """(market, params) of every request, in order."""
+        self.used_weight = {"spot": 0, "um": 0}
+        self._lock = threading.Lock()
+        self._http_server = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        """Base url, to be used as the `base_url` of the connector clients."""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                market = KLINES_PATHS.get(url.path)
+                if market is None:
+                    status, response, weight = 404, {"code": -1000, "msg": f"Unknown path {url.path}"}, 0
+                else:
+                    status, response, weight = server._klines(market, dict(parse_qsl(url.query)))
+                payload = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("X-MBX-USED-WEIGHT-1M", str(weight))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self.host, 0), Handler)
+        self.port = self._http_server.server_address[1]
+        threading.Thread(target=self._http_server.serve_forever, name="local-kline-server", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def _klines(self, market: str, params: dict) -> tuple:
+        interval = params.get("interval")
+        if "symbol" not in params or interval not in INTERVAL_MS:
+            return 400, {"code": -1120, "msg": "Invalid interval."}, 0
+        interval_ms = INTERVAL_MS[interval]
+        limit = min(int(params.get("limit", 500)), MAX_KLINES_PER_REQUEST[market])
+        now = self.now()
+        start = max(int(params.get("startTime", 0)), self.listing_time)
+        end = min(int(params.get("endTime", now)), now)
+        first = -(-start // interval_ms) * interval_ms
+
+        open_times = range(first, end + 1, interval_ms)
+        # Without startTime, the exchange returns the latest klines
+        open_times = open_times[:limit] if "startTime" in params else open_times[-limit:]
+        rows = [kline_row(params["symbol"], interval, open_time) for open_time in open_times]
+        with self._lock:
+            self.requests.append((market, params))
+            weight = self.used_weight[market] = self.used_weight[market] + klines_request_weight(market, limit)
+        return 200, rows, weight
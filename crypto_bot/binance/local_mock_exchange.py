@@ -0,0 +1,297 @@
+# crypto_bot/binance/local_mock_exchange.py
+"""
+Local stand-in for the Binance order endpoints, to run the `OrderGateway` offline.
+
+    exchange = LocalMockExchange(api_key, secret_key, on_report=on_report)
+    exchange.start()
+    gateway = OrderGateway(api_key, secret_key, base_urls={"spot": exchange.rest_url, "um": exchange.rest_url})
+
+    await exchange.start_websocket_api()     # order.place / order.cancel, requires `websockets`
+    gateway = OrderGateway(..., ws_api_urls=exchange.ws_api_urls)
+
+Signatures are checked like the exchange does. LIMIT orders rest until `fill` is called,
+MARKET orders are filled at once. Every state change is reported to `on_report(market, event)`
+as an executionReport (spot) or ORDER_TRADE_UPDATE (um) user data stream event.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .order_gateway import ORDER_PATHS, PING_PATHS
+
+
+WS_API_PATHS = {"spot": "/ws-api/v3", "um": "/ws-fapi/v1"}
+
+
+class LocalMockExchange:
+    """
+    Implements POST / DELETE of the spot and um order endpoints, the ping endpoints,
+    and the order.place / order.cancel methods of the websocket API.
+    """
+    def __init__(self,
+                 api_key: str,
+                 secret_key: str,
+                 host: str = "127.0.0.1",
+                 on_report: callable = None,
+                 fill_price: float = None):
+        """
+        Args:
+            on_report (callable): Called with (market, user data stream event) on every order update.
+            fill_price (float): Price of the MARKET order fills, defaults to the order's price or 1.
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key.encode()
+        self.host = host
+        self.on_report = on_report
+        self.fill_price = fill_price
+
+        self.orders = {}
+        """(market, order id) -> order dict"""
+        self.requests = []
+        """(transport, method, path or websocket API method, params) of every request, in order."""
+        self._order_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._http_server = None
+        self._ws_server = None
+        self.port = None
+        self.ws_port = None
+
+    @property
+    def rest_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_api_urls(self) -> dict:
+        """market -> websocket API url, to be used as the `ws_api_urls` of the `OrderGateway`."""
+        return {market: f"ws://{self.host}:{self.ws_port}{path}" for market, path in WS_API_PATHS.items()}
+
+    """REST"""
+
+    def start(self) -> None:
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode() if length else ""
+                query = "&".join(part for part in (url.query, body) if part)
+                status, response = exchange._handle_rest(self.command, url.path, query, self.headers.get("X-MBX-APIKEY"))
+                payload = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("X-MBX-USED-WEIGHT-1M", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._http_server = ThreadingHTTPServer((self.host, 0), Handler)
+        self.port = self._http_server.server_address[1]
+        threading.Thread(target=self._http_server.serve_forever, name="mock-exchange", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server.server_close()
+            self._http_server = None
+
+    def _handle_rest(self, method: str, path: str, query: str, api_key: str) -> tuple:
+        markets = {order_path: market for market, order_path in ORDER_PATHS.items()}
+        if path in PING_PATHS.values():
+            return 200, {}
+        market = markets.get(path)
+        if market is None:
+            return 404, {"code": -1000, "msg": f"Unknown path {path}"}
+
+        unsigned, _, signature = query.rpartition("&signature=")
+        params = dict(parse_qsl(unsigned))
+        self.requests.append(("rest", method, path, params))
+        if api_key != self.api_key or signature != self._sign(unsigned):
+            return 400, {"code": -1022, "msg": "Signature for this request is not valid."}
+        if method == "POST":
+            return self._place(market, params)
+        if method == "DELETE":
+            return self._cancel(market, params)
+        return 400, {"code": -1000, "msg": f"Unsupported method {method}"}
+
+    def _sign(self, query: str) -> str:
+        return hmac.new(self.secret_key, query.encode(), hashlib.sha256).hexdigest()
+
+    """Websocket API"""
+
+    async def start_websocket_api(self) -> None:
+        try:
+            from websockets.asyncio.server import serve
+        except ImportError:
+            # websockets < 13
+            from websockets import serve
+        self._ws_server = await serve(self._handle_ws_connection, self.host, 0)
+        self.ws_port = next(iter(self._ws_server.sockets)).getsockname()[1]
+
+    async def stop_websocket_api(self) -> None:
+        if self._ws_server is not None:
+            self._ws_server.close()
+            await self._ws_server.wait_closed()
+            self._ws_server = None
+
+    async def _handle_ws_connection(self, connection, *args) -> None:
+        # websockets < 13 passes the path as second argument
+        path = args[0] if args else connection.request.path
+        market = {ws_path: market for market, ws_path in WS_API_PATHS.items()}.get(path, "spot")
+        async for frame in connection:
+            request = json.loads(frame)
+            method = request.get("method")
+            params = dict(request.get("params") or {})
+            self.requests.append(("websocket", None, method, params))
+
+            signature = params.pop("signature", None)
+            if params.get("apiKey") != self.api_key or signature != self._sign(urlencode(sorted(params.items()))):
+                status, result = 400, {"code": -1022, "msg": "Signature for this request is not valid."}
+            elif method == "order.place":
+                status, result = self._place(market, params)
+            elif method == "order.cancel":
+                status, result = self._cancel(market, params)
+            else:
+                status, result = 400, {"code": -1000, "msg": f"Unknown method {method}"}
+
+            response = {"id": request.get("id"), "status": status}
+            response["result" if status == 200 else "error"] = result
+            await connection.send(json.dumps(response))
+
+    """Orders"""
+
+    def _place(self, market: str, params: dict) -> tuple:
+        now = int(time.time() * 1000)
+        order_type = params.get("type")
+        quantity = float(params.get("quantity", 0))
+        if not params.get("symbol") or params.get("side") not in ("BUY", "SELL") or not order_type or quantity <= 0:
+            return 400, {"code": -1102, "msg": "Mandatory parameter was not sent, was empty/null, or malformed."}
+        if order_type == "LIMIT" and not params.get("price"):
+            return 400, {"code": -1102, "msg": "Mandatory parameter 'price' was not sent."}
+
+        with self._lock:
+            order = {
+                "symbol": params["symbol"],
+                "orderId": next(self._order_ids),
+                "clientOrderId": params.get("newClientOrderId") or f"mock{now}",
+                "side": params["side"],
+                "type": order_type,
+                "timeInForce": params.get("timeInForce", "GTC"),
+                "price": params.get("price", "0"),
+                "origQty": params["quantity"],
+                "executedQty": 0.0,
+                "quote": 0.0,
+                "status": "NEW",
+                "updateTime": now,
+            }
+            self.orders[(market, order["orderId"])] = order
+        self._report(market, order, "NEW")
+        if order_type == "MARKET":
+            self.fill(market, order["orderId"])
+        return 200, self._ack(market, order)
+
+    def _cancel(self, market: str, params: dict) -> tuple:
+        with self._lock:
+            order = None
+            if "orderId" in params:
+                order = self.orders.get((market, int(params["orderId"])))
+            else:
+                for candidate in self.orders.values():
+                    if candidate["clientOrderId"] == params.get("origClientOrderId"):
+                        order = candidate
+            if order is None or order["status"] not in ("NEW", "PARTIALLY_FILLED"):
+                return 400, {"code": -2011, "msg": "Unknown order sent."}
+            order["status"] = "CANCELED"
+            order["updateTime"] = int(time.time() * 1000)
+        self._report(market, order, "CANCELED")
+        response = self._ack(market, order)
+        response["origClientOrderId"] = order["clientOrderId"]
+        return 200, response
+
+    def fill(self, market: str, order_id: int, quantity: float = None, price: float = None) -> None:
+        """
+        Fill (part of) an open order.
+
+        Args:
+            quantity (float): Defaults to the remaining quantity.
+            price (float): Defaults to the order price (`fill_price` or 1 for MARKET orders).
+        """
+        with self._lock:
+            order = self.orders[(market, order_id)]
+            remaining = float(order["origQty"]) - order["executedQty"]
+            quantity = remaining if quantity is None else min(quantity, remaining)
+            price = price or float(order["price"]) or self.fill_price or 1.0
+            order["executedQty"] += quantity
+            order["quote"] += quantity * price
+            order["status"] = "FILLED" if order["executedQty"] >= float(order["origQty"]) else "PARTIALLY_FILLED"
+            order["updateTime"] = int(time.time() * 1000)
+        self._report(market, order, "TRADE", quantity, price)
+
+    def _ack(self, market: str, order: dict) -> dict:
+        ack = {
+            "symbol": order["symbol"],
+            "orderId": order["orderId"],
+            "clientOrderId": order["clientOrderId"],
+            "price": order["price"],
+            "origQty": order["origQty"],
+            "executedQty": str(order["executedQty"]),
+            "status": order["status"],
+            "timeInForce": order["timeInForce"],
+            "type": order["type"],
+            "side": order["side"],
+        }
+        if market == "spot":
+            ack["transactTime"] = order["updateTime"]
+            ack["cummulativeQuoteQty"] = str(order["quote"])
+        else:
+            ack["updateTime"] = order["updateTime"]
+            ack["cumQuote"] = str(order["quote"])
+            ack["avgPrice"] = str(order["quote"] / order["executedQty"] if order["executedQty"] else 0.0)
+        return ack
+
+    def _report(self, market: str, order: dict, execution_type: str, last_quantity: float = 0.0,
+                last_price: float = 0.0) -> None:
+        if self.on_report is None:
+            return
+        now = order["updateTime"]
+        trade_id = next(self._trade_ids) if execution_type == "TRADE" else -1
+        if market == "spot":
+            event = {
+                "e": "executionReport", "E": now, "s": order["symbol"], "c": order["clientOrderId"],
+                "S": order["side"], "o": order["type"], "f": order["timeInForce"], "q": order["origQty"],
+                "p": order["price"], "P": "0", "F": "0", "g": -1, "C": "", "x": execution_type,
+                "X": order["status"], "r": "NONE", "i": order["orderId"], "l": str(last_quantity),
+                "z": str(order["executedQty"]), "L": str(last_price), "n": "0", "N": None, "T": now,
+                "t": trade_id, "w": order["status"] in ("NEW", "PARTIALLY_FILLED"), "m": False,
+                "M": execution_type == "TRADE", "O": now, "Z": str(order["quote"]),
+                "Y": str(last_quantity * last_price), "Q": "0",
+            }
+        else:
+            executed = order["executedQty"]
+            event = {
+                "e": "ORDER_TRADE_UPDATE", "E": now, "T": now,
+                "o": {
+                    "s": order["symbol"], "c": order["clientOrderId"], "S": order["side"], "o": order["type"],
+                    "f": order["timeInForce"], "q": order["origQty"], "p": order["price"],
+                    "ap": str(order["quote"] / executed if executed else 0.0), "sp": "0", "x": execution_type,
+                    "X": order["status"], "i": order["orderId"], "l": str(last_quantity), "z": str(executed),
+                    "L": str(last_price), "N": "USDT", "n": "0", "T": now, "t": trade_id, "b": "0", "a": "0",
+                    "m": False, "R": False, "wt": "CONTRACT_PRICE", "ot": order["type"], "ps": "BOTH",
+                    "cp": False, "rp": "0",
+                },
+            }
+        self.on_report(market, event)
@@ -0,0 +1,96 @@
+# crypto_bot/binance/local_websocket_server.py
+"""
+Local stand-in for the Binance combined stream endpoint, to run the websocket clients offline.
+
+    server = LocalBinanceWebsocketServer()
+    await server.start()
+    client = AsyncBinanceWebsocketClient(server.url, on_message)
+    await client.connect()
+    await client.subscribe(["btcusdt@aggTrade"])
+    await server.publish("btcusdt@aggTrade", {...})
+
+Requires the `websockets` package.
+"""
+import asyncio
+import json
+
+
+class LocalBinanceWebsocketServer:
+    """
+    Implements the SUBSCRIBE / UNSUBSCRIBE / LIST_SUBSCRIPTIONS methods of the
+    combined stream endpoint (/stream) and pushes the published payloads to the
+    connections subscribed to their stream, wrapped as {"stream": ..., "data": ...}.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            port (int): 0 picks a free port, see `url` once started.
+        """
+        self.host = host
+        self.port = port
+        self.subscriptions = {}
+        """connection -> set of streams"""
+        self.requests = []
+        """Every request received, in order."""
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """Base url, to be used as the `stream_url` of the clients."""
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        try:
+            from websockets.asyncio.server import serve
+        except ImportError:
+            # websockets < 13
+            from websockets import serve
+        self._server = await serve(self._handle_connection, self.host, self.port)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, connection, *args) -> None:
+        self.subscriptions[connection] = set()
+        try:
+            async for frame in connection:
+                request = json.loads(frame)
+                self.requests.append(request)
+                method = request.get("method")
+                streams = self.subscriptions[connection]
+                if method == "SUBSCRIBE":
+                    streams.update(request.get("params", []))
+                    response = {"result": None, "id": request.get("id")}
+                elif method == "UNSUBSCRIBE":
+                    streams.difference_update(request.get("params", []))
+                    response = {"result": None, "id": request.get("id")}
+                elif method == "LIST_SUBSCRIPTIONS":
+                    response = {"result": sorted(streams), "id": request.get("id")}
+                else:
+                    response = {"code": 2, "msg": f"Invalid request: unknown method {method}", "id": request.get("id")}
+                await connection.send(json.dumps(response))
+        except Exception:
+            pass
+        finally:
+            self.subscriptions.pop(connection, None)
+
+    async def publish(self, stream: str, data) -> int:
+        """
+        Push a payload to every connection subscribed to the stream.
+
+        Returns:
+            int: Number of connections the payload was sent to.
+        """
+        frame = json.dumps({"stream": stream, "data": data})
+        connections = [c for c, streams in self.subscriptions.items() if stream in streams]
+        for connection in connections:
+            await connection.send(frame)
+        return len(connections)
+
+    async def drop_connections(self) -> None:
+        """Close every open connection, e.g. to exercise the clients' reconnect."""
+        await asyncio.gather(*(connection.close() for connection in list(self.subscriptions)))
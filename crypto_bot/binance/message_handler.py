@@ -1,15 +1,118 @@
-import json
+import re
 import time
-from crypto_bot import market_data, update_market_data
+from functools import partial
+from crypto_bot import (update_market_data, update_market_data_batch, update_book_ticker, update_mark_price,
+                        get_mark_price_store, get_ticker_store, market_data_subscriptions)
+from crypto_bot.utils.json_decoder import get_json_decoder
+from .events import AggTrade, Trade, Kline, Ticker, MiniTicker, MarkPriceUpdate, DepthUpdate
+from .order_book import OrderBookManager
+from .order_gateway import OrderTable
+from .account_state import AccountState
+
+
+STREAM_TYPE_EVENT_TYPES = {
+    # Stream type (e.g. "aggTrade" in "btcusdt@aggTrade") -> event type ("e")
+    # Only stream types whose payloads always have the same event type are listed here.
+    # Streams of other types (e.g. "<symbol>@ticker_<window_size>", user data streams)
+    # are dispatched on the "e" field of every payload.
+    "aggTrade": "aggTrade",
+    "trade": "trade",
+    "kline": "kline",
+    "continuousKline": "continuous_kline",
+    "miniTicker": "24hrMiniTicker",
+    "bookTicker": "bookTicker",
+    "depth": "depthUpdate",
+    "markPrice": "markPriceUpdate",
+    "forceOrder": "forceOrder",
+    "compositeIndex": "compositeIndex",
+    "contractInfo": "contractInfo",
+    "assetIndex": "assetIndexUpdate",
+}
+
+_STREAM_TYPE_PATTERN = re.compile(r"[A-Za-z]+")
+_PARTIAL_DEPTH_STREAM_PATTERN = re.compile(r"^([^@]+)@depth\d+")
+_ARRAY_STREAM_PATTERN = re.compile(r"^!(markPrice|ticker|miniTicker)@arr(@|$)")
+
+
+def get_stream_type(stream_name: str) -> str:
+    """
+    Get the stream type of a stream name.
+
+    e.g.:
+        "btcusdt@aggTrade"      -> "aggTrade"
+        "btcusdt@depth20@100ms" -> "depth"
+        "btcusdt@kline_1m"      -> "kline"
+        "!markPrice@arr@1s"     -> "markPrice"
+        "!bookTicker"           -> "bookTicker"
+        "<listenKey>"           -> None
+
+    Returns:
+        str: The stream type, or None if the stream name has no type (user data streams).
+    """
+    if stream_name.startswith("!"):
+        stream_type = stream_name[1:].split("@", 1)[0]
+    elif "@" in stream_name:
+        stream_type = stream_name.split("@", 2)[1]
+    else:
+        return None
+
+    match = _STREAM_TYPE_PATTERN.match(stream_type)
+    return match.group() if match else None
+
 
 class BinanceWSMessageHandler:
     """
     A class that handles messages from the Binance websocket streams.
     """
     def __init__(self,
-                 callback=None):
+                 callback=None,
+                 json_decoder: str = None,
+                 recorder=None,
+                 kline_aggregator=None,
+                 latency_monitor=None,
+                 gap_detector=None,
+                 trade_flow=None):
+        """
+        Args:
+            callback (callable): Called with every decoded message after it has been handled,
+                on the websocket thread. Slow consumers go through a `ConsumerPipeline`
+                (callback=pipeline.publish, see crypto_bot/pipeline.py).
+            json_decoder (str): JSON decoder backend ("orjson", "msgspec" or "json").
+                Defaults to the fastest installed one.
+            recorder (TickRecorder): Records every raw frame with its receive time, before it is decoded.
+            kline_aggregator (KlineAggregator): Builds bars from the aggTrade events,
+                reconciled with the closed kline events.
+            latency_monitor (LatencyMonitor): Records the exchange -> receive -> decode -> store
+                latencies of every frame (see binance/latency_monitor.py).
+            gap_detector (GapDetector): Checks the aggTrade sequences (see binance/connection_supervisor.py).
+            trade_flow (TradeFlow): Rolling VWAP / volume delta / rates of the aggTrade events
+                (see binance/trade_flow.py).
+        """
         self.handler_tree = None
         self.callback = callback
+        self.recorder = recorder
+        self.kline_aggregator = kline_aggregator
+        self.latency_monitor = latency_monitor
+        self.gap_detector = gap_detector
+        self.trade_flow = trade_flow
+        self.errors = 0
+        """Number of error frames received."""
+
+        self.json_decoder_backend, self._decode = get_json_decoder(json_decoder)
+
+        self._stream_handlers = {"spot": {}, "um": {}}
+        """market -> stream name -> handler (None: dispatch on the "e" field)."""
+        self._batch_handlers = {"spot": {}, "um": {}}
+        """market -> stream name -> handler of whole array frames (None: handled payload by payload)."""
+
+        self.order_books = OrderBookManager()
+        """Local order books built from the diff. depth streams (<symbol>@depth)."""
+
+        self.orders = OrderTable()
+        """Orders, updated by the executionReport / ORDER_TRADE_UPDATE events (see `OrderGateway`)."""
+
+        self.account = AccountState(orders=self.orders)
+        """Balances, positions and open orders, updated by the user data stream events."""
 
         self._initialize_handler_tree()
     
@@ -30,8 +133,10 @@ class BinanceWSMessageHandler:
 
                     # User Data Streams
                     "outboundAccountInfo": self._outbound_account_info_handler,
+                    "outboundAccountPosition": self._outbound_account_info_handler,
                     "balanceUpdate": self._balance_update_handler,
                     "executionReport": self._execution_report_handler, # https://binance-docs.github.io/apidocs/spot/en/#public-api-definitions
+                    "listenKeyExpired": self._listen_key_expired_handler,
                     "depthUpdate": self._depth_handler,
                     "bookTicker": self._spot_book_ticker_handler,
                 },
@@ -60,9 +165,22 @@ class BinanceWSMessageHandler:
                     "STRATEGY_UPDATE": self._um_strategy_update_handler,
                     "GRID_UPDATE": self._um_grid_update_handler,
                     "CONDITIONAL_ORDER_TRIGGER_REJECT": self._um_conditional_order_trigger_reject_handler,
+                    "listenKeyExpired": self._listen_key_expired_handler,
                 },
             },
         }
+        self.batch_handler_tree = {
+            # Array stream type (e.g. "markPrice" in "!markPrice@arr") -> handler of a whole frame
+            "spot": {
+                "ticker": self._ticker_batch_handler,
+                "miniTicker": self._miniticker_batch_handler,
+            },
+            "um": {
+                "markPrice": self._mark_price_batch_handler,
+                "ticker": self._ticker_batch_handler,
+                "miniTicker": self._miniticker_batch_handler,
+            },
+        }
 
 
     um_ACCOUNT_UPDATE_HANDLER_TREE = {}
@@ -82,33 +200,37 @@ class BinanceWSMessageHandler:
 
         See more here: https://binance-docs.github.io/apidocs/futures/en/#aggregate-trade-streams
         """
-        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
-        # price = message["p"]
-        # quantity = message["q"]
-        # trade_time = message["T"]
+        agg_trade = AggTrade.from_message(message)
         update_market_data(
             exchange="binance",
-            symbol=symbol,
+            symbol=agg_trade.symbol,
             market_type=market,
             event_type="aggTrade",
-            data=message,
+            data=agg_trade,
         )
+        if self.gap_detector is not None:
+            self.gap_detector.on_agg_trade(market, agg_trade)
+        if self.kline_aggregator is not None:
+            self.kline_aggregator.on_agg_trade(market, agg_trade)
+        if self.trade_flow is not None:
+            self.trade_flow.on_agg_trade(market, agg_trade)
 
     def _trade_handler(self, message, **kwargs):
         """
         Trade streams push raw trade information; each trade has a unique buyer and seller.
         """
-        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
-        update_market_data("binance", symbol, "spot", "trade", message)
+        trade = Trade.from_message(message)
+        update_market_data("binance", trade.symbol, "spot", "trade", trade)
     
     def _kline_handler(self, message, market: str, **kwargs):
         """
         Kline/candlestick Stream push updates to the current klines/candlestick every second.
         
         """
-        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
-        interval = message["k"]["i"] # Interval (e.g. "1m")
-        update_market_data("binance", symbol, market, f"kline__{interval}", message)
+        kline = Kline.from_message(message)
+        update_market_data("binance", kline.symbol, market, f"kline__{kline.interval}", kline)
+        if self.kline_aggregator is not None and kline.is_closed:
+            self.kline_aggregator.on_kline(market, kline)
     
     def _ticker_handler(self, message, market: str, **kwargs):
         """
@@ -116,8 +238,19 @@ class BinanceWSMessageHandler:
         These are NOT the statistics of the UTC day, but a 24hr rolling window for the previous 24hrs.
         
         """
-        symbol = message["s"]
-        update_market_data("binance", symbol, market, "ticker", message)
+        ticker = Ticker.from_message(message)
+        get_ticker_store("binance", market, "ticker").update_from_message(message)
+        update_market_data("binance", ticker.symbol, market, "ticker", ticker)
+
+    def _ticker_batch_handler(self, messages: list, market: str, **kwargs):
+        """
+        !ticker@arr frame: every changed symbol's ticker, applied to the ticker store at once.
+        """
+        if not messages:
+            return
+        store = get_ticker_store("binance", market, "ticker")
+        store.update_from_messages(messages)
+        market_data_subscriptions.publish("binance", None, market, "tickerBatch", store)
 
     def _window_ticker_handler(self, message, **kwargs):
         raise NotImplementedError
@@ -127,8 +260,19 @@ class BinanceWSMessageHandler:
         24hr rolling window mini-ticker statistics. These are NOT the statistics of the UTC day.
         but a 24hr rolling window for the previous 24hrs.
         """
-        symbol = message["s"]
-        update_market_data("binance", symbol, market, "miniTicker", message)
+        mini_ticker = MiniTicker.from_message(message)
+        get_ticker_store("binance", market, "miniTicker").update_from_message(message)
+        update_market_data("binance", mini_ticker.symbol, market, "miniTicker", mini_ticker)
+
+    def _miniticker_batch_handler(self, messages: list, market: str, **kwargs):
+        """
+        !miniTicker@arr frame, applied to the mini-ticker store at once.
+        """
+        if not messages:
+            return
+        store = get_ticker_store("binance", market, "miniTicker")
+        store.update_from_messages(messages)
+        market_data_subscriptions.publish("binance", None, market, "miniTickerBatch", store)
 
     def _spot_book_ticker_handler(self, message, **kwargs):
         """
@@ -143,23 +287,55 @@ class BinanceWSMessageHandler:
             "A":"40.66000000"  // best ask qty
         }
         """
-        symbol = message["s"]
-        update_market_data("binance", symbol, "spot", "bookTicker", message)
+        update_book_ticker("binance", "spot", message)
 
     def _depth_handler(self, message, market: str, **kwargs):
-        update_market_data("binance", message["s"], market, "depth", message)
+        """
+        Diff. depth stream (<symbol>@depth).
+        Events are applied to the local order book of the symbol (see `self.order_books`),
+        subscribers of the "orderBook" event type get the `LocalOrderBook`.
+        """
+        book = self.order_books.on_depth_update(market, DepthUpdate.from_message(message))
+        if book.is_synced:
+            market_data_subscriptions.publish("binance", book.symbol, market, "orderBook", book)
 
-    def _outbound_account_info_handler(self, message):
-        raise NotImplementedError
+    def _partial_depth_handler(self, message, market: str, symbol: str, **kwargs):
+        """
+        Partial book depth stream (<symbol>@depth<levels>), stored as is.
+        The spot payload has no "s" field, the symbol is bound from the stream name.
+        """
+        update_market_data("binance", symbol, market, "depth", message)
 
-    def _balance_update_handler(self, message):
-        raise NotImplementedError
+    def _outbound_account_info_handler(self, message, **kwargs):
+        """
+        Spot account update (user data stream): balances of the assets that changed.
+
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#payload-account-update
+        """
+        self.account.on_outbound_account_position(message)
+
+    def _balance_update_handler(self, message, **kwargs):
+        """
+        Spot deposit / withdrawal / transfer (user data stream).
+
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#payload-balance-update
+        """
+        self.account.on_balance_update(message)
 
-    def _execution_report_handler(self, message):
+    def _listen_key_expired_handler(self, message, market: str, **kwargs):
         """
+        The user data stream's listenKey expired: published so that a new one is created
+        (see `ListenKeyKeepalive`).
+        """
+        market_data_subscriptions.publish("binance", None, market, "listenKeyExpired", message)
+
+    def _execution_report_handler(self, message, **kwargs):
+        """
+        Spot order update (user data stream).
+
         See more here: https://binance-docs.github.io/apidocs/spot/en/#public-api-definitions
         """
-        raise NotImplementedError
+        self.orders.on_execution_report(message)
 
 
     """UM Futures Websocket Handlers"""
@@ -169,14 +345,38 @@ class BinanceWSMessageHandler:
         """
         Mark price and funding rate for a single symbol pushed every 3 or 1 seconds.
         """
-        symbol = message["s"] # Symbol (e.g. "BTCUSDT")
-        mark_price = message["p"] # Mark price
-        funding_rate = message["r"] # Funding rate
-        next_funding_time = message["T"] # Next funding time
-        update_market_data("binance", symbol, "um", "markPriceUpdate", message)
-        update_market_data("binance", symbol, "um", "markPrice", mark_price)
-        update_market_data("binance", symbol, "um", "fundingRate", funding_rate)
-        update_market_data("binance", symbol, "um", "nextFundingTime", next_funding_time)
+        mark_price_update = MarkPriceUpdate.from_message(message)
+        symbol = mark_price_update.symbol
+        update_market_data("binance", symbol, "um", "markPriceUpdate", mark_price_update)
+        update_market_data("binance", symbol, "um", "markPrice", mark_price_update.mark_price)
+        update_market_data("binance", symbol, "um", "fundingRate", mark_price_update.funding_rate)
+        update_market_data("binance", symbol, "um", "nextFundingTime", mark_price_update.next_funding_time)
+        update_mark_price("binance", "um", mark_price_update)
+
+    def _mark_price_batch_handler(self, messages: list, market: str = "um", **kwargs):
+        """
+        !markPrice@arr frame: mark price and funding rate of all symbols,
+        applied to the mark price store at once. The per-symbol `market_data` entries of
+        `_mark_price_update_handler` are written from the parsed columns, without per-symbol notifications.
+        """
+        if not messages:
+            return
+        store = get_mark_price_store("binance", market)
+        rows = store.update_from_messages(messages)
+        symbols = [message["s"] for message in messages]
+        mark_price = store.markPrice[rows].tolist()
+        funding_rate = store.fundingRate[rows].tolist()
+        next_funding_time = store.nextFundingTime[rows].tolist()
+        events = list(map(MarkPriceUpdate, store.eventTime[rows].tolist(), symbols, mark_price,
+                          store.indexPrice[rows].tolist(), store.estimatedSettlePrice[rows].tolist(),
+                          funding_rate, next_funding_time))
+        update_market_data_batch("binance", market, symbols, {
+            "markPriceUpdate": events,
+            "markPrice": mark_price,
+            "fundingRate": funding_rate,
+            "nextFundingTime": next_funding_time,
+        })
+        market_data_subscriptions.publish("binance", None, market, "markPriceBatch", store)
 
     def _continuous_kline_handler(self, message):
         raise NotImplementedError
@@ -196,8 +396,13 @@ class BinanceWSMessageHandler:
     def _contract_info_handler(self, message):
         raise NotImplementedError
 
-    def _um_depth_handler(self, message):
-        raise NotImplementedError
+    def _um_depth_handler(self, message, market: str = "um", **kwargs):
+        """
+        Diff. depth stream (<symbol>@depth).
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#diff-book-depth-streams
+        """
+        self._depth_handler(message, market=market)
 
 
     def _um_book_ticker_handler(self, message, **kwargs):
@@ -218,29 +423,51 @@ class BinanceWSMessageHandler:
 
         e.g.: Binance__um__BNBUSDT__book_ticker
         """
-        symbol = message["s"]
-        update_market_data("binance", symbol, "um", "bookTicker", message)
+        update_book_ticker("binance", "um", message)
 
-    def _um_margin_call_handler(self, message):
-        raise NotImplementedError
+    def _um_margin_call_handler(self, message, **kwargs):
+        """
+        UM futures margin call (user data stream).
 
-    def _um_account_update_handler(self, message):
-        raise NotImplementedError
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-margin-call
+        """
+        self.account.on_margin_call(message)
 
-    def _um_order_trade_update_handler(self, message):
-        raise NotImplementedError
+    def _um_account_update_handler(self, message, **kwargs):
+        """
+        UM futures balance and position update (user data stream).
 
-    def _um_account_config_update_handler(self, message):
-        raise NotImplementedError
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-balance-and-position-update
+        """
+        self.account.on_account_update(message)
 
-    def _um_strategy_update_handler(self, message):
-        raise NotImplementedError
+    def _um_order_trade_update_handler(self, message, **kwargs):
+        """
+        UM futures order update (user data stream).
 
-    def _um_grid_update_handler(self, message):
-        raise NotImplementedError
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-order-update
+        """
+        self.orders.on_order_trade_update(message)
 
-    def _um_conditional_order_trigger_reject_handler(self, message, **kwargs):
-        raise NotImplementedError
+    def _um_account_config_update_handler(self, message, **kwargs):
+        """
+        UM futures leverage / Multi-Assets mode change (user data stream).
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-account-configuration-update-previous-leverage-update
+        """
+        self.account.on_account_config_update(message)
+
+    def _um_user_event_handler(self, message, **kwargs):
+        """
+        User data stream events without account state (STRATEGY_UPDATE, GRID_UPDATE,
+        CONDITIONAL_ORDER_TRIGGER_REJECT): published as is, under their event type.
+        They must not raise, since they share the connection of the order and account events.
+        """
+        market_data_subscriptions.publish("binance", None, "um", message["e"], message)
+
+    _um_strategy_update_handler = _um_user_event_handler
+    _um_grid_update_handler = _um_user_event_handler
+    _um_conditional_order_trigger_reject_handler = _um_user_event_handler
 
     def _unknown_event_type_handler(self, message, market: str, stream_name: str, **kwargs):
         
@@ -249,59 +476,125 @@ class BinanceWSMessageHandler:
                           Stream name: {stream_name}\n \
                           Additional kwargs: {kwargs}")
 
-    def _handle_single_data_point(self, data_point: dict, market: str, stream_name: str):
+    def _resolve_stream_handler(self, market: str, stream_name: str):
         """
-        Handle a single data point.
+        Find the handler of every payload of a stream from its name.
+
+        Returns:
+            callable: The handler, or None if the payloads have to be dispatched on "e".
+        """
+        partial_depth = _PARTIAL_DEPTH_STREAM_PATTERN.match(stream_name)
+        if partial_depth:
+            # Partial book depth payloads are snapshots, not diffs (even though
+            # UM ones have the "depthUpdate" event type)
+            return partial(self._partial_depth_handler, symbol=partial_depth.group(1).upper())
+
+        event_type = STREAM_TYPE_EVENT_TYPES.get(get_stream_type(stream_name))
+        return self.handler_tree[market]["e"].get(event_type)
+
+    def _resolve_batch_handler(self, market: str, stream_name: str):
+        """
+        Find the handler of whole frames of an array stream (e.g. "!markPrice@arr@1s").
+
+        Returns:
+            callable: The handler, or None if the payloads have to be handled one by one.
+        """
+        match = _ARRAY_STREAM_PATTERN.match(stream_name)
+        if match is None:
+            return None
+        return self.batch_handler_tree[market].get(match.group(1))
+
+    def register_streams(self, market: str, streams: list) -> None:
+        """
+        Precompute the handlers of the given streams.
+        Called once per subscription, so that no stream name has to be parsed per message.
+        """
+        stream_handlers = self._stream_handlers[market]
+        batch_handlers = self._batch_handlers[market]
+        for stream_name in streams:
+            stream_handlers[stream_name] = self._resolve_stream_handler(market, stream_name)
+            batch_handlers[stream_name] = self._resolve_batch_handler(market, stream_name)
+
+    def _get_stream_handler(self, market: str, stream_name: str):
+        try:
+            return self._stream_handlers[market][stream_name]
+        except KeyError:
+            # Stream that was not registered (e.g. subscribed directly through the websocket client)
+            handler = self._resolve_stream_handler(market, stream_name)
+            self._stream_handlers[market][stream_name] = handler
+            return handler
+
+    def _handle_event(self, data_point: dict, market: str, stream_name: str):
+        """
+        Handle a single data point by its event type ("e").
         """
         event_type = data_point.get("e")
+        handler = self.handler_tree[market]["e"].get(event_type)
 
-        if event_type:
-            handler = self.handler_tree[market]["e"].get(event_type)
-            if handler:
-                handler(data_point, market=market)
-            else:
-                self._unknown_event_type_handler(data_point, market, stream_name,
-                                            user_message="Can't find handler for event type")
+        if handler:
+            handler(data_point, market=market)
+        elif event_type:
+            self._unknown_event_type_handler(data_point, market, stream_name,
+                                        user_message="Can't find handler for event type")
         else:
-            if "depth" in stream_name:
-                event_type = "depthUpdate"
-            elif "bookTicker" in stream_name:
-                event_type = "bookTicker"
-            else:
-                self._unknown_event_type_handler(data_point, market, stream_name)
-            
-            handler = self.handler_tree[market]["e"].get(event_type)
+            self._unknown_event_type_handler(data_point, market, stream_name)
 
-            if handler:
-                handler(data_point, market=market)
-            else:
-                self._unknown_event_type_handler(data_point, market, stream_name, 
-                                            user_message="Can't find handler for event type")
+    def _handle_single_data_point(self, data_point: dict, market: str, stream_name: str):
+        """
+        Handle a single data point.
+        """
+        handler = self._get_stream_handler(market, stream_name)
+        if handler is None:
+            self._handle_event(data_point, market, stream_name)
+        else:
+            handler(data_point, market=market)
 
 
     def _handle_multiple_data_points(self, data_points: list, market: str, stream_name: str):
         """
-        Handle multiple data points.
+        Handle multiple data points: array streams with a batch handler are handled
+        in one call per frame, others payload by payload.
         """
-        for data_point in data_points:
-            self._handle_single_data_point(data_point, market, stream_name)
+        try:
+            batch_handler = self._batch_handlers[market][stream_name]
+        except KeyError:
+            batch_handler = self._resolve_batch_handler(market, stream_name)
+            self._batch_handlers[market][stream_name] = batch_handler
+        if batch_handler is not None:
+            batch_handler(data_points, market=market)
+            return
+
+        handler = self._get_stream_handler(market, stream_name)
+        if handler is None:
+            for data_point in data_points:
+                self._handle_event(data_point, market, stream_name)
+        else:
+            for data_point in data_points:
+                handler(data_point, market=market)
 
 
     def _handle_error(self, error):
         """
-        Handle an error.
+        Handle an error frame. Runs on the websocket thread: never blocks,
+        dead connections are replaced by the `ConnectionSupervisor`.
         """
         error_code = error.get("code")
         error_message = error.get("msg")
 
-        
+        self.errors += 1
         print(f"Error code {error_code}: {error_message}, {error}")
-        time.sleep(1)
-        #raise Exception(f"Error code {error_code}: {error_message}, {error}")
 
 
-    def _handle_full_message(self, message, market: str):
-        message = json.loads(message)
+    def _handle_full_message(self, message, market: str, receive_ns: int = None):
+        """
+        Args:
+            receive_ns (int): Receive time (`time.time_ns()`) of the frame, when latencies are recorded.
+        """
+        if receive_ns is not None:
+            decode_start_ns = time.time_ns()
+        message = self._decode(message)
+        if receive_ns is not None:
+            decoded_ns = time.time_ns()
         if "data" in message and "stream" in message:
             data = message["data"]
             stream_name = message["stream"]
@@ -312,7 +605,15 @@ class BinanceWSMessageHandler:
             else:
                 # Single data point
                 self._handle_single_data_point(data, market, stream_name)
+
+            if receive_ns is not None:
+                self.latency_monitor.observe(market, stream_name, data, receive_ns, decode_start_ns, decoded_ns,
+                                             time.time_ns())
         
+        elif "result" in message and "id" in message:
+            # Response to a SUBSCRIBE / UNSUBSCRIBE / LIST_SUBSCRIPTIONS request
+            pass
+
         else:
             # Error
             self._handle_error(message)
@@ -321,17 +622,33 @@ class BinanceWSMessageHandler:
             self.callback(message)
 
 
+    def _get_message_handler(self, market: str) -> callable:
+        """
+        Websocket client callback of a market, with the recorder / latency monitor
+        calls only when they are set.
+        """
+        handle = self._handle_full_message
+        recorder = self.recorder
+        if self.latency_monitor is not None:
+            def on_message(_, message):
+                receive_ns = time.time_ns()
+                if recorder is not None:
+                    recorder.record(market, message, receive_ns)
+                handle(message, market, receive_ns)
+        elif recorder is not None:
+            def on_message(_, message):
+                recorder.record(market, message, time.time_ns())
+                handle(message, market)
+        else:
+            def on_message(_, message):
+                handle(message, market)
+        return on_message
+
     def get_on_um_message_handler(self) -> callable:
-        def on_um_message(_, message):
-            self._handle_full_message(message, "um")
-        return on_um_message
+        return self._get_message_handler("um")
 
-    
     def get_spot_message_handler(self) -> callable:
-        def on_spot_message(_, message):
-            self._handle_full_message(message, "spot")
-        return on_spot_message
-
+        return self._get_message_handler("spot")
 
 
 STREAM_DESCRIPTION = {
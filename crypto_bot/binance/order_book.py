@@ -0,0 +1,345 @@
+# crypto_bot/binance/order_book.py
+"""
+Local L2 order books maintained from the diff. depth streams (<symbol>@depth).
+
+See more here:
+- SPOT: https://binance-docs.github.io/apidocs/spot/en/#how-to-manage-a-local-order-book-correctly
+- FUTURES: https://binance-docs.github.io/apidocs/futures/en/#how-to-manage-a-local-order-book-correctly
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .events import DepthUpdate
+
+
+class PriceLadder:
+    """
+    One side of an order book, kept as sorted arrays of price levels.
+
+    Prices are stored as sort keys (price for bids, -price for asks) in ascending order,
+    so the best level of both sides is always the last element:
+    best level lookup is O(1), top-k is a slice, and updates close to the top of the book
+    (where most of them happen) shift only a few elements.
+    """
+    def __init__(self, is_bid: bool, capacity: int = 1024):
+        self.is_bid = is_bid
+        self._sign = 1.0 if is_bid else -1.0
+        self.keys = np.empty(capacity, dtype=np.float64)
+        self.quantities = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+    def _grow(self) -> None:
+        capacity = len(self.keys) * 2
+        keys = np.empty(capacity, dtype=np.float64)
+        quantities = np.empty(capacity, dtype=np.float64)
+        keys[:self.size] = self.keys[:self.size]
+        quantities[:self.size] = self.quantities[:self.size]
+        self.keys = keys
+        self.quantities = quantities
+
+    def set(self, price: float, quantity: float) -> None:
+        """
+        Set the quantity of a price level. A quantity of 0 removes the level.
+        """
+        key = self._sign * price
+        n = self.size
+        keys = self.keys
+        i = int(np.searchsorted(keys[:n], key))
+
+        if i < n and keys[i] == key:
+            if quantity == 0:
+                keys[i:n - 1] = keys[i + 1:n]
+                self.quantities[i:n - 1] = self.quantities[i + 1:n]
+                self.size = n - 1
+            else:
+                self.quantities[i] = quantity
+        elif quantity != 0:
+            if n == len(keys):
+                self._grow()
+                keys = self.keys
+            keys[i + 1:n + 1] = keys[i:n]
+            self.quantities[i + 1:n + 1] = self.quantities[i:n]
+            keys[i] = key
+            self.quantities[i] = quantity
+            self.size = n + 1
+
+    def update(self, levels: list) -> None:
+        """
+        Args:
+            levels (list): [(price, quantity), ...]
+        """
+        for price, quantity in levels:
+            self.set(price, quantity)
+
+    def clear(self) -> None:
+        self.size = 0
+
+    def best(self) -> tuple:
+        """
+        Returns:
+            tuple: (price, quantity) of the best level, or None if the side is empty.
+        """
+        n = self.size
+        if n == 0:
+            return None
+        return self._sign * float(self.keys[n - 1]), float(self.quantities[n - 1])
+
+    def top(self, k: int) -> tuple:
+        """
+        Best k levels, best first.
+
+        Returns:
+            tuple: (prices, quantities) as NumPy arrays.
+        """
+        n = self.size
+        start = max(n - k, 0)
+        return self._sign * self.keys[start:n][::-1], self.quantities[start:n][::-1].copy()
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class LocalOrderBook:
+    """
+    Order book of a single symbol, built from a REST snapshot plus the diff. depth events.
+
+    Diff events received before the snapshot is available are buffered and replayed
+    on top of it. Sequence rules (U: first update ID, u: final update ID, pu: previous
+    final update ID) differ between the markets:
+
+        spot: drop events with u <= lastUpdateId,
+              first event: U <= lastUpdateId + 1 <= u, then U == previous u + 1
+        um:   drop events with u < lastUpdateId,
+              first event: U <= lastUpdateId <= u, then pu == previous u
+
+    Any violation means events were missed: the book is cleared and has to be rebuilt
+    from a new snapshot (`needs_snapshot` becomes True).
+    """
+    def __init__(self, symbol: str, market: str, max_buffered_events: int = 10000):
+        self.symbol = symbol
+        self.market = market
+
+        self.bids = PriceLadder(is_bid=True)
+        self.asks = PriceLadder(is_bid=False)
+
+        self.last_update_id = None
+        """Final update ID of the last applied event (or lastUpdateId of the snapshot)."""
+        self.is_synced = False
+        self.needs_snapshot = True
+        self.resync_count = 0
+
+        self._first_event_applied = False
+        self._buffer = deque(maxlen=max_buffered_events)
+        self._pending_snapshot = None
+        self._lock = threading.Lock()
+
+    def set_pending_snapshot(self, snapshot: dict) -> None:
+        """
+        Hand over a REST depth snapshot fetched on another thread.
+        It is applied on the thread that processes the diff events, with the next event.
+        """
+        with self._lock:
+            self._pending_snapshot = snapshot
+
+    def apply_snapshot(self, snapshot: dict) -> None:
+        """
+        Rebuild the book from a REST depth snapshot and replay the buffered events on top of it.
+
+        Args:
+            snapshot (dict): Response of `Spot.depth` / `UMFutures.depth`
+                ({"lastUpdateId": ..., "bids": [[price, qty], ...], "asks": [...]})
+        """
+        self.bids.clear()
+        self.asks.clear()
+        for price, quantity in snapshot["bids"]:
+            self.bids.set(float(price), float(quantity))
+        for price, quantity in snapshot["asks"]:
+            self.asks.set(float(price), float(quantity))
+
+        self.last_update_id = snapshot["lastUpdateId"]
+        self.is_synced = True
+        self.needs_snapshot = False
+        self._first_event_applied = False
+
+        buffered = list(self._buffer)
+        self._buffer.clear()
+        for event in buffered:
+            if not self._apply(event):
+                return
+
+    def on_depth_update(self, event: DepthUpdate) -> bool:
+        """
+        Handle a diff. depth event.
+
+        Returns:
+            bool: False if the book is not synced (waiting for, or in need of, a snapshot).
+        """
+        if self._pending_snapshot is not None:
+            with self._lock:
+                snapshot, self._pending_snapshot = self._pending_snapshot, None
+            self._buffer.append(event)
+            self.apply_snapshot(snapshot)
+            return self.is_synced
+
+        if not self.is_synced:
+            self._buffer.append(event)
+            return False
+
+        return self._apply(event)
+
+    def _apply(self, event: DepthUpdate) -> bool:
+        last_update_id = self.last_update_id
+        if self.market == "um":
+            if event.final_update_id < last_update_id:
+                return True
+            if self._first_event_applied:
+                in_sequence = event.previous_final_update_id == last_update_id
+            else:
+                in_sequence = event.first_update_id <= last_update_id <= event.final_update_id
+        else:
+            if event.final_update_id <= last_update_id:
+                return True
+            if self._first_event_applied:
+                in_sequence = event.first_update_id == last_update_id + 1
+            else:
+                in_sequence = event.first_update_id <= last_update_id + 1 <= event.final_update_id
+
+        if not in_sequence:
+            self._reset(event)
+            return False
+
+        self.bids.update(event.bids)
+        self.asks.update(event.asks)
+        self.last_update_id = event.final_update_id
+        self._first_event_applied = True
+        return True
+
+    def _reset(self, event: DepthUpdate) -> None:
+        """
+        Sequence gap: drop the book and wait for a new snapshot, buffering from this event on.
+        """
+        self.bids.clear()
+        self.asks.clear()
+        self.is_synced = False
+        self.needs_snapshot = True
+        self.resync_count += 1
+        self._buffer.clear()
+        self._buffer.append(event)
+
+    def best_bid(self) -> tuple:
+        """(price, quantity) of the best bid, or None."""
+        return self.bids.best()
+
+    def best_ask(self) -> tuple:
+        """(price, quantity) of the best ask, or None."""
+        return self.asks.best()
+
+    def top_bids(self, k: int) -> tuple:
+        """(prices, quantities) of the best k bids, best first."""
+        return self.bids.top(k)
+
+    def top_asks(self, k: int) -> tuple:
+        """(prices, quantities) of the best k asks, best first."""
+        return self.asks.top(k)
+
+
+class OrderBookManager:
+    """
+    Keeps a `LocalOrderBook` per market and symbol, and fetches the REST snapshots
+    (on background threads) whenever a book has to be (re)built.
+
+    At most one snapshot request per book is in flight. After a failed request, the next one
+    waits `retry_delay` seconds, doubled after each further failure up to `max_retry_delay`,
+    so persistent REST errors do not turn every depth event into a request.
+    """
+    def __init__(self,
+                 snapshot_fetchers: dict = None,
+                 snapshot_limit: int = 1000,
+                 on_gap: callable = None,
+                 retry_delay: float = 1.0,
+                 max_retry_delay: float = 60.0):
+        """
+        Args:
+            snapshot_fetchers (dict): market -> callable(symbol=..., limit=...) returning a depth snapshot.
+                e.g. {"spot": Spot().depth, "um": UMFutures().depth}
+            snapshot_limit (int): Number of levels of the snapshots.
+            on_gap (callable): Called with (market, symbol, last applied update ID, event) when a
+                synced book misses events (e.g. `GapDetector.on_book_gap`).
+            retry_delay (float): Delay (s) before retrying a failed snapshot request.
+            max_retry_delay (float): Maximum delay (s) between retries.
+        """
+        self.snapshot_fetchers = snapshot_fetchers or {}
+        self.snapshot_limit = snapshot_limit
+        self.on_gap = on_gap
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.books = {"spot": {}, "um": {}}
+        """market -> symbol -> LocalOrderBook"""
+        self.snapshot_failures = {}
+        """(market, symbol) -> consecutive failed snapshot requests"""
+        self._in_flight = set()
+        self._retry_at = {}
+        """(market, symbol) -> monotonic time before which no snapshot is requested"""
+        self._lock = threading.Lock()
+
+    def set_snapshot_fetcher(self, market: str, fetcher: callable) -> None:
+        self.snapshot_fetchers[market] = fetcher
+
+    def get(self, market: str, symbol: str) -> LocalOrderBook:
+        return self.books[market].get(symbol)
+
+    def on_depth_update(self, market: str, event: DepthUpdate) -> LocalOrderBook:
+        """
+        Apply a diff. depth event to its book, requesting a snapshot if needed.
+        """
+        book = self.books[market].get(event.symbol)
+        if book is None:
+            book = self.books[market][event.symbol] = LocalOrderBook(event.symbol, market)
+
+        if book.is_synced:
+            last_update_id = book.last_update_id
+            if not book.on_depth_update(event) and self.on_gap is not None:
+                self.on_gap(market, event.symbol, last_update_id, event)
+        else:
+            book.on_depth_update(event)
+        if book.needs_snapshot:
+            self._request_snapshot(book)
+        return book
+
+    def _request_snapshot(self, book: LocalOrderBook) -> None:
+        fetcher = self.snapshot_fetchers.get(book.market)
+        if fetcher is None:
+            return
+
+        key = (book.market, book.symbol)
+        with self._lock:
+            if key in self._in_flight:
+                return
+            retry_at = self._retry_at.get(key)
+            if retry_at is not None and time.monotonic() < retry_at:
+                return
+            self._in_flight.add(key)
+
+        def fetch():
+            try:
+                snapshot = fetcher(symbol=book.symbol, limit=self.snapshot_limit)
+            except Exception as e:
+                with self._lock:
+                    failures = self.snapshot_failures.get(key, 0) + 1
+                    self.snapshot_failures[key] = failures
+                    delay = min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay)
+                    self._retry_at[key] = time.monotonic() + delay
+                    self._in_flight.discard(key)
+                print(f"Failed to fetch {book.market} depth snapshot of {book.symbol} "
+                      f"(retry in {delay:.1f}s): {e}")
+                return
+            book.set_pending_snapshot(snapshot)
+            with self._lock:
+                self.snapshot_failures.pop(key, None)
+                self._retry_at.pop(key, None)
+                self._in_flight.discard(key)
+
+        threading.Thread(target=fetch, name=f"depth-snapshot-{book.symbol}", daemon=True).start()
@@ -0,0 +1,759 @@
+# crypto_bot/binance/order_gateway.py
+"""
+Order entry for spot and um futures, over REST or the websocket API.
+
+    gateway = OrderGateway(api_key, secret_key, orders=message_handler.orders, rest=binance_client.rest)
+    gateway.warm()
+    order = gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=0.001, price=25000, time_in_force="GTC")
+    order.status, order.order_id
+    gateway.ack_latency[("um", "rest")].percentile(99)
+
+The hot path does as little as possible per order:
+- The HMAC key is set up once; every signature copies the keyed state instead of re-keying.
+- The query string prefix of each (symbol, side, type, time in force) is built once and cached.
+- Requests go over a kept-alive (and periodically pinged) connection, or over a websocket API connection.
+
+With `symbol_filters` (e.g. `SymbolRegistry.filters`), prices and quantities are rounded to the tick /
+step size of the symbol in fixed-point and formatted at its precision (see `SymbolFilters`).
+
+Orders are tracked in an `OrderTable`, fed by the acks and by the executionReport /
+ORDER_TRADE_UPDATE events of the user data streams (see `BinanceWSMessageHandler.orders`).
+"""
+import asyncio
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode
+
+import numpy as np
+from binance.error import ClientError, ServerError
+
+from crypto_bot.utils import fixed_point
+from crypto_bot.utils.histogram import LatencyHistogram
+from .rest_scheduler import RestScheduler, PRIORITY_ORDER, request_weight
+
+
+REST_BASE_URLS = {"spot": "https://api.binance.com", "um": "https://fapi.binance.com"}
+WS_API_URLS = {"spot": "wss://ws-api.binance.com:443/ws-api/v3", "um": "wss://ws-fapi.binance.com/ws-fapi/v1"}
+
+ORDER_PATHS = {"spot": "/api/v3/order", "um": "/fapi/v1/order"}
+PING_PATHS = {"spot": "/api/v3/ping", "um": "/fapi/v1/ping"}
+
+FINAL_ORDER_STATUSES = {"FILLED", "CANCELED", "EXPIRED", "REJECTED", "EXPIRED_IN_MATCH", "CLOSED"}
+"""CLOSED: not open anymore according to a REST reconciliation, final status unknown (see `OrderTable.reconcile`)."""
+
+ORDER_STATUS_UNKNOWN = "UNKNOWN"
+"""
+The request was sent but its outcome is unknown (timeout, connection error or 5XX response):
+the order may or may not exist. It stays open until an ack, a user data stream event or
+a REST reconciliation (see `OrderTable.reconcile`) settles it.
+"""
+
+ORDER_STATUS_RANKS = {"PENDING_NEW": 0, ORDER_STATUS_UNKNOWN: 0, "NEW": 1, "PARTIALLY_FILLED": 2, **{status: 3 for status in FINAL_ORDER_STATUSES}}
+"""Acks never move an order back to an earlier status than the user data stream reported."""
+
+
+def format_number(value) -> str:
+    """Price / quantity -> shortest exact decimal string (no exponent), strings are kept as is."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    return np.format_float_positional(value, trim="-")
+
+
+def _to_fixed(value) -> int:
+    """Price / quantity (str, float or int) -> fixed-point value."""
+    return fixed_point.parse(value) if isinstance(value, str) else fixed_point.from_float(value)
+
+
+class RequestSigner:
+    """
+    HMAC SHA256 signatures with a key set up once.
+    """
+    def __init__(self, secret_key: str):
+        self._hmac = hmac.new(secret_key.encode(), digestmod=hashlib.sha256)
+
+    def sign(self, query: str) -> str:
+        signature = self._hmac.copy()
+        signature.update(query.encode())
+        return signature.hexdigest()
+
+
+class OrderState:
+    """
+    Last known state of an order.
+    """
+    __slots__ = ("market", "symbol", "client_order_id", "order_id", "side", "order_type", "price",
+                 "quantity", "time_in_force", "status", "filled_quantity", "filled_quote",
+                 "last_fill_price", "last_fill_quantity", "reject_reason", "update_time",
+                 "sent_time", "sent_ns", "ack_ns", "report_ns")
+
+    def __init__(self, market: str, symbol: str, client_order_id: str, side: str = None,
+                 order_type: str = None, price: float = 0.0, quantity: float = 0.0, time_in_force: str = None):
+        self.market = market
+        self.symbol = symbol
+        self.client_order_id = client_order_id
+        self.order_id = None
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.time_in_force = time_in_force
+        self.status = "PENDING_NEW"
+        self.filled_quantity = 0.0
+        self.filled_quote = 0.0
+        self.last_fill_price = 0.0
+        self.last_fill_quantity = 0.0
+        self.reject_reason = None
+        self.update_time = 0
+        """Exchange time of the last update (ms)."""
+        self.sent_time = 0
+        """Local time (ms) the request was sent at."""
+        self.sent_ns = 0
+        """perf_counter_ns() when the request was sent."""
+        self.ack_ns = 0
+        self.report_ns = 0
+        """perf_counter_ns() of the first user data stream event."""
+
+    @property
+    def is_open(self) -> bool:
+        return self.status not in FINAL_ORDER_STATUSES
+
+    @property
+    def average_price(self) -> float:
+        return self.filled_quote / self.filled_quantity if self.filled_quantity else 0.0
+
+    def __repr__(self):
+        return (f"OrderState({self.market} {self.symbol} {self.side} {self.order_type} {self.quantity}@{self.price} "
+                f"{self.status} filled={self.filled_quantity} client_order_id={self.client_order_id} order_id={self.order_id})")
+
+
+class OrderTable:
+    """
+    Orders indexed by client order id and by (market, exchange order id).
+
+    Closed orders are kept until more than `max_closed_orders` of them are.
+    """
+    def __init__(self, on_update: callable = None, max_closed_orders: int = 10_000):
+        """
+        Args:
+            on_update (callable): Called with the OrderState after every update.
+        """
+        self.on_update = on_update
+        self.max_closed_orders = max_closed_orders
+        self.orders = {}
+        """client order id -> OrderState"""
+        self.by_order_id = {}
+        """(market, order id) -> OrderState"""
+        self.open_by_symbol = {}
+        """(market, symbol) -> client order id -> OrderState, of the open orders only"""
+        self.report_latency = {"spot": LatencyHistogram(), "um": LatencyHistogram()}
+        """market -> send to first user data stream event latency (ns)"""
+        self._closed = deque()
+        self._lock = threading.Lock()
+
+    def add(self, order: OrderState) -> None:
+        with self._lock:
+            self.orders[order.client_order_id] = order
+            if order.order_id is not None:
+                self.by_order_id[(order.market, order.order_id)] = order
+            if order.is_open:
+                self.open_by_symbol.setdefault((order.market, order.symbol), {})[order.client_order_id] = order
+
+    def get(self, client_order_id: str) -> OrderState:
+        return self.orders.get(client_order_id)
+
+    def get_by_order_id(self, market: str, order_id: int) -> OrderState:
+        return self.by_order_id.get((market, order_id))
+
+    def open_orders(self, market: str = None, symbol: str = None) -> list:
+        if market is not None and symbol is not None:
+            return list(self.open_by_symbol.get((market, symbol), {}).values())
+        return [
+            order
+            for (order_market, order_symbol), orders in list(self.open_by_symbol.items())
+            if (market is None or order_market == market) and (symbol is None or order_symbol == symbol)
+            for order in list(orders.values())
+        ]
+
+    def _set_order_id(self, order: OrderState, order_id: int) -> None:
+        if order_id is not None and order.order_id is None:
+            order.order_id = order_id
+            self.by_order_id[(order.market, order_id)] = order
+
+    def _updated(self, order: OrderState, was_open: bool) -> None:
+        if was_open and not order.is_open:
+            open_orders = self.open_by_symbol.get((order.market, order.symbol))
+            if open_orders is not None:
+                open_orders.pop(order.client_order_id, None)
+                if not open_orders:
+                    del self.open_by_symbol[(order.market, order.symbol)]
+            self._closed.append(order)
+            while len(self._closed) > self.max_closed_orders:
+                closed = self._closed.popleft()
+                self.orders.pop(closed.client_order_id, None)
+                self.by_order_id.pop((closed.market, closed.order_id), None)
+        if self.on_update:
+            self.on_update(order)
+
+    def _find_or_add(self, market: str, symbol: str, client_order_id: str, order_id: int) -> OrderState:
+        order = self.by_order_id.get((market, order_id)) or self.orders.get(client_order_id)
+        if order is None:
+            # Order placed by another session (or before a restart)
+            order = OrderState(market, symbol, client_order_id)
+            self.orders[client_order_id] = order
+            self.open_by_symbol.setdefault((market, symbol), {})[client_order_id] = order
+        self._set_order_id(order, order_id)
+        return order
+
+    def on_ack(self, order: OrderState, response: dict) -> None:
+        """
+        Update an order with the response of a place / cancel request (REST or websocket API).
+        """
+        with self._lock:
+            was_open = order.is_open
+            self._set_order_id(order, response.get("orderId"))
+            status = response.get("status")
+            # The user data stream may already have reported a later state
+            if status and ORDER_STATUS_RANKS.get(status, 1) >= ORDER_STATUS_RANKS.get(order.status, 1):
+                order.status = status
+            executed = response.get("executedQty")
+            if executed is not None and float(executed) > order.filled_quantity:
+                order.filled_quantity = float(executed)
+                quote = response.get("cummulativeQuoteQty") or response.get("cumQuote")
+                if quote is not None:
+                    order.filled_quote = float(quote)
+            order.update_time = response.get("updateTime") or response.get("transactTime") or order.update_time
+            self._updated(order, was_open)
+
+    def on_reject(self, order: OrderState, reason: str) -> None:
+        with self._lock:
+            was_open = order.is_open
+            order.status = "REJECTED"
+            order.reject_reason = reason
+            self._updated(order, was_open)
+
+    def on_unknown(self, order: OrderState, reason: str) -> None:
+        """The place request failed without an answer of the exchange (see ORDER_STATUS_UNKNOWN)."""
+        with self._lock:
+            if order.status != "PENDING_NEW":
+                # Already settled by the user data stream
+                return
+            order.status = ORDER_STATUS_UNKNOWN
+            order.reject_reason = reason
+            self._updated(order, True)
+
+    def _on_report(self, market: str, symbol: str, client_order_id: str, order_id: int, side: str,
+                   order_type: str, price: str, quantity: str, time_in_force: str, status: str,
+                   filled_quantity: str, filled_quote: float, last_fill_price: str,
+                   last_fill_quantity: str, reject_reason: str, update_time: int) -> OrderState:
+        received_ns = time.perf_counter_ns()
+        with self._lock:
+            order = self._find_or_add(market, symbol, client_order_id, order_id)
+            was_open = order.is_open
+            if not order.report_ns:
+                order.report_ns = received_ns
+                if order.sent_ns:
+                    self.report_latency[market].record(received_ns - order.sent_ns)
+            if update_time < order.update_time:
+                # Late event: an ack or a later event already updated the order
+                return order
+            order.side = side
+            order.order_type = order_type
+            order.price = float(price)
+            order.quantity = float(quantity)
+            order.time_in_force = time_in_force
+            order.status = status
+            last_fill_quantity = float(last_fill_quantity)
+            if last_fill_quantity:
+                order.last_fill_quantity = last_fill_quantity
+                order.last_fill_price = float(last_fill_price)
+            order.filled_quantity = float(filled_quantity)
+            order.filled_quote = filled_quote
+            if reject_reason and reject_reason != "NONE":
+                order.reject_reason = reject_reason
+            order.update_time = update_time
+            self._updated(order, was_open)
+        return order
+
+    def reconcile(self, market: str, open_orders: list, snapshot_time: int) -> int:
+        """
+        Apply a REST snapshot of the open orders of a market (e.g. get_open_orders()).
+
+        Orders of the snapshot are added or updated unless a newer event updated them.
+        Local open orders missing from the snapshot, and not updated since `snapshot_time`,
+        were closed while no event was received: they are marked CLOSED. So are the
+        UNKNOWN orders sent before `snapshot_time` (never placed, or already closed).
+
+        Args:
+            open_orders (list): Open orders as returned by the REST API.
+            snapshot_time (int): Time (ms) the snapshot was requested at.
+        Returns:
+            int: Number of orders corrected.
+        """
+        corrections = 0
+        with self._lock:
+            seen = set()
+            for rest_order in open_orders:
+                order = self._find_or_add(market, rest_order["symbol"], rest_order["clientOrderId"], rest_order["orderId"])
+                seen.add(order.client_order_id)
+                update_time = rest_order.get("updateTime") or rest_order.get("time") or 0
+                if update_time < order.update_time:
+                    continue
+                filled_quantity = float(rest_order["executedQty"])
+                if order.status != rest_order["status"] or order.filled_quantity != filled_quantity:
+                    corrections += 1
+                was_open = order.is_open
+                order.side = rest_order["side"]
+                order.order_type = rest_order["type"]
+                order.price = float(rest_order["price"])
+                order.quantity = float(rest_order["origQty"])
+                order.time_in_force = rest_order.get("timeInForce")
+                order.status = rest_order["status"]
+                order.filled_quantity = filled_quantity
+                order.filled_quote = float(rest_order.get("cummulativeQuoteQty") or rest_order.get("cumQuote") or 0.0)
+                order.update_time = update_time
+                self._updated(order, was_open)
+
+            for order in [order for (order_market, _), orders in list(self.open_by_symbol.items())
+                          if order_market == market for order in list(orders.values())]:
+                if order.client_order_id in seen or order.update_time >= snapshot_time:
+                    continue
+                if order.order_id is None and not (order.status == ORDER_STATUS_UNKNOWN
+                                                   and order.sent_time < snapshot_time):
+                    continue
+                order.status = "CLOSED"
+                corrections += 1
+                self._updated(order, True)
+        return corrections
+
+    def on_execution_report(self, message: dict) -> OrderState:
+        """
+        Spot executionReport event.
+
+        See more here: https://binance-docs.github.io/apidocs/spot/en/#payload-order-update
+        """
+        # "C" is the id of the canceled order for cancels, "c" the id of the cancel request
+        client_order_id = message.get("C") or message["c"]
+        return self._on_report(
+            "spot", message["s"], client_order_id, message["i"], message["S"], message["o"],
+            message["p"], message["q"], message["f"], message["X"], message["z"], float(message["Z"]),
+            message["L"], message["l"], message.get("r"), message["T"],
+        )
+
+    def on_order_trade_update(self, message: dict) -> OrderState:
+        """
+        UM futures ORDER_TRADE_UPDATE event.
+
+        See more here: https://binance-docs.github.io/apidocs/futures/en/#event-order-update
+        """
+        order = message["o"]
+        return self._on_report(
+            "um", order["s"], order["c"], order["i"], order["S"], order["o"],
+            order["p"], order["q"], order["f"], order["X"], order["z"], float(order["ap"]) * float(order["z"]),
+            order["L"], order["l"], None, order["T"],
+        )
+
+
+class WebsocketApiConnection:
+    """
+    Connection to the websocket API of a market (runs on an asyncio event loop).
+    Responses are matched to their requests by id.
+
+    Requires the `websockets` package.
+    """
+    def __init__(self, url: str, api_key: str, signer: RequestSigner, request_timeout: float = 10.0):
+        self.url = url
+        self.api_key = api_key
+        self.signer = signer
+        self.request_timeout = request_timeout
+        self._websocket = None
+        self._reader = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    async def connect(self) -> None:
+        from .async_websocket_client import _connect
+        self._websocket = await _connect(self.url, max_size=None)
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+
+    async def _read(self) -> None:
+        try:
+            async for frame in self._websocket:
+                response = json.loads(frame)
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Websocket API connection {self.url} closed"))
+            self._pending.clear()
+
+    async def request(self, method: str, params: dict, signed: bool = True) -> dict:
+        """
+        Returns:
+            dict: The "result" of the response.
+        Raises:
+            ClientError: Error response.
+            TimeoutError: No response within `request_timeout`.
+        """
+        if signed:
+            params["apiKey"] = self.api_key
+            params["timestamp"] = int(time.time() * 1000)
+            params["signature"] = self.signer.sign(urlencode(sorted(params.items())))
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._websocket.send(json.dumps({"id": request_id, "method": method, "params": params}))
+            response = await asyncio.wait_for(future, self.request_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No response to {method} within {self.request_timeout}s") from None
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in response:
+            error = response["error"]
+            raise ClientError(response.get("status"), error.get("code"), error.get("msg"), None)
+        return response["result"]
+
+    async def close(self) -> None:
+        if self._websocket is not None:
+            await self._websocket.close()
+            self._websocket = None
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+
+class OrderGateway:
+    """
+    Places and cancels orders, tracks them in an `OrderTable` and measures send to ack latency.
+
+    Paths:
+        "rest": signed REST requests over a kept-alive connection.
+        "websocket": websocket API requests (see `start_websocket_api`).
+    """
+    def __init__(self,
+                 api_key: str,
+                 secret_key: str,
+                 orders: OrderTable = None,
+                 rest: RestScheduler = None,
+                 base_urls: dict = None,
+                 ws_api_urls: dict = None,
+                 recv_window: int = 5000,
+                 request_timeout: float = 10.0,
+                 client_order_id_prefix: str = "cb",
+                 symbol_filters: callable = None):
+        """
+        Args:
+            orders (OrderTable): Table of the orders, usually `BinanceWSMessageHandler.orders`
+                so that the user data stream events update it.
+            rest (RestScheduler): Shares its weight budget (orders have the highest priority)
+                and its connection pool.
+            base_urls (dict): market -> REST base url override (e.g. a `LocalMockExchange`).
+            ws_api_urls (dict): market -> websocket API url override.
+            recv_window (int): recvWindow of the signed requests (ms).
+            request_timeout (float): Timeout (s) of the order requests. An order whose request
+                times out (or fails with a 5XX) is marked UNKNOWN, see ORDER_STATUS_UNKNOWN.
+            symbol_filters (callable): (market, symbol) -> `SymbolFilters` or None. Prices are rounded to
+                the nearest tick, quantities down to the step size. Without filters (or for an unknown
+                symbol), numbers are sent as given (see `format_number`).
+        """
+        self.api_key = api_key
+        self.signer = RequestSigner(secret_key)
+        self.orders = orders if orders is not None else OrderTable()
+        self.rest = rest
+        self.base_urls = {**REST_BASE_URLS, **(base_urls or {})}
+        self.ws_api_urls = {**WS_API_URLS, **(ws_api_urls or {})}
+        self.recv_window = recv_window
+        self.request_timeout = request_timeout
+        self.client_order_id_prefix = client_order_id_prefix
+        self.symbol_filters = symbol_filters
+
+        import requests  # Imported with the gateway, not with the message handler (OrderTable)
+        self.session = requests.Session()
+        self.session.headers.update({"X-MBX-APIKEY": api_key})
+        if rest is not None:
+            self.session.mount("https://", rest.adapter)
+            self.session.mount("http://", rest.adapter)
+
+        self.ack_latency = {
+            (market, path): LatencyHistogram() for market in ("spot", "um") for path in ("rest", "websocket")
+        }
+        """(market, path) -> send to ack latency (ns)"""
+
+        self._order_urls = {market: self.base_urls[market] + path for market, path in ORDER_PATHS.items()}
+        self._templates = {}
+        self._client_order_ids = itertools.count(1)
+        self._client_order_id_base = f"{client_order_id_prefix}{int(time.time() * 1000) % 10**10}"
+        self._keepalive_thread = None
+        self._keepalive_stop = threading.Event()
+
+        self.ws_api = {}
+        """market -> WebsocketApiConnection"""
+        self.loop = None
+
+    """Connections"""
+
+    def warm(self) -> None:
+        """Open (or refresh) the kept-alive REST connection of each market."""
+        for market, path in PING_PATHS.items():
+            try:
+                self.session.get(self.base_urls[market] + path, timeout=5)
+            except OSError as e:  # requests.RequestException is an IOError
+                print(f"Order gateway: could not warm {market} connection: {e!r}")
+
+    def start_keepalive(self, interval: float = 30.0) -> None:
+        """Ping both markets every `interval` seconds, so the connections are never cold."""
+        def keepalive():
+            while not self._keepalive_stop.wait(interval):
+                self.warm()
+
+        self.warm()
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(target=keepalive, name="order-gateway-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self) -> None:
+        self._keepalive_stop.set()
+        if self._keepalive_thread is not None:
+            self._keepalive_thread.join()
+            self._keepalive_thread = None
+
+    async def start_websocket_api(self, markets: tuple = ("spot", "um")) -> None:
+        """Connect to the websocket API of the markets, on the running event loop."""
+        self.loop = asyncio.get_running_loop()
+        for market in markets:
+            connection = WebsocketApiConnection(self.ws_api_urls[market], self.api_key, self.signer,
+                                                self.request_timeout)
+            await connection.connect()
+            self.ws_api[market] = connection
+
+    async def stop_websocket_api(self) -> None:
+        for connection in self.ws_api.values():
+            await connection.close()
+        self.ws_api = {}
+
+    """Requests"""
+
+    def new_client_order_id(self) -> str:
+        return f"{self._client_order_id_base}_{next(self._client_order_ids)}"
+
+    def _template(self, symbol: str, side: str, order_type: str, time_in_force: str) -> str:
+        key = (symbol, side, order_type, time_in_force)
+        template = self._templates.get(key)
+        if template is None:
+            params = {"symbol": symbol, "side": side, "type": order_type}
+            if time_in_force:
+                params["timeInForce"] = time_in_force
+            template = self._templates[key] = urlencode(params) + "&"
+        return template
+
+    def _order_numbers(self, market: str, symbol: str, quantity, price) -> tuple:
+        """
+        Quantity and price (None if not given) of an order as parameter strings,
+        rounded and formatted with the `SymbolFilters` of the symbol when there are some.
+        """
+        filters = self.symbol_filters(market, symbol) if self.symbol_filters is not None else None
+        if filters is None:
+            return format_number(quantity), None if price is None else format_number(price)
+        quantity = filters.format_qty(filters.round_qty(_to_fixed(quantity)))
+        if price is not None:
+            price = filters.format_price(filters.round_price(_to_fixed(price)))
+        return quantity, price
+
+    def _order_params(self, order: OrderState, params: dict) -> dict:
+        order_params = {"symbol": order.symbol, "side": order.side, "type": order.order_type,
+                        "quantity": format_number(order.quantity), "newClientOrderId": order.client_order_id}
+        if order.time_in_force:
+            order_params["timeInForce"] = order.time_in_force
+        if order.price:
+            order_params["price"] = format_number(order.price)
+        order_params.update(params)
+        return order_params
+
+    def _signed_query(self, query: str) -> str:
+        query = f"{query}recvWindow={self.recv_window}&timestamp={int(time.time() * 1000)}"
+        return f"{query}&signature={self.signer.sign(query)}"
+
+    def _send_rest(self, market: str, method: str, query: str, weight: int) -> dict:
+        if self.rest is not None:
+            self.rest.limiters[market].acquire(weight, PRIORITY_ORDER)
+        response = self.session.request(method, f"{self._order_urls[market]}?{query}", timeout=self.request_timeout)
+        if response.status_code >= 500:
+            raise ServerError(response.status_code, response.text)
+        if response.status_code >= 400:
+            try:
+                error = response.json()
+            except ValueError:
+                error = {"msg": response.text}
+            raise ClientError(response.status_code, error.get("code"), error.get("msg"), response.headers)
+        return response.json()
+
+    def _new_order_state(self, market, symbol, side, order_type, quantity, price, time_in_force, client_order_id):
+        """The order of the request, quantity and price are the parameter strings (see `_order_numbers`)."""
+        order = OrderState(market, symbol, client_order_id or self.new_client_order_id(),
+                           side, order_type, float(price) if price else 0.0, float(quantity), time_in_force)
+        self.orders.add(order)
+        return order
+
+    def _acked(self, order: OrderState, path: str, response: dict) -> OrderState:
+        order.ack_ns = time.perf_counter_ns()
+        self.ack_latency[(order.market, path)].record(order.ack_ns - order.sent_ns)
+        self.orders.on_ack(order, response)
+        return order
+
+    def new_order(self,
+                  market: str,
+                  symbol: str,
+                  side: str,
+                  order_type: str,
+                  quantity,
+                  price=None,
+                  time_in_force: str = None,
+                  client_order_id: str = None,
+                  path: str = "rest",
+                  **params) -> OrderState:
+        """
+        Place an order and wait for the ack.
+
+        Args:
+            market (str): "spot" or "um"
+            side (str): "BUY" or "SELL"
+            order_type (str): "LIMIT", "MARKET", ...
+            quantity (float | str): Rounded down to the step size, with `symbol_filters`.
+            price (float | str): Limit price. Rounded to the nearest tick, with `symbol_filters`.
+            time_in_force (str): "GTC", "IOC", "FOK", "GTX"
+            client_order_id (str): Defaults to a unique id of this gateway.
+            path (str): "rest" or "websocket"
+            params: Other order parameters (e.g. reduceOnly="true").
+        Returns:
+            OrderState: The order, updated with the ack (and later by the user data stream).
+        Raises:
+            ClientError: Rejected order (the order is marked REJECTED).
+            ServerError, OSError, TimeoutError: Unknown outcome (the order is marked UNKNOWN).
+            RuntimeError: The websocket API is not started, or the call would block its event loop.
+        """
+        if path == "websocket":
+            self._check_websocket_api(market)
+        quantity, price = self._order_numbers(market, symbol, quantity, price)
+        order = self._new_order_state(market, symbol, side, order_type, quantity, price, time_in_force, client_order_id)
+        if path == "websocket":
+            return self._run_websocket(self.new_order_async(order=order, **params))
+
+        query = self._template(symbol, side, order_type, time_in_force)
+        query += f"quantity={quantity}&"
+        if price is not None:
+            query += f"price={price}&"
+        if params:
+            query += urlencode(params) + "&"
+        query += f"newClientOrderId={order.client_order_id}&"
+        query = self._signed_query(query)
+
+        order.sent_time = int(time.time() * 1000)
+        order.sent_ns = time.perf_counter_ns()
+        try:
+            response = self._send_rest(market, "POST", query, request_weight(market, "new_order", {}))
+        except ClientError as e:
+            self.orders.on_reject(order, e.error_message)
+            raise
+        except (ServerError, OSError) as e:  # requests.RequestException (and Timeout) is an IOError
+            self.orders.on_unknown(order, repr(e))
+            raise
+        return self._acked(order, "rest", response)
+
+    async def new_order_async(self,
+                              market: str = None,
+                              symbol: str = None,
+                              side: str = None,
+                              order_type: str = None,
+                              quantity=None,
+                              price=None,
+                              time_in_force: str = None,
+                              client_order_id: str = None,
+                              order: OrderState = None,
+                              **params) -> OrderState:
+        """
+        Place an order over the websocket API (on the loop of `start_websocket_api`).
+        Arguments are those of `new_order`.
+        """
+        connection = self.ws_api.get(market or order.market)
+        if connection is None:
+            raise RuntimeError(f"Websocket API of {market or order.market} not started: call start_websocket_api first.")
+        if order is None:
+            quantity, price = self._order_numbers(market, symbol, quantity, price)
+            order = self._new_order_state(market, symbol, side, order_type, quantity, price, time_in_force, client_order_id)
+        request_params = self._order_params(order, params)
+        request_params["recvWindow"] = self.recv_window
+        order.sent_time = int(time.time() * 1000)
+        order.sent_ns = time.perf_counter_ns()
+        try:
+            response = await connection.request("order.place", request_params)
+        except ClientError as e:
+            self.orders.on_reject(order, e.error_message)
+            raise
+        except OSError as e:  # TimeoutError, ConnectionError (closed connection)
+            self.orders.on_unknown(order, repr(e))
+            raise
+        return self._acked(order, "websocket", response)
+
+    def cancel_order(self, market: str, symbol: str, client_order_id: str = None, order_id: int = None,
+                     path: str = "rest") -> dict:
+        """
+        Cancel an order by client order id or exchange order id.
+
+        Returns:
+            dict: The exchange response.
+        """
+        params = {"symbol": symbol}
+        if order_id is not None:
+            params["orderId"] = order_id
+        else:
+            params["origClientOrderId"] = client_order_id
+
+        if path == "websocket":
+            self._check_websocket_api(market)
+            connection = self.ws_api[market]
+            params["recvWindow"] = self.recv_window
+            response = self._run_websocket(connection.request("order.cancel", params))
+        else:
+            response = self._send_rest(market, "DELETE", self._signed_query(urlencode(params) + "&"),
+                                       request_weight(market, "cancel_order", {}))
+
+        order = self.orders.get(response.get("origClientOrderId") or response.get("clientOrderId") or client_order_id) \
+            or self.orders.get_by_order_id(market, response.get("orderId"))
+        if order is not None:
+            self.orders.on_ack(order, response)
+        return response
+
+    def _check_websocket_api(self, market: str) -> None:
+        """Raise before anything is sent (or added to the table) if a blocking websocket API call cannot run."""
+        if self.loop is None or market not in self.ws_api:
+            raise RuntimeError(f"Websocket API of {market} not started: call start_websocket_api first.")
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            raise RuntimeError("Blocking call on the event loop: await new_order_async instead.")
+
+    def _run_websocket(self, coroutine):
+        """Run a websocket API request on the gateway's loop from another thread, and wait for it."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def latency_summary(self) -> dict:
+        """
+        Returns:
+            dict: {"ack": {(market, path): summary}, "report": {market: summary}} in ns, see `LatencyHistogram.summary`.
+        """
+        return {
+            "ack": {key: histogram.summary() for key, histogram in self.ack_latency.items() if histogram.count},
+            "report": {market: histogram.summary()
+                       for market, histogram in self.orders.report_latency.items() if histogram.count},
+        }
@@ -0,0 +1,229 @@
+# crypto_bot/binance/recorder.py
+"""
+Records raw websocket frames, with their receive timestamps, into append-only segment files.
+
+Segment file:
+    SEGMENT_MAGIC
+    block, block, ...
+
+Block:
+    BLOCK_HEADER (codec, stored size, raw size, record count, first / last receive time)
+    payload: records, compressed with the block's codec
+
+Record:
+    RECORD_HEADER (receive time in ns since the epoch, market id, frame size)
+    frame bytes
+
+Blocks are self-contained: a segment cut short by a crash is readable up to its last full block.
+"""
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+
+SEGMENT_MAGIC = b"CBTICK01"
+SEGMENT_SUFFIX = ".ticks"
+
+BLOCK_HEADER = struct.Struct("<BIIIqq")
+RECORD_HEADER = struct.Struct("<qBI")
+
+MARKET_IDS = {"spot": 0, "um": 1}
+MARKETS = {market_id: market for market, market_id in MARKET_IDS.items()}
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_LZ4 = 3
+CODEC_NAMES = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD, "lz4": CODEC_LZ4}
+
+
+def get_compressor(codec: str = None) -> tuple:
+    """
+    Args:
+        codec (str): "zstd", "lz4", "zlib" or "none". If None, the first installed of zstd, lz4, zlib.
+    Returns:
+        tuple: (codec id, compress function)
+    """
+    if codec in (None, "zstd"):
+        try:
+            import zstandard
+            compressor = zstandard.ZstdCompressor(level=3)
+            return CODEC_ZSTD, compressor.compress
+        except ImportError:
+            if codec is not None:
+                raise
+    if codec in (None, "lz4"):
+        try:
+            import lz4.block
+            return CODEC_LZ4, lambda data: lz4.block.compress(data, store_size=False)
+        except ImportError:
+            if codec is not None:
+                raise
+    if codec in (None, "zlib"):
+        return CODEC_ZLIB, lambda data: zlib.compress(data, 1)
+    if codec == "none":
+        return CODEC_NONE, bytes
+    raise ValueError(f"Unknown codec: {codec}. Available: {list(CODEC_NAMES)}")
+
+
+def decompress_block(codec: int, payload, raw_size: int):
+    """
+    Returns:
+        The raw records of a block (the payload itself, without copy, for CODEC_NONE).
+    """
+    if codec == CODEC_NONE:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_size)
+    if codec == CODEC_LZ4:
+        import lz4.block
+        return lz4.block.decompress(payload, uncompressed_size=raw_size)
+    raise ValueError(f"Unknown codec id: {codec}")
+
+
+class TickRecorder:
+    """
+    Writes frames to rotating segment files on a background thread.
+
+    `record` only timestamps the frame and puts it on an unbounded queue, so the websocket
+    threads never wait for compression or disk; frames are never dropped.
+
+        recorder = TickRecorder("data/ticks")
+        recorder.start()
+        message_handler = BinanceWSMessageHandler(recorder=recorder)
+    """
+    def __init__(self,
+                 directory: str,
+                 prefix: str = "binance",
+                 codec: str = None,
+                 block_size: int = 1 << 20,
+                 flush_interval: float = 1.0,
+                 segment_size: int = 1 << 30,
+                 segment_duration: float = 3600.0):
+        """
+        Args:
+            directory (str): Directory of the segment files.
+            prefix (str): Segment file name prefix.
+            codec (str): Block compression ("zstd", "lz4", "zlib", "none"), see `get_compressor`.
+            block_size (int): Raw bytes buffered before a block is compressed and written.
+            flush_interval (float): Seconds after which a partial block is written anyway.
+            segment_size (int): Bytes after which a new segment file is started.
+            segment_duration (float): Seconds after which a new segment file is started.
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.codec, self._compress = get_compressor(codec)
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.segment_size = segment_size
+        self.segment_duration = segment_duration
+
+        self.frames_recorded = 0
+        self.blocks_written = 0
+        self.bytes_written = 0
+        self.segments = []
+        """Paths of the segment files written so far."""
+
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._file = None
+        self._segment_started = 0.0
+        self._segment_bytes = 0
+
+    def record(self, market: str, frame, receive_time_ns: int = None) -> None:
+        """
+        Record a frame. Called on the websocket threads.
+
+        Args:
+            market (str): "spot" or "um"
+            frame (str | bytes): Raw websocket frame.
+            receive_time_ns (int): Receive time in ns since the epoch, defaults to now.
+        """
+        self._queue.put((receive_time_ns or time.time_ns(), market, frame))
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write every queued frame, then close the current segment."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        block = bytearray()
+        count = 0
+        first_time = last_time = 0
+        block_started = time.monotonic()
+
+        while True:
+            timeout = max(self.flush_interval - (time.monotonic() - block_started), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout) if count else self._queue.get()
+            except queue.Empty:
+                item = False
+
+            if item:
+                receive_time_ns, market, frame = item
+                if isinstance(frame, str):
+                    frame = frame.encode()
+                block += RECORD_HEADER.pack(receive_time_ns, MARKET_IDS[market], len(frame))
+                block += frame
+                if not count:
+                    first_time = receive_time_ns
+                    block_started = time.monotonic()
+                last_time = receive_time_ns
+                count += 1
+                self.frames_recorded += 1
+
+            stopping = item is None
+            if count and (stopping or len(block) >= self.block_size
+                          or time.monotonic() - block_started >= self.flush_interval):
+                self._write_block(bytes(block), count, first_time, last_time)
+                block.clear()
+                count = 0
+
+            if stopping:
+                self._close_segment()
+                return
+
+    def _write_block(self, raw: bytes, count: int, first_time: int, last_time: int) -> None:
+        if self._file is None or self._segment_bytes >= self.segment_size \
+                or time.monotonic() - self._segment_started >= self.segment_duration:
+            self._open_segment(first_time)
+
+        payload = self._compress(raw)
+        self._file.write(BLOCK_HEADER.pack(self.codec, len(payload), len(raw), count, first_time, last_time))
+        self._file.write(payload)
+        self._file.flush()
+
+        written = BLOCK_HEADER.size + len(payload)
+        self._segment_bytes += written
+        self.bytes_written += written
+        self.blocks_written += 1
+
+    def _open_segment(self, first_time: int) -> None:
+        self._close_segment()
+        started = datetime.fromtimestamp(first_time / 1e9, tz=timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.directory, f"{self.prefix}-{started}-{len(self.segments):06d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "ab")
+        self._file.write(SEGMENT_MAGIC)
+        self._segment_bytes = len(SEGMENT_MAGIC)
+        self._segment_started = time.monotonic()
+        self.segments.append(path)
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
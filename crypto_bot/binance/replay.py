@@ -0,0 +1,197 @@
+# crypto_bot/binance/replay.py
+"""
+Replays recorded sessions (see recorder.py) through a `BinanceWSMessageHandler`,
+exactly as the live websocket clients would call it.
+
+    handler = BinanceWSMessageHandler()
+    stats = ReplayEngine(handler, ["data/ticks"]).run()            # as fast as possible
+    stats = ReplayEngine(handler, ["data/ticks"], speed=1.0).run() # wall-clock speed
+
+    python -m crypto_bot.binance.replay data/ticks [--speed 1.0]
+"""
+import argparse
+import heapq
+import mmap
+import os
+import time
+
+from .message_handler import BinanceWSMessageHandler
+from .recorder import (
+    SEGMENT_MAGIC, SEGMENT_SUFFIX, BLOCK_HEADER, RECORD_HEADER, MARKETS, CODEC_NONE,
+    decompress_block,
+)
+
+
+class SegmentReader:
+    """
+    Memory-mapped reader of a segment file.
+
+    Frames are yielded as memoryviews of the mapped file (uncompressed blocks) or of the
+    decompressed block: no frame is copied.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def blocks(self, start_ns: int = None, end_ns: int = None):
+        """
+        Yields:
+            tuple: (codec, payload memoryview, raw size, record count, first time, last time)
+            of every complete block overlapping [start_ns, end_ns].
+        """
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size <= len(SEGMENT_MAGIC):
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # The mapping is not closed explicitly: frames yielded from it may still be referenced
+        # by the caller, it is unmapped once the last of them is released.
+        view = memoryview(mapped)
+        if view[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            raise ValueError(f"{self.path} is not a tick segment file")
+        offset = len(SEGMENT_MAGIC)
+        size = len(view)
+        while offset + BLOCK_HEADER.size <= size:
+            codec, stored_size, raw_size, count, first_time, last_time = \
+                BLOCK_HEADER.unpack_from(view, offset)
+            offset += BLOCK_HEADER.size
+            if offset + stored_size > size:
+                # Block cut short (recorder still writing, or crashed)
+                break
+            payload = view[offset:offset + stored_size]
+            offset += stored_size
+            if (start_ns is not None and last_time < start_ns) or \
+                    (end_ns is not None and first_time > end_ns):
+                continue
+            yield codec, payload, raw_size, count, first_time, last_time
+
+    def frames(self, start_ns: int = None, end_ns: int = None):
+        """
+        Yields:
+            tuple: (receive time ns, market, frame memoryview)
+        """
+        for codec, payload, raw_size, count, _, _ in self.blocks(start_ns, end_ns):
+            raw = decompress_block(codec, payload, raw_size)
+            records = raw if codec == CODEC_NONE else memoryview(raw)
+            position = 0
+            for _ in range(count):
+                receive_time, market_id, length = RECORD_HEADER.unpack_from(records, position)
+                position += RECORD_HEADER.size
+                if (start_ns is None or receive_time >= start_ns) and (end_ns is None or receive_time <= end_ns):
+                    yield receive_time, MARKETS[market_id], records[position:position + length]
+                position += length
+
+
+def find_segments(path: str) -> list:
+    """
+    Segment files of a recording directory, in recording order (or [path] for a file).
+    """
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path) if name.endswith(SEGMENT_SUFFIX)
+        )
+    return [path]
+
+
+def recording_frames(path: str, start_ns: int = None, end_ns: int = None):
+    """Frames of every segment of a recording, in order."""
+    for segment in find_segments(path):
+        yield from SegmentReader(segment).frames(start_ns, end_ns)
+
+
+class ReplayEngine:
+    """
+    Feeds recorded frames to a message handler in receive time order.
+    Several recordings (e.g. separate spot and um recorders) are merged by receive time.
+    """
+    def __init__(self,
+                 message_handler: BinanceWSMessageHandler,
+                 paths: list,
+                 speed: float = None,
+                 start_ns: int = None,
+                 end_ns: int = None):
+        """
+        Args:
+            message_handler (BinanceWSMessageHandler): The handler to drive.
+            paths (list): Recording directories and / or segment files.
+            speed (float): Replay speed relative to the recording (1.0: wall-clock speed).
+                None: as fast as possible.
+            start_ns (int): Skip frames received before (ns since the epoch).
+            end_ns (int): Stop after frames received after (ns since the epoch).
+        """
+        self.message_handler = message_handler
+        self.paths = paths
+        self.speed = speed
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+
+        self.frames_replayed = 0
+        self.bytes_replayed = 0
+
+    def frames(self):
+        """
+        Yields:
+            tuple: (receive time ns, market, frame memoryview), merged across recordings.
+        """
+        recordings = [recording_frames(path, self.start_ns, self.end_ns) for path in self.paths]
+        if len(recordings) == 1:
+            return recordings[0]
+        return heapq.merge(*recordings, key=lambda frame: frame[0])
+
+    def run(self) -> dict:
+        """
+        Replay every frame.
+
+        Returns:
+            dict: {"frames", "bytes", "elapsed", "frames_per_second", "recorded_duration"}
+        """
+        on_message = {
+            "spot": self.message_handler.get_spot_message_handler(),
+            "um": self.message_handler.get_on_um_message_handler(),
+        }
+        # The stdlib json decoder does not accept memoryviews
+        as_bytes = self.message_handler.json_decoder_backend == "json"
+        speed = self.speed
+
+        first_time = last_time = None
+        started = time.perf_counter()
+        frames = 0
+        size = 0
+        for receive_time, market, frame in self.frames():
+            if first_time is None:
+                first_time = receive_time
+            last_time = receive_time
+
+            if speed is not None:
+                delay = (receive_time - first_time) / 1e9 / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            size += len(frame)
+            on_message[market](None, bytes(frame) if as_bytes else frame)
+            frames += 1
+
+        elapsed = time.perf_counter() - started
+        self.frames_replayed += frames
+        self.bytes_replayed += size
+        return {
+            "frames": frames,
+            "bytes": size,
+            "elapsed": elapsed,
+            "frames_per_second": frames / elapsed if elapsed else 0.0,
+            "recorded_duration": (last_time - first_time) / 1e9 if frames else 0.0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Binance frames through BinanceWSMessageHandler.")
+    parser.add_argument("paths", nargs="+", help="Recording directories or segment files")
+    parser.add_argument("--speed", type=float, default=None, help="1.0 for wall-clock speed, default: as fast as possible")
+    args = parser.parse_args()
+
+    stats = ReplayEngine(BinanceWSMessageHandler(), args.paths, speed=args.speed).run()
+    print(f"{stats['frames']:,} frames ({stats['bytes'] / 1e6:,.1f} MB, {stats['recorded_duration']:,.1f}s recorded) "
+          f"replayed in {stats['elapsed']:,.2f}s: {stats['frames_per_second']:,.0f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
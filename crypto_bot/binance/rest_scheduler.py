@@ -0,0 +1,359 @@
+# crypto_bot/binance/rest_scheduler.py
+"""
+Shared REST layer of the Spot / UMFutures connector clients.
+
+    rest = RestScheduler()
+    spot_client = rest.wrap("spot", Spot(api_key, secret_key))
+    um_client = rest.wrap("um", UMFutures(api_key, secret_key))
+    spot_client.depth("BTCUSDT", limit=1000)    # scheduled, weighted and coalesced
+
+- Every client's session is served by one pooled keep-alive connection adapter.
+- Each market has a token bucket of request weight. It refills at the IP's weight limit
+  per minute, and is corrected by the X-MBX-USED-WEIGHT-1M headers of the responses and
+  paused by the Retry-After of 429 / 418 responses.
+- Requests wait for their weight by priority: orders go before everything else, and bulk
+  requests (history pulls) leave a reserve of weight to the others.
+- Identical read-only requests in flight at the same time are sent once and share the response.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+
+REQUEST_WEIGHT_PER_MINUTE = {"spot": 6000, "um": 2400}
+"""Request weight limits of the IPs (see exchange_info()["rateLimits"])."""
+
+PRIORITY_ORDER = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BULK = 2
+
+ORDER_METHODS = {
+    "new_order", "new_order_test", "cancel_order", "cancel_open_orders", "cancel_and_replace",
+    "new_oco_order", "cancel_oco_order", "new_batch_order", "cancel_batch_order", "modify_order",
+    "modify_batch_order", "countdown_cancel_order",
+}
+
+BULK_METHODS = {
+    "klines", "ui_klines", "continuous_klines", "index_price_klines", "mark_price_klines",
+    "agg_trades", "trades", "historical_trades", "funding_rate", "open_interest_hist",
+    "top_long_short_position_ratio", "long_short_account_ratio", "top_long_short_account_ratio",
+    "taker_long_short_ratio", "my_trades", "get_account_trades", "get_all_orders",
+}
+
+COALESCED_METHODS = {
+    "ping", "time", "exchange_info", "depth", "trades", "historical_trades", "agg_trades",
+    "klines", "ui_klines", "continuous_klines", "index_price_klines", "mark_price_klines",
+    "avg_price", "ticker_24hr", "ticker_24hr_price_change", "ticker_price", "book_ticker",
+    "rolling_window_ticker", "mark_price", "funding_rate", "funding_info", "open_interest",
+    "account", "balance", "get_position_risk", "get_open_orders", "get_orders",
+}
+"""Read-only (GET) methods: identical calls in flight at the same time are sent once."""
+
+
+def _depth_weight(market: str, limit: int) -> int:
+    if market == "spot":
+        for max_limit, weight in ((100, 5), (500, 25), (1000, 50)):
+            if limit <= max_limit:
+                return weight
+        return 250
+    for max_limit, weight in ((50, 2), (100, 5), (500, 10)):
+        if limit <= max_limit:
+            return weight
+    return 20
+
+
+def klines_request_weight(market: str, limit: int) -> int:
+    """
+    Request weight of a klines request (also of the um continuous / index / mark price klines).
+
+    See more here:
+    - SPOT: https://binance-docs.github.io/apidocs/spot/en/#kline-candlestick-data
+    - FUTURES: https://binance-docs.github.io/apidocs/futures/en/#kline-candlestick-data
+    """
+    if market == "spot":
+        return 2
+    for max_limit, weight in ((99, 1), (499, 2), (1000, 5)):
+        if limit <= max_limit:
+            return weight
+    return 10
+
+
+REQUEST_WEIGHTS = {
+    # market -> method -> weight, or callable(kwargs) -> weight
+    "spot": {
+        "depth": lambda kwargs: _depth_weight("spot", kwargs.get("limit", 100)),
+        "klines": lambda kwargs: klines_request_weight("spot", kwargs.get("limit", 500)),
+        "ui_klines": lambda kwargs: klines_request_weight("spot", kwargs.get("limit", 500)),
+        "exchange_info": 20,
+        "ticker_24hr": lambda kwargs: 2 if kwargs.get("symbol") else 80,
+        "ticker_price": lambda kwargs: 2 if kwargs.get("symbol") else 4,
+        "book_ticker": lambda kwargs: 2 if kwargs.get("symbol") else 4,
+        "historical_trades": 25,
+        "agg_trades": 4,
+        "account": 20,
+        "my_trades": 20,
+        "get_open_orders": lambda kwargs: 6 if kwargs.get("symbol") else 80,
+        "get_orders": 20,
+        "new_listen_key": 2,
+        "renew_listen_key": 2,
+        "close_listen_key": 2,
+    },
+    "um": {
+        "depth": lambda kwargs: _depth_weight("um", kwargs.get("limit", 500)),
+        "klines": lambda kwargs: klines_request_weight("um", kwargs.get("limit", 500)),
+        "continuous_klines": lambda kwargs: klines_request_weight("um", kwargs.get("limit", 500)),
+        "index_price_klines": lambda kwargs: klines_request_weight("um", kwargs.get("limit", 500)),
+        "mark_price_klines": lambda kwargs: klines_request_weight("um", kwargs.get("limit", 500)),
+        "ticker_24hr_price_change": lambda kwargs: 1 if kwargs.get("symbol") else 40,
+        "ticker_price": lambda kwargs: 1 if kwargs.get("symbol") else 2,
+        "book_ticker": lambda kwargs: 2 if kwargs.get("symbol") else 5,
+        "historical_trades": 20,
+        "agg_trades": 20,
+        "account": 5,
+        "balance": 5,
+        "get_position_risk": 5,
+        "get_open_orders": lambda kwargs: 1 if kwargs.get("symbol") else 40,
+        "get_orders": lambda kwargs: 1 if kwargs.get("symbol") else 40,
+        "get_all_orders": 5,
+        "get_account_trades": 5,
+        "new_order": 0,
+        "cancel_order": 1,
+        "cancel_open_orders": 1,
+        "new_batch_order": 5,
+    },
+}
+
+
+def request_weight(market: str, method: str, kwargs: dict) -> int:
+    """Request weight of a connector client method call (1 if unknown)."""
+    weight = REQUEST_WEIGHTS.get(market, {}).get(method, 1)
+    return weight(kwargs) if callable(weight) else weight
+
+
+def request_priority(method: str) -> int:
+    if method in ORDER_METHODS:
+        return PRIORITY_ORDER
+    if method in BULK_METHODS:
+        return PRIORITY_BULK
+    return PRIORITY_DEFAULT
+
+
+class WeightLimiter:
+    """
+    Token bucket of request weight, shared by the threads sending requests of one market.
+
+    Waiting requests are served in priority then arrival order: a request only takes
+    weight when it is the first in line, so a late order request overtakes queued history pulls.
+    """
+    def __init__(self, weight_per_minute: int, bulk_reserve: float = 0.2):
+        """
+        Args:
+            weight_per_minute (int): The IP's request weight limit.
+            bulk_reserve (float): Share of the weight bulk requests may not use.
+        """
+        self.capacity = weight_per_minute
+        self.rate = weight_per_minute / 60.0
+        self.bulk_reserve = bulk_reserve * weight_per_minute
+        self.tokens = float(weight_per_minute)
+        self.used_weight = 0
+        """Last X-MBX-USED-WEIGHT-1M reported by the exchange."""
+        self.paused_until = 0.0
+        self.waited = 0.0
+        """Total seconds spent waiting for weight."""
+
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, weight: int, priority: int = PRIORITY_DEFAULT) -> None:
+        """Wait until the request is first in line and its weight is available, then spend it."""
+        weight = min(weight, self.capacity)
+        reserve = self.bulk_reserve if priority >= PRIORITY_BULK else 0.0
+        entry = (priority, next(self._sequence))
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiting[0] != entry:
+                        self._condition.wait()
+                        continue
+                    missing = weight + reserve - self.tokens
+                    if now >= self.paused_until and missing <= 0:
+                        self.tokens -= weight
+                        return
+                    self._condition.wait(max(self.paused_until - now, missing / self.rate, 0.001))
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                self.waited += time.monotonic() - started
+
+    def observe(self, used_weight: int) -> None:
+        """Correct the bucket with the weight the exchange counted in the current minute."""
+        with self._condition:
+            self.used_weight = used_weight
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - used_weight)
+
+    def pause(self, seconds: float) -> None:
+        """Send nothing for a while (429 / 418 responses)."""
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+            self._condition.notify_all()
+
+
+class ScheduledRestClient:
+    """
+    Proxy of a connector client: method calls go through the `RestScheduler`,
+    other attributes are the client's.
+    """
+    def __init__(self, scheduler: "RestScheduler", market: str, client):
+        self._scheduler = scheduler
+        self._market = market
+        self.client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        def scheduled(*args, **kwargs):
+            return self._scheduler.call(self._market, name, attribute, *args, **kwargs)
+        scheduled.__name__ = name
+        return scheduled
+
+    def set_credentials(self, api_key: str = None, secret_key: str = None) -> None:
+        """Change the client's credentials in place (the session and its connections are kept)."""
+        self.client.api_key = api_key
+        self.client.api_secret = secret_key
+        if api_key:
+            self.client.session.headers["X-MBX-APIKEY"] = api_key
+        else:
+            self.client.session.headers.pop("X-MBX-APIKEY", None)
+
+
+class RestScheduler:
+    """
+    Weight budget, priorities and coalescing of the REST requests of every wrapped client.
+    """
+    def __init__(self,
+                 weight_limits: dict = None,
+                 bulk_reserve: float = 0.2,
+                 pool_connections: int = 4,
+                 pool_maxsize: int = 32):
+        """
+        Args:
+            weight_limits (dict): market -> request weight per minute, defaults to REQUEST_WEIGHT_PER_MINUTE.
+            bulk_reserve (float): Share of the weight bulk requests may not use, see `WeightLimiter`.
+            pool_connections (int): Hosts kept in the connection pool.
+            pool_maxsize (int): Keep-alive connections per host.
+        """
+        weight_limits = weight_limits or REQUEST_WEIGHT_PER_MINUTE
+        self.limiters = {
+            market: WeightLimiter(limit, bulk_reserve) for market, limit in weight_limits.items()
+        }
+        from requests.adapters import HTTPAdapter
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.requests_sent = 0
+        self.requests_coalesced = 0
+
+        self._hosts = {}
+        """host -> market"""
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, market: str, client) -> ScheduledRestClient:
+        """
+        Route a connector client (Spot / UMFutures) of the market through the scheduler.
+        """
+        self._hosts[urlparse(client.base_url).netloc] = market
+        session = client.session
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        session.hooks["response"].append(self._on_response)
+        return ScheduledRestClient(self, market, client)
+
+    def _on_response(self, response, *args, **kwargs):
+        limiter = self.limiters.get(self._hosts.get(urlparse(response.url).netloc))
+        if limiter is None:
+            return
+        used_weight = response.headers.get("X-MBX-USED-WEIGHT-1M") or response.headers.get("X-MBX-USED-WEIGHT")
+        if used_weight is not None:
+            limiter.observe(int(used_weight))
+        if response.status_code in (418, 429):
+            limiter.pause(float(response.headers.get("Retry-After", 60)))
+
+    def call(self, market: str, method: str, function, *args, weight: int = None, priority: int = None, **kwargs):
+        """
+        Call a connector client method once its weight is available.
+
+        Args:
+            weight (int): Overrides the weight of REQUEST_WEIGHTS.
+            priority (int): PRIORITY_ORDER, PRIORITY_DEFAULT or PRIORITY_BULK, defaults by method.
+        """
+        key = None
+        if method in COALESCED_METHODS:
+            key = (market, method, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+
+        if key is not None:
+            with self._lock:
+                future = self._in_flight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._in_flight[key] = Future()
+            if not owner:
+                self.requests_coalesced += 1
+                return future.result()
+
+        try:
+            limiter = self.limiters.get(market)
+            if limiter is not None:
+                limiter.acquire(
+                    request_weight(market, method, kwargs) if weight is None else weight,
+                    request_priority(method) if priority is None else priority,
+                )
+            self.requests_sent += 1
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            if key is not None:
+                future.set_exception(e)
+            raise
+        finally:
+            if key is not None:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+
+        if key is not None:
+            future.set_result(result)
+        return result
+
+    def usage(self) -> dict:
+        """
+        Returns:
+            dict: market -> {"used_weight", "tokens", "waiting", "waited"}
+        """
+        return {
+            market: {
+                "used_weight": limiter.used_weight,
+                "tokens": limiter.tokens,
+                "waiting": len(limiter._waiting),
+                "waited": limiter.waited,
+            }
+            for market, limiter in self.limiters.items()
+        }
@@ -0,0 +1,363 @@
+# crypto_bot/binance/shared_market_state.py
+"""
+Multi-process ingestion: websocket connections are decoded in worker processes, which
+write the top of book / mark price of every symbol into shared memory tables read by
+the main process.
+
+    ingestion = MultiProcessIngestion(
+        symbols={"um": ["BTCUSDT", "ETHUSDT", ...]},
+        streams={"um": ["!bookTicker", "!markPrice@arr"]},
+        processes_per_market=2,
+    )
+    ingestion.start()
+    ingestion.tables["um"]["bookTicker"].read("BTCUSDT")
+
+Tables are written with seqlock-style versioning: every row has a sequence number that
+is odd while the row is being written. Readers never lock, they read the row and retry
+if the sequence number was odd or changed in the meantime.
+A row must have a single writer: `split_streams` keeps the streams writing the same rows
+(e.g. "!bookTicker" and "btcusdt@bookTicker") on the same worker.
+"""
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .message_handler import BinanceWSMessageHandler, get_stream_type
+from .stream_manager import default_stream_weight
+
+
+BOOK_TICKER_COLUMNS = (
+    ("bid", np.float64),
+    ("bidQty", np.float64),
+    ("ask", np.float64),
+    ("askQty", np.float64),
+    ("updateId", np.int64),
+    ("eventTime", np.int64),
+    ("transactTime", np.int64),
+)
+
+MARK_PRICE_COLUMNS = (
+    ("markPrice", np.float64),
+    ("indexPrice", np.float64),
+    ("fundingRate", np.float64),
+    ("nextFundingTime", np.int64),
+    ("eventTime", np.int64),
+)
+
+
+class SharedSymbolTable:
+    """
+    Fixed set of symbols (rows) x columns, in a `multiprocessing.shared_memory` block.
+
+    Layout: one int64 sequence column followed by one contiguous array per column,
+    each `len(symbols)` long.
+    """
+    def __init__(self,
+                 symbols: list,
+                 columns: tuple,
+                 name: str = None,
+                 create: bool = True):
+        """
+        Args:
+            symbols (list): Row -> symbol. Must be the same list in every process.
+            columns (tuple): ((column name, NumPy dtype), ...), 8 bytes dtypes.
+            name (str): Shared memory block name, required to attach (create=False).
+            create (bool): Create the block (owner process) or attach to an existing one.
+        """
+        self.symbols = list(symbols)
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.columns = tuple(columns)
+        rows = max(len(self.symbols), 1)
+        size = 8 * rows * (len(self.columns) + 1)
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        self._owner = create
+
+        self.seq = np.ndarray((rows,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.arrays = {}
+        for i, (column, dtype) in enumerate(self.columns):
+            self.arrays[column] = np.ndarray((rows,), dtype=dtype, buffer=self.shm.buf, offset=8 * rows * (i + 1))
+        if create:
+            self.seq[:] = 0
+            for column, dtype in self.columns:
+                self.arrays[column][:] = np.nan if np.dtype(dtype).kind == "f" else 0
+
+        self._column_arrays = tuple(self.arrays[column] for column, _ in self.columns)
+
+    def spec(self) -> dict:
+        """Arguments to attach to the table from another process: SharedSymbolTable(**spec, create=False)."""
+        return {"symbols": self.symbols, "columns": self.columns, "name": self.name}
+
+    def write_row(self, row: int, values: tuple) -> None:
+        """
+        Write a row (single writer per row). values are in column order.
+        """
+        seq = self.seq
+        seq[row] += 1   # odd: write in progress
+        for array, value in zip(self._column_arrays, values):
+            array[row] = value
+        seq[row] += 1   # even: row consistent
+
+    def write(self, symbol: str, values: tuple) -> bool:
+        """
+        Returns:
+            bool: False if the symbol has no row in the table.
+        """
+        row = self.index.get(symbol)
+        if row is None:
+            return False
+        self.write_row(row, values)
+        return True
+
+    def read_row(self, row: int, max_retries: int = 1000) -> tuple:
+        """
+        Consistent copy of a row, without locking.
+
+        Returns:
+            tuple: (values in column order, sequence number)
+        """
+        seq = self.seq
+        for _ in range(max_retries):
+            before = int(seq[row])
+            if before & 1:
+                continue
+            values = tuple(array[row].item() for array in self._column_arrays)
+            if int(seq[row]) == before:
+                return values, before
+        raise TimeoutError(f"Row {row} of {self.name} kept changing while being read")
+
+    def read(self, symbol: str) -> dict:
+        """
+        Returns:
+            dict: column -> value, or None if the symbol has no row or was never written.
+        """
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        values, version = self.read_row(row)
+        if version == 0:
+            return None
+        return dict(zip((column for column, _ in self.columns), values))
+
+    def snapshot(self) -> dict:
+        """
+        Consistent copy of every row: columns are copied in one vectorized pass,
+        and only the rows written during the copy are read again.
+
+        Returns:
+            dict: {"symbol": np.ndarray, "seq": np.ndarray, column: np.ndarray, ...}
+        """
+        before = self.seq.copy()
+        arrays = {column: array.copy() for column, array in self.arrays.items()}
+        after = self.seq.copy()
+
+        for row in np.flatnonzero((before != after) | (before & 1).astype(bool)):
+            values, after[row] = self.read_row(row)
+            for (column, _), value in zip(self.columns, values):
+                arrays[column][row] = value
+
+        return {"symbol": np.array(self.symbols, dtype=object), "seq": after, **arrays}
+
+    def close(self) -> None:
+        self.seq = None
+        self.arrays = {}
+        self._column_arrays = ()
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class SharedMemoryMessageHandler(BinanceWSMessageHandler):
+    """
+    Message handler of the worker processes: bookTicker and markPriceUpdate events are
+    written to the shared tables instead of the (process local) market data.
+    """
+    def __init__(self, book_ticker_table: SharedSymbolTable = None, mark_price_table: SharedSymbolTable = None, **kwargs):
+        self.book_ticker_table = book_ticker_table
+        self.mark_price_table = mark_price_table
+        super().__init__(**kwargs)
+
+    def _write_book_ticker(self, message):
+        if self.book_ticker_table is None:
+            return
+        self.book_ticker_table.write(message["s"], (
+            float(message["b"]),
+            float(message["B"]),
+            float(message["a"]),
+            float(message["A"]),
+            message["u"],
+            message.get("E", 0),
+            message.get("T", 0),
+        ))
+
+    def _spot_book_ticker_handler(self, message, **kwargs):
+        self._write_book_ticker(message)
+
+    def _um_book_ticker_handler(self, message, **kwargs):
+        self._write_book_ticker(message)
+
+    def _mark_price_update_handler(self, message, **kwargs):
+        if self.mark_price_table is None:
+            return
+        self.mark_price_table.write(message["s"], (
+            float(message["p"]),
+            float(message["i"]),
+            float(message["r"]),
+            message["T"],
+            message["E"],
+        ))
+
+    def _mark_price_batch_handler(self, messages, **kwargs):
+        for message in messages:
+            self._mark_price_update_handler(message)
+
+
+def _ingestion_worker(market: str,
+                      streams: list,
+                      table_specs: dict,
+                      stream_url: str,
+                      stop_event) -> None:
+    """
+    Worker process: one websocket connection, decoded and written to the shared tables.
+    """
+    if market == "spot":
+        from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient as WebsocketClient
+    else:
+        from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient as WebsocketClient
+
+    tables = {
+        event_type: SharedSymbolTable(**spec, create=False)
+        for event_type, spec in table_specs.items()
+    }
+    handler = SharedMemoryMessageHandler(
+        book_ticker_table=tables.get("bookTicker"),
+        mark_price_table=tables.get("markPrice"),
+    )
+    on_message = handler.get_spot_message_handler() if market == "spot" else handler.get_on_um_message_handler()
+    handler.register_streams(market, streams)
+
+    client = WebsocketClient(
+        on_message=on_message,
+        is_combined=True,
+        **({"stream_url": stream_url} if stream_url else {}),
+    )
+    client.subscribe(stream=streams)
+    try:
+        while not stop_event.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.stop()
+        for table in tables.values():
+            table.close()
+
+
+SHARED_TABLE_STREAM_TYPES = ("bookTicker", "markPrice")
+"""Stream types written to the shared tables (the table is named after the stream type)."""
+
+
+def split_streams(streams: list, n: int) -> list:
+    """
+    Split streams in n groups of about the same estimated message rate.
+
+    Streams writing the same rows of a shared table go to the same group, so that every
+    row has a single writer: the streams of a symbol (e.g. "btcusdt@markPrice" and
+    "btcusdt@markPrice@1s"), and every stream of a table next to its all-market stream
+    (e.g. "!bookTicker" and "btcusdt@bookTicker").
+
+    Returns:
+        list: n lists of streams (some may be empty).
+    """
+    all_market_tables = {
+        get_stream_type(stream) for stream in streams
+        if stream.startswith("!") and get_stream_type(stream) in SHARED_TABLE_STREAM_TYPES
+    }
+    # (table, symbol or None for the whole table) or stream -> streams that must share a group
+    units = {}
+    for stream in streams:
+        table = get_stream_type(stream)
+        if table in all_market_tables:
+            key = (table, None)
+        elif table in SHARED_TABLE_STREAM_TYPES:
+            key = (table, stream.split("@", 1)[0].lower())
+        else:
+            key = stream
+        units.setdefault(key, []).append(stream)
+
+    groups = [[] for _ in range(n)]
+    loads = [0.0] * n
+    unit_weights = [(sum(map(default_stream_weight, unit)), unit) for unit in units.values()]
+    for weight, unit in sorted(unit_weights, key=lambda unit_weight: unit_weight[0], reverse=True):
+        i = loads.index(min(loads))
+        groups[i].extend(unit)
+        loads[i] += weight
+    return groups
+
+
+class MultiProcessIngestion:
+    """
+    Runs the websocket connections in worker processes writing into shared memory tables:
+        tables[market]["bookTicker"] (BOOK_TICKER_COLUMNS)
+        tables[market]["markPrice"]  (MARK_PRICE_COLUMNS, um only)
+    """
+    def __init__(self,
+                 symbols: dict,
+                 streams: dict,
+                 processes_per_market: int = 1,
+                 stream_urls: dict = None):
+        """
+        Args:
+            symbols (dict): market -> list of symbols (rows of the tables), e.g. from exchange_info.
+                Updates of other symbols are ignored.
+            streams (dict): market -> list of streams, split over the worker processes of the market.
+            processes_per_market (int): Worker processes (= websocket connections) per market.
+            stream_urls (dict): market -> websocket base url override.
+        """
+        self.symbols = symbols
+        self.streams = streams
+        self.processes_per_market = processes_per_market
+        self.stream_urls = stream_urls or {}
+
+        self.tables = {}
+        self.processes = []
+        self._stop_event = None
+
+    def start(self) -> None:
+        self._stop_event = multiprocessing.Event()
+        for market, market_streams in self.streams.items():
+            self.tables[market] = {
+                "bookTicker": SharedSymbolTable(self.symbols[market], BOOK_TICKER_COLUMNS),
+            }
+            if market == "um":
+                self.tables[market]["markPrice"] = SharedSymbolTable(self.symbols[market], MARK_PRICE_COLUMNS)
+            table_specs = {event_type: table.spec() for event_type, table in self.tables[market].items()}
+
+            for group in split_streams(market_streams, self.processes_per_market):
+                if not group:
+                    continue
+                process = multiprocessing.Process(
+                    target=_ingestion_worker,
+                    args=(market, group, table_specs, self.stream_urls.get(market), self._stop_event),
+                    name=f"binance-ingestion-{market}-{len(self.processes)}",
+                    daemon=True,
+                )
+                process.start()
+                self.processes.append(process)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        for market_tables in self.tables.values():
+            for table in market_tables.values():
+                table.close()
+        self.tables = {}
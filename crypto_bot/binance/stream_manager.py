@@ -0,0 +1,242 @@
+# crypto_bot/binance/stream_manager.py
+"""
+Spreads stream subscriptions over several websocket connections.
+
+A single connection can subscribe to a limited number of streams (1024 on spot, 200 on
+UM futures), and all the frames of a connection are received, in order, by a single
+socket: one hot connection delays every stream it carries.
+"""
+import threading
+
+from .message_handler import get_stream_type
+
+
+SPOT_MAX_STREAMS_PER_CONNECTION = 1024
+UM_MAX_STREAMS_PER_CONNECTION = 200
+
+STREAM_TYPE_WEIGHTS = {
+    # Stream type -> relative message rate, used to balance the connections' load.
+    "bookTicker": 20.0,
+    "depth": 10.0,
+    "aggTrade": 5.0,
+    "trade": 5.0,
+    "kline": 1.0,
+    "continuousKline": 4.0,
+    "markPrice": 1.0,
+    "miniTicker": 1.0,
+    "ticker": 1.0,
+    "forceOrder": 1.0,
+}
+
+ALL_MARKET_STREAM_WEIGHT_MULTIPLIER = 200.0
+"""All market streams ("!bookTicker", "!markPrice@arr", ...) carry every symbol."""
+
+
+def default_stream_weight(stream: str, symbol_weights: dict = None) -> float:
+    """
+    Estimated relative message rate of a stream.
+
+    Args:
+        stream (str): e.g. "btcusdt@bookTicker", "!markPrice@arr"
+        symbol_weights (dict): Multipliers of high-rate symbols, e.g. {"btcusdt": 10.0}
+    """
+    weight = STREAM_TYPE_WEIGHTS.get(get_stream_type(stream), 1.0)
+    if stream.startswith("!"):
+        return weight * ALL_MARKET_STREAM_WEIGHT_MULTIPLIER
+    if symbol_weights:
+        weight *= symbol_weights.get(stream.split("@", 1)[0].lower(), 1.0)
+    return weight
+
+
+class StreamConnection:
+    """
+    A websocket client and the streams it is subscribed to.
+    """
+    def __init__(self, client, index: int):
+        self.client = client
+        self.index = index
+        self.streams = {}
+        """stream -> weight"""
+        self.load = 0.0
+        self.reconnect_count = 0
+
+    def __len__(self) -> int:
+        return len(self.streams)
+
+
+class StreamManager:
+    """
+    Subscribes streams over N connections of a market.
+
+    Policies:
+        "least_loaded": Every stream goes to the connection with the lowest estimated
+            message rate that has room for it; heaviest streams are placed first, so
+            high-rate symbols end up spread evenly over the connections.
+        "fill": Streams fill the connections in order, opening as few as possible.
+
+    New connections are opened when every connection is full; streams can be added
+    and removed at any time, only the connections concerned receive a (UN)SUBSCRIBE.
+    A connection can be replaced with a new one carrying the same streams (`reconnect`).
+    After `stop`, subscribing opens new connections again.
+    """
+    def __init__(self,
+                 connection_factory: callable,
+                 max_streams_per_connection: int = UM_MAX_STREAMS_PER_CONNECTION,
+                 min_connections: int = 1,
+                 max_connections: int = None,
+                 policy: str = "least_loaded",
+                 stream_weight: callable = None,
+                 symbol_weights: dict = None,
+                 run: callable = None,
+                 on_subscribe: callable = None,
+                 on_reconnect: callable = None):
+        """
+        Args:
+            connection_factory (callable): Returns a new websocket client (thread-based
+                connector client or AsyncBinanceWebsocketClient), with subscribe(stream=...),
+                unsubscribe(stream=...) and stop().
+            max_streams_per_connection (int): Per connection stream limit.
+            min_connections (int): Connections opened up front, streams are balanced over them.
+            max_connections (int): Raise instead of opening more connections. None: no limit.
+            policy (str): "least_loaded" or "fill".
+            stream_weight (callable): stream -> estimated relative message rate.
+                Defaults to `default_stream_weight` with the given symbol_weights.
+            symbol_weights (dict): Multipliers of high-rate symbols, e.g. {"btcusdt": 10.0}
+            run (callable): Applied to the results of the clients' methods
+                (e.g. BinanceClient._run, to schedule the coroutines of async clients).
+            on_subscribe (callable): Called with the list of streams before they are subscribed
+                (e.g. BinanceWSMessageHandler.register_streams).
+            on_reconnect (callable): Called with (StreamConnection, previous client) once a
+                connection was replaced by `reconnect` (e.g. to subscribe the user data stream again).
+        """
+        if policy not in ("least_loaded", "fill"):
+            raise ValueError(f"Unknown policy: {policy}. Use 'least_loaded' or 'fill'.")
+
+        self.connection_factory = connection_factory
+        self.min_connections = min_connections
+        self.max_streams_per_connection = max_streams_per_connection
+        self.max_connections = max_connections
+        self.policy = policy
+        self.symbol_weights = symbol_weights or {}
+        self.stream_weight = stream_weight or (lambda stream: default_stream_weight(stream, self.symbol_weights))
+        self._run = run or (lambda result: result)
+        self.on_subscribe = on_subscribe
+        self.on_reconnect = on_reconnect
+
+        self.connections = []
+        self.stream_connections = {}
+        """stream -> StreamConnection"""
+        self._next_index = 0
+        self._lock = threading.RLock()
+
+        for _ in range(min_connections):
+            self._open_connection()
+
+    def _open_connection(self) -> StreamConnection:
+        if self.max_connections is not None and len(self.connections) >= self.max_connections:
+            raise RuntimeError(f"Stream limit reached: {self.max_connections} connections "
+                               f"x {self.max_streams_per_connection} streams")
+        connection = StreamConnection(self.connection_factory(), self._next_index)
+        self._next_index += 1
+        self.connections.append(connection)
+        return connection
+
+    def _pick_connection(self) -> StreamConnection:
+        available = [c for c in self.connections if len(c) < self.max_streams_per_connection]
+        if not available:
+            return self._open_connection()
+        if self.policy == "fill":
+            return available[0]
+        return min(available, key=lambda c: (c.load, len(c)))
+
+    def subscribe(self, streams: list) -> dict:
+        """
+        Subscribe to streams that are not subscribed yet.
+
+        Returns:
+            dict: StreamConnection -> list of streams newly subscribed on it.
+        """
+        with self._lock:
+            new_streams = [s for s in dict.fromkeys(streams) if s not in self.stream_connections]
+            if not new_streams:
+                return {}
+            while len(self.connections) < self.min_connections:
+                # Subscribing again after `stop`
+                self._open_connection()
+            if self.on_subscribe:
+                self.on_subscribe(new_streams)
+
+            weights = {stream: self.stream_weight(stream) for stream in new_streams}
+            if self.policy == "least_loaded":
+                new_streams.sort(key=weights.get, reverse=True)
+
+            assignment = {}
+            for stream in new_streams:
+                connection = self._pick_connection()
+                connection.streams[stream] = weights[stream]
+                connection.load += weights[stream]
+                self.stream_connections[stream] = connection
+                assignment.setdefault(connection, []).append(stream)
+
+            for connection, connection_streams in assignment.items():
+                self._run(connection.client.subscribe(stream=connection_streams))
+            return assignment
+
+    def unsubscribe(self, streams: list) -> None:
+        """
+        Unsubscribe from streams. Connections left without streams are closed,
+        except for the first `min_connections` ones.
+        """
+        with self._lock:
+            removal = {}
+            for stream in dict.fromkeys(streams):
+                connection = self.stream_connections.pop(stream, None)
+                if connection is None:
+                    continue
+                connection.load -= connection.streams.pop(stream)
+                removal.setdefault(connection, []).append(stream)
+
+            for connection, connection_streams in removal.items():
+                if not connection.streams and connection not in self.connections[:self.min_connections]:
+                    self._run(connection.client.stop())
+                    self.connections.remove(connection)
+                else:
+                    self._run(connection.client.unsubscribe(stream=connection_streams))
+
+    def reconnect(self, connection: StreamConnection) -> None:
+        """
+        Replace the client of a connection with a new one subscribed to exactly the same streams,
+        then close the previous client.
+        """
+        with self._lock:
+            previous_client = connection.client
+            client = self.connection_factory()
+            if connection.streams:
+                self._run(client.subscribe(stream=list(connection.streams)))
+            connection.client = client
+            connection.reconnect_count += 1
+        try:
+            self._run(previous_client.stop())
+        except Exception as e:
+            print(f"Failed to close the replaced connection {connection.index}: {e!r}")
+        if self.on_reconnect:
+            self.on_reconnect(connection, previous_client)
+
+    @property
+    def streams(self) -> list:
+        return list(self.stream_connections)
+
+    def loads(self) -> list:
+        """
+        Returns:
+            list: [(connection index, number of streams, estimated load), ...]
+        """
+        return [(c.index, len(c), c.load) for c in self.connections]
+
+    def stop(self) -> None:
+        """Close every connection and forget the subscriptions."""
+        with self._lock:
+            for connection in self.connections:
+                self._run(connection.client.stop())
+            self.connections = []
+            self.stream_connections = {}
@@ -0,0 +1,354 @@
+# crypto_bot/binance/symbol_info.py
+"""
+Symbol metadata from exchange_info: the symbol registry, with per-symbol price / quantity filters
+(tick size, step size, ...) in fixed-point units (see utils/fixed_point.py), cached on disk.
+
+    registry = SymbolRegistry({"spot": spot_client, "um": um_client})
+    registry.load()                     # from the disk cache when warm, refreshed in the background
+    registry.start_refresh()
+    um = registry.tables["um"]
+    um.id("BTCUSDT"), um.contract_type[um.ids(["BTCUSDT", "ETHUSDT"])]
+    use_symbol_table("binance", "um", um)   # store rows == symbol IDs (see crypto_bot.use_symbol_table)
+
+    btc = registry.filters("um", "BTCUSDT")
+    price = btc.round_price(fixed_point.parse("64123.456"))
+    btc.format_price(price)                              # "64123.5" with a 0.10 tick
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from crypto_bot.utils import fixed_point
+from crypto_bot.utils.json_decoder import get_json_decoder
+
+
+DEFAULT_CACHE_DIRECTORY = "data/exchange_info"
+
+STATUSES = ("", "TRADING", "BREAK", "HALT", "END_OF_DAY", "PRE_TRADING", "POST_TRADING", "AUCTION_MATCH",
+            "PENDING_TRADING", "SETTLING", "CLOSE", "DELIVERING", "DELIVERED", "PRE_DELIVERING", "PRE_SETTLE")
+"""Symbol status codes of the `status` column (0: not listed by the last exchange_info anymore)."""
+
+CONTRACT_TYPES = ("", "PERPETUAL", "CURRENT_MONTH", "NEXT_MONTH", "CURRENT_QUARTER", "NEXT_QUARTER",
+                  "PERPETUAL_DELIVERING", "TRADIFI_PERPETUAL")
+"""Contract type codes of the `contract_type` column (0: spot, or unknown)."""
+
+FILTER_COLUMNS = ("tick_size", "step_size", "min_price", "max_price", "min_qty", "max_qty", "min_notional")
+
+
+class SymbolFilters:
+    """
+    Trading filters of a symbol, in fixed-point units.
+    """
+    __slots__ = ("symbol", "tick_size", "step_size", "min_price", "max_price", "min_qty", "max_qty",
+                 "min_notional", "price_decimals", "qty_decimals")
+
+    def __init__(self,
+                 symbol: str,
+                 tick_size: int,
+                 step_size: int,
+                 min_price: int = 0,
+                 max_price: int = 0,
+                 min_qty: int = 0,
+                 max_qty: int = 0,
+                 min_notional: int = 0):
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.step_size = step_size
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_qty = min_qty
+        self.max_qty = max_qty
+        self.min_notional = min_notional
+        self.price_decimals = fixed_point.step_decimals(tick_size)
+        self.qty_decimals = fixed_point.step_decimals(step_size)
+
+    @classmethod
+    def from_symbol_info(cls, symbol_info: dict) -> "SymbolFilters":
+        """
+        Args:
+            symbol_info (dict): An entry of exchange_info()["symbols"] (spot or um).
+        """
+        filters = {f["filterType"]: f for f in symbol_info.get("filters", ())}
+        price_filter = filters.get("PRICE_FILTER", {})
+        lot_size = filters.get("LOT_SIZE", {})
+        # "NOTIONAL" (spot), "MIN_NOTIONAL" (um: "notional", older spot: "minNotional")
+        notional = filters.get("NOTIONAL") or filters.get("MIN_NOTIONAL") or {}
+        min_notional = notional.get("minNotional", notional.get("notional", "0"))
+        # Saturated: some spot maxQty / maxPrice do not fit the int64 columns of `SymbolTable`
+        parse = fixed_point.parse_int64
+        return cls(
+            symbol=symbol_info["symbol"],
+            tick_size=parse(price_filter.get("tickSize", "0.00000001")),
+            step_size=parse(lot_size.get("stepSize", "0.00000001")),
+            min_price=parse(price_filter.get("minPrice", "0")),
+            max_price=parse(price_filter.get("maxPrice", "0")),
+            min_qty=parse(lot_size.get("minQty", "0")),
+            max_qty=parse(lot_size.get("maxQty", "0")),
+            min_notional=parse(min_notional),
+        )
+
+    def round_price(self, price: int, mode: str = "nearest") -> int:
+        return fixed_point.round_to_step(price, self.tick_size, mode)
+
+    def round_qty(self, quantity: int, mode: str = "down") -> int:
+        return fixed_point.round_to_step(quantity, self.step_size, mode)
+
+    def format_price(self, price: int) -> str:
+        """Order parameter string of a scaled price, at the symbol's precision."""
+        return fixed_point.to_string(price, self.price_decimals)
+
+    def format_qty(self, quantity: int) -> str:
+        return fixed_point.to_string(quantity, self.qty_decimals)
+
+
+def _write_json(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary_path, path)
+
+
+def _code(codes: tuple, value: str) -> int:
+    try:
+        return codes.index(value)
+    except ValueError:
+        return 0
+
+
+class SymbolTable:
+    """
+    The symbols of a market with stable integer IDs, and their metadata in columns indexed by ID.
+
+    IDs are assigned in order of appearance and never reused: symbols delisted from exchange_info
+    keep their ID (status 0), new ones are appended. `symbols` and `index` are only appended to,
+    so they can be shared with the columnar stores (`SymbolColumnStore(symbol_table=...)`);
+    the metadata columns are replaced as a whole by every refresh.
+
+        symbol, base_asset, quote_asset                     list of str
+        status, contract_type                               int8 codes (STATUSES, CONTRACT_TYPES)
+        tick_size, step_size, min_price, max_price,
+        min_qty, max_qty, min_notional                      int64, fixed-point
+    """
+    def __init__(self, market: str):
+        self.market = market
+        self.symbols: list = []
+        """ID -> symbol"""
+        self.index: dict = {}
+        """Symbol -> ID"""
+        self.fetched_at = 0.0
+        """time.time() of the exchange_info the metadata comes from."""
+        self._lock = threading.Lock()
+        self._set_columns([], [], [], [], [[] for _ in FILTER_COLUMNS])
+
+    def _set_columns(self, base_asset: list, quote_asset: list, status: list, contract_type: list, filters: list) -> None:
+        self.base_asset = base_asset
+        self.quote_asset = quote_asset
+        self.status = np.array(status, dtype=np.int8)
+        self.contract_type = np.array(contract_type, dtype=np.int8)
+        for name, column in zip(FILTER_COLUMNS, filters):
+            setattr(self, name, np.array(column, dtype=np.int64))
+
+    def add_symbol(self, symbol: str) -> int:
+        """
+        The ID of a symbol, assigned if it has none yet (e.g. a symbol listed since the last refresh,
+        met in a stream). Its metadata is filled by the next refresh.
+        """
+        symbol_id = self.index.get(symbol)
+        if symbol_id is not None:
+            return symbol_id
+        with self._lock:
+            symbol_id = self.index.get(symbol)
+            if symbol_id is None:
+                symbol_id = len(self.symbols)
+                self.symbols.append(symbol)
+                self.index[symbol] = symbol_id
+        return symbol_id
+
+    def id(self, symbol: str) -> int:
+        """The ID of a symbol, or None."""
+        return self.index.get(symbol)
+
+    def ids(self, symbols: list) -> np.ndarray:
+        """IDs of the given symbols (-1 if unknown), as an int64 array."""
+        index = self.index
+        return np.array([index.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+
+    def filters(self, symbol: str) -> SymbolFilters:
+        """
+        The `SymbolFilters` of a symbol, or None if it has no metadata: not listed yet,
+        or not listed by the last exchange_info anymore (status 0, its filter columns are 0).
+        """
+        symbol_id = self.index.get(symbol)
+        if symbol_id is None or symbol_id >= len(self.tick_size):
+            return None
+        if self.status[symbol_id] == 0 or self.tick_size[symbol_id] == 0:
+            return None
+        return SymbolFilters(symbol, *(int(getattr(self, name)[symbol_id]) for name in FILTER_COLUMNS))
+
+    def update(self, exchange_info: dict, fetched_at: float = None) -> int:
+        """
+        Replace the metadata with the one of an exchange_info response, adding IDs for the new symbols.
+
+        Returns:
+            int: Number of new symbols.
+        """
+        known = len(self.symbols)
+        rows = {}
+        for symbol_info in exchange_info["symbols"]:
+            symbol_filters = SymbolFilters.from_symbol_info(symbol_info)
+            rows[self.add_symbol(symbol_info["symbol"])] = (
+                symbol_info.get("baseAsset", ""),
+                symbol_info.get("quoteAsset", ""),
+                _code(STATUSES, symbol_info.get("status", "")),
+                _code(CONTRACT_TYPES, symbol_info.get("contractType", "")),
+                *(getattr(symbol_filters, name) for name in FILTER_COLUMNS),
+            )
+        empty = ("", "", 0, 0) + (0,) * len(FILTER_COLUMNS)
+        columns = list(zip(*(rows.get(symbol_id, empty) for symbol_id in range(len(self.symbols))))) \
+            or [() for _ in empty]
+        self._set_columns(list(columns[0]), list(columns[1]), columns[2], columns[3], columns[4:])
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+        return len(self.symbols) - known
+
+    def to_dict(self) -> dict:
+        """Column-oriented, for the disk cache (loads in a few ms for thousands of symbols)."""
+        return {
+            "market": self.market,
+            "fetched_at": self.fetched_at,
+            "symbol": list(self.symbols),
+            "base_asset": self.base_asset,
+            "quote_asset": self.quote_asset,
+            "status": [STATUSES[code] for code in self.status.tolist()],
+            "contract_type": [CONTRACT_TYPES[code] for code in self.contract_type.tolist()],
+            **{name: getattr(self, name).tolist() for name in FILTER_COLUMNS},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SymbolTable":
+        table = cls(data["market"])
+        table.symbols.extend(data["symbol"])
+        table.index.update((symbol, symbol_id) for symbol_id, symbol in enumerate(table.symbols))
+        table._set_columns(
+            data["base_asset"],
+            data["quote_asset"],
+            [_code(STATUSES, status) for status in data["status"]],
+            [_code(CONTRACT_TYPES, contract_type) for contract_type in data["contract_type"]],
+            [data[name] for name in FILTER_COLUMNS],
+        )
+        table.fetched_at = data["fetched_at"]
+        return table
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+
+class SymbolRegistry:
+    """
+    `SymbolTable`s of the markets, loaded from the disk cache (or exchange_info on a cold cache),
+    and refreshed from exchange_info in the background once older than `ttl`.
+    """
+    def __init__(self,
+                 rest_clients: dict = None,
+                 cache_directory: str = DEFAULT_CACHE_DIRECTORY,
+                 ttl: float = 3600.0):
+        """
+        Args:
+            rest_clients (dict): market -> client with exchange_info(). Without clients
+                the registry only reads the cache.
+            cache_directory (str): None disables the cache.
+            ttl (float): Seconds after which the metadata is refreshed.
+        """
+        self.rest_clients = rest_clients or {}
+        self.cache_directory = cache_directory
+        self.ttl = ttl
+        self.tables = {}
+        """market -> SymbolTable"""
+        self.refresh_failures = 0
+        _, self._decode = get_json_decoder()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def path(self, market: str) -> str:
+        return os.path.join(self.cache_directory, f"{market}_symbols.json") if self.cache_directory else None
+
+    def load(self, markets: tuple = ("spot", "um")) -> dict:
+        """
+        Load the tables of the markets: from the cache if there is one, even stale
+        (the background refresh updates it), from exchange_info otherwise.
+
+        Returns:
+            dict: market -> SymbolTable
+        """
+        for market in markets:
+            path = self.path(market)
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    self.tables[market] = SymbolTable.from_dict(self._decode(f.read()))
+            else:
+                self.tables[market] = SymbolTable(market)
+                self.refresh(market)
+        return self.tables
+
+    def table(self, market: str) -> SymbolTable:
+        return self.tables[market]
+
+    def filters(self, market: str, symbol: str) -> SymbolFilters:
+        """
+        The `SymbolFilters` of a symbol, or None (unknown market or symbol, see `SymbolTable.filters`).
+        Usable as `OrderGateway(symbol_filters=registry.filters)`.
+        """
+        table = self.tables.get(market)
+        return table.filters(symbol) if table is not None else None
+
+    def is_stale(self, market: str) -> bool:
+        return time.time() - self.tables[market].fetched_at >= self.ttl
+
+    def refresh(self, market: str) -> int:
+        """
+        Update a table from exchange_info, and write the cache.
+
+        Returns:
+            int: Number of new symbols.
+        """
+        client = self.rest_clients.get(market)
+        if client is None:
+            raise ValueError(f"No {market} REST client to fetch exchange_info")
+        table = self.tables.setdefault(market, SymbolTable(market))
+        added = table.update(client.exchange_info())
+        path = self.path(market)
+        if path:
+            _write_json(path, table.to_dict())
+        return added
+
+    def start_refresh(self, check_interval: float = 60.0) -> None:
+        """Refresh the stale tables on a background thread (right away for a stale cache)."""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(check_interval,), name="symbol-registry-refresh", daemon=True)
+            self._thread.start()
+
+    def stop_refresh(self) -> None:
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, check_interval: float) -> None:
+        while True:
+            for market in list(self.tables):
+                if market in self.rest_clients and self.is_stale(market):
+                    try:
+                        self.refresh(market)
+                    except Exception as e:
+                        self.refresh_failures += 1
+                        print(f"Failed to refresh the {market} symbols: {e!r}")
+            if self._stop_event.wait(check_interval):
+                return
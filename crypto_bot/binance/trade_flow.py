@@ -0,0 +1,248 @@
+# crypto_bot/binance/trade_flow.py
+"""
+Rolling trade-flow metrics of the aggTrade streams, per market / symbol, over several
+time windows at once:
+
+    vwap            quote volume / volume
+    cvd             taker buy volume - taker sell volume ("m" false: the buyer is the taker)
+    imbalance       cvd / volume, in [-1, 1]
+    trade_rate      trades per second (`f`..`l` of the aggTrades)
+    notional_rate   quote volume per second
+
+plus the cumulative volume delta since the start (`cumulative_cvd`).
+
+    trade_flow = TradeFlow(windows=("10s", "1m", "5m"))
+    message_handler = BinanceWSMessageHandler(trade_flow=trade_flow)
+    trade_flow.start()      # also count the aggTrades backfilled after a gap
+    ...
+    trade_flow.metrics("um", "BTCUSDT")["1m"]["vwap"]
+    trade_flow.table("um", "1m")            # one NumPy array per metric, over all symbols
+
+Every window keeps its trades in a deque with running sums: a trade is appended once
+per window and popped once, when it leaves the window, so updates are O(1) amortized
+whatever the window length. Windows are in exchange time (trade time): a window only
+moves when a newer trade of the symbol arrives, or when metrics are read with `now`.
+
+Live aggTrades (websocket thread) and backfilled ones (backfill thread) update the
+same windows, so updates and reads hold the lock of the TradeFlow.
+"""
+import re
+import threading
+from collections import deque
+
+import numpy as np
+
+from crypto_bot import market_data_subscriptions
+from .events import AggTrade
+
+
+METRICS = ("volume", "quote_volume", "buy_volume", "sell_volume", "trade_count", "agg_trade_count",
+           "vwap", "cvd", "imbalance", "trade_rate", "notional_rate")
+
+_WINDOW_PATTERN = re.compile(r"^(\d+)(ms|s|m|h|d)$")
+_UNIT_MS = {"ms": 1, "s": 1_000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+
+def window_ms(window: str) -> int:
+    """
+    e.g.:
+        "500ms" -> 500
+        "10s"   -> 10000
+        "1h"    -> 3600000
+    """
+    match = _WINDOW_PATTERN.match(window)
+    if match is None or not int(match.group(1)):
+        raise ValueError(f"Invalid window: {window}. Use e.g. '10s', '1m', '4h'.")
+    return int(match.group(1)) * _UNIT_MS[match.group(2)]
+
+
+class RollingWindow:
+    """
+    Running sums of the trades of the last `window_ms` milliseconds.
+    Trades are (trade time, quantity, quote quantity, taker buy, trade count) tuples.
+    """
+    __slots__ = ("window", "window_ms", "trades", "volume", "quote_volume", "buy_volume", "trade_count")
+
+    def __init__(self, window: str):
+        self.window = window
+        self.window_ms = window_ms(window)
+        self.trades = deque()
+        self.volume = 0.0
+        self.quote_volume = 0.0
+        self.buy_volume = 0.0
+        self.trade_count = 0
+
+    def add(self, trade: tuple) -> None:
+        self.trades.append(trade)
+        self.volume += trade[1]
+        self.quote_volume += trade[2]
+        if trade[3]:
+            self.buy_volume += trade[1]
+        self.trade_count += trade[4]
+
+    def evict(self, now: int) -> None:
+        """Drop the trades at or before now - window_ms."""
+        trades = self.trades
+        cutoff = now - self.window_ms
+        while trades and trades[0][0] <= cutoff:
+            _, quantity, quote_quantity, is_buy, trade_count = trades.popleft()
+            self.volume -= quantity
+            self.quote_volume -= quote_quantity
+            if is_buy:
+                self.buy_volume -= quantity
+            self.trade_count -= trade_count
+        if not trades:
+            # Reset the float drift of the running sums
+            self.volume = self.quote_volume = self.buy_volume = 0.0
+            self.trade_count = 0
+
+    def metrics(self) -> dict:
+        volume = self.volume
+        buy_volume = self.buy_volume
+        sell_volume = volume - buy_volume
+        seconds = self.window_ms / 1000
+        return {
+            "volume": volume,
+            "quote_volume": self.quote_volume,
+            "buy_volume": buy_volume,
+            "sell_volume": sell_volume,
+            "trade_count": self.trade_count,
+            "agg_trade_count": len(self.trades),
+            "vwap": self.quote_volume / volume if volume else float("nan"),
+            "cvd": buy_volume - sell_volume,
+            "imbalance": (buy_volume - sell_volume) / volume if volume else 0.0,
+            "trade_rate": self.trade_count / seconds,
+            "notional_rate": self.quote_volume / seconds,
+        }
+
+
+class SymbolTradeFlow:
+    """
+    The rolling windows and cumulative volume delta of one market / symbol.
+    """
+    __slots__ = ("windows", "cumulative_cvd", "last_trade_time", "late_trades")
+
+    def __init__(self, windows: tuple):
+        self.windows = tuple(RollingWindow(window) for window in windows)
+        self.cumulative_cvd = 0.0
+        self.last_trade_time = None
+        self.late_trades = 0
+        """Trades older than the newest one (e.g. backfilled), added to the windows anyway."""
+
+    def add_trade(self, trade_time: int, price: float, quantity: float, is_buyer_maker: bool, trade_count: int) -> None:
+        trade = (trade_time, quantity, price * quantity, not is_buyer_maker, trade_count)
+        self.cumulative_cvd += -quantity if is_buyer_maker else quantity
+
+        last_trade_time = self.last_trade_time
+        if last_trade_time is not None and trade_time < last_trade_time:
+            # Out of order: only the windows still covering it take it, at their end
+            # (it leaves them a bit later than it should, the sums stay exact meanwhile).
+            self.late_trades += 1
+            for window in self.windows:
+                if trade_time > last_trade_time - window.window_ms:
+                    window.add(trade)
+            return
+
+        self.last_trade_time = trade_time
+        for window in self.windows:
+            window.add(trade)
+            window.evict(trade_time)
+
+    def metrics(self, now: int = None) -> dict:
+        """
+        Args:
+            now (int): Move the windows to this time (ms) first, e.g. to decay quiet symbols.
+
+        Returns:
+            dict: window -> {metric: value}
+        """
+        if now is not None:
+            for window in self.windows:
+                window.evict(now)
+        return {window.window: window.metrics() for window in self.windows}
+
+
+class TradeFlow:
+    """
+    Rolling trade-flow metrics of every symbol of the aggTrade streams, per market.
+    """
+    def __init__(self, windows: tuple = ("10s", "1m", "5m", "15m"), exchange: str = "binance"):
+        """
+        Args:
+            windows (tuple): Window lengths, e.g. "500ms", "10s", "1m", "4h".
+        """
+        for window in windows:
+            window_ms(window)
+        self.windows = tuple(windows)
+        self.exchange = exchange
+        self.flows = {"spot": {}, "um": {}}
+        """market -> symbol -> SymbolTradeFlow"""
+        self._subscription = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Also count the aggTrades backfilled over REST (see `Backfiller`)."""
+        if self._subscription is None:
+            self._subscription = market_data_subscriptions.subscribe(
+                self._on_backfill, self.exchange, None, None, "aggTradeBackfill")
+
+    def stop(self) -> None:
+        if self._subscription is not None:
+            market_data_subscriptions.unsubscribe(self._subscription)
+            self._subscription = None
+
+    def _on_backfill(self, exchange, symbol, market_type, event_type, agg_trades) -> None:
+        with self._lock:
+            for agg_trade in agg_trades:
+                self._add_agg_trade(market_type, agg_trade)
+
+    def _symbol_flow(self, market: str, symbol: str) -> SymbolTradeFlow:
+        flow = self.flows[market].get(symbol)
+        if flow is None:
+            flow = self.flows[market][symbol] = SymbolTradeFlow(self.windows)
+        return flow
+
+    def on_agg_trade(self, market: str, agg_trade: AggTrade) -> None:
+        with self._lock:
+            self._add_agg_trade(market, agg_trade)
+
+    def _add_agg_trade(self, market: str, agg_trade: AggTrade) -> None:
+        self._symbol_flow(market, agg_trade.symbol).add_trade(
+            agg_trade.trade_time, agg_trade.price, agg_trade.quantity, agg_trade.is_buyer_maker,
+            agg_trade.last_trade_id - agg_trade.first_trade_id + 1)
+
+    def get_flow(self, market: str, symbol: str) -> SymbolTradeFlow:
+        return self.flows[market].get(symbol)
+
+    def metrics(self, market: str, symbol: str, now: int = None) -> dict:
+        """
+        Returns:
+            dict: window -> {metric: value} (see `METRICS`), or None if the symbol has no trades yet.
+        """
+        with self._lock:
+            flow = self.get_flow(market, symbol)
+            return flow.metrics(now) if flow else None
+
+    def table(self, market: str, window: str, now: int = None) -> dict:
+        """
+        One window's metrics of every symbol of a market, e.g. to rank symbols by imbalance.
+
+        Returns:
+            dict: "symbol" and every metric of `METRICS` -> NumPy array, plus "cumulative_cvd".
+        """
+        position = self.windows.index(window)
+        with self._lock:
+            flows = list(self.flows[market].items())
+            rows = []
+            for _, flow in flows:
+                rolling_window = flow.windows[position]
+                if now is not None:
+                    rolling_window.evict(now)
+                rows.append(rolling_window.metrics())
+            cumulative_cvd = [flow.cumulative_cvd for _, flow in flows]
+
+        table = {"symbol": np.array([symbol for symbol, _ in flows], dtype=object)}
+        for metric in METRICS:
+            table[metric] = np.array([row[metric] for row in rows], dtype=np.float64)
+        table["cumulative_cvd"] = np.array(cumulative_cvd, dtype=np.float64)
+        return table
@@ -1,13 +1,15 @@
 # cryptobot/main.py
 
-import os
-from decimal import Decimal
+import logging
 from datetime import datetime
 from .binance.binance_client import BinanceClient
+from .binance.config import BinanceConfig
 from .binance.message_handler import BinanceWSMessageHandler
-from .utils.util import repeat_running_until_keyboard_interrupt
+from .binance.symbol_info import SymbolRegistry
+from .utils.util import run_on_updates_until_keyboard_interrupt
 from .binance import message_handler as mh 
-from . import market_data as m
+from . import market_data_subscriptions
+from .screener import FundingBasisScreener
 
 um_streams = [
     "!bookTicker",
@@ -18,31 +20,44 @@ message_handler = BinanceWSMessageHandler(
     # callback=lambda msg: print(msg),
 )
 binance_client = BinanceClient(
-    message_handler=message_handler
+    message_handler=message_handler,
+    symbol_registry=SymbolRegistry(),
+    # BINANCE_HEADLESS=1 under a process supervisor: no prompt, background authentication
+    config=BinanceConfig.from_env(defer_listen_keys=True, log_level=logging.INFO),
 )
 
-def fn():
-    os.system("clear")
-    trb_um = m["binance"]["TRBUSDT"]["um"]
+CLEAR_SCREEN = "\033[H\033[2J"
 
-    trb_funding_rate = trb_um["fundingRate"]
-    trb_funding_rate = Decimal(trb_funding_rate) * 100
-    trb_book_ticker = trb_um["bookTicker"]
-    print(f"""
-TRBUSDT: {trb_book_ticker["b"]} | {trb_book_ticker["a"]} | {trb_funding_rate} % |
+screener = FundingBasisScreener(top_n=20)
 
-{datetime.fromtimestamp(int(trb_book_ticker["E"])/1000)}
-""")
+display_queue = market_data_subscriptions.subscribe_queue(
+    exchange="binance",
+    market_type="um",
+    event_type="screener",
+)
+
+def fn(update):
+    _, view = update
+    print(CLEAR_SCREEN, end="")
+    print(f"{'symbol':<16}{'bid':>14}{'ask':>14}{'funding %/y':>14}{'premium %':>12}{'spread bps':>12}")
+    for symbol, bid, ask, funding, premium, spread in zip(
+            view["symbol"], view["umBid"], view["umAsk"], view["fundingAnnualized"],
+            view["premium"], view["umSpreadBps"]):
+        print(f"{symbol:<16}{bid:>14.8g}{ask:>14.8g}{funding * 100:>14.2f}{premium * 100:>12.4f}{spread:>12.2f}")
+    print(f"\n{datetime.now()}")
 
 
 if __name__ == "__main__":
+    screener.start()
     binance_client.start_stream(
         um_streams=um_streams,
     )
 
-    repeat_running_until_keyboard_interrupt(
+    run_on_updates_until_keyboard_interrupt(
         fn=fn,
-        interval=0.1,
+        queue=display_queue,
+        timeout=1.0,
     )
 
+    screener.stop()
     binance_client.stop_stream()    
\ No newline at end of file
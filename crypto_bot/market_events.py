@@ -0,0 +1,245 @@
+# crypto_bot/market_events.py
+
+import asyncio
+import threading
+import time
+
+from crypto_bot.utils.histogram import LatencyHistogram
+from crypto_bot.pipeline import make_buffer
+
+
+class CoalescingQueue:
+    """
+    Thread-safe queue that only keeps the latest value of every key.
+
+    A consumer slower than the updates does not fall behind: it always gets the latest
+    value of each updated key, in the order the keys were first updated since the last `get`.
+    """
+    def __init__(self, track_latency: bool = False):
+        """
+        Args:
+            track_latency (bool): Record in `latency` the time (ns) from the first pending
+                update of a key to its `get`.
+        """
+        self._pending = {}
+        self._condition = threading.Condition()
+        self.coalesced = 0
+        """Number of values overwritten before being consumed."""
+        self.latency = LatencyHistogram() if track_latency else None
+        self._put_times = {}
+
+    def put(self, key, value) -> None:
+        with self._condition:
+            if key in self._pending:
+                self.coalesced += 1
+            elif self.latency is not None:
+                self._put_times[key] = time.perf_counter_ns()
+            self._pending[key] = value
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> tuple:
+        """
+        Wait for an update.
+
+        Returns:
+            tuple: (key, latest value), or None on timeout.
+        """
+        with self._condition:
+            if not self._pending and not self._condition.wait_for(lambda: self._pending, timeout):
+                return None
+            key = next(iter(self._pending))
+            if self.latency is not None:
+                self.latency.record(time.perf_counter_ns() - self._put_times.pop(key))
+            return key, self._pending.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class AsyncCoalescingQueue:
+    """
+    asyncio flavour of `CoalescingQueue`. `put` may be called from any thread,
+    `get` is awaited on the event loop the queue was created for
+    (the running loop if none is given).
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._event = asyncio.Event()
+        self.coalesced = 0
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+                self._pending[key] = value
+                return
+            self._pending[key] = value
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def get(self) -> tuple:
+        """
+        Returns:
+            tuple: (key, latest value)
+        """
+        while True:
+            with self._lock:
+                if self._pending:
+                    key = next(iter(self._pending))
+                    return key, self._pending.pop(key)
+                self._event.clear()
+            await self._event.wait()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class MarketDataSubscriptions:
+    """
+    Per exchange / symbol / market type / event type subscriptions to market data updates.
+
+    Callbacks are called synchronously, on the thread that updated the market data
+    (usually the websocket thread), with:
+        callback(exchange, symbol, market_type, event_type, data)
+
+    Any of the 4 keys may be None when subscribing, matching every value.
+    Slow consumers should subscribe through `subscribe_queue` / `subscribe_async_queue`,
+    which coalesce the updates so that only the latest state is kept.
+    """
+    def __init__(self):
+        self._subscriptions = {}
+        """(exchange, symbol, market_type, event_type) -> {subscription id: callback}"""
+        self._wildcard_masks = {}
+        """Wildcard mask (which of the 4 keys are None) -> number of subscriptions."""
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self,
+                  callback: callable,
+                  exchange: str = None,
+                  symbol: str = None,
+                  market_type: str = None,
+                  event_type: str = None) -> tuple:
+        """
+        Subscribe to market data updates.
+
+        Returns:
+            tuple: Subscription token, to be passed to `unsubscribe`.
+        """
+        key = (exchange, symbol, market_type, event_type)
+        mask = tuple(k is None for k in key)
+        with self._lock:
+            subscription_id = self._next_id
+            self._next_id += 1
+            subscriptions = dict(self._subscriptions.get(key, {}))
+            subscriptions[subscription_id] = callback
+            self._subscriptions = {**self._subscriptions, key: subscriptions}
+            self._wildcard_masks = {**self._wildcard_masks, mask: self._wildcard_masks.get(mask, 0) + 1}
+        return key, subscription_id
+
+    def unsubscribe(self, token: tuple) -> None:
+        key, subscription_id = token
+        mask = tuple(k is None for k in key)
+        with self._lock:
+            subscriptions = dict(self._subscriptions.get(key, {}))
+            if subscriptions.pop(subscription_id, None) is None:
+                return
+            all_subscriptions = dict(self._subscriptions)
+            if subscriptions:
+                all_subscriptions[key] = subscriptions
+            else:
+                del all_subscriptions[key]
+            masks = dict(self._wildcard_masks)
+            masks[mask] -= 1
+            if masks[mask] == 0:
+                del masks[mask]
+            self._subscriptions = all_subscriptions
+            self._wildcard_masks = masks
+
+    def subscribe_queue(self,
+                        exchange: str = None,
+                        symbol: str = None,
+                        market_type: str = None,
+                        event_type: str = None,
+                        track_latency: bool = False) -> CoalescingQueue:
+        """
+        Subscribe through a `CoalescingQueue`, keyed by (exchange, symbol, market_type, event_type).
+        The queue's `subscription` attribute holds the token to unsubscribe.
+        """
+        queue = CoalescingQueue(track_latency)
+
+        def put(exchange, symbol, market_type, event_type, data):
+            queue.put((exchange, symbol, market_type, event_type), data)
+
+        queue.subscription = self.subscribe(put, exchange, symbol, market_type, event_type)
+        return queue
+
+    def subscribe_buffer(self,
+                         exchange: str = None,
+                         symbol: str = None,
+                         market_type: str = None,
+                         event_type: str = None,
+                         policy: str = "drop_oldest",
+                         capacity: int = 1024,
+                         block_timeout: float = None):
+        """
+        Subscribe through a bounded buffer of crypto_bot.pipeline ("drop_oldest", "conflate"
+        (keyed by (exchange, symbol, market_type, event_type)) or "block"), whose `dropped`
+        counter tells how much a slow consumer missed. Items are
+        ((exchange, symbol, market_type, event_type), data).
+        The buffer's `subscription` attribute holds the token to unsubscribe.
+        """
+        buffer = make_buffer(policy, capacity, block_timeout)
+        put = buffer.put
+
+        def put_update(exchange, symbol, market_type, event_type, data):
+            key = (exchange, symbol, market_type, event_type)
+            put((key, data), key)
+
+        buffer.subscription = self.subscribe(put_update, exchange, symbol, market_type, event_type)
+        return buffer
+
+    def subscribe_async_queue(self,
+                              exchange: str = None,
+                              symbol: str = None,
+                              market_type: str = None,
+                              event_type: str = None,
+                              loop: asyncio.AbstractEventLoop = None) -> AsyncCoalescingQueue:
+        """
+        Subscribe through an `AsyncCoalescingQueue`, keyed by (exchange, symbol, market_type, event_type).
+        The queue's `subscription` attribute holds the token to unsubscribe.
+        """
+        queue = AsyncCoalescingQueue(loop)
+
+        def put(exchange, symbol, market_type, event_type, data):
+            queue.put((exchange, symbol, market_type, event_type), data)
+
+        queue.subscription = self.subscribe(put, exchange, symbol, market_type, event_type)
+        return queue
+
+    def publish(self,
+                exchange: str,
+                symbol: str,
+                market_type: str,
+                event_type: str,
+                data) -> None:
+        """
+        Notify the matching subscribers of an update.
+        """
+        masks = self._wildcard_masks
+        if not masks:
+            return
+
+        subscriptions = self._subscriptions
+        key = (exchange, symbol, market_type, event_type)
+        for mask in masks:
+            pattern = tuple(None if wildcard else k for wildcard, k in zip(mask, key))
+            callbacks = subscriptions.get(pattern)
+            if not callbacks:
+                continue
+            for callback in callbacks.values():
+                try:
+                    callback(exchange, symbol, market_type, event_type, data)
+                except Exception as e:
+                    print(f"Error in market data subscriber {callback}: {e}")
@@ -0,0 +1,396 @@
+# crypto_bot/market_store.py
+
+from operator import itemgetter
+
+import numpy as np
+
+from crypto_bot.utils import fixed_point
+
+
+class SymbolColumnStore:
+    """
+    Columnar per-symbol store for a single exchange / market type.
+
+    Every symbol gets a row the first time it is seen and keeps it for the lifetime
+    of the store, so a row index can be cached by readers. Each field lives in its
+    own preallocated NumPy column (FLOAT_COLUMNS: float64, NaN until written,
+    INT_COLUMNS: int64), so a whole-market view is a single slice of every column
+    (see `snapshot`).
+
+    With a `SymbolTable` (binance/symbol_info.py), rows are the table's symbol IDs, shared by
+    every store of the market: the store uses the table's `symbols` / `index`, and rows of
+    symbols without data are NaN / 0.
+
+    Note:
+        The store is meant to be written by a single thread (the websocket thread).
+        Readers on other threads may observe a row while it is being written.
+    """
+    FLOAT_COLUMNS = ()
+    INT_COLUMNS = ()
+    MESSAGE_FIELDS = {}
+    """Column -> key of the raw payload field, for `update_from_messages`."""
+
+    def __init__(self, capacity: int = 1024, symbol_table=None):
+        """
+        Args:
+            symbol_table (SymbolTable): Use its symbol IDs as rows.
+        """
+        self.capacity = 0
+        self.size = 0
+        """Rows in use (symbols of a symbol table added since are given rows on their first update)."""
+        self.symbol_table = symbol_table
+        if symbol_table is not None:
+            self.symbols: list = symbol_table.symbols
+            self.index: dict = symbol_table.index
+            capacity = max(capacity, len(self.symbols))
+        else:
+            self.symbols: list = []
+            """Row -> symbol."""
+            self.index: dict = {}
+            """Symbol -> row."""
+
+        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS:
+            setattr(self, name, None)
+
+        # Array streams list the same symbols in the same order frame after frame
+        self._last_symbols = None
+        self._last_rows = None
+        self._message_getter = None
+
+        self._allocate(capacity)
+        if symbol_table is not None:
+            self.size = len(self.symbols)
+
+    def _allocate(self, capacity: int) -> None:
+        """
+        (Re)allocate every column with the given capacity, keeping existing rows.
+        """
+        for name in self.FLOAT_COLUMNS:
+            column = np.full(capacity, np.nan, dtype=np.float64)
+            if self.size:
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        for name in self.INT_COLUMNS:
+            column = np.zeros(capacity, dtype=np.int64)
+            if self.size:
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def add_symbol(self, symbol: str) -> int:
+        """
+        Assign a row to the symbol (if it does not have one yet) and return it.
+        """
+        row = self.index.get(symbol)
+        if row is None:
+            if self.symbol_table is not None:
+                row = self.symbol_table.add_symbol(symbol)
+            else:
+                row = len(self.symbols)
+                self.index[symbol] = row
+                self.symbols.append(symbol)
+        if row >= self.capacity:
+            self._allocate(max(self.capacity * 2, row + 1))
+        if row >= self.size:
+            self.size = row + 1
+        return row
+
+    def rows(self, symbols: list) -> np.ndarray:
+        """
+        Rows of the given symbols (adding the unknown ones), as an int64 array.
+        """
+        if symbols == self._last_symbols:
+            return self._last_rows
+        index = self.index
+        size = self.size
+        rows = np.array([
+            row if row is not None and row < size else self.add_symbol(symbol)
+            for symbol, row in zip(symbols, map(index.get, symbols))
+        ], dtype=np.int64)
+        self._last_symbols = symbols
+        self._last_rows = rows
+        return rows
+
+    def update_from_message(self, message: dict) -> int:
+        """
+        Update the row of a single raw payload, following MESSAGE_FIELDS.
+
+        Returns:
+            int: The row of the symbol.
+        """
+        fields = self.MESSAGE_FIELDS
+        symbol = message[fields["symbol"]]
+        row = self.index.get(symbol)
+        if row is None or row >= self.size:
+            row = self.add_symbol(symbol)
+        for name in self.FLOAT_COLUMNS:
+            getattr(self, name)[row] = float(message[fields[name]])
+        for name in self.INT_COLUMNS:
+            getattr(self, name)[row] = message[fields[name]]
+        return row
+
+    def update_from_messages(self, messages: list) -> np.ndarray:
+        """
+        Update the rows of a batch of raw payloads (e.g. an array stream frame) column by column,
+        following MESSAGE_FIELDS. Payloads of the same symbol are applied in order.
+
+        Returns:
+            np.ndarray: The rows of the payloads (empty for an empty batch).
+        """
+        if not messages:
+            return np.empty(0, dtype=np.int64)
+        if self._message_getter is None:
+            fields = self.MESSAGE_FIELDS
+            self._message_getter = itemgetter(*(fields[name] for name in ("symbol",) + self.FLOAT_COLUMNS + self.INT_COLUMNS))
+        # One pass over the payloads, transposed into one tuple per field
+        symbols, *values = zip(*map(self._message_getter, messages))
+        rows = self.rows(list(symbols))
+        n_floats = len(self.FLOAT_COLUMNS)
+        for name, column in zip(self.FLOAT_COLUMNS, values[:n_floats]):
+            getattr(self, name)[rows] = np.array(column, dtype=np.float64)
+        for name, column in zip(self.INT_COLUMNS, values[n_floats:]):
+            getattr(self, name)[rows] = np.array(column, dtype=np.int64)
+        return rows
+
+    def get(self, symbol: str) -> dict:
+        """
+        Get the row of a symbol as a dict of python scalars.
+
+        Returns:
+            dict: Keys are the column names, or None if the symbol was never seen.
+        """
+        row = self.index.get(symbol)
+        if row is None or row >= self.size:
+            return None
+        values = {"symbol": symbol}
+        for name in self.FLOAT_COLUMNS:
+            values[name] = float(getattr(self, name)[row])
+        for name in self.INT_COLUMNS:
+            values[name] = int(getattr(self, name)[row])
+        return values
+
+    def snapshot(self) -> dict:
+        """
+        Copy of every column for all known symbols, aligned by row.
+
+        Returns:
+            dict: {"symbol": np.ndarray, column: np.ndarray, ...}
+        """
+        size = self.size
+        snapshot = {"symbol": np.array(self.symbols[:size], dtype=object)}
+        for name in self.FLOAT_COLUMNS + self.INT_COLUMNS:
+            snapshot[name] = getattr(self, name)[:size].copy()
+        return snapshot
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, symbol: str) -> bool:
+        row = self.index.get(symbol)
+        return row is not None and row < self.size
+
+
+class BookTickerStore(SymbolColumnStore):
+    """
+    Columnar top-of-book store (bookTicker streams):
+
+        bid, bidQty, ask, askQty                            float64
+        bidFixed, bidQtyFixed, askFixed, askQtyFixed        int64, exact fixed-point values
+                                                            (see utils/fixed_point.py), saturated
+                                                            above ~9.2e10
+        updateId, eventTime, transactTime                   int64
+
+    Writing an update is a handful of scalar stores into existing arrays.
+    Comparisons and spreads of the fixed-point columns are exact, e.g.
+    `store.askFixed[row] - store.bidFixed[row]` is the spread in 1e-8 units.
+    """
+    FLOAT_COLUMNS = ("bid", "bidQty", "ask", "askQty")
+    INT_COLUMNS = ("bidFixed", "bidQtyFixed", "askFixed", "askQtyFixed", "updateId", "eventTime", "transactTime")
+
+    def update(self,
+               symbol: str,
+               update_id: int,
+               bid: float,
+               bid_qty: float,
+               ask: float,
+               ask_qty: float,
+               event_time: int = 0,
+               transact_time: int = 0) -> int:
+        """
+        Update the top of book of a symbol from float values
+        (the fixed-point columns are set to the nearest fixed-point values).
+
+        Returns:
+            int: The row of the symbol.
+        """
+        return self.update_fixed(
+            symbol,
+            update_id,
+            fixed_point.from_float(bid),
+            fixed_point.from_float(bid_qty),
+            fixed_point.from_float(ask),
+            fixed_point.from_float(ask_qty),
+            event_time,
+            transact_time,
+        )
+
+    def update_fixed(self,
+                     symbol: str,
+                     update_id: int,
+                     bid: int,
+                     bid_qty: int,
+                     ask: int,
+                     ask_qty: int,
+                     event_time: int = 0,
+                     transact_time: int = 0) -> int:
+        """
+        Update the top of book of a symbol from fixed-point values
+        (the float columns are derived from them, the fixed columns are saturated to int64).
+
+        Returns:
+            int: The row of the symbol.
+        """
+        row = self.index.get(symbol)
+        if row is None or row >= self.size:
+            row = self.add_symbol(symbol)
+        saturate = fixed_point.saturate
+        self.bidFixed[row] = saturate(bid)
+        self.bidQtyFixed[row] = saturate(bid_qty)
+        self.askFixed[row] = saturate(ask)
+        self.askQtyFixed[row] = saturate(ask_qty)
+        scale = fixed_point.SCALE
+        self.bid[row] = bid / scale
+        self.bidQty[row] = bid_qty / scale
+        self.ask[row] = ask / scale
+        self.askQty[row] = ask_qty / scale
+        self.updateId[row] = update_id
+        self.eventTime[row] = event_time
+        self.transactTime[row] = transact_time
+        return row
+
+    def update_from_message(self, message: dict) -> int:
+        """
+        Update the store from a raw bookTicker payload, parsed straight into fixed-point values
+        (saturated, see `fixed_point.parse_int64`).
+        Spot payloads have no "E" / "T" fields, those columns are left at 0.
+        """
+        symbol = message["s"]
+        row = self.index.get(symbol)
+        if row is None or row >= self.size:
+            row = self.add_symbol(symbol)
+        parse = fixed_point.parse_int64
+        bid, bid_qty, ask, ask_qty = message["b"], message["B"], message["a"], message["A"]
+        # float(string) is the float of the fixed-point value, see fixed_point.to_float
+        self.bid[row] = float(bid)
+        self.bidQty[row] = float(bid_qty)
+        self.ask[row] = float(ask)
+        self.askQty[row] = float(ask_qty)
+        self.bidFixed[row] = parse(bid)
+        self.bidQtyFixed[row] = parse(bid_qty)
+        self.askFixed[row] = parse(ask)
+        self.askQtyFixed[row] = parse(ask_qty)
+        self.updateId[row] = message["u"]
+        self.eventTime[row] = message.get("E", 0)
+        self.transactTime[row] = message.get("T", 0)
+        return row
+
+
+class MarkPriceStore(SymbolColumnStore):
+    """
+    Columnar mark price / funding store (markPrice streams):
+
+        markPrice, indexPrice, estimatedSettlePrice, fundingRate    float64
+        nextFundingTime, eventTime                                  int64
+    """
+    FLOAT_COLUMNS = ("markPrice", "indexPrice", "estimatedSettlePrice", "fundingRate")
+    INT_COLUMNS = ("nextFundingTime", "eventTime")
+    MESSAGE_FIELDS = {
+        "symbol": "s",
+        "markPrice": "p",
+        "indexPrice": "i",
+        "estimatedSettlePrice": "P",
+        "fundingRate": "r",
+        "nextFundingTime": "T",
+        "eventTime": "E",
+    }
+
+    def update(self,
+               symbol: str,
+               mark_price: float,
+               index_price: float,
+               estimated_settle_price: float,
+               funding_rate: float,
+               next_funding_time: int,
+               event_time: int) -> int:
+        """
+        Returns:
+            int: The row of the symbol.
+        """
+        row = self.index.get(symbol)
+        if row is None or row >= self.size:
+            row = self.add_symbol(symbol)
+        self.markPrice[row] = mark_price
+        self.indexPrice[row] = index_price
+        self.estimatedSettlePrice[row] = estimated_settle_price
+        self.fundingRate[row] = funding_rate
+        self.nextFundingTime[row] = next_funding_time
+        self.eventTime[row] = event_time
+        return row
+
+    def update_from_event(self, event) -> int:
+        """Update the store from a `MarkPriceUpdate` event."""
+        return self.update(
+            event.symbol,
+            event.mark_price,
+            event.index_price,
+            event.estimated_settle_price,
+            event.funding_rate,
+            event.next_funding_time,
+            event.event_time,
+        )
+
+
+class TickerStore(SymbolColumnStore):
+    """
+    Columnar 24hr rolling window ticker store (ticker streams).
+    """
+    FLOAT_COLUMNS = ("priceChange", "priceChangePercent", "weightedAvgPrice", "lastPrice", "lastQty",
+                     "open", "high", "low", "volume", "quoteVolume")
+    INT_COLUMNS = ("eventTime", "openTime", "closeTime", "firstTradeId", "lastTradeId", "count")
+    MESSAGE_FIELDS = {
+        "symbol": "s",
+        "priceChange": "p",
+        "priceChangePercent": "P",
+        "weightedAvgPrice": "w",
+        "lastPrice": "c",
+        "lastQty": "Q",
+        "open": "o",
+        "high": "h",
+        "low": "l",
+        "volume": "v",
+        "quoteVolume": "q",
+        "eventTime": "E",
+        "openTime": "O",
+        "closeTime": "C",
+        "firstTradeId": "F",
+        "lastTradeId": "L",
+        "count": "n",
+    }
+
+
+class MiniTickerStore(SymbolColumnStore):
+    """
+    Columnar 24hr rolling window mini-ticker store (miniTicker streams).
+    """
+    FLOAT_COLUMNS = ("close", "open", "high", "low", "volume", "quoteVolume")
+    INT_COLUMNS = ("eventTime",)
+    MESSAGE_FIELDS = {
+        "symbol": "s",
+        "close": "c",
+        "open": "o",
+        "high": "h",
+        "low": "l",
+        "volume": "v",
+        "quoteVolume": "q",
+        "eventTime": "E",
+    }
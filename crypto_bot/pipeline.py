@@ -0,0 +1,298 @@
+# crypto_bot/pipeline.py
+"""
+Bounded stage between the websocket threads and slow consumers (loggers, plotters, ...).
+
+Every consumer runs on its own thread, behind its own bounded buffer; the producer side
+(the websocket thread) only appends to the buffers, so a slow consumer loses data
+(counted in `dropped`) instead of adding latency to ingestion. Overflow policies:
+
+    "drop_oldest"   `RingBuffer`: keep the latest `capacity` items, never blocks the producer
+    "conflate"      `ConflatingBuffer`: keep the latest item per key (e.g. per stream), and at most
+                    `capacity` keys; never blocks the producer
+    "block"         `BlockingBuffer`: the producer waits for room (up to `block_timeout`, then drops),
+                    for consumers that must see every item and are known to keep up
+
+    pipeline = ConsumerPipeline()
+    pipeline.add_consumer("logger", log_message, policy="drop_oldest", capacity=10000)
+    pipeline.add_consumer("plot", plot_message, policy="conflate", key=lambda message: message.get("stream"))
+    handler = BinanceWSMessageHandler(callback=pipeline.publish)
+    pipeline.start()
+"""
+import queue
+import threading
+from collections import deque
+
+
+POLICIES = ("drop_oldest", "conflate", "block")
+
+
+class RingBuffer:
+    """
+    Bounded single-consumer buffer that drops its oldest item when full.
+
+    `put` takes no lock: deque appends / pops are atomic, the consumer is only woken up
+    (through an Event) when it may be waiting.
+    """
+    policy = "drop_oldest"
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.dropped = 0
+        """Items overwritten before being consumed."""
+        self.conflated = 0
+        self._items = deque(maxlen=capacity)
+        self._event = threading.Event()
+
+    def put(self, item, key=None) -> None:
+        items = self._items
+        if len(items) >= self.capacity:
+            self.dropped += 1
+        items.append(item)
+        if not self._event.is_set():
+            self._event.set()
+
+    def get(self, timeout: float = None):
+        """
+        Returns:
+            The oldest item, or None on timeout.
+        """
+        items = self._items
+        while True:
+            try:
+                return items.popleft()
+            except IndexError:
+                pass
+            self._event.clear()
+            if items:
+                continue
+            if not self._event.wait(timeout):
+                return None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class ConflatingBuffer:
+    """
+    Bounded single-consumer buffer keeping only the latest item of every key,
+    in the order the keys were first put since they were last consumed.
+    When `capacity` keys are pending, the oldest key is dropped.
+    """
+    policy = "conflate"
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.dropped = 0
+        """Pending keys dropped because the buffer was full."""
+        self.conflated = 0
+        """Items overwritten by a newer item of the same key."""
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+
+    def put(self, item, key=None) -> None:
+        with self._lock:
+            pending = self._pending
+            if key in pending:
+                self.conflated += 1
+            elif len(pending) >= self.capacity:
+                del pending[next(iter(pending))]
+                self.dropped += 1
+            pending[key] = item
+        if not self._event.is_set():
+            self._event.set()
+
+    def get(self, timeout: float = None):
+        """
+        Returns:
+            The latest item of the oldest pending key, or None on timeout.
+        """
+        while True:
+            with self._lock:
+                pending = self._pending
+                if pending:
+                    return pending.pop(next(iter(pending)))
+                self._event.clear()
+            if not self._event.wait(timeout):
+                return None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class BlockingBuffer:
+    """
+    Bounded buffer whose producer waits for room, at most `block_timeout` seconds
+    (None: forever) before dropping the item.
+    """
+    policy = "block"
+
+    def __init__(self, capacity: int = 1024, block_timeout: float = None):
+        self.capacity = capacity
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        """Items dropped after waiting `block_timeout`."""
+        self.conflated = 0
+        self.blocked = 0
+        """Puts that had to wait for room."""
+        self._queue = queue.Queue(maxsize=capacity)
+
+    def put(self, item, key=None) -> None:
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            self.blocked += 1
+        try:
+            self._queue.put(item, timeout=self.block_timeout)
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout: float = None):
+        """
+        Returns:
+            The oldest item, or None on timeout.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+
+def make_buffer(policy: str = "drop_oldest", capacity: int = 1024, block_timeout: float = None):
+    """
+    Args:
+        policy (str): One of POLICIES.
+        block_timeout (float): Only used by the "block" policy.
+    """
+    if policy == "drop_oldest":
+        return RingBuffer(capacity)
+    if policy == "conflate":
+        return ConflatingBuffer(capacity)
+    if policy == "block":
+        return BlockingBuffer(capacity, block_timeout)
+    raise ValueError(f"Unknown policy: {policy}. Use one of {POLICIES}.")
+
+
+class Consumer:
+    """
+    A callback run on its own thread, fed by its own buffer.
+    """
+    def __init__(self, name: str, callback: callable, buffer, key: callable = None):
+        self.name = name
+        self.callback = callback
+        self.buffer = buffer
+        self.key = key
+        self.processed = 0
+        self.errors = 0
+        self._running = False
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=f"consumer-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        if self._thread is not None:
+            self._running = False
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        get = self.buffer.get
+        callback = self.callback
+        while self._running:
+            item = get(0.1)
+            if item is None:
+                continue
+            try:
+                callback(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in consumer {self.name}: {e!r}")
+            self.processed += 1
+
+    def stats(self) -> dict:
+        buffer = self.buffer
+        return {
+            "policy": buffer.policy,
+            "capacity": buffer.capacity,
+            "depth": len(buffer),
+            "dropped": buffer.dropped,
+            "conflated": buffer.conflated,
+            "processed": self.processed,
+            "errors": self.errors,
+        }
+
+
+class ConsumerPipeline:
+    """
+    Fans the items published by the producer out to the consumers' buffers.
+    `publish` is meant to be the message handler's callback.
+    """
+    def __init__(self):
+        self.consumers = {}
+        """name -> Consumer"""
+        self._consumers = ()
+        self._lock = threading.Lock()
+
+    def add_consumer(self,
+                     name: str,
+                     callback: callable,
+                     policy: str = "drop_oldest",
+                     capacity: int = 1024,
+                     key: callable = None,
+                     block_timeout: float = None,
+                     start: bool = False) -> Consumer:
+        """
+        Args:
+            callback (callable): Called with every item, on the consumer's thread.
+            policy (str): Overflow policy, one of POLICIES.
+            capacity (int): Items ("conflate": keys) the buffer holds.
+            key (callable): item -> conflation key, required by the "conflate" policy.
+            block_timeout (float): Longest wait of the producer with the "block" policy (None: forever).
+            start (bool): Start the consumer's thread right away (otherwise with `start`).
+        """
+        if policy == "conflate" and key is None:
+            raise ValueError("The conflate policy requires a key function")
+        consumer = Consumer(name, callback, make_buffer(policy, capacity, block_timeout), key)
+        with self._lock:
+            if name in self.consumers:
+                raise ValueError(f"Consumer {name} already exists")
+            self.consumers[name] = consumer
+            self._consumers = tuple(self.consumers.values())
+        if start:
+            consumer.start()
+        return consumer
+
+    def remove_consumer(self, name: str) -> None:
+        with self._lock:
+            consumer = self.consumers.pop(name, None)
+            self._consumers = tuple(self.consumers.values())
+        if consumer is not None:
+            consumer.stop()
+
+    def publish(self, item) -> None:
+        for consumer in self._consumers:
+            key = consumer.key
+            consumer.buffer.put(item, key(item) if key is not None else None)
+
+    def start(self) -> None:
+        for consumer in self._consumers:
+            consumer.start()
+
+    def stop(self) -> None:
+        for consumer in self._consumers:
+            consumer.stop()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: consumer name -> {"policy", "capacity", "depth", "dropped", "conflated", "processed", "errors"}
+        """
+        return {consumer.name: consumer.stats() for consumer in self._consumers}
@@ -0,0 +1,247 @@
+# crypto_bot/screener.py
+"""
+Cross-market basis / funding screener over all symbols.
+
+The screener reads the columnar stores directly (`book_tickers` for spot and um,
+`mark_prices` for um) through row index arrays aligned on the um symbols, so a
+recompute is a handful of NumPy operations over whole columns, whatever the number
+of symbols:
+
+    screener = FundingBasisScreener(top_n=20)
+    screener.start()        # recompute on every !markPrice@arr frame
+    ...
+    screener.view["symbol"], screener.view["fundingAnnualized"]
+
+Every recompute is published as ("binance", None, "um", "screener", view)
+to `market_data_subscriptions`.
+"""
+import re
+
+import numpy as np
+
+from crypto_bot import get_book_ticker_store, get_mark_price_store, market_data_subscriptions
+
+
+DEFAULT_FUNDING_INTERVAL_HOURS = 8
+HOURS_PER_YEAR = 365 * 24
+
+SORT_KEYS = ("fundingAnnualized", "basis", "premium", "umSpreadBps")
+
+_MULTIPLIER_PREFIX_PATTERN = re.compile(r"^(1000000|1000)(?=[A-Z])")
+
+
+def spot_symbol_candidates(um_symbol: str) -> list:
+    """
+    Spot symbols that may quote the same asset as an um symbol, with the um / spot price ratio.
+
+    e.g.:
+        "BTCUSDT"           -> [("BTCUSDT", 1)]
+        "BTCUSDT_250328"    -> [("BTCUSDT", 1)]
+        "1000PEPEUSDT"      -> [("1000PEPEUSDT", 1), ("PEPEUSDT", 1000)]
+
+    Returns:
+        list: [(spot symbol, multiplier), ...] in order of preference.
+    """
+    symbol = um_symbol.split("_", 1)[0]
+    candidates = [(symbol, 1)]
+    match = _MULTIPLIER_PREFIX_PATTERN.match(symbol)
+    if match:
+        candidates.append((symbol[match.end():], int(match.group(1))))
+    return candidates
+
+
+def _take(column: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """column[rows] with NaN where rows is -1."""
+    return np.where(rows >= 0, column[np.maximum(rows, 0)], np.nan)
+
+
+class FundingBasisScreener:
+    """
+    Keeps spot and um top of book plus mark price / funding aligned by um symbol,
+    and ranks all symbols on every update:
+
+        basis               um mid / (spot mid * multiplier) - 1
+        premium             mark price / index price - 1
+        fundingAnnualized   funding rate * funding periods per year
+        umSpreadBps         um (ask - bid) / mid in bps (spotSpreadBps likewise)
+        spreadRank          rank of umSpreadBps, 0 being the tightest
+
+    Values that can not be computed yet (e.g. no spot book ticker) are NaN
+    and sorted last.
+    """
+    def __init__(self,
+                 exchange: str = "binance",
+                 top_n: int = 20,
+                 sort_by: str = "fundingAnnualized",
+                 absolute: bool = True,
+                 funding_interval_hours: dict = None):
+        """
+        Args:
+            top_n (int): Number of symbols of the published view.
+            sort_by (str): Column the view is sorted by, one of SORT_KEYS.
+            absolute (bool): Sort by absolute value, descending. Otherwise sort descending by value.
+            funding_interval_hours (dict): symbol -> funding interval of the symbols not funded
+                every DEFAULT_FUNDING_INTERVAL_HOURS (see `fundingIntervalHours` of the
+                um `funding_info` endpoint).
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {SORT_KEYS}, got {sort_by}")
+        self.exchange = exchange
+        self.top_n = top_n
+        self.sort_by = sort_by
+        self.absolute = absolute
+        self.funding_interval_hours = dict(funding_interval_hours or {})
+
+        self.mark_prices = get_mark_price_store(exchange, "um")
+        self.um_book_tickers = get_book_ticker_store(exchange, "um")
+        self.spot_book_tickers = get_book_ticker_store(exchange, "spot")
+
+        # Aligned on the rows of `mark_prices`
+        self._um_rows = np.empty(0, dtype=np.int64)
+        self._spot_rows = np.empty(0, dtype=np.int64)
+        self._multipliers = np.empty(0, dtype=np.float64)
+        self._periods_per_year = np.empty(0, dtype=np.float64)
+        self._store_sizes = None
+
+        self.columns = {}
+        """Every computed column for all symbols, aligned on the rows of `mark_prices`."""
+        self.view = {}
+        """The `top_n` rows of `columns`, sorted."""
+        self._subscription = None
+
+    def start(self) -> None:
+        """Recompute on every mark price batch of the exchange."""
+        if self._subscription is None:
+            self._subscription = market_data_subscriptions.subscribe(
+                self._on_mark_price_batch, self.exchange, None, "um", "markPriceBatch")
+
+    def stop(self) -> None:
+        if self._subscription is not None:
+            market_data_subscriptions.unsubscribe(self._subscription)
+            self._subscription = None
+
+    def _on_mark_price_batch(self, exchange, symbol, market_type, event_type, data) -> None:
+        self.update()
+
+    def set_funding_intervals(self, funding_interval_hours: dict) -> None:
+        """
+        Args:
+            funding_interval_hours (dict): symbol -> funding interval in hours.
+        """
+        self.funding_interval_hours.update(funding_interval_hours)
+        index = self.mark_prices.index
+        for symbol, hours in funding_interval_hours.items():
+            row = index.get(symbol)
+            if row is not None and row < len(self._periods_per_year):
+                self._periods_per_year[row] = HOURS_PER_YEAR / hours
+
+    def _align(self) -> None:
+        """
+        Extend the row index arrays to the symbols added to the stores since the last call.
+        Only runs a Python loop when a store grew.
+        """
+        sizes = (len(self.mark_prices), len(self.um_book_tickers), len(self.spot_book_tickers))
+        if sizes == self._store_sizes:
+            return
+        self._store_sizes = sizes
+
+        size = sizes[0]
+        known = len(self._um_rows)
+        if size > known:
+            added = size - known
+            self._um_rows = np.concatenate([self._um_rows, np.full(added, -1, dtype=np.int64)])
+            self._spot_rows = np.concatenate([self._spot_rows, np.full(added, -1, dtype=np.int64)])
+            self._multipliers = np.concatenate([self._multipliers, np.ones(added)])
+            periods = [
+                HOURS_PER_YEAR / self.funding_interval_hours.get(symbol, DEFAULT_FUNDING_INTERVAL_HOURS)
+                for symbol in self.mark_prices.symbols[known:size]
+            ]
+            self._periods_per_year = np.concatenate([self._periods_per_year, periods])
+
+        symbols = self.mark_prices.symbols
+        um_index = self.um_book_tickers.index
+        spot_index = self.spot_book_tickers.index
+        # Stores sharing a symbol table know symbols they have no row for yet
+        um_size, spot_size = sizes[1], sizes[2]
+        for row in np.flatnonzero(self._um_rows < 0):
+            um_row = um_index.get(symbols[row], -1)
+            self._um_rows[row] = um_row if um_row < um_size else -1
+        for row in np.flatnonzero(self._spot_rows < 0):
+            for spot_symbol, multiplier in spot_symbol_candidates(symbols[row]):
+                spot_row = spot_index.get(spot_symbol)
+                if spot_row is not None and spot_row < spot_size:
+                    self._spot_rows[row] = spot_row
+                    self._multipliers[row] = multiplier
+                    break
+
+    def update(self) -> dict:
+        """
+        Recompute every column and the top-N view, and publish the view.
+
+        Returns:
+            dict: The view, column name -> array of `top_n` values.
+        """
+        self._align()
+        size = len(self._um_rows)
+        marks = self.mark_prices
+        um = self.um_book_tickers
+        spot = self.spot_book_tickers
+
+        mark_price = marks.markPrice[:size]
+        index_price = marks.indexPrice[:size]
+        funding_rate = marks.fundingRate[:size]
+
+        um_bid = _take(um.bid, self._um_rows)
+        um_ask = _take(um.ask, self._um_rows)
+        spot_bid = _take(spot.bid, self._spot_rows) * self._multipliers
+        spot_ask = _take(spot.ask, self._spot_rows) * self._multipliers
+        um_mid = (um_bid + um_ask) * 0.5
+        spot_mid = (spot_bid + spot_ask) * 0.5
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            basis = um_mid / spot_mid - 1.0
+            premium = mark_price / index_price - 1.0
+            um_spread_bps = (um_ask - um_bid) / um_mid * 1e4
+            spot_spread_bps = (spot_ask - spot_bid) / spot_mid * 1e4
+        funding_annualized = funding_rate * self._periods_per_year
+
+        # NaN sort last in argsort
+        spread_rank = np.empty(size, dtype=np.int64)
+        spread_rank[np.argsort(um_spread_bps, kind="stable")] = np.arange(size)
+
+        columns = {
+            "symbol": np.array(marks.symbols[:size], dtype=object),
+            "markPrice": mark_price.copy(),
+            "indexPrice": index_price.copy(),
+            "fundingRate": funding_rate.copy(),
+            "fundingAnnualized": funding_annualized,
+            "nextFundingTime": marks.nextFundingTime[:size].copy(),
+            "umBid": um_bid,
+            "umAsk": um_ask,
+            "spotMid": spot_mid,
+            "basis": basis,
+            "premium": premium,
+            "umSpreadBps": um_spread_bps,
+            "spotSpreadBps": spot_spread_bps,
+            "spreadRank": spread_rank,
+        }
+        self.columns = columns
+        self.view = {name: column[self.top_rows(columns[self.sort_by])] for name, column in columns.items()}
+
+        market_data_subscriptions.publish(self.exchange, None, "um", "screener", self.view)
+        return self.view
+
+    def top_rows(self, values: np.ndarray) -> np.ndarray:
+        """
+        Rows of the `top_n` highest values (absolute values if `absolute`), NaN excluded, sorted.
+        """
+        key = -np.abs(values) if self.absolute else -values
+        key = np.where(np.isnan(key), np.inf, key)
+        top_n = min(self.top_n, np.count_nonzero(~np.isnan(values)))
+        if top_n <= 0:
+            return np.empty(0, dtype=np.int64)
+        if top_n < len(key):
+            rows = np.argpartition(key, top_n - 1)[:top_n]
+        else:
+            rows = np.arange(len(key))
+        return rows[np.argsort(key[rows], kind="stable")][:top_n]
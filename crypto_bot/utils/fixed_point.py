@@ -0,0 +1,151 @@
+# crypto_bot/utils/fixed_point.py
+"""
+Fixed-point prices and quantities: scaled integers of SCALE (1e-8) units.
+
+Binance prices and quantities have at most 8 decimals, so every value of the payloads is an
+exact integer of 1e-8 units. Parsing gives that exact integer (no float or Decimal rounding
+reaches the result, see EXACT_FLOAT_LIMIT):
+
+    bid = parse("25.35190000")      # 2535190000
+    ask = parse("25.36520000")      # 2536520000
+    ask - bid                       # 1330000, exactly 0.0133
+    to_string(ask - bid)            # "0.0133"
+
+Sums, differences and comparisons of scaled values are plain integer operations.
+Values up to ~9.2e10 fit in int64 (NumPy columns): `parse_int64` saturates larger ones
+(e.g. quantities of huge-supply tokens), whose float column keeps the magnitude.
+Products (e.g. notionals) can exceed it, `mul` computes them with Python integers.
+
+Fixed-point values are used by `BookTickerStore` (fixed columns next to the float ones),
+`SymbolFilters` / `SymbolTable` and the order gateway's price / quantity formatting.
+The typed events, order book ladders, trade flow and the other stores are float.
+"""
+import numpy as np
+
+
+DECIMALS = 8
+SCALE = 10 ** DECIMALS
+
+_POWERS = tuple(10 ** (DECIMALS - n) for n in range(DECIMALS + 1))
+"""Number of decimals of a string -> factor to SCALE units."""
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+EXACT_FLOAT_LIMIT = 2 ** 50 / SCALE
+"""
+Below this magnitude (~1.1e7), round(float(string) * SCALE) is the exact scaled value of a string
+with at most DECIMALS decimals: float(string) and the product are both within half an ulp,
+so the product is less than 0.5 away from the scaled integer. `parse` takes this path,
+much faster than going through the digits, and the digits beyond it.
+"""
+
+
+def parse(value: str) -> int:
+    """
+    "0.00120000" -> 120000
+
+    Values with more than DECIMALS decimals are rounded to the nearest SCALE unit.
+    """
+    number = float(value)
+    if -EXACT_FLOAT_LIMIT < number < EXACT_FLOAT_LIMIT:
+        return round(number * SCALE)
+    return _parse_digits(value)
+
+
+def parse_int64(value: str) -> int:
+    """
+    `parse`, saturated to the int64 range of the fixed-point columns (|value| above ~9.2e10).
+    Never raises on a valid exchange payload.
+    """
+    number = float(value)
+    if -EXACT_FLOAT_LIMIT < number < EXACT_FLOAT_LIMIT:
+        return round(number * SCALE)
+    return saturate(_parse_digits(value))
+
+
+def saturate(value: int) -> int:
+    """Clamp a scaled value to the int64 range."""
+    return INT64_MAX if value > INT64_MAX else INT64_MIN if value < INT64_MIN else value
+
+
+def _parse_digits(value: str) -> int:
+    """`parse` from the digits of the string, for the values too large for the float path."""
+    point = value.find(".")
+    if point < 0:
+        return int(value) * SCALE
+    decimals = len(value) - point - 1
+    if decimals <= DECIMALS:
+        return int(value.replace(".", "", 1)) * _POWERS[decimals]
+    scaled = int(value[:point] + value[point + 1:point + 1 + DECIMALS])
+    if value[point + 1 + DECIMALS] >= "5":
+        scaled += -1 if value.startswith("-") else 1
+    return scaled
+
+
+def parse_many(values: list) -> np.ndarray:
+    """Parse a sequence of strings into an int64 array (saturated, see `parse_int64`)."""
+    return np.fromiter(map(parse_int64, values), dtype=np.int64, count=len(values))
+
+
+def from_float(value: float) -> int:
+    """Nearest scaled value of a float (e.g. of a user input, not of a payload)."""
+    return round(value * SCALE)
+
+
+def to_float(value: int) -> float:
+    """
+    Scaled value -> float. The same float as float(string) of the parsed string:
+    value and SCALE are exact doubles (below 2 ** 53), so the division is correctly rounded.
+    """
+    return value / SCALE
+
+
+def to_string(value: int, decimals: int = None) -> str:
+    """
+    Scaled value -> decimal string, with `decimals` decimals (trailing zeros stripped if None).
+    For order parameters, `decimals` is the precision of the symbol (see `SymbolFilters`).
+    """
+    sign = "-" if value < 0 else ""
+    whole, fraction = divmod(abs(value), SCALE)
+    fraction = f"{fraction:0{DECIMALS}d}"
+    if decimals is None:
+        fraction = fraction.rstrip("0")
+    else:
+        fraction = fraction[:decimals]
+    return f"{sign}{whole}.{fraction}" if fraction else f"{sign}{whole}"
+
+
+def mul(a: int, b: int) -> int:
+    """Product of two scaled values, rounded down to SCALE units (e.g. price * quantity)."""
+    return a * b // SCALE
+
+
+def div(a: int, b: int) -> int:
+    """Quotient of two scaled values, rounded down to SCALE units."""
+    return a * SCALE // b
+
+
+def round_to_step(value: int, step: int, mode: str = "down") -> int:
+    """
+    Round a scaled value to a multiple of a scaled step (tick size / step size).
+
+    Args:
+        mode (str): "down", "up" or "nearest" (halves up).
+    """
+    if mode == "down":
+        return value // step * step
+    if mode == "up":
+        return -(-value // step) * step
+    if mode == "nearest":
+        return (value + step // 2) // step * step
+    raise ValueError(f"Unknown rounding mode: {mode}")
+
+
+def step_decimals(step: int) -> int:
+    """Decimals of a scaled step, e.g. tick size 0.0100 -> 2."""
+    decimals = DECIMALS
+    while decimals and step % 10 == 0:
+        step //= 10
+        decimals -= 1
+    return decimals
@@ -0,0 +1,128 @@
+# crypto_bot/utils/histogram.py
+"""
+Fixed-memory latency histogram with log-linear buckets (HdrHistogram-style):
+every bucket is at most 1/SUB_BUCKET_HALF_COUNT (< 1%) wide relative to its values,
+so percentiles keep that precision over the whole range, and recording is O(1).
+"""
+import numpy as np
+
+
+SUB_BUCKET_BITS = 8
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF_COUNT = SUB_BUCKET_COUNT >> 1
+
+
+def bucket_index(value: int) -> int:
+    """Index of the bucket of a non-negative integer value."""
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    if exponent <= 0:
+        return value
+    return exponent * SUB_BUCKET_HALF_COUNT + (value >> exponent)
+
+
+def bucket_value(index: int) -> int:
+    """Highest value of a bucket."""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    exponent = index // SUB_BUCKET_HALF_COUNT - 1
+    sub_bucket = index - exponent * SUB_BUCKET_HALF_COUNT
+    return ((sub_bucket + 1) << exponent) - 1
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in ns (or any non-negative integer unit).
+    Values above `max_value` are counted in the last bucket.
+
+        histogram = LatencyHistogram()
+        histogram.record(time.perf_counter_ns() - sent)
+        histogram.percentile(99.9)
+    """
+    def __init__(self, max_value: int = 60 * 10**9):
+        """
+        Args:
+            max_value (int): Highest value tracked with full precision (default: 60s in ns).
+        """
+        self.max_value = max_value
+        self.counts = np.zeros(bucket_index(max_value) + 1, dtype=np.int64)
+        self._last_index = len(self.counts) - 1
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value: int) -> None:
+        value = int(value)
+        if value < 0:
+            value = 0
+        index = bucket_index(value)
+        self.counts[index if index < self._last_index else self._last_index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_many(self, values) -> None:
+        """Record an array of values at once."""
+        values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        if not len(values):
+            return
+        for value in (int(values.min()), int(values.max())):
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        exponents = np.maximum(np.frexp(values.astype(np.float64))[1].astype(np.int64) - SUB_BUCKET_BITS, 0)
+        indexes = np.where(exponents > 0, exponents * SUB_BUCKET_HALF_COUNT + (values >> exponents), values)
+        np.add.at(self.counts, np.minimum(indexes, self._last_index), 1)
+        self.count += len(values)
+        self.total += int(values.sum())
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        size = min(len(self.counts), len(other.counts))
+        self.counts[:size] += other.counts[:size]
+        self.counts[-1] += other.counts[size:].sum()
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is None:
+                continue
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def reset(self) -> None:
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def percentile(self, percentile: float) -> int:
+        """
+        Returns:
+            int: The value below which `percentile`% of the recorded values are (bucket precision),
+            or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = max(int(np.ceil(percentile / 100.0 * self.count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(bucket_value(index), self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else None
+
+    def summary(self, percentiles: tuple = (50, 90, 99, 99.9)) -> dict:
+        """
+        Returns:
+            dict: {"count", "min", "mean", "max", "p50", "p90", ...}
+        """
+        summary = {"count": self.count, "min": self.min, "mean": self.mean, "max": self.max}
+        for percentile in percentiles:
+            summary[f"p{percentile:g}"] = self.percentile(percentile)
+        return summary
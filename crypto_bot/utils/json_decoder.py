@@ -0,0 +1,54 @@
+# crypto_bot/utils/json_decoder.py
+
+import json
+
+
+def _orjson_decoder() -> callable:
+    import orjson
+    return orjson.loads
+
+
+def _msgspec_decoder() -> callable:
+    import msgspec
+    return msgspec.json.Decoder().decode
+
+
+def _json_decoder() -> callable:
+    return json.loads
+
+
+JSON_DECODER_BACKENDS = {
+    "orjson": _orjson_decoder,
+    "msgspec": _msgspec_decoder,
+    "json": _json_decoder,
+}
+"""Backend name -> factory returning a `loads`-like callable (accepts str or bytes)."""
+
+DEFAULT_JSON_DECODER_ORDER = ("orjson", "msgspec", "json")
+"""Backends tried in order when no backend is requested."""
+
+
+def get_json_decoder(backend: str = None) -> tuple:
+    """Get a JSON decoding function.
+
+    Args:
+        backend (str): One of "orjson", "msgspec" or "json".
+            If None, the first importable backend of DEFAULT_JSON_DECODER_ORDER is used.
+    Returns:
+        tuple: (backend name, decode function)
+    Raises:
+        ValueError: If the backend is unknown.
+        ImportError: If the requested backend is not installed.
+    """
+    if backend is not None:
+        if backend not in JSON_DECODER_BACKENDS:
+            raise ValueError(f"Unknown json decoder backend: {backend}. "
+                             f"Available: {list(JSON_DECODER_BACKENDS)}")
+        return backend, JSON_DECODER_BACKENDS[backend]()
+
+    for name in DEFAULT_JSON_DECODER_ORDER:
+        try:
+            return name, JSON_DECODER_BACKENDS[name]()
+        except ImportError:
+            continue
+    return "json", json.loads
@@ -0,0 +1,54 @@
+# crypto_bot/utils/log.py
+"""
+Non-blocking logging: the root logger only puts records on a queue, a listener thread formats
+and writes them, so logging calls on the websocket threads never wait for I/O.
+"""
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_FORMAT = "%(asctime)s.%(msecs)03d UTC %(levelname)s %(threadName)s %(name)s: %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_listener: QueueListener = None
+_queue_handler: QueueHandler = None
+
+
+def configure_logging(level: int = logging.INFO, handler: logging.Handler = None) -> QueueListener:
+    """
+    Route the root logger through a queue to `handler` (stderr by default), at `level`.
+    Calling it again only changes the level.
+
+    Returns:
+        QueueListener: The listener thread writing the records (see `stop_logging`).
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    if handler is None:
+        handler = logging.StreamHandler(sys.stderr)
+        formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+        formatter.converter = time.gmtime
+        handler.setFormatter(formatter)
+    records = queue.SimpleQueue()
+    _queue_handler = QueueHandler(records)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the listener thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
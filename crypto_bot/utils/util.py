@@ -38,4 +38,30 @@ def repeat_running_until_keyboard_interrupt(
             break
         
         except Exception as e:
-            time.sleep(interval)
\ No newline at end of file
+            time.sleep(interval)
+
+def run_on_updates_until_keyboard_interrupt(
+        fn: callable,
+        queue,
+        timeout: float = None,
+) -> None:
+    """Call fn every time the queue gets an update, until a keyboard interrupt occurs.
+
+    Args:
+        fn (callable): Called with the (key, value) pair returned by the queue.
+        queue: A queue whose get(timeout) returns the next update, or None on timeout
+            (e.g. crypto_bot.market_events.CoalescingQueue).
+        timeout (float): Wake up interval, so that keyboard interrupts are not delayed
+            while no updates arrive.
+    """
+    while True:
+        try:
+            update = queue.get(timeout=timeout)
+            if update is not None:
+                fn(update)
+
+        except KeyboardInterrupt:
+            break
+
+        except Exception as e:
+            continue
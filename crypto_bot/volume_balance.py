@@ -0,0 +1,389 @@
+# crypto_bot/volume_balance.py
+"""
+Live spot / futures volume balance (um volume / spot volume per time bucket) of every symbol,
+the streaming version of the kline analysis of trb_research.ipynb.
+
+Spot and um volumes are joined on the bucket open time (trade time - trade time % interval)
+as they arrive, from the aggTrade streams and, when subscribed, the closed klines of the
+same interval (which replace the aggregated volume of their bucket, later trades of that
+bucket and side are ignored):
+
+    balance = VolumeBalance(interval="1m", on_alert=print)
+    balance.add_symbols(um_symbols)     # maps e.g. 1000PEPEUSDT to the PEPEUSDT spot volume
+    balance.start()
+    ...
+    balance.history("TRBUSDT")          # dict of NumPy arrays, oldest first
+    balance.table()                     # latest final bucket of every symbol
+
+Buckets live in a fixed ring indexed by open time, so a late trade or kline goes straight
+to its bucket and a missing bucket is just an empty slot: nothing is recomputed.
+A bucket is final `lateness` intervals after it closed, checked on every new bucket of the
+symbol and on a timer (symbols that stopped trading); the log balance of every final
+bucket with volume on both sides updates an exponentially weighted mean / variance, and a
+z-score above `z_threshold` is an alert, published as
+(exchange, um symbol, "um", "volumeBalanceAlert", alert dict).
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+from crypto_bot import market_data_subscriptions
+from crypto_bot.binance.kline_aggregator import INTERVAL_MS
+from crypto_bot.screener import spot_symbol_candidates
+
+
+SPOT = 1
+UM = 2
+"""Bits of the `sides` column: the markets that reported a bucket."""
+
+
+class BalanceSeries:
+    """
+    Spot and um volume buckets of one symbol, in a ring indexed by bucket open time.
+    """
+    def __init__(self, symbol: str, interval_ms: int, capacity: int):
+        self.symbol = symbol
+        self.interval_ms = interval_ms
+        self.capacity = capacity
+        self.open_time = np.full(capacity, -1, dtype=np.int64)
+        self.spot_volume = np.zeros(capacity, dtype=np.float64)
+        self.um_volume = np.zeros(capacity, dtype=np.float64)
+        self.sides = np.zeros(capacity, dtype=np.int8)
+        self.kline_sides = np.zeros(capacity, dtype=np.int8)
+        """Sides whose volume was set by a closed kline: their trades are not added anymore."""
+        self.zscore = np.full(capacity, np.nan, dtype=np.float64)
+
+        self.newest = None
+        """Open time of the newest bucket."""
+        self.final_until = None
+        """Open time of the newest final bucket."""
+        self.mean = 0.0
+        self.variance = 0.0
+        self.samples = 0
+        """Final buckets counted in mean / variance."""
+        self.late_updates = 0
+        """Updates of final buckets (kept in the history, not in the statistics)."""
+        self.dropped = 0
+        """Updates older than the ring."""
+        self.ignored = 0
+        """Trades of a side whose volume was set by a closed kline."""
+
+    def _slot(self, open_time: int) -> int:
+        """Position of the bucket, reset if it held an older bucket. None if older than the ring."""
+        position = (open_time // self.interval_ms) % self.capacity
+        slot_time = self.open_time[position]
+        if slot_time != open_time:
+            if slot_time > open_time:
+                return None
+            self.open_time[position] = open_time
+            self.spot_volume[position] = 0.0
+            self.um_volume[position] = 0.0
+            self.sides[position] = 0
+            self.kline_sides[position] = 0
+            self.zscore[position] = np.nan
+        return position
+
+    def add(self, side: int, open_time: int, volume: float, replace: bool = False) -> bool:
+        """
+        Add (or with replace, set) the volume of one side to a bucket.
+        Once set by replace (a closed kline), the side of the bucket ignores added volumes.
+
+        Returns:
+            bool: False if the bucket is older than the ring or the volume was ignored.
+        """
+        if self.newest is not None and open_time <= self.newest - self.capacity * self.interval_ms:
+            self.dropped += 1
+            return False
+        position = self._slot(open_time)
+        if position is None:
+            self.dropped += 1
+            return False
+        column = self.spot_volume if side == SPOT else self.um_volume
+        if replace:
+            column[position] = volume
+            self.kline_sides[position] |= side
+        elif self.kline_sides[position] & side:
+            self.ignored += 1
+            return False
+        else:
+            column[position] += volume
+        self.sides[position] |= side
+        if self.final_until is not None and open_time <= self.final_until:
+            self.late_updates += 1
+        if self.newest is None or open_time > self.newest:
+            self.newest = open_time
+        return True
+
+    def finalize(self, until: int, span: int) -> list:
+        """
+        Make final the buckets up to `until` (open time), in order, and update the statistics.
+
+        Returns:
+            list: [(open time, balance, z-score), ...] of the buckets made final with a balance.
+        """
+        interval_ms = self.interval_ms
+        # At most the buckets still in the ring
+        start = until - (self.capacity - 1) * interval_ms
+        if self.final_until is not None:
+            start = max(start, self.final_until + interval_ms)
+        alpha = 2.0 / (span + 1)
+        finalized = []
+        for open_time in range(start, until + 1, interval_ms):
+            position = (open_time // interval_ms) % self.capacity
+            if self.open_time[position] != open_time or self.sides[position] != SPOT | UM:
+                continue
+            spot_volume = float(self.spot_volume[position])
+            um_volume = float(self.um_volume[position])
+            if spot_volume <= 0 or um_volume <= 0:
+                continue
+            balance = um_volume / spot_volume
+            value = math.log(balance)
+            if self.samples:
+                deviation = value - self.mean
+                zscore = deviation / math.sqrt(self.variance) if self.variance > 0 else 0.0
+                self.mean += alpha * deviation
+                self.variance = (1 - alpha) * (self.variance + alpha * deviation * deviation)
+            else:
+                zscore = 0.0
+                self.mean = value
+            self.samples += 1
+            self.zscore[position] = zscore
+            finalized.append((open_time, balance, zscore))
+        self.final_until = until
+        return finalized
+
+    def history(self, k: int = None) -> dict:
+        """
+        The last k buckets up to the newest (all the ring if k is None), oldest first.
+        Missing buckets have NaN volumes.
+
+        Returns:
+            dict: "open_time", "spot_volume", "um_volume", "balance", "zscore", "final" -> NumPy array
+        """
+        if self.newest is None:
+            k = 0
+        k = self.capacity if k is None else min(k, self.capacity)
+        interval_ms = self.interval_ms
+        open_time = (self.newest if k else 0) - np.arange(k - 1, -1, -1, dtype=np.int64) * interval_ms
+        positions = (open_time // interval_ms) % self.capacity
+        present = self.open_time[positions] == open_time
+        sides = np.where(present, self.sides[positions], 0)
+        spot_volume = np.where(sides & SPOT, self.spot_volume[positions], np.nan)
+        um_volume = np.where(sides & UM, self.um_volume[positions], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            balance = um_volume / spot_volume
+        return {
+            "open_time": open_time,
+            "spot_volume": spot_volume,
+            "um_volume": um_volume,
+            "balance": balance,
+            "zscore": np.where(present, self.zscore[positions], np.nan),
+            "final": open_time <= (self.final_until if self.final_until is not None else -1),
+        }
+
+
+class VolumeBalance:
+    """
+    Volume balance buckets, statistics and divergence alerts of every symbol, keyed by um symbol.
+    """
+    def __init__(self,
+                 interval: str = "1m",
+                 capacity: int = 1440,
+                 lateness: int = 2,
+                 span: int = 60,
+                 z_threshold: float = 4.0,
+                 min_samples: int = 30,
+                 on_alert: callable = None,
+                 exchange: str = "binance",
+                 finalize_every: float = 1.0):
+        """
+        Args:
+            interval (str): Bucket interval, a key of INTERVAL_MS.
+            capacity (int): Buckets kept per symbol.
+            lateness (int): Intervals a closed bucket still accepts late data before it is final.
+            span (int): Span, in buckets, of the exponentially weighted mean / variance of the log balance.
+            z_threshold (float): Absolute z-score of the log balance of a final bucket that raises an alert.
+            min_samples (int): Final buckets needed before alerting.
+            on_alert (callable): Called with every alert dict, in addition to its publication
+                (on the websocket thread, or on the finalize thread for symbols without new trades).
+            finalize_every (float): Seconds between two finalizations on the wall clock (see `finalize_due`),
+                None to finalize only when a symbol gets a new bucket.
+        """
+        if interval not in INTERVAL_MS:
+            raise ValueError(f"Unsupported interval: {interval}. Available: {list(INTERVAL_MS)}")
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.capacity = capacity
+        self.lateness = lateness
+        self.span = span
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.on_alert = on_alert
+        self.exchange = exchange
+
+        self.series = {}
+        """um symbol -> BalanceSeries"""
+        self.spot_symbols = {}
+        """spot symbol -> (um symbol, um contract multiplier), see `add_symbols`"""
+        self.finalize_every = finalize_every
+        self.alert_count = 0
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_symbols(self, um_symbols: list) -> None:
+        """
+        Map spot symbols to um symbols quoting a multiple of the asset (e.g. PEPEUSDT -> 1000PEPEUSDT).
+        A um symbol of the same name always wins (BTCUSDT -> the perpetual, not BTCUSDT_250328),
+        otherwise the first um symbol added is kept. Symbols not added are matched by name.
+        """
+        for um_symbol in um_symbols:
+            for spot_symbol, multiplier in spot_symbol_candidates(um_symbol):
+                if spot_symbol not in self.spot_symbols or spot_symbol == um_symbol:
+                    self.spot_symbols[spot_symbol] = (um_symbol, multiplier)
+
+    def start(self) -> None:
+        """
+        Follow the aggTrades (live and backfilled) and the closed klines of the interval,
+        and finalize the buckets every `finalize_every` seconds.
+        """
+        if self.finalize_every and self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="volume-balance-finalize", daemon=True)
+            self._thread.start()
+        if not self._subscriptions:
+            subscribe = market_data_subscriptions.subscribe
+            self._subscriptions = [
+                subscribe(self._on_agg_trade, self.exchange, None, None, "aggTrade"),
+                subscribe(self._on_agg_trades, self.exchange, None, None, "aggTradeBackfill"),
+                subscribe(self._on_kline, self.exchange, None, None, f"kline__{self.interval}"),
+            ]
+
+    def stop(self) -> None:
+        for subscription in self._subscriptions:
+            market_data_subscriptions.unsubscribe(subscription)
+        self._subscriptions = []
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.finalize_every):
+            try:
+                self.finalize_due()
+            except Exception as e:
+                print(f"Volume balance finalize error: {e!r}")
+
+    def finalize_due(self, now: int = None) -> None:
+        """
+        Finalize the buckets of every symbol that closed `lateness` intervals before `now`
+        (ms, defaults to the wall clock), also for symbols that stopped receiving trades.
+        """
+        if now is None:
+            now = int(time.time() * 1000)
+        until = now - now % self.interval_ms - (self.lateness + 1) * self.interval_ms
+        with self._lock:
+            for series in list(self.series.values()):
+                self._finalize(series, until)
+
+    def _on_agg_trade(self, exchange, symbol, market_type, event_type, agg_trade) -> None:
+        self.add_volume(market_type, symbol, agg_trade.trade_time, agg_trade.quantity)
+
+    def _on_agg_trades(self, exchange, symbol, market_type, event_type, agg_trades) -> None:
+        for agg_trade in agg_trades:
+            self.add_volume(market_type, symbol, agg_trade.trade_time, agg_trade.quantity)
+
+    def _on_kline(self, exchange, symbol, market_type, event_type, kline) -> None:
+        if kline.is_closed:
+            self.add_volume(market_type, symbol, kline.start_time, kline.volume, replace=True)
+
+    def get_series(self, um_symbol: str) -> BalanceSeries:
+        return self.series.get(um_symbol)
+
+    def add_volume(self, market: str, symbol: str, time: int, volume: float, replace: bool = False) -> None:
+        """
+        Add the volume (base asset) of a trade, or with replace set the volume of a closed kline,
+        to the bucket of `time` (ms). Spot volumes are converted to um contracts.
+        """
+        if market == "spot":
+            um_symbol, multiplier = self.spot_symbols.get(symbol, (symbol, 1))
+            side = SPOT
+            # In um contracts (e.g. 1000PEPEUSDT contracts are 1000 PEPE)
+            volume /= multiplier
+        else:
+            um_symbol = symbol
+            side = UM
+
+        interval_ms = self.interval_ms
+        open_time = time - time % interval_ms
+        with self._lock:
+            series = self.series.get(um_symbol)
+            if series is None:
+                series = self.series[um_symbol] = BalanceSeries(um_symbol, interval_ms, self.capacity)
+            newest = series.newest
+            if not series.add(side, open_time, volume, replace):
+                return
+            if newest is not None and open_time > newest:
+                self._finalize(series, open_time - (self.lateness + 1) * interval_ms)
+
+    def _finalize(self, series: BalanceSeries, until: int) -> None:
+        if series.final_until is not None and until <= series.final_until:
+            return
+        for open_time, balance, zscore in series.finalize(until, self.span):
+            if series.samples >= self.min_samples and abs(zscore) >= self.z_threshold:
+                self._alert({
+                    "symbol": series.symbol,
+                    "interval": self.interval,
+                    "open_time": open_time,
+                    "balance": balance,
+                    "zscore": zscore,
+                    "mean_balance": math.exp(series.mean),
+                })
+
+    def _alert(self, alert: dict) -> None:
+        self.alert_count += 1
+        if self.on_alert is not None:
+            self.on_alert(alert)
+        market_data_subscriptions.publish(self.exchange, alert["symbol"], "um", "volumeBalanceAlert", alert)
+
+    def history(self, um_symbol: str, k: int = None) -> dict:
+        """
+        Returns:
+            dict: column -> NumPy array (see `BalanceSeries.history`), or None for an unknown symbol.
+        """
+        series = self.series.get(um_symbol)
+        return series.history(k) if series else None
+
+    def table(self) -> dict:
+        """
+        The newest final bucket of every symbol, to scan all symbols at once.
+
+        Returns:
+            dict: "symbol", "open_time", "balance", "zscore", "mean_balance", "samples" -> NumPy array
+        """
+        symbols = list(self.series)
+        rows = []
+        for symbol in symbols:
+            series = self.series[symbol]
+            open_time = series.final_until if series.final_until is not None else -1
+            position = (open_time // self.interval_ms) % self.capacity
+            if open_time >= 0 and series.open_time[position] == open_time and series.sides[position] == SPOT | UM:
+                spot_volume = series.spot_volume[position]
+                balance = series.um_volume[position] / spot_volume if spot_volume > 0 else np.nan
+                zscore = series.zscore[position]
+            else:
+                balance = zscore = np.nan
+            rows.append((open_time, balance, zscore, math.exp(series.mean) if series.samples else np.nan, series.samples))
+        columns = list(zip(*rows)) if rows else [(), (), (), (), ()]
+        return {
+            "symbol": np.array(symbols, dtype=object),
+            "open_time": np.array(columns[0], dtype=np.int64),
+            "balance": np.array(columns[1], dtype=np.float64),
+            "zscore": np.array(columns[2], dtype=np.float64),
+            "mean_balance": np.array(columns[3], dtype=np.float64),
+            "samples": np.array(columns[4], dtype=np.int64),
+        }
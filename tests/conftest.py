@@ -0,0 +1,22 @@
+# tests/conftest.py
+import json
+import os
+import time
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixture(name: str):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def wait_until(condition: callable, timeout: float = 2.0) -> bool:
+    """Poll `condition` until it is true (background threads of the code under test)."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
@@ -0,0 +1,54 @@
+# tests/test_account_state.py
+"""
+UM futures user data events without order reports, fed to the message handler as frames.
+"""
+import json
+
+import pytest
+
+from crypto_bot import market_data_subscriptions
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+
+
+@pytest.fixture
+def handler():
+    return BinanceWSMessageHandler()
+
+
+def send(handler, event):
+    handler.get_on_um_message_handler()(None, json.dumps({"stream": "listen-key", "data": event}).encode())
+
+
+def test_account_config_update(handler):
+    send(handler, {"e": "ACCOUNT_CONFIG_UPDATE", "E": 1, "T": 1, "ac": {"s": "BTCUSDT", "l": 25}})
+    send(handler, {"e": "ACCOUNT_CONFIG_UPDATE", "E": 2, "T": 2, "ai": {"j": True}})
+
+    assert handler.account.leverage == {"BTCUSDT": 25}
+    assert handler.account.multi_assets_mode is True
+    assert handler.account.last_event_time["um"] == 2
+
+
+def test_margin_call(handler, capsys):
+    event = {"e": "MARGIN_CALL", "E": 3, "cw": "3.16812045", "p": [
+        {"s": "ETHUSDT", "ps": "LONG", "pa": "1.327", "mt": "CROSSED", "iw": "0", "mp": "187.17127",
+         "up": "-1.166074", "mm": "1.614445"},
+    ]}
+    send(handler, event)
+
+    position = handler.account.positions["ETHUSDT"]["LONG"]
+    assert (position.margin_type, position.unrealized_pnl) == ("CROSSED", -1.166074)
+    assert handler.account.margin_call == event
+    assert "ETHUSDT" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("event_type", ["STRATEGY_UPDATE", "GRID_UPDATE", "CONDITIONAL_ORDER_TRIGGER_REJECT"])
+def test_other_user_events_are_published(handler, event_type):
+    received = []
+    token = market_data_subscriptions.subscribe(
+        lambda exchange, symbol, market_type, event_type, data: received.append(data),
+        "binance", None, "um", event_type)
+    try:
+        send(handler, {"e": event_type, "E": 4, "T": 4})
+    finally:
+        market_data_subscriptions.unsubscribe(token)
+    assert received == [{"e": event_type, "E": 4, "T": 4}]
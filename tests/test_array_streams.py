@@ -0,0 +1,51 @@
+# tests/test_array_streams.py
+"""
+Array stream frames: one batch update of the stores, per-symbol mark price entries kept in `market_data`.
+"""
+import json
+
+from crypto_bot import get_mark_price_store, market_data, market_data_subscriptions
+from crypto_bot.binance.events import MarkPriceUpdate
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+
+
+def mark_price(symbol, price, event_time):
+    return {"e": "markPriceUpdate", "E": event_time, "s": symbol, "p": price, "i": price, "P": price,
+            "r": "0.00010000", "T": event_time + 3600000}
+
+
+def test_mark_price_frame_keeps_per_symbol_entries():
+    handler = BinanceWSMessageHandler()
+    on_message = handler.get_on_um_message_handler()
+    frame = [mark_price("ARRAYAUSDT", "10.5", 1000), mark_price("ARRAYBUSDT", "20.25", 1000)]
+    received = []
+    token = market_data_subscriptions.subscribe(
+        lambda exchange, symbol, market_type, event_type, data: received.append((symbol, event_type)),
+        "binance", None, "um", None)
+    try:
+        on_message(None, json.dumps({"stream": "!markPrice@arr", "data": frame}).encode())
+    finally:
+        market_data_subscriptions.unsubscribe(token)
+
+    assert received == [(None, "markPriceBatch")]
+    entries = market_data["binance"]["ARRAYBUSDT"]["um"]
+    assert (entries["markPrice"], entries["fundingRate"], entries["nextFundingTime"]) == (20.25, 0.0001, 3601000)
+    assert entries["markPriceUpdate"] == MarkPriceUpdate.from_message(frame[1])
+    assert get_mark_price_store("binance", "um").get("ARRAYAUSDT")["markPrice"] == 10.5
+
+
+def test_empty_array_frames_are_ignored():
+    handler = BinanceWSMessageHandler()
+    on_message = handler.get_on_um_message_handler()
+    received = []
+    token = market_data_subscriptions.subscribe(
+        lambda exchange, symbol, market_type, event_type, data: received.append(event_type),
+        "binance", None, "um", None)
+    try:
+        for stream_name in ("!markPrice@arr", "!ticker@arr", "!miniTicker@arr"):
+            on_message(None, json.dumps({"stream": stream_name, "data": []}).encode())
+    finally:
+        market_data_subscriptions.unsubscribe(token)
+
+    assert received == []
+    assert get_mark_price_store("binance", "um").update_from_messages([]).dtype == "int64"
@@ -0,0 +1,165 @@
+# tests/test_async_websocket_client.py
+"""
+AsyncBinanceWebsocketClient against the local websocket stand-in (no network).
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from crypto_bot.binance.async_websocket_client import AsyncBinanceWebsocketClient
+from crypto_bot.binance.local_websocket_server import LocalBinanceWebsocketServer
+
+
+AGG_TRADE = {
+    "e": "aggTrade", "E": 1700000000000, "s": "BTCUSDT", "a": 1, "p": "100.0", "q": "0.5",
+    "f": 1, "l": 1, "T": 1700000000000, "m": False,
+}
+
+
+async def wait_for(condition: callable, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def test_subscribe_receive_unsubscribe():
+    async def scenario():
+        server = LocalBinanceWebsocketServer()
+        await server.start()
+        frames = []
+        threads = set()
+
+        def on_message(client, frame):
+            threads.add(threading.get_ident())
+            frames.append(json.loads(frame))
+
+        client = AsyncBinanceWebsocketClient(server.url, on_message)
+        await client.connect()
+        await client.subscribe(["btcusdt@aggTrade", "ethusdt@aggTrade"])
+        await wait_for(lambda: len(frames) == 1)  # SUBSCRIBE response
+        assert frames[0] == {"result": None, "id": 1}
+
+        assert await server.publish("btcusdt@aggTrade", AGG_TRADE) == 1
+        await wait_for(lambda: len(frames) == 2)
+        assert frames[1] == {"stream": "btcusdt@aggTrade", "data": AGG_TRADE}
+
+        await client.unsubscribe("ethusdt@aggTrade")
+        await client.list_subscribe()
+        await wait_for(lambda: len(frames) == 4)
+        assert frames[3]["result"] == ["btcusdt@aggTrade"]
+        assert await server.publish("ethusdt@aggTrade", AGG_TRADE) == 0
+
+        await client.close()
+        await server.stop()
+        # Frames are delivered on the event loop thread
+        assert threads == {threading.get_ident()}
+
+    run(scenario())
+
+
+def test_reconnect_resubscribes():
+    async def scenario():
+        server = LocalBinanceWebsocketServer()
+        await server.start()
+        frames = []
+        connects = []
+        client = AsyncBinanceWebsocketClient(
+            server.url, lambda client, frame: frames.append(json.loads(frame)),
+            min_reconnect_delay=0.01, on_connect=connects.append,
+        )
+        await client.connect()
+        await client.subscribe("btcusdt@aggTrade")
+        await wait_for(lambda: any("btcusdt@aggTrade" in s for s in server.subscriptions.values()))
+
+        await server.drop_connections()
+        await wait_for(lambda: len(connects) == 2 and client.is_connected)
+        assert client.reconnect_count == 1
+        await wait_for(lambda: [r["method"] for r in server.requests] == ["SUBSCRIBE", "SUBSCRIBE"])
+        assert server.requests[1]["params"] == ["btcusdt@aggTrade"]
+
+        await wait_for(lambda: any("btcusdt@aggTrade" in s for s in server.subscriptions.values()))
+        await server.publish("btcusdt@aggTrade", AGG_TRADE)
+        await wait_for(lambda: frames and frames[-1].get("stream") == "btcusdt@aggTrade")
+
+        await client.close()
+        await server.stop()
+
+    run(scenario())
+
+
+def test_close_interrupts_reconnect_backoff():
+    async def scenario():
+        server = LocalBinanceWebsocketServer()
+        await server.start()
+        client = AsyncBinanceWebsocketClient(server.url, lambda client, frame: None,
+                                             min_reconnect_delay=30.0)
+        await client.connect()
+        await server.drop_connections()
+        await wait_for(lambda: client.reconnect_count == 1)
+
+        start = time.monotonic()
+        await client.close()
+        assert time.monotonic() - start < 1.0
+        assert not client.is_connected
+        await server.stop()
+
+    run(scenario())
+
+
+def test_connect_timeout():
+    async def scenario():
+        # Accepts TCP connections but never answers the websocket handshake
+        writers = []
+        server = await asyncio.start_server(lambda reader, writer: writers.append(writer), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AsyncBinanceWebsocketClient(f"ws://127.0.0.1:{port}", lambda client, frame: None,
+                                             connect_timeout=0.2)
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await client.connect()
+        assert time.monotonic() - start < 2.0
+        assert client._run_task is None
+
+        for writer in writers:
+            writer.close()
+        server.close()
+        await server.wait_closed()
+
+    run(scenario())
+
+
+def test_frames_reach_message_handler():
+    from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+    from crypto_bot import market_data_subscriptions
+
+    async def scenario():
+        server = LocalBinanceWebsocketServer()
+        await server.start()
+        handler = BinanceWSMessageHandler()
+        received = []
+        token = market_data_subscriptions.subscribe(
+            lambda exchange, symbol, market_type, event_type, data: received.append(data),
+            "binance", "BTCUSDT", "um", "aggTrade",
+        )
+
+        client = AsyncBinanceWebsocketClient(server.url, handler.get_on_um_message_handler())
+        await client.connect()
+        await client.subscribe("btcusdt@aggTrade")
+        await wait_for(lambda: any("btcusdt@aggTrade" in s for s in server.subscriptions.values()))
+        await server.publish("btcusdt@aggTrade", AGG_TRADE)
+        await wait_for(lambda: received)
+        assert received[0].agg_trade_id == 1 and received[0].price == 100.0
+
+        market_data_subscriptions.unsubscribe(token)
+        await client.close()
+        await server.stop()
+
+    run(scenario())
@@ -0,0 +1,30 @@
+# tests/test_binance_client.py
+"""
+Headless authentication warnings go through logging, and the client leaves logging alone by default.
+"""
+import logging
+
+from crypto_bot.binance import config as config_module
+from crypto_bot.binance.binance_client import BinanceClient
+from crypto_bot.binance.config import BinanceConfig
+
+
+def test_headless_missing_credentials_are_logged(monkeypatch, caplog, capsys):
+    monkeypatch.setattr(config_module, "load_dotenv", lambda: None)
+    monkeypatch.delenv(config_module.API_KEY_VARIABLE, raising=False)
+    monkeypatch.delenv(config_module.SECRET_KEY_VARIABLE, raising=False)
+    # Only the authentication step, without connecting anything
+    client = BinanceClient.__new__(BinanceClient)
+    client.config = BinanceConfig(headless=True)
+
+    with caplog.at_level(logging.WARNING, logger="crypto_bot.binance.binance_client"):
+        client._auth_and_get_listen_key()
+
+    assert [record.getMessage() for record in caplog.records] == \
+        ["No api key or secret key found, continuing without authentication."]
+    assert capsys.readouterr().out == ""
+
+
+def test_logging_is_opt_in():
+    assert BinanceConfig().log_level is None
+    assert BinanceConfig.from_env(dotenv=False, log_level=logging.INFO).log_level == logging.INFO
@@ -0,0 +1,110 @@
+# tests/test_connection_supervisor.py
+"""
+ConnectionSupervisor: quiet connections are pinged and kept while their keepalive answers,
+dead ones are replaced.
+"""
+from types import SimpleNamespace
+
+from crypto_bot.binance.connection_supervisor import ConnectionSupervisor
+from crypto_bot.binance.rest_scheduler import request_weight
+
+
+class ThreadClient:
+    """Stands in for a connector client: `ping` is answered by a pong when `alive`."""
+    def __init__(self, on_pong, alive=True):
+        self.on_pong = on_pong
+        self.alive = alive
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        if self.alive:
+            self.on_pong(self)
+
+
+class StreamManager:
+    def __init__(self, supervisor, alive=True):
+        self.supervisor = supervisor
+        self.alive = alive
+        self.reconnects = 0
+        self.connections = [SimpleNamespace(index=0, streams={"illiquidusdt@aggTrade"}, client=self._client())]
+
+    def _client(self):
+        on_message = self.supervisor.instrument("um", lambda client, message: None)
+        client = ThreadClient(on_message.on_keepalive, self.alive)
+        self.supervisor.attach(client, on_message)
+        return client
+
+    def reconnect(self, connection):
+        self.reconnects += 1
+        connection.client = self._client()
+
+
+def advance(supervisor, client, seconds):
+    """Move the connection's clock `seconds` into the past, then check it."""
+    health = supervisor.health(client)
+    health.last_frame -= seconds
+    health.last_keepalive -= seconds
+    if health.last_ping is not None:
+        health.last_ping -= seconds
+    supervisor.check()
+
+
+def test_quiet_connection_with_keepalive_is_kept():
+    supervisor = ConnectionSupervisor(stale_after=30, ping_after=10, min_reconnect_delay=0)
+    stream_manager = StreamManager(supervisor)
+    supervisor.add_stream_manager("um", stream_manager)
+    client = stream_manager.connections[0].client
+
+    advance(supervisor, client, 15)
+    assert client.pings == 1
+    supervisor.check()
+    assert client.pings == 1
+
+    # Minutes without frames: pinged every ping_after seconds, answered, never replaced
+    for _ in range(12):
+        advance(supervisor, client, 10)
+    assert client.pings == 13
+    assert stream_manager.reconnects == 0
+
+
+def test_dead_connection_is_replaced():
+    supervisor = ConnectionSupervisor(stale_after=30, ping_after=10, min_reconnect_delay=0)
+    stream_manager = StreamManager(supervisor, alive=False)
+    supervisor.add_stream_manager("um", stream_manager)
+    client = stream_manager.connections[0].client
+
+    advance(supervisor, client, 15)
+    assert client.pings == 1 and stream_manager.reconnects == 0
+
+    advance(supervisor, client, 10)
+    assert client.pings == 2 and stream_manager.reconnects == 0
+
+    advance(supervisor, client, 10)
+    assert stream_manager.reconnects == 1
+    assert supervisor.reconnect_count == 1
+    assert stream_manager.connections[0].client is not client
+
+
+def test_failures_carry_over_to_the_new_connection():
+    supervisor = ConnectionSupervisor(stale_after=30, ping_after=10, min_reconnect_delay=0)
+    stream_manager = StreamManager(supervisor, alive=False)
+    supervisor.add_stream_manager("um", stream_manager)
+    connection = stream_manager.connections[0]
+
+    # Replacements that never receive a frame back off further and further
+    for failures in (1, 2):
+        advance(supervisor, connection.client, 60)
+        assert stream_manager.reconnects == failures
+        assert supervisor.health(connection.client).failures == failures
+
+    # A connection that received frames hands over a clean slate
+    supervisor.health(connection.client).frames += 1
+    advance(supervisor, connection.client, 60)
+    assert stream_manager.reconnects == 3
+    assert supervisor.health(connection.client).failures == 0
+
+
+def test_agg_trades_weight():
+    assert request_weight("um", "agg_trades", {"symbol": "BTCUSDT", "limit": 1000}) == 20
+    assert request_weight("spot", "agg_trades", {"symbol": "BTCUSDT"}) == 4
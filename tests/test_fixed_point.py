@@ -0,0 +1,47 @@
+# tests/test_fixed_point.py
+"""
+Fixed-point parsing and the fixed columns of the book ticker store, up to values beyond int64.
+"""
+import json
+
+from crypto_bot import get_book_ticker_store
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+from crypto_bot.binance.symbol_info import SymbolTable
+from crypto_bot.utils import fixed_point
+
+
+def test_parse():
+    assert fixed_point.parse("25.35190000") == 2535190000
+    assert fixed_point.to_string(fixed_point.parse("64123.456")) == "64123.456"
+    # Exact beyond the float path, saturated to int64 beyond ~9.2e10
+    assert fixed_point.parse_int64("12345678.12345678") == 1234567812345678
+    assert fixed_point.parse_int64("100000000000") == fixed_point.INT64_MAX
+    assert fixed_point.parse_int64("-100000000000") == fixed_point.INT64_MIN
+    assert fixed_point.parse_many(["1", "1000000000000"]).tolist() == [fixed_point.SCALE, fixed_point.INT64_MAX]
+
+
+def test_huge_book_ticker_quantity_does_not_raise():
+    handler = BinanceWSMessageHandler()
+    frame = {"stream": "hugeusdt@bookTicker", "data": {
+        "e": "bookTicker", "u": 1, "E": 2, "T": 3, "s": "HUGEUSDT",
+        "b": "0.00000120", "B": "100000000000", "a": "0.00000121", "A": "250000000000.5",
+    }}
+    handler.get_on_um_message_handler()(None, json.dumps(frame).encode())
+
+    store = get_book_ticker_store("binance", "um")
+    row = store.index["HUGEUSDT"]
+    assert (store.bidQty[row], store.askQty[row]) == (1e11, 250000000000.5)
+    assert store.bidQtyFixed[row] == store.askQtyFixed[row] == fixed_point.INT64_MAX
+    assert (store.bidFixed[row], store.askFixed[row]) == (120, 121)
+
+    store.update_fixed("HUGEUSDT", 2, 120, 10 ** 20, 121, 1)
+    assert store.bidQtyFixed[row] == fixed_point.INT64_MAX and store.bidQty[row] == 1e12
+
+
+def test_symbol_table_with_huge_limits():
+    table = SymbolTable("spot")
+    table.update({"symbols": [{"symbol": "HUGEUSDT", "status": "TRADING", "filters": [
+        {"filterType": "PRICE_FILTER", "tickSize": "0.00000001", "maxPrice": "1000"},
+        {"filterType": "LOT_SIZE", "stepSize": "1", "maxQty": "9222449000000"},
+    ]}]})
+    assert table.filters("HUGEUSDT").max_qty == fixed_point.INT64_MAX
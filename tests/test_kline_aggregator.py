@@ -0,0 +1,77 @@
+# tests/test_kline_aggregator.py
+from crypto_bot.binance.events import AggTrade, Kline
+from crypto_bot.binance.kline_aggregator import KlineAggregator
+
+
+MINUTE = 60_000
+T0 = 1_700_000_040_000  # 1m boundary
+
+
+def agg_trade(trade_time: int, price: float, quantity: float = 1.0, trade_id: int = 1, is_buyer_maker: bool = False):
+    return AggTrade(event_time=trade_time, symbol="BTCUSDT", agg_trade_id=trade_id, price=price,
+                    quantity=quantity, first_trade_id=trade_id, last_trade_id=trade_id,
+                    trade_time=trade_time, is_buyer_maker=is_buyer_maker)
+
+
+def closed_kline(start_time: int, open: float, high: float, low: float, close: float, volume: float = 3.0):
+    return Kline(event_time=start_time + MINUTE, symbol="BTCUSDT", start_time=start_time,
+                 close_time=start_time + MINUTE - 1, interval="1m", first_trade_id=1, last_trade_id=3,
+                 open=open, close=close, high=high, low=low, volume=volume, trade_count=3, is_closed=True,
+                 quote_volume=volume * close, taker_buy_volume=1.0, taker_buy_quote_volume=close)
+
+
+def test_trades_build_bars():
+    aggregator = KlineAggregator(intervals=["1m"])
+    for i, (offset, price) in enumerate([(0, 100.0), (10_000, 102.0), (20_000, 99.0), (MINUTE, 101.0)]):
+        aggregator.on_agg_trade("um", agg_trade(T0 + offset, price, trade_id=i + 1, is_buyer_maker=bool(i % 2)))
+
+    bars = aggregator.last_bars("um", "BTCUSDT", "1m")
+    assert list(bars["open_time"]) == [T0]
+    assert (bars["open"][0], bars["high"][0], bars["low"][0], bars["close"][0]) == (100.0, 102.0, 99.0, 99.0)
+    assert bars["volume"][0] == 3.0 and bars["taker_buy_volume"][0] == 2.0 and bars["trade_count"][0] == 3
+    assert aggregator.get_series("um", "BTCUSDT", "1m").current()["open"] == 101.0
+
+
+def test_trades_after_kline_close_replace_the_seed():
+    aggregator = KlineAggregator(intervals=["1m"])
+    aggregator.on_agg_trade("um", agg_trade(T0 + 1_000, 99.0))
+    # The exchange closes the bar before any trade of the next minute
+    assert aggregator.on_kline("um", closed_kline(T0, 99.0, 101.0, 98.0, 100.0))
+    seed = aggregator.get_series("um", "BTCUSDT", "1m").current()
+    assert seed["open_time"] == T0 + MINUTE and seed["trade_count"] == 0
+
+    aggregator.on_agg_trade("um", agg_trade(T0 + MINUTE + 1_000, 105.0, trade_id=2))
+    aggregator.on_agg_trade("um", agg_trade(T0 + MINUTE + 2_000, 106.0, trade_id=3))
+    current = aggregator.get_series("um", "BTCUSDT", "1m").current()
+    assert (current["open"], current["high"], current["low"], current["close"]) == (105.0, 106.0, 105.0, 106.0)
+    assert current["volume"] == 2.0 and current["trade_count"] == 2
+
+    aggregator.on_agg_trade("um", agg_trade(T0 + 2 * MINUTE, 104.0, trade_id=4))
+    bars = aggregator.last_bars("um", "BTCUSDT", "1m")
+    assert list(bars["open_time"]) == [T0, T0 + MINUTE]
+    assert list(bars["close"]) == [100.0, 106.0]
+    assert list(bars["open"]) == [99.0, 105.0]
+    assert list(bars["low"]) == [98.0, 105.0]
+
+
+def test_seed_without_trades_closes_flat():
+    aggregator = KlineAggregator(intervals=["1m"])
+    aggregator.on_agg_trade("um", agg_trade(T0, 99.0))
+    aggregator.on_kline("um", closed_kline(T0, 99.0, 101.0, 98.0, 100.0))
+    aggregator.on_agg_trade("um", agg_trade(T0 + 2 * MINUTE, 103.0, trade_id=2))
+
+    bars = aggregator.last_bars("um", "BTCUSDT", "1m")
+    assert list(bars["open_time"]) == [T0, T0 + MINUTE]
+    assert (bars["open"][1], bars["high"][1], bars["low"][1], bars["close"][1]) == (100.0, 100.0, 100.0, 100.0)
+    assert bars["volume"][1] == 0.0
+
+
+def test_kline_replaces_closed_bar():
+    aggregator = KlineAggregator(intervals=["1m"])
+    aggregator.on_agg_trade("um", agg_trade(T0, 99.0))
+    aggregator.on_agg_trade("um", agg_trade(T0 + MINUTE, 100.0, trade_id=2))
+    assert aggregator.on_kline("um", closed_kline(T0, 98.5, 101.0, 98.0, 99.5, volume=7.0))
+    bars = aggregator.last_bars("um", "BTCUSDT", "1m")
+    assert (bars["open"][0], bars["close"][0], bars["volume"][0]) == (98.5, 99.5, 7.0)
+    # Too old for the ring
+    assert not aggregator.on_kline("um", closed_kline(T0 - 10 * MINUTE, 1.0, 1.0, 1.0, 1.0))
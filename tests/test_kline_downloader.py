@@ -0,0 +1,131 @@
+# tests/test_kline_downloader.py
+"""
+KlineDownloader paging and day cache, against the local klines stand-in.
+"""
+import importlib.util
+import time
+
+import numpy as np
+import pytest
+
+from binance.spot import Spot
+from binance.um_futures import UMFutures
+
+from crypto_bot.binance.kline_downloader import DAY_MS, KlineDownloader, decode_klines
+from crypto_bot.binance.local_kline_server import LocalKlineServer, kline_row
+from crypto_bot.binance.rest_scheduler import klines_request_weight, request_weight
+
+
+DAY = 19_700 * DAY_MS  # 2023-12-08 00:00 UTC
+MINUTE = 60_000
+
+
+@pytest.fixture
+def server():
+    server = LocalKlineServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+def make_downloader(server, cache_directory, **kwargs) -> KlineDownloader:
+    return KlineDownloader(
+        fetchers={"spot": Spot(base_url=server.url).klines, "um": UMFutures(base_url=server.url).klines},
+        cache_directory=cache_directory,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("market, limits", [("spot", [1000, 1000, 880]), ("um", [1500, 1380])])
+def test_pages_cover_range(server, tmp_path, market, limits):
+    downloader = make_downloader(server, str(tmp_path))
+    klines = downloader.download(market, "TRBUSDT", "1m", DAY, DAY + 2 * DAY_MS - 1)
+
+    assert sorted(int(params["limit"]) for _, params in server.requests) == sorted(limits)
+    assert len(limits) == downloader.requests_sent
+    assert len(klines["open_time"]) == 2 * 1440
+    assert np.all(np.diff(klines["open_time"]) == MINUTE)
+    expected = decode_klines([kline_row("TRBUSDT", "1m", DAY + 1000 * MINUTE)])
+    row = 1000
+    for column, values in expected.items():
+        assert klines[column].dtype == values.dtype
+        assert klines[column][row] == values[0]
+    assert server.used_weight[market] == sum(klines_request_weight(market, limit) for limit in limits)
+
+
+def test_limit_is_sized_to_the_page(server, tmp_path):
+    downloader = make_downloader(server, str(tmp_path))
+    downloader.download("um", "TRBUSDT", "1h", DAY, DAY + DAY_MS - 1)
+    assert server.requests[-1][1]["limit"] == "24"
+    assert server.used_weight["um"] == klines_request_weight("um", 24) == 1
+
+    # Coarse intervals download many days per request, still cached day by day
+    klines = downloader.download("um", "TRBUSDT", "1d", DAY - 100 * DAY_MS, DAY - 1)
+    assert len(server.requests) == 2
+    assert server.requests[-1][1]["limit"] == "100"
+    assert len(klines["open_time"]) == 100
+    assert len(list(tmp_path.rglob("1d/*.npz"))) == 100
+
+
+def test_range_is_trimmed_to_start_end(server, tmp_path):
+    downloader = make_downloader(server, str(tmp_path))
+    start, end = DAY + 90 * MINUTE, DAY + DAY_MS + 30 * MINUTE
+    klines = downloader.download("um", "TRBUSDT", "1m", start, end)
+    assert klines["open_time"][0] == start and klines["open_time"][-1] == end
+    assert len(klines["open_time"]) == (end - start) // MINUTE + 1
+
+
+def test_listing_day_has_partial_klines(tmp_path):
+    server = LocalKlineServer(listing_time=DAY + 12 * 3_600_000)
+    server.start()
+    try:
+        klines = make_downloader(server, str(tmp_path)).download("um", "NEWUSDT", "1h", DAY, DAY + 2 * DAY_MS - 1)
+    finally:
+        server.stop()
+    assert len(klines["open_time"]) == 12 + 24
+    assert klines["open_time"][0] == DAY + 12 * 3_600_000
+
+
+@pytest.mark.parametrize("file_format", [
+    "npz",
+    pytest.param("parquet", marks=pytest.mark.skipif(
+        importlib.util.find_spec("pyarrow") is None, reason="pyarrow is not installed")),
+])
+def test_cached_days_are_not_downloaded_again(server, tmp_path, file_format):
+    first = make_downloader(server, str(tmp_path), file_format=file_format)
+    klines = first.download("spot", "TRBUSDT", "5m", DAY, DAY + 3 * DAY_MS - 1)
+    requests = len(server.requests)
+    assert requests == 1
+    assert len(list(tmp_path.rglob(f"*.{file_format}"))) == 3
+
+    second = make_downloader(server, str(tmp_path), file_format=file_format)
+    cached = second.download("spot", "TRBUSDT", "5m", DAY, DAY + 3 * DAY_MS - 1)
+    assert len(server.requests) == requests and second.requests_sent == 0
+    for column, values in klines.items():
+        assert np.array_equal(cached[column], values)
+
+    # Only the day missing from the cache is downloaded
+    second.download("spot", "TRBUSDT", "5m", DAY, DAY + 4 * DAY_MS - 1)
+    assert len(server.requests) == requests + 1
+    assert server.requests[-1][1]["startTime"] == str(DAY + 3 * DAY_MS)
+
+
+def test_current_day_is_not_cached(server, tmp_path):
+    downloader = make_downloader(server, str(tmp_path))
+    today = int(time.time() * 1000) // DAY_MS * DAY_MS
+    downloader.download("um", "TRBUSDT", "1h", today - DAY_MS)
+    assert len(server.requests) == 1
+    assert [path.name for path in tmp_path.rglob("*.npz")] == [
+        time.strftime("%Y-%m-%d.npz", time.gmtime((today - DAY_MS) / 1000))]
+
+    # The day in progress is downloaded again, the complete day is read from the cache
+    downloader.download("um", "TRBUSDT", "1h", today - DAY_MS)
+    assert len(server.requests) == 2
+    assert server.requests[-1][1]["startTime"] == str(today)
+
+
+def test_one_klines_weight_function():
+    for limit in (50, 100, 499, 500, 1000, 1500):
+        assert request_weight("um", "klines", {"limit": limit}) == klines_request_weight("um", limit)
+        assert request_weight("spot", "klines", {"limit": limit}) == klines_request_weight("spot", limit) == 2
+    assert [klines_request_weight("um", limit) for limit in (99, 100, 499, 500, 1000, 1001)] == [1, 2, 2, 5, 5, 10]
@@ -0,0 +1,56 @@
+# tests/test_latency_monitor.py
+"""
+LatencyMonitor: samples recorded once while pulled concurrently, recorder time kept out of the decode stage.
+"""
+import json
+import threading
+import time
+
+from crypto_bot.binance.latency_monitor import FLUSH_SIZE, LatencyMonitor
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+
+
+def frame(n):
+    return json.dumps({"stream": "btcusdt@aggTrade", "data": {
+        "e": "aggTrade", "E": 1000 + n, "s": "BTCUSDT", "a": n, "p": "100.0", "q": "1.0",
+        "f": n, "l": n, "T": 1000 + n, "m": True,
+    }}).encode()
+
+
+def test_concurrent_pull_records_every_sample_once():
+    monitor = LatencyMonitor()
+    on_message = BinanceWSMessageHandler(latency_monitor=monitor).get_on_um_message_handler()
+    frames = [frame(n) for n in range(FLUSH_SIZE * 5 + 7)]
+    done = threading.Event()
+
+    def pull():
+        while not done.is_set():
+            monitor.summary()
+            monitor.prometheus_text()
+
+    puller = threading.Thread(target=pull)
+    puller.start()
+    try:
+        for message in frames:
+            on_message(None, message)
+    finally:
+        done.set()
+        puller.join()
+
+    [stats] = monitor.summary().values()
+    assert stats["messages"] == len(frames)
+    for stage in ("exchange_to_receive", "receive_to_decode", "decode_to_store"):
+        assert stats[stage]["count"] == len(frames)
+
+
+def test_recorder_time_is_not_decode_time():
+    class SlowRecorder:
+        def record(self, market, message, receive_ns):
+            time.sleep(0.02)
+
+    monitor = LatencyMonitor()
+    handler = BinanceWSMessageHandler(latency_monitor=monitor, recorder=SlowRecorder())
+    handler.get_on_um_message_handler()(None, frame(1))
+
+    [stats] = monitor.summary().values()
+    assert stats["receive_to_decode"]["max"] < 20_000_000
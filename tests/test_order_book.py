@@ -0,0 +1,156 @@
+# tests/test_order_book.py
+"""
+Order books rebuilt from the recorded diff. depth frames of fixtures/depth_replay.json,
+replayed through the message handler as the websocket delivers them.
+"""
+import json
+import threading
+import time
+
+import pytest
+
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+from crypto_bot.binance.order_book import OrderBookManager, PriceLadder
+from crypto_bot.binance.events import DepthUpdate
+from tests.conftest import load_fixture, wait_until
+
+
+class SnapshotFetcher:
+    """Stand-in of Spot.depth / UMFutures.depth."""
+    def __init__(self, snapshot: dict = None, error: Exception = None):
+        self.snapshot = snapshot
+        self.error = error
+        self.calls = []
+
+    def __call__(self, symbol: str, limit: int) -> dict:
+        self.calls.append((symbol, limit, time.monotonic()))
+        if self.error is not None:
+            raise self.error
+        return self.snapshot
+
+
+def replay(market: str, session: dict, handler: BinanceWSMessageHandler = None):
+    """
+    Replay the frames of a recorded session. The first frame triggers the snapshot request,
+    the snapshot is applied (with the buffered frames) on the next frame.
+    """
+    if handler is None:
+        handler = BinanceWSMessageHandler()
+    fetcher = SnapshotFetcher(session["snapshot"])
+    handler.order_books.set_snapshot_fetcher(market, fetcher)
+    on_message = handler.get_on_um_message_handler() if market == "um" else handler.get_spot_message_handler()
+
+    frames = [json.dumps(frame).encode() for frame in session["frames"]]
+    on_message(None, frames[0])
+    book = handler.order_books.get(market, session["symbol"])
+    assert wait_until(lambda: book._pending_snapshot is not None)
+    for frame in frames[1:]:
+        on_message(None, frame)
+    return handler, book, fetcher, on_message
+
+
+@pytest.mark.parametrize("market", ["um", "spot"])
+def test_replay_builds_book(market):
+    session = load_fixture("depth_replay.json")[market]
+    expected = session["expected"]
+    _, book, fetcher, _ = replay(market, session)
+
+    assert len(fetcher.calls) == 1
+    assert book.is_synced and not book.needs_snapshot
+    assert book.last_update_id == expected["last_update_id"]
+    assert book.best_bid() == pytest.approx(tuple(expected["best_bid"]))
+    assert book.best_ask() == pytest.approx(tuple(expected["best_ask"]))
+
+    prices, quantities = book.top_bids(3)
+    assert list(zip(prices, quantities)) == pytest.approx([tuple(level) for level in expected["top_bids"]])
+    prices, quantities = book.top_asks(3)
+    assert list(zip(prices, quantities)) == pytest.approx([tuple(level) for level in expected["top_asks"]])
+
+
+@pytest.mark.parametrize("market", ["um", "spot"])
+def test_gap_resyncs_from_new_snapshot(market):
+    session = load_fixture("depth_replay.json")[market]
+    handler, book, fetcher, on_message = replay(market, session)
+    gaps = []
+    handler.order_books.on_gap = lambda *args: gaps.append(args)
+
+    on_message(None, json.dumps(session["gap_frame"]).encode())
+    assert gaps and gaps[0][:3] == (market, session["symbol"], session["expected"]["last_update_id"])
+    assert not book.is_synced and book.needs_snapshot
+    assert book.resync_count == 1
+    assert book.best_bid() is None
+    assert wait_until(lambda: len(fetcher.calls) == 2)
+
+
+def test_um_uses_previous_final_update_id():
+    session = load_fixture("depth_replay.json")["um"]
+    _, book, _, on_message = replay("um", session)
+    # U does not follow u + 1 on um, only pu == previous u matters
+    frame = {"stream": "btcusdt@depth@100ms", "data": {
+        "e": "depthUpdate", "E": 1, "T": 1, "s": "BTCUSDT", "U": 1020, "u": 1021, "pu": 1008,
+        "b": [["100.25", "3.0"]], "a": []}}
+    on_message(None, json.dumps(frame).encode())
+    assert book.is_synced
+    assert book.last_update_id == 1021
+    assert book.best_bid() == (100.25, 3.0)
+
+
+def test_snapshot_requests_back_off_after_failures():
+    fetcher = SnapshotFetcher(error=ConnectionError("503"))
+    manager = OrderBookManager({"um": fetcher}, retry_delay=0.05, max_retry_delay=0.1)
+    session = load_fixture("depth_replay.json")["um"]
+    events = [DepthUpdate.from_message(frame["data"]) for frame in session["frames"]]
+    key = ("um", session["symbol"])
+
+    manager.on_depth_update("um", events[0])
+    assert wait_until(lambda: manager.snapshot_failures.get(key) == 1)
+    # Within the retry delay, events do not trigger requests
+    for event in events[1:]:
+        manager.on_depth_update("um", event)
+    assert len(fetcher.calls) == 1
+
+    for failures in (2, 3):
+        time.sleep(0.11)
+        manager.on_depth_update("um", events[-1])
+        assert wait_until(lambda: manager.snapshot_failures.get(key) == failures)
+    assert len(fetcher.calls) == 3
+
+    fetcher.error = None
+    fetcher.snapshot = session["snapshot"]
+    time.sleep(0.11)
+    manager.on_depth_update("um", events[-1])
+    book = manager.get("um", session["symbol"])
+    assert wait_until(lambda: book._pending_snapshot is not None)
+    assert key not in manager.snapshot_failures
+
+
+def test_one_snapshot_request_in_flight():
+    release = threading.Event()
+
+    def fetcher(symbol, limit):
+        calls.append(symbol)
+        release.wait(1)
+        return {"lastUpdateId": 1, "bids": [], "asks": []}
+
+    calls = []
+    manager = OrderBookManager({"um": fetcher})
+    event = DepthUpdate.from_message(load_fixture("depth_replay.json")["um"]["frames"][0]["data"])
+    for _ in range(50):
+        manager.on_depth_update("um", event)
+    release.set()
+    assert calls == ["BTCUSDT"]
+
+
+def test_price_ladder_sorted_levels():
+    bids = PriceLadder(is_bid=True, capacity=2)
+    for price, quantity in [(10.0, 1.0), (12.0, 2.0), (11.0, 3.0), (9.0, 4.0)]:
+        bids.set(price, quantity)
+    bids.set(12.0, 0)
+    assert bids.best() == (11.0, 3.0)
+    prices, quantities = bids.top(2)
+    assert list(prices) == [11.0, 10.0] and list(quantities) == [3.0, 1.0]
+
+    asks = PriceLadder(is_bid=False)
+    asks.update([(10.0, 1.0), (9.5, 2.0), (10.5, 3.0)])
+    assert asks.best() == (9.5, 2.0)
+    assert list(asks.top(5)[0]) == [9.5, 10.0, 10.5]
@@ -0,0 +1,205 @@
+# tests/test_order_gateway.py
+"""
+OrderGateway against the LocalMockExchange: acks, user data stream reports, cancels and rejections.
+"""
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+from binance.error import ClientError, ServerError
+
+from crypto_bot.binance.local_mock_exchange import LocalMockExchange
+from crypto_bot.binance.message_handler import BinanceWSMessageHandler
+from crypto_bot.binance.order_gateway import ORDER_STATUS_UNKNOWN, OrderGateway
+from crypto_bot.binance.symbol_info import SymbolFilters
+from crypto_bot.utils import fixed_point
+
+
+API_KEY = "test-api-key"
+SECRET_KEY = "test-secret-key"
+
+
+@pytest.fixture
+def handler():
+    return BinanceWSMessageHandler()
+
+
+@pytest.fixture
+def exchange(handler):
+    """Mock exchange whose reports reach the handler as user data stream frames."""
+    on_message = {"spot": handler.get_spot_message_handler(), "um": handler.get_on_um_message_handler()}
+
+    def on_report(market, event):
+        on_message[market](None, json.dumps({"stream": "listen-key", "data": event}).encode())
+
+    exchange = LocalMockExchange(API_KEY, SECRET_KEY, on_report=on_report)
+    exchange.start()
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def gateway(exchange, handler):
+    return OrderGateway(API_KEY, SECRET_KEY, orders=handler.orders,
+                        base_urls={"spot": exchange.rest_url, "um": exchange.rest_url})
+
+
+@pytest.mark.parametrize("market", ["spot", "um"])
+def test_rest_ack(gateway, exchange, market):
+    order = gateway.new_order(market, "BTCUSDT", "BUY", "LIMIT", quantity=0.001, price=25000.5, time_in_force="GTC")
+
+    assert order.status == "NEW"
+    assert order.order_id is not None
+    assert gateway.orders.get_by_order_id(market, order.order_id) is order
+    assert gateway.orders.open_orders(market, "BTCUSDT") == [order]
+    assert gateway.ack_latency[(market, "rest")].count == 1
+
+    _, method, _, params = exchange.requests[-1]
+    assert method == "POST"
+    assert (params["quantity"], params["price"], params["newClientOrderId"]) == ("0.001", "25000.5", order.client_order_id)
+
+
+def test_symbol_filters_round_order_numbers(exchange, handler):
+    filters = {"BTCUSDT": SymbolFilters("BTCUSDT", tick_size=fixed_point.parse("0.10"),
+                                        step_size=fixed_point.parse("0.001"))}
+    gateway = OrderGateway(API_KEY, SECRET_KEY, orders=handler.orders,
+                           base_urls={"spot": exchange.rest_url, "um": exchange.rest_url},
+                           symbol_filters=lambda market, symbol: filters.get(symbol))
+    order = gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=0.0019, price=25000.06, time_in_force="GTC")
+    _, _, _, params = exchange.requests[-1]
+    assert (params["quantity"], params["price"]) == ("0.001", "25000.1")
+    assert (order.quantity, order.price) == (0.001, 25000.1)
+
+    # Unknown symbol: sent as given
+    gateway.new_order("um", "ETHUSDT", "BUY", "LIMIT", quantity="0.0019", price=2000.06, time_in_force="GTC")
+    _, _, _, params = exchange.requests[-1]
+    assert (params["quantity"], params["price"]) == ("0.0019", "2000.06")
+
+
+@pytest.mark.parametrize("market", ["spot", "um"])
+def test_fill_reports_lifecycle(gateway, exchange, market):
+    order = gateway.new_order(market, "ETHUSDT", "SELL", "LIMIT", quantity=2, price=2000, time_in_force="GTC")
+    assert gateway.orders.report_latency[market].count == 1
+
+    exchange.fill(market, order.order_id, quantity=0.5, price=2000)
+    assert order.status == "PARTIALLY_FILLED"
+    assert (order.filled_quantity, order.last_fill_quantity, order.last_fill_price) == (0.5, 0.5, 2000.0)
+    assert order.is_open
+
+    exchange.fill(market, order.order_id, price=2001)
+    assert order.status == "FILLED"
+    assert order.filled_quantity == 2.0
+    assert order.average_price == pytest.approx((0.5 * 2000 + 1.5 * 2001) / 2)
+    assert gateway.orders.open_orders(market) == []
+
+
+def test_market_order_filled_at_once(gateway, exchange):
+    exchange.fill_price = 99.5
+    order = gateway.new_order("um", "BTCUSDT", "BUY", "MARKET", quantity=1)
+    assert order.status == "FILLED"
+    assert order.average_price == 99.5
+
+
+@pytest.mark.parametrize("by", ["client_order_id", "order_id"])
+def test_cancel(gateway, by):
+    order = gateway.new_order("spot", "BTCUSDT", "BUY", "LIMIT", quantity=1, price=100, time_in_force="GTC")
+    if by == "client_order_id":
+        response = gateway.cancel_order("spot", "BTCUSDT", client_order_id=order.client_order_id)
+    else:
+        response = gateway.cancel_order("spot", "BTCUSDT", order_id=order.order_id)
+    assert response["status"] == "CANCELED"
+    assert order.status == "CANCELED"
+    assert not order.is_open and gateway.orders.open_orders("spot") == []
+
+    with pytest.raises(ClientError) as error:
+        gateway.cancel_order("spot", "BTCUSDT", order_id=order.order_id)
+    assert error.value.error_code == -2011
+
+
+def test_rejections(gateway, exchange):
+    with pytest.raises(ClientError) as error:
+        gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=1, time_in_force="GTC")
+    assert error.value.error_code == -1102
+    order = gateway.orders.get(exchange.requests[-1][3]["newClientOrderId"])
+    assert order.status == "REJECTED" and "price" in order.reject_reason
+    assert gateway.orders.open_orders() == []
+
+    forged = OrderGateway(API_KEY, "wrong-secret", base_urls={"spot": exchange.rest_url, "um": exchange.rest_url})
+    with pytest.raises(ClientError) as error:
+        forged.new_order("spot", "BTCUSDT", "BUY", "MARKET", quantity=1)
+    assert error.value.error_code == -1022
+    assert [order.status for order in forged.orders.orders.values()] == ["REJECTED"]
+
+
+def test_timeout_marks_order_unknown_until_reconciled():
+    # Accepts connections but never answers
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    url = f"http://127.0.0.1:{server.getsockname()[1]}"
+    try:
+        gateway = OrderGateway(API_KEY, SECRET_KEY, base_urls={"spot": url, "um": url}, request_timeout=0.2)
+        with pytest.raises(OSError):
+            gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=1, price=100, time_in_force="GTC")
+    finally:
+        server.close()
+
+    [order] = gateway.orders.orders.values()
+    assert order.status == ORDER_STATUS_UNKNOWN
+    assert gateway.orders.open_orders("um") == [order]
+
+    # A REST snapshot taken after the send, without the order: it is not open
+    assert gateway.orders.reconcile("um", [], order.sent_time + 1) == 1
+    assert order.status == "CLOSED"
+    assert gateway.orders.open_orders("um") == []
+
+
+def test_server_error_marks_order_unknown(gateway, exchange, monkeypatch):
+    monkeypatch.setattr(exchange, "_place", lambda market, params: (503, {"code": -1001, "msg": "Internal error"}))
+    with pytest.raises(ServerError):
+        gateway.new_order("spot", "BTCUSDT", "BUY", "LIMIT", quantity=1, price=100, time_in_force="GTC")
+    [order] = gateway.orders.orders.values()
+    assert order.status == ORDER_STATUS_UNKNOWN
+
+
+def test_websocket_path_requires_started_api(gateway):
+    with pytest.raises(RuntimeError, match="not started"):
+        gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=1, price=100, time_in_force="GTC", path="websocket")
+    with pytest.raises(RuntimeError, match="not started"):
+        gateway.cancel_order("um", "BTCUSDT", order_id=1, path="websocket")
+    assert gateway.orders.orders == {}
+
+
+def test_websocket_api_path(gateway, exchange):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(exchange.start_websocket_api(), loop).result(5)
+        gateway.ws_api_urls = exchange.ws_api_urls
+        asyncio.run_coroutine_threadsafe(gateway.start_websocket_api(), loop).result(5)
+
+        order = gateway.new_order("um", "BTCUSDT", "BUY", "LIMIT", quantity=1, price=100,
+                                  time_in_force="GTC", path="websocket")
+        assert order.status == "NEW" and order.order_id is not None
+        assert gateway.ack_latency[("um", "websocket")].count == 1
+
+        response = gateway.cancel_order("um", "BTCUSDT", order_id=order.order_id, path="websocket")
+        assert response["status"] == "CANCELED" and order.status == "CANCELED"
+
+        # From the gateway's own loop, the blocking call is refused before the order is created
+        async def blocking_call():
+            gateway.new_order("um", "BTCUSDT", "BUY", "MARKET", quantity=1, path="websocket")
+
+        orders = len(gateway.orders.orders)
+        with pytest.raises(RuntimeError, match="Blocking call"):
+            asyncio.run_coroutine_threadsafe(blocking_call(), loop).result(5)
+        assert len(gateway.orders.orders) == orders
+    finally:
+        asyncio.run_coroutine_threadsafe(gateway.stop_websocket_api(), loop).result(5)
+        asyncio.run_coroutine_threadsafe(exchange.stop_websocket_api(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
@@ -0,0 +1,122 @@
+# tests/test_shared_market_state.py
+"""
+Shared memory tables (seqlock rows) and the split of the streams over the worker processes.
+"""
+import pytest
+
+from crypto_bot.binance.shared_market_state import (
+    BOOK_TICKER_COLUMNS,
+    SharedMemoryMessageHandler,
+    SharedSymbolTable,
+    split_streams,
+)
+
+
+@pytest.fixture
+def table():
+    table = SharedSymbolTable(["BTCUSDT", "ETHUSDT"], BOOK_TICKER_COLUMNS)
+    yield table
+    table.close()
+
+
+class TornColumn:
+    """
+    First column of a table whose first read of a row is followed by a write of another
+    writer (seqlock protocol included) before the reader gets to the other columns.
+    """
+    def __init__(self, table: SharedSymbolTable, row: int, values: tuple):
+        self.table = table
+        self.pending = (row, values)
+        self.reads = 0
+
+    def __getitem__(self, row):
+        table = self.table
+        value = table.arrays[table.columns[0][0]][row]
+        self.reads += 1
+        if self.pending is not None and self.pending[0] == row:
+            _, values = self.pending
+            self.pending = None
+            table.seq[row] += 1
+            for (column, _), new_value in zip(table.columns, values):
+                table.arrays[column][row] = new_value
+            table.seq[row] += 1
+        return value
+
+
+def test_write_read_round_trip(table):
+    assert table.read("BTCUSDT") is None
+    assert not table.write("XRPUSDT", (1.0, 1.0, 1.0, 1.0, 1, 1, 1))
+
+    values = (42_000.5, 1.25, 42_001.0, 0.5, 123, 1_700_000_000_000, 1_700_000_000_001)
+    assert table.write("BTCUSDT", values)
+    row = table.read("BTCUSDT")
+    assert row == dict(zip((column for column, _ in BOOK_TICKER_COLUMNS), values))
+    assert isinstance(row["updateId"], int)
+    assert table.read_row(0) == (values, 2)
+
+    # Another process attaches to the same block
+    attached = SharedSymbolTable(**table.spec(), create=False)
+    try:
+        assert attached.read("BTCUSDT") == row
+        attached.write("ETHUSDT", (2_000.0, 1.0, 2_000.5, 2.0, 7, 8, 9))
+        snapshot = table.snapshot()
+    finally:
+        attached.close()
+    assert list(snapshot["symbol"]) == ["BTCUSDT", "ETHUSDT"]
+    assert list(snapshot["seq"]) == [2, 2]
+    assert list(snapshot["bid"]) == [42_000.5, 2_000.0]
+
+
+def test_torn_read_is_retried(table):
+    table.write("BTCUSDT", (1.0, 1.0, 1.0, 1.0, 1, 1, 1))
+    new_values = (2.0, 2.0, 2.0, 2.0, 2, 2, 2)
+    # The writer completes between the read of the first column and the others
+    torn = TornColumn(table, 0, new_values)
+    table._column_arrays = (torn, *table._column_arrays[1:])
+
+    values, version = table.read_row(0)
+    assert (values, version) == (new_values, 4)
+    assert torn.reads == 2
+
+
+def test_row_being_written_times_out(table):
+    table.write("BTCUSDT", (1.0, 1.0, 1.0, 1.0, 1, 1, 1))
+    table.seq[0] += 1   # writer died in the middle of the row
+    with pytest.raises(TimeoutError):
+        table.read_row(0, max_retries=10)
+    # The other rows stay readable
+    assert table.read("ETHUSDT") is None
+
+
+def test_handler_writes_book_tickers(table):
+    handler = SharedMemoryMessageHandler(book_ticker_table=table)
+    handler._um_book_ticker_handler({
+        "e": "bookTicker", "u": 400900217, "E": 1568014460893, "T": 1568014460891, "s": "ETHUSDT",
+        "b": "25.35190000", "B": "31.21000000", "a": "25.36520000", "A": "40.66000000",
+    })
+    assert table.read("ETHUSDT")["ask"] == 25.3652
+
+
+@pytest.mark.parametrize("streams", [
+    ["!bookTicker", "btcusdt@bookTicker", "!markPrice@arr", "btcusdt@markPrice", "ethusdt@aggTrade"],
+    ["btcusdt@markPrice", "ethusdt@markPrice", "btcusdt@markPrice@1s", "btcusdt@bookTicker", "btcusdt@aggTrade"],
+])
+def test_streams_writing_the_same_rows_share_a_worker(streams):
+    groups = split_streams(streams, 4)
+    assert sorted(stream for group in groups for stream in group) == sorted(streams)
+
+    def worker(stream):
+        return next(i for i, group in enumerate(groups) if stream in group)
+
+    if "!bookTicker" in streams:
+        assert worker("!bookTicker") == worker("btcusdt@bookTicker")
+        assert worker("!markPrice@arr") == worker("btcusdt@markPrice")
+        assert worker("!bookTicker") != worker("!markPrice@arr")
+    else:
+        assert worker("btcusdt@markPrice") == worker("btcusdt@markPrice@1s")
+        assert len([group for group in groups if group]) == 4
+
+
+def test_split_streams_balances_the_load():
+    streams = [f"{symbol}@aggTrade" for symbol in ("btcusdt", "ethusdt", "solusdt", "xrpusdt")]
+    assert sorted(len(group) for group in split_streams(streams, 2)) == [2, 2]
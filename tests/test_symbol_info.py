@@ -0,0 +1,54 @@
+# tests/test_symbol_info.py
+"""
+SymbolTable / SymbolRegistry: filters derived from the table, dropped symbols, the disk cache.
+"""
+import os
+
+from crypto_bot.binance.symbol_info import SymbolRegistry, SymbolTable
+from crypto_bot.utils import fixed_point
+
+
+def symbol_info(symbol, tick_size="0.10", step_size="0.001"):
+    return {"symbol": symbol, "status": "TRADING", "baseAsset": symbol[:-4], "quoteAsset": "USDT",
+            "contractType": "PERPETUAL", "filters": [
+                {"filterType": "PRICE_FILTER", "tickSize": tick_size, "minPrice": "0.10", "maxPrice": "1000000"},
+                {"filterType": "LOT_SIZE", "stepSize": step_size, "minQty": step_size, "maxQty": "1000"},
+                {"filterType": "MIN_NOTIONAL", "notional": "5"},
+            ]}
+
+
+class RestClient:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.calls = 0
+
+    def exchange_info(self):
+        self.calls += 1
+        return {"symbols": [symbol_info(symbol) for symbol in self.symbols]}
+
+
+def test_dropped_symbol_has_no_filters():
+    table = SymbolTable("um")
+    table.update({"symbols": [symbol_info("BTCUSDT"), symbol_info("TRBUSDT", "0.001", "0.1")]})
+    trb = table.filters("TRBUSDT")
+    assert (trb.tick_size, trb.step_size, trb.price_decimals) == (100000, 10000000, 3)
+
+    table.update({"symbols": [symbol_info("BTCUSDT")]})
+    assert table.id("TRBUSDT") == 1
+    assert table.filters("TRBUSDT") is None
+    assert table.filters("BTCUSDT").format_price(table.filters("BTCUSDT").round_price(fixed_point.parse("64123.456"))) \
+        == "64123.5"
+
+
+def test_registry_filters_from_the_cached_table(tmp_path):
+    client = RestClient(["BTCUSDT", "ETHUSDT"])
+    registry = SymbolRegistry({"um": client}, cache_directory=str(tmp_path))
+    registry.load(("um",))
+    assert registry.filters("um", "ETHUSDT").step_size == fixed_point.parse("0.001")
+    assert registry.filters("spot", "ETHUSDT") is None
+    assert os.listdir(tmp_path) == ["um_symbols.json"]
+
+    cached = SymbolRegistry(cache_directory=str(tmp_path))
+    cached.load(("um",))
+    assert cached.filters("um", "BTCUSDT").tick_size == fixed_point.parse("0.10")
+    assert client.calls == 1
@@ -0,0 +1,117 @@
+# tests/test_trade_flow.py
+"""
+TradeFlow rolling windows: eviction, late (backfilled) trades, the per-market table,
+and live trades racing backfilled ones.
+"""
+import math
+import threading
+
+import pytest
+
+from crypto_bot import market_data_subscriptions
+from crypto_bot.binance.events import AggTrade
+from crypto_bot.binance.trade_flow import METRICS, TradeFlow, window_ms
+
+
+def agg_trade(symbol: str, trade_time: int, price: float, quantity: float, is_buyer_maker: bool = False,
+              trade_count: int = 1) -> AggTrade:
+    return AggTrade.from_message({
+        "e": "aggTrade", "E": trade_time, "s": symbol, "a": trade_time, "p": str(price), "q": str(quantity),
+        "f": 100, "l": 100 + trade_count - 1, "T": trade_time, "m": is_buyer_maker,
+    })
+
+
+def test_window_ms():
+    assert [window_ms(window) for window in ("500ms", "10s", "1m", "4h")] == [500, 10_000, 60_000, 14_400_000]
+    for window in ("0s", "10", "1w"):
+        with pytest.raises(ValueError):
+            window_ms(window)
+
+
+def test_trades_leave_the_window():
+    flow = TradeFlow(windows=("10s", "1m"))
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 0, 100.0, 1.0, trade_count=3))
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 5_000, 110.0, 1.0, is_buyer_maker=True))
+    metrics = flow.metrics("um", "BTCUSDT")
+    assert metrics["10s"]["volume"] == 2.0 and metrics["10s"]["trade_count"] == 4
+    assert metrics["10s"]["vwap"] == 105.0 and metrics["10s"]["cvd"] == 0.0
+
+    # The first trade leaves the 10s window (at exactly 10s), not the 1m one
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 10_000, 120.0, 2.0))
+    metrics = flow.metrics("um", "BTCUSDT")
+    assert metrics["10s"]["volume"] == 3.0 and metrics["10s"]["agg_trade_count"] == 2
+    assert metrics["10s"]["imbalance"] == pytest.approx(1 / 3)
+    assert metrics["1m"]["volume"] == 4.0 and metrics["1m"]["trade_count"] == 5
+
+    # Reading with `now` decays a quiet symbol, the cumulative delta stays
+    metrics = flow.metrics("um", "BTCUSDT", now=70_000)
+    assert metrics["1m"]["volume"] == 0.0 and math.isnan(metrics["1m"]["vwap"])
+    assert flow.get_flow("um", "BTCUSDT").cumulative_cvd == 2.0
+    assert flow.metrics("spot", "BTCUSDT") is None
+
+
+def test_late_trades_only_join_the_windows_covering_them():
+    flow = TradeFlow(windows=("10s", "1m"))
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 30_000, 100.0, 1.0))
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 25_000, 100.0, 2.0))    # late, within both windows
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 15_000, 100.0, 4.0))    # late, older than the 10s window
+
+    symbol_flow = flow.get_flow("um", "BTCUSDT")
+    assert symbol_flow.late_trades == 2 and symbol_flow.last_trade_time == 30_000
+    metrics = flow.metrics("um", "BTCUSDT")
+    assert metrics["10s"]["volume"] == 3.0
+    assert metrics["1m"]["volume"] == 7.0
+    assert symbol_flow.cumulative_cvd == 7.0
+
+    # Late trades leave the windows (queued at their end) and the sums go back to zero
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 100_000, 100.0, 1.0))
+    metrics = flow.metrics("um", "BTCUSDT")
+    assert metrics["10s"]["volume"] == metrics["1m"]["volume"] == 1.0
+
+
+def test_table():
+    flow = TradeFlow(windows=("10s", "1m"))
+    flow.on_agg_trade("um", agg_trade("BTCUSDT", 0, 100.0, 1.0))
+    flow.on_agg_trade("um", agg_trade("ETHUSDT", 0, 10.0, 2.0, is_buyer_maker=True))
+    flow.on_agg_trade("um", agg_trade("ETHUSDT", 20_000, 12.0, 1.0))
+    flow.on_agg_trade("spot", agg_trade("BTCUSDT", 0, 100.0, 5.0))
+
+    table = flow.table("um", "10s")
+    assert list(table["symbol"]) == ["BTCUSDT", "ETHUSDT"]
+    assert set(table) == {"symbol", "cumulative_cvd", *METRICS}
+    assert list(table["volume"]) == [1.0, 1.0]
+    assert list(table["cumulative_cvd"]) == [1.0, -1.0]
+
+    table = flow.table("um", "1m", now=30_000)
+    assert list(table["volume"]) == [1.0, 3.0]
+    assert list(table["imbalance"]) == [1.0, pytest.approx(-1 / 3)]
+    table = flow.table("um", "10s", now=30_000)
+    assert list(table["volume"]) == [0.0, 0.0]
+    with pytest.raises(ValueError):
+        flow.table("um", "5m")
+
+
+def test_backfill_races_live_trades():
+    flow = TradeFlow(windows=("1s", "1h"))
+    flow.start()
+    try:
+        trades = 20_000
+        backfill = [agg_trade("BTCUSDT", i, 100.0, 1.0) for i in range(trades)]
+        live = [agg_trade("BTCUSDT", trades + i, 100.0, 1.0) for i in range(trades)]
+
+        def publish_backfill():
+            for i in range(0, trades, 100):
+                market_data_subscriptions.publish("binance", "BTCUSDT", "um", "aggTradeBackfill", backfill[i:i + 100])
+
+        thread = threading.Thread(target=publish_backfill, name="aggtrade-backfill")
+        thread.start()
+        for trade in live:
+            flow.on_agg_trade("um", trade)
+        thread.join()
+    finally:
+        flow.stop()
+
+    # Every trade is counted once in the hour window, whatever the interleaving
+    metrics = flow.metrics("um", "BTCUSDT")["1h"]
+    assert metrics["volume"] == metrics["trade_count"] == metrics["agg_trade_count"] == 2 * trades
+    assert flow.get_flow("um", "BTCUSDT").cumulative_cvd == 2 * trades
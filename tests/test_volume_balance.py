@@ -0,0 +1,53 @@
+# tests/test_volume_balance.py
+"""
+VolumeBalance buckets: closed klines are authoritative over late trades, quiet symbols finalize on the clock.
+"""
+from crypto_bot.volume_balance import VolumeBalance
+
+MINUTE = 60_000
+
+
+def test_trades_after_the_kline_are_ignored():
+    balance = VolumeBalance(interval="1m", finalize_every=None)
+    balance.add_volume("um", "TRBUSDT", 10, 1.0)
+    balance.add_volume("um", "TRBUSDT", 20, 2.0)
+    balance.add_volume("um", "TRBUSDT", 0, 5.0, replace=True)
+    # Late aggTrade of the same bucket, already counted in the kline
+    balance.add_volume("um", "TRBUSDT", MINUTE - 1, 2.0)
+    # The spot side has no kline yet, its trades still add up
+    balance.add_volume("spot", "TRBUSDT", 30, 1.5)
+    balance.add_volume("spot", "TRBUSDT", 40, 1.0)
+
+    series = balance.get_series("TRBUSDT")
+    history = balance.history("TRBUSDT", 1)
+    assert (history["um_volume"][0], history["spot_volume"][0]) == (5.0, 2.5)
+    assert series.ignored == 1
+
+
+def test_quiet_symbol_is_finalized_on_the_clock():
+    balance = VolumeBalance(interval="1m", lateness=1, finalize_every=None)
+    balance.add_volume("um", "TRBUSDT", 0, 4.0)
+    balance.add_volume("spot", "TRBUSDT", 0, 2.0)
+    assert balance.get_series("TRBUSDT").final_until is None
+
+    # No trade since: the bucket is final once `lateness` intervals passed after its close
+    balance.finalize_due(now=2 * MINUTE - 1)
+    assert balance.get_series("TRBUSDT").samples == 0
+    balance.finalize_due(now=2 * MINUTE)
+    series = balance.get_series("TRBUSDT")
+    assert series.final_until == 0
+    assert series.samples == 1
+    assert balance.table()["balance"][0] == 2.0
+
+
+def test_spot_symbol_maps_to_the_perpetual():
+    for um_symbols in (["BTCUSDT", "BTCUSDT_250328"], ["BTCUSDT_250328", "BTCUSDT", "BTCUSDT_250627"]):
+        balance = VolumeBalance(interval="1m", finalize_every=None)
+        balance.add_symbols(um_symbols + ["1000PEPEUSDT"])
+        assert balance.spot_symbols["BTCUSDT"] == ("BTCUSDT", 1)
+        assert balance.spot_symbols["PEPEUSDT"] == ("1000PEPEUSDT", 1000)
+
+    balance.add_volume("spot", "BTCUSDT", 0, 2.0)
+    balance.add_volume("um", "BTCUSDT", 0, 3.0)
+    assert balance.history("BTCUSDT", 1)["balance"][0] == 1.5
+    assert balance.get_series("BTCUSDT_250328") is None